@@ -1,6 +1,5 @@
 import sys
 import pandas as pd
-import sqlite3
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QLabel, QTableView,
     QFrame, QScrollArea, QGridLayout, QDialog, QMessageBox, QHeaderView,
@@ -11,6 +10,7 @@ from PyQt6.QtGui import QFont, QPixmap
 import logging
 import os
 from .Common.Freeze_column import FreezeTableWidget
+from utils.db_pool import get_connection, transaction, fetch_all, fetch_one, read_frame, table_columns
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -70,6 +70,7 @@ class CRMTab(QWidget):
         self.app = app
         self.parent_frame = parent_frame
         self.conn = None
+        self.db_path = None
         self.pivot_data = None
         self.table_view = None
         self.search_var = QLineEdit()
@@ -213,7 +214,9 @@ class CRMTab(QWidget):
         try:
             # Use resource_path to get the correct path to the database
             db_path = self.app.resource_path("crm_data.db")
-            self.conn = sqlite3.connect(db_path)
+            # اتصال مشترک db_pool (همان اتصال thread جاری؛ بسته نمی‌شود)
+            self.conn = get_connection(db_path)
+            self.db_path = db_path
             logger.info(f"Connected to SQLite database at {db_path}")
         except Exception as e:
             logger.error(f"Failed to connect to SQLite database: {str(e)}")
@@ -225,9 +228,7 @@ class CRMTab(QWidget):
             self.init_db()
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pivot_crm'")
-            if not cursor.fetchone():
+            if not fetch_one(self.db_path, "SELECT name FROM sqlite_master WHERE type='table' AND name='pivot_crm'"):
                 QMessageBox.warning(self, "Warning", "Pivot table not found in database. Please ensure the pivot_crm table exists.")
                 self.placeholder_label.setText("No pivot_crm table found in database.")
                 return
@@ -248,9 +249,8 @@ class CRMTab(QWidget):
             return
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT DISTINCT [Analysis Method] FROM pivot_crm WHERE [Analysis Method] IS NOT NULL")
-            unique_methods = ["All"] + sorted([row[0] for row in cursor.fetchall()])
+            rows = fetch_all(self.db_path, "SELECT DISTINCT [Analysis Method] FROM pivot_crm WHERE [Analysis Method] IS NOT NULL")
+            unique_methods = ["All"] + sorted([row[0] for row in rows])
             self.filter_var.clear()
             self.filter_var.addItems(unique_methods)
             if self.filter_var.currentText() not in unique_methods:
@@ -268,8 +268,6 @@ class CRMTab(QWidget):
             return
 
         try:
-            cursor = self.conn.cursor()
-
             # If Our OREAS checkbox is checked, show only records from our_oreas
             if self.our_oreas_checkbox.isChecked():
                 query = """
@@ -286,8 +284,7 @@ class CRMTab(QWidget):
             search_text = self.search_var.text().strip().lower()
             filter_method = self.filter_var.currentText()
 
-            cursor.execute("PRAGMA table_info(pivot_crm)")
-            columns = [info[1] for info in cursor.fetchall()]
+            columns = table_columns(self.db_path, "pivot_crm")
 
             # === جستجو فقط در ستون CRM ID ===
             if search_text:
@@ -304,7 +301,7 @@ class CRMTab(QWidget):
             if conditions:
                 query += " WHERE " + " AND ".join(conditions)
 
-            df = pd.read_sql_query(query, self.conn, params=params)
+            df = read_frame(self.db_path, query, params=params)
             if df.empty:
                 self._set_status_table("No data after filtering")
                 return
@@ -364,9 +361,7 @@ class CRMTab(QWidget):
         layout.setContentsMargins(10, 10, 10, 10)
         layout.setSpacing(10)
 
-        cursor = self.conn.cursor()
-        cursor.execute("PRAGMA table_info(pivot_crm)")
-        columns = [info[1] for info in cursor.fetchall()]
+        columns = table_columns(self.db_path, "pivot_crm")
         entry_vars = {col: QLineEdit() for col in columns}
 
         scroll_area = QScrollArea()
@@ -405,13 +400,11 @@ class CRMTab(QWidget):
     def save_record(self, entry_vars, dialog):
         """Save new record to 'pivot_crm'."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("PRAGMA table_info(pivot_crm)")
-            columns = [info[1] for info in cursor.fetchall()]
+            columns = table_columns(self.db_path, "pivot_crm")
             values = [entry_vars[col].text() or None for col in columns]
             query = f"INSERT INTO pivot_crm ({', '.join(f'[{col}]' for col in columns)}) VALUES ({', '.join(['?'] * len(columns))})"
-            cursor.execute(query, values)
-            self.conn.commit()
+            with transaction(self.db_path) as conn:
+                conn.execute(query, values)
             logger.info("Added new record to pivot_crm table")
             self.update_display()
             QMessageBox.information(dialog, "Success", "Record added successfully!")
@@ -445,8 +438,7 @@ class CRMTab(QWidget):
         layout.setContentsMargins(10, 10, 10, 10)
         layout.setSpacing(10)
 
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM pivot_crm WHERE [CRM ID] = ?", (id_value,))
+        cursor = self.conn.execute("SELECT * FROM pivot_crm WHERE [CRM ID] = ?", (id_value,))
         record = cursor.fetchone()
         columns = [desc[0] for desc in cursor.description]
         entry_vars = {col: QLineEdit(str(record[i]) if record[i] is not None else "") for i, col in enumerate(columns)}
@@ -487,14 +479,12 @@ class CRMTab(QWidget):
     def save_edit(self, entry_vars, id_value, dialog):
         """Save edited record to 'pivot_crm'."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("PRAGMA table_info(pivot_crm)")
-            columns = [info[1] for info in cursor.fetchall()]
+            columns = table_columns(self.db_path, "pivot_crm")
             set_clause = ", ".join(f"[{col}] = ?" for col in columns if col != 'CRM ID')
             query = f"UPDATE pivot_crm SET {set_clause} WHERE [CRM ID] = ?"
             update_values = [entry_vars[col].text() or None for col in columns if col != 'CRM ID'] + [id_value]
-            cursor.execute(query, update_values)
-            self.conn.commit()
+            with transaction(self.db_path) as conn:
+                conn.execute(query, update_values)
             logger.info(f"Updated record with CRM ID = {id_value}")
             self.update_display()
             QMessageBox.information(dialog, "Success", "Record updated successfully!")
@@ -518,13 +508,12 @@ class CRMTab(QWidget):
             return
 
         try:
-            cursor = self.conn.cursor()
             id_col = 'CRM ID'
-            for row in selected:
-                id_value = self.table_view.model().data(self.table_view.model().index(row.row(), 0))
-                cursor.execute(f"DELETE FROM pivot_crm WHERE [{id_col}] = ?", (id_value,))
-                logger.info(f"Deleted record with {id_col} = {id_value}")
-            self.conn.commit()
+            with transaction(self.db_path) as conn:
+                for row in selected:
+                    id_value = self.table_view.model().data(self.table_view.model().index(row.row(), 0))
+                    conn.execute(f"DELETE FROM pivot_crm WHERE [{id_col}] = ?", (id_value,))
+                    logger.info(f"Deleted record with {id_col} = {id_value}")
             self.update_display()
             QMessageBox.information(self, "Success", "Selected records deleted successfully!")
         except Exception as e:
@@ -532,19 +521,11 @@ class CRMTab(QWidget):
             QMessageBox.warning(self, "Error", f"Failed to delete records:\n{str(e)}")
 
     def reset_cache(self):
-        """Reset cache and close database connection."""
-        if self.conn:
-            self.conn.close()
-            logger.info("SQLite database connection closed")
+        """Reset cache and drop the database connection (the pooled connection stays open)."""
         self.conn = None
+        self.db_path = None
         self.pivot_data = None
         self.column_widths = {}
         self.search_var.clear()
         self.filter_var.setCurrentText("All")
         self.ui_initialized = False
-
-    def __del__(self):
-        """Ensure database connection is closed when object is destroyed."""
-        if self.conn:
-            self.conn.close()
-            logger.info("SQLite database connection closed in destructor")
@@ -5,37 +5,32 @@ import pandas as pd
 import re
 import time
 import logging
-from collections import deque
+from utils.correction_kernel import correct_by_label
+from utils.undo_journal import app_journal, JournalError
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+JOURNAL_SCOPE = 'df_check'
+
 class DFCorrectionThread(QThread):
     """Thread for applying DF corrections in the background."""
     progress = pyqtSignal(int)
-    finished = pyqtSignal(str, int)
+    finished = pyqtSignal(object, int)
     error = pyqtSignal(str)
 
     def __init__(self, df, solution_labels, new_df):
         super().__init__()
-        self.df = df.copy()
+        self.df = df  # read only; the result is applied on the GUI thread
         self.solution_labels = solution_labels
         self.new_df = new_df
 
     def run(self):
         try:
-            corrected_rows = 0
-            total_rows = len(self.solution_labels)
-            for i, solution_label in enumerate(self.solution_labels):
-                mask = (self.df['Solution Label'] == solution_label) & (self.df['Type'] == 'Samp')
-                matching_rows = self.df[mask]
-                if not matching_rows.empty:
-                    self.df.loc[mask, 'DF'] = self.new_df
-                    corrected_rows += len(matching_rows)
-                if total_rows > 10:
-                    self.progress.emit(int((i + 1) / total_rows * 100))
-            self.finished.emit(self.df.to_json(), corrected_rows)
+            result = correct_by_label(self.df, dict.fromkeys(self.solution_labels, self.new_df), 'DF')
+            self.progress.emit(100)
+            self.finished.emit(result, result.corrected_rows)
         except Exception as e:
             self.error.emit(str(e))
 
@@ -54,7 +49,10 @@ class DFCheckFrame(QWidget):
         self.included_samples = set()
         self.df_value = 1.0
         self.new_df = 1.0
-        self.undo_stack = deque()
+        self.journal = app_journal(app)
+        self.journal.register(f"{JOURNAL_SCOPE}.df_cache", lambda: self.df_cache)
+        self.journal.register(f"{JOURNAL_SCOPE}.corrected_dfs", lambda: self.corrected_dfs)
+        self._corrected_dfs_before = {}
         self.is_select_all_processing = False
 
         # CRITICAL: Connect this instance to app (مثل WeightCheckFrame)
@@ -174,6 +172,11 @@ class DFCheckFrame(QWidget):
         undo_button.clicked.connect(self.undo_last_change)
         input_layout.addWidget(undo_button)
 
+        redo_button = QPushButton("Redo")
+        redo_button.setToolTip("Redo the last undone DF correction")
+        redo_button.clicked.connect(self.redo_last_change)
+        input_layout.addWidget(redo_button)
+
         input_layout.addStretch()
         main_layout.addWidget(input_group)
 
@@ -443,7 +446,7 @@ class DFCheckFrame(QWidget):
             QMessageBox.warning(self, "Warning", "No samples included! Check 'Include' checkboxes.")
             return
 
-        self.undo_stack.append(df.copy().to_json())
+        self._corrected_dfs_before = dict(self.corrected_dfs)
 
         # Store corrections like Weight (استفاده از original_bad_dfs)
         if self.original_bad_dfs is not None:
@@ -462,13 +465,9 @@ class DFCheckFrame(QWidget):
 
         if len(valid_labels) <= 10:
             try:
-                corrected_rows = 0
-                for solution_label in valid_labels:
-                    mask = (df['Solution Label'] == solution_label) & (df['Type'] == 'Samp')
-                    matching_rows = df[mask]
-                    if not matching_rows.empty:
-                        df.loc[mask, 'DF'] = self.new_df
-                        corrected_rows += len(matching_rows)
+                result = correct_by_label(df, dict.fromkeys(valid_labels, self.new_df), 'DF')
+                self.apply_correction_result(result)
+                corrected_rows = result.corrected_rows
                 self.df_cache = df
                 self.app.set_data(self.df_cache)
                 self.data_changed.emit()
@@ -524,37 +523,54 @@ class DFCheckFrame(QWidget):
         self.selected_solution_labels = []
         self.select_all_checkbox.setCheckState(Qt.CheckState.Unchecked)
 
+    def apply_correction_result(self, result):
+        """Write a correction into df_cache and journal the changed cells and corrected_dfs entries."""
+        with self.journal.group("DF correction", JOURNAL_SCOPE):
+            result.apply(self.df_cache, self.journal, f"{JOURNAL_SCOPE}.df_cache")
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.corrected_dfs",
+                                          self._corrected_dfs_before, self.corrected_dfs)
+
     def undo_last_change(self):
         """Undo the last DF correction and update the table (مثل Weight)."""
-        if not self.undo_stack:
+        if not self.journal.can_undo(JOURNAL_SCOPE):
             QMessageBox.information(self, "Info", "No changes to undo!")
             return
-        
-        # Restore previous data from undo stack
-        prev_json = self.undo_stack.pop()
-        self.df_cache = pd.read_json(prev_json)
+        try:
+            self.journal.undo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Undo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change undone")
+        if self.bad_dfs.empty:
+            QMessageBox.information(self, "Info", "No DF issues found after undo.")
+
+    def redo_last_change(self):
+        """Redo the last undone DF correction and update the table."""
+        if not self.journal.can_redo(JOURNAL_SCOPE):
+            QMessageBox.information(self, "Info", "No changes to redo!")
+            return
+        try:
+            self.journal.redo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Redo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change redone")
+
+    def refresh_after_journal_step(self):
+        """Publish df_cache after an undo/redo and rebuild the bad DF table."""
         self.app.set_data(self.df_cache)
         self.data_changed.emit()
         self.app.notify_data_changed()  # Notify all tabs of data change
-        
-        # Recalculate bad_dfs based on restored data (مثل Weight)
         self.recalculate_bad_dfs()
-
-        # Clear corrected_dfs since we're reverting to previous state (مثل Weight)
-        self.corrected_dfs.clear()
-        
-        # Update table to reflect restored bad DFs
         self.update_correction_table()
         self.clear_ui_state()
-        
-        QMessageBox.information(self, "Success", "Last change undone")
-        if self.bad_dfs.empty:
-            QMessageBox.information(self, "Info", "No DF issues found after undo.")
 
-    def on_correction_finished(self, df_json, corrected_rows):
+    def on_correction_finished(self, result, corrected_rows):
         """Handle thread completion (منطق دقیق مثل Weight)."""
         try:
-            self.df_cache = pd.read_json(df_json)
+            self.apply_correction_result(result)
             self.app.set_data(self.df_cache)
             self.data_changed.emit()
             self.app.notify_data_changed()  # Notify all tabs of data change
@@ -604,7 +620,7 @@ class DFCheckFrame(QWidget):
         self.corrected_dfs.clear()  # Clear corrected_dfs (مثل Weight)
         self.selected_solution_labels = []
         self.included_samples.clear()
-        self.undo_stack.clear()
+        self.journal.clear(JOURNAL_SCOPE)
         self.is_select_all_processing = False
         self.df_value = 1.0
         self.new_df = 1.0
@@ -4,7 +4,6 @@ import os
 import logging
 import threading
 import time
-import sqlite3
 import pandas as pd
 from datetime import datetime
 
@@ -20,6 +19,7 @@ from screens.calibration_tab import ElementsTab
 from screens.pivot.pivot_tab import PivotTab
 from screens.CRM import CRMTab
 from utils.load_file import load_additional
+from utils.db_pool import execute, fetch_one, fetch_value
 from screens.process.result import ResultsFrame
 from screens.process.verification.drift_frame import CheckRMFrame
 from screens.process.weight_check import WeightCheckFrame
@@ -213,12 +213,8 @@ class MainWindow(QMainWindow):
     # ────────────────────────────────────────
     def _user_id_from_username(self):
         try:
-            conn = sqlite3.connect(self.resource_path("crm_data.db"))
-            cur = conn.cursor()
-            cur.execute("SELECT id FROM users WHERE username = ? AND is_active = 1", (self.username,))
-            uid = cur.fetchone()
-            conn.close()
-            return uid[0] if uid else None
+            return fetch_value(self.resource_path("crm_data.db"),
+                               "SELECT id FROM users WHERE username = ? AND is_active = 1", (self.username,))
         except Exception as e:
             logger.error(f"Failed to get user_id: {e}")
             return None
@@ -228,13 +224,10 @@ class MainWindow(QMainWindow):
     # ────────────────────────────────────────
     def get_user_role(self):
         try:
-            conn = sqlite3.connect(self.resource_path("crm_data.db"))
-            cur = conn.cursor()
-            cur.execute("SELECT role FROM users WHERE username = ? AND is_active = 1", (self.username,))
-            row = cur.fetchone()
-            conn.close()
-            if row and row[0]:
-                return row[0].lower()
+            role = fetch_value(self.resource_path("crm_data.db"),
+                               "SELECT role FROM users WHERE username = ? AND is_active = 1", (self.username,))
+            if role:
+                return role.lower()
             return "viewer"
         except Exception as e:
             logger.error(f"Error getting user role: {e}")
@@ -283,11 +276,7 @@ class MainWindow(QMainWindow):
 
     def mark_notification_read(self, notif_id):
         try:
-            conn = sqlite3.connect(self.resource_path("crm_data.db"))
-            cur = conn.cursor()
-            cur.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
-            conn.commit()
-            conn.close()
+            execute(self.resource_path("crm_data.db"), "UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
 
             if hasattr(self, 'management_tab') and self.management_tab:
                 self.management_tab.load_notifications()
@@ -309,15 +298,11 @@ class MainWindow(QMainWindow):
 
     def check_new_notifications(self):
         try:
-            conn = sqlite3.connect(self.resource_path("crm_data.db"))
-            cur = conn.cursor()
-            cur.execute("""
+            row = fetch_one(self.resource_path("crm_data.db"), """
                 SELECT id, message FROM notifications 
                 WHERE user_id = ? AND is_read = 0 AND created_at > ?
                 ORDER BY created_at DESC LIMIT 1
             """, (self.user_id, datetime.fromtimestamp(self.last_notif_check).isoformat()))
-            row = cur.fetchone()
-            conn.close()
 
             if row:
                 notif_id, message = row
@@ -435,11 +420,7 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            conn = sqlite3.connect(self.resource_path("crm_data.db"))
-            cur = conn.cursor()
-            cur.execute("UPDATE users SET remember_me = 0 WHERE username = ?", (self.username,))
-            conn.commit()
-            conn.close()
+            execute(self.resource_path("crm_data.db"), "UPDATE users SET remember_me = 0 WHERE username = ?", (self.username,))
             logger.info(f"User {self.username} logged out.")
         except Exception as e:
             logger.error(f"Logout DB error: {e}")
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Synthetic ICP runs and a headless benchmark runner for the processing hot paths."""
@@ -0,0 +1,450 @@
+# benchmarks/run_benchmarks.py
+"""Headless benchmarks for the processing hot paths.
+
+Runs without a QApplication: the Qt worker threads are driven by calling
+run() directly, and the few attributes they read from the main window are
+supplied by small context objects. Each benchmark is timed (best and median
+of --repeat runs) and then run once more under tracemalloc for peak memory.
+
+    python -m benchmarks.run_benchmarks --sizes small medium --output bench.json
+    python -m benchmarks.run_benchmarks --only pivot filter --baseline bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_run import CRM_LABELS, WRITERS, generate_run
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'small': dict(n_samples=100, n_wavelengths=20),
+    'medium': dict(n_samples=1000, n_wavelengths=40),
+    'large': dict(n_samples=5000, n_wavelengths=60),
+}
+
+
+class _Text:
+    """Stand-in for a QLineEdit/QComboBox that only needs text()/currentText()."""
+
+    def __init__(self, value):
+        self.value = str(value)
+
+    def text(self):
+        return self.value
+
+    def currentText(self):
+        return self.value
+
+
+def _run_worker(worker, *signals):
+    """Call a QThread's run() synchronously and return what it emitted on `signals`."""
+    emitted = {}
+    for name in signals:
+        getattr(worker, name).connect(lambda *args, name=name: emitted.__setitem__(name, args))
+    worker.run()
+    if 'error' in emitted:
+        raise RuntimeError(emitted['error'][0])
+    return emitted
+
+
+def _use_private_parse_cache(cache_dir):
+    """Point the shared parse cache at `cache_dir`; returns a callable that restores the user's setting."""
+    from utils import parsed_file_cache
+    saved_env = os.environ.get('ICP_PARSE_CACHE_DIR')
+    saved_cache = parsed_file_cache._cache
+    os.environ['ICP_PARSE_CACHE_DIR'] = cache_dir
+    parsed_file_cache._cache = None
+
+    def restore():
+        if saved_env is None:
+            os.environ.pop('ICP_PARSE_CACHE_DIR', None)
+        else:
+            os.environ['ICP_PARSE_CACHE_DIR'] = saved_env
+        parsed_file_cache._cache = saved_cache
+    return restore
+
+
+class BenchmarkContext:
+    """Synthetic run of one size plus the derived frames the benchmarks share."""
+
+    def __init__(self, size_name, work_dir, seed=0):
+        self.size_name = size_name
+        self.work_dir = work_dir
+        self.data = generate_run(seed=seed, **SIZES[size_name])
+        self.files = {}
+        for name, (writer, ext) in WRITERS.items():
+            path = os.path.join(work_dir, f"{size_name}_{name}{ext}")
+            writer(self.data, path)
+            self.files[name] = path
+
+        from utils.pivot_func import build_pivot
+        samples = self.data[self.data['Type'] == 'Samp']
+        self.pivot = build_pivot(samples, 'Corr Con').pivot_df
+        self.app = SimpleNamespace(results=SimpleNamespace(last_filtered_data=self.pivot), rm_check=None)
+
+        sample_rows = samples.drop_duplicates('Solution Label')
+        self.bad_weight_labels = sample_rows.loc[
+            (sample_rows['Act Wgt'] < 0.19) | (sample_rows['Act Wgt'] > 0.21), 'Solution Label'].tolist()
+        self.bad_volume_labels = sample_rows.loc[sample_rows['Act Vol'] != 50.0, 'Solution Label'].tolist()
+        self.bad_df_labels = sample_rows.loc[sample_rows['DF'] != 250.0, 'Solution Label'].tolist()
+        self._rm_results = None
+        self._qc_db = None
+
+    @property
+    def rows(self):
+        return len(self.data)
+
+    def rm_results(self):
+        if self._rm_results is None:
+            from screens.process.verification.find_rm import CheckRMThread
+            self._rm_results = _run_worker(CheckRMThread(self.app, 'RM'), 'finished', 'error')['finished'][0]
+        return self._rm_results
+
+    def qc_database(self):
+        """SQLite file with crm_data (CRM + BLANK measurements) and pivot_crm reference grades."""
+        if self._qc_db is None:
+            path = os.path.join(self.work_dir, f"{self.size_name}_qc.db")
+            rows = self.data[self.data['Solution Label'].isin(CRM_LABELS + ['BLANK'])]
+            crm_ids = rows['Solution Label'].str.replace('OREAS ', 'CRM ', regex=False).where(
+                rows['Solution Label'] != 'BLANK', 'BLANK')
+            crm_data = pd.DataFrame({
+                'crm_id': crm_ids.to_numpy(),
+                'solution_label': rows['Solution Label'].to_numpy(),
+                'element': rows['Element'].to_numpy(),
+                'value': rows['Corr Con'].to_numpy(),
+                'file_name': 'synthetic_run',
+                'folder_name': 'synthetic',
+            })
+            crm_data.insert(0, 'id', np.arange(1, len(crm_data) + 1))
+            grades = rows[rows['Solution Label'] != 'BLANK'].copy()
+            grades['symbol'] = grades['Element'].str.split().str[0]
+            reference = grades.groupby(['Solution Label', 'symbol'])['Corr Con'].mean().unstack()
+            reference.index = reference.index.str.replace('CRM ', 'OREAS ', regex=False)
+            reference.index.name = 'CRM ID'
+            reference.insert(0, 'Analysis Method', '4-Acid Digestion')
+            with sqlite3.connect(path) as conn:
+                crm_data.to_sql('crm_data', conn, index=False, if_exists='replace')
+                reference.reset_index().to_sql('pivot_crm', conn, index=False, if_exists='replace')
+            self._qc_db = path
+        return self._qc_db
+
+
+# Each benchmark: (ctx) -> zero-argument callable that does the timed work
+
+def bench_load(fmt):
+    def prepare(ctx):
+        from utils.load_file import FileParser
+        from utils.parsed_file_cache import get_parsed_file_cache
+
+        def load():
+            cache = get_parsed_file_cache()
+            # only ever the benchmark's own cache (run_benchmarks points it into work_dir)
+            if cache is not None and os.path.commonpath([cache.cache_dir, ctx.work_dir]) == ctx.work_dir:
+                cache.clear()
+            _run_worker(FileParser(ctx.files[fmt]), 'finished', 'error')
+        return load
+    return prepare
+
+
+def bench_load_cached(ctx):
+    from utils.load_file import FileParser
+    path = ctx.files['sample_id_csv']
+    _run_worker(FileParser(path), 'finished', 'error')
+    return lambda: _run_worker(FileParser(path), 'finished', 'error')
+
+
+def bench_pivot(ctx):
+    from utils.pivot_func import build_pivot
+    samples = ctx.data[ctx.data['Type'] == 'Samp']
+    return lambda: build_pivot(samples, 'Corr Con')
+
+
+def bench_filter(ctx):
+    from screens.pivot.pivot_filter import PivotFilterIndex
+    column = ctx.pivot.columns[1]
+    filters = {column: {'min_val': float(ctx.pivot[column].quantile(0.1)),
+                        'max_val': float(ctx.pivot[column].quantile(0.9))}}
+
+    def run():
+        index = PivotFilterIndex(ctx.pivot)
+        index.mask(filters, 's-00', {}, 2)
+        index.mask(filters, 's-001', {}, 2)
+    return run
+
+
+def bench_weight_correction(ctx):
+    from screens.process.weight_check import WeightCorrectionThread
+    return lambda: _run_worker(WeightCorrectionThread(ctx.data, ctx.bad_weight_labels, 0.2), 'finished', 'error')
+
+
+def bench_volume_correction(ctx):
+    from screens.process.volume_check import VolumeCorrectionThread
+    return lambda: _run_worker(VolumeCorrectionThread(ctx.data, ctx.bad_volume_labels, 50.0), 'finished', 'error')
+
+
+def bench_df_correction(ctx):
+    from screens.process.DF_check import DFCorrectionThread
+    return lambda: _run_worker(DFCorrectionThread(ctx.data, ctx.bad_df_labels, 250.0), 'finished', 'error')
+
+
+def bench_rm_check(ctx):
+    from screens.process.verification.find_rm import CheckRMThread
+    return lambda: _run_worker(CheckRMThread(ctx.app, 'RM'), 'finished', 'error')
+
+
+def bench_rm_drift(ctx):
+    from screens.process.verification.rm_ratio import ApplySingleRM
+    results = ctx.rm_results()
+    rm_df = results['rm_df']
+    element = results['elements'][0]
+    rm_num = int(rm_df['rm_num'].mode().iloc[0])
+    drifted = rm_df.copy()
+    drifted[element] = drifted[element] * 1.05
+
+    def run():
+        result = ApplySingleRM(ctx.app.results.last_filtered_data, 'RM', element, rm_num, drifted, rm_df, results['segments'], True).run()
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+    return run
+
+
+def bench_rm_drift_all(ctx):
+    from screens.process.verification.rm_ratio import ApplyRMDrift
+    results = ctx.rm_results()
+    rm_df = results['rm_df']
+    elements = results['elements']
+    rm_num = int(rm_df['rm_num'].mode().iloc[0])
+    drifted = rm_df.copy()
+    drifted[elements] = drifted[elements].apply(pd.to_numeric, errors='coerce') * 1.05
+
+    def run():
+        result = ApplyRMDrift(ctx.app.results.last_filtered_data, 'RM', elements, rm_num, drifted, rm_df, results['segments'], True).run()
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+    return run
+
+
+def bench_rm_navigate(ctx):
+    # step through every RM interval the way the drift preview does
+    results = ctx.rm_results()
+    index = results['segment_index']
+    pivot_df = results['pivot_df']
+    element = results['elements'][0]
+    rm_rows = index.rm_rows
+
+    def run():
+        view = index.frame_view(pivot_df)
+        for prev_pivot, curr_pivot in zip(rm_rows[:-1], rm_rows[1:]):
+            data = pivot_df.iloc[index.rows_between(prev_pivot, curr_pivot, view)]
+            data[data[element].notna()]
+    return run
+
+
+def bench_rm_optimize_all(ctx):
+    from screens.process.verification.rm_ratio import optimize_rm_groups
+    results = ctx.rm_results()
+    rm_df = results['rm_df']
+    elements = results['elements']
+    rows = rm_df[rm_df['rm_num'] == rm_df['rm_num'].mode().iloc[0]].sort_values('pivot_index')
+    pivots = rows['pivot_index'].to_numpy()
+    values = rows[elements].to_numpy(dtype=float)
+    _, groups = np.unique(results['segment_index'].segment_of(pivots), return_inverse=True)
+    n_groups = int(groups.max()) + 1
+    return lambda: optimize_rm_groups(pivots.astype(float), values, ~np.isnan(values), groups, n_groups, 'zero')
+
+
+def bench_crm_check(ctx):
+    from screens.process.CRM_check import CRMManager
+    pivot = ctx.pivot
+    columns = list(pivot.columns)
+    crm_rows = pivot[pivot['Solution Label'].isin(CRM_LABELS)]
+    inline = {
+        row['Solution Label']: [{col: row[col] * 1.02 for col in columns[1:]}]
+        for _, row in crm_rows.drop_duplicates('Solution Label').iterrows()
+    }
+    pivot_tab = SimpleNamespace(
+        results_frame=SimpleNamespace(last_filtered_data=pivot, decimal_combo=_Text(2)),
+        _inline_crm_rows=inline, crm_diff_min=_Text(-12), crm_diff_max=_Text(12),
+    )
+    manager = CRMManager(pivot_tab)
+    return lambda: manager._build_crm_row_lists_for_columns(columns)
+
+
+def bench_change_report(ctx):
+    # weight/volume/DF corrections on the bad samples plus a drift ratio for every sample of one element
+    from screens.process.changeReport import ReportGenerationThread
+    from utils.correction_ledger import correction_ledger
+    element = ctx.pivot.columns[1]
+    app = SimpleNamespace(
+        init_data=ctx.data, results=SimpleNamespace(last_filtered_data=ctx.pivot),
+        weight_check=SimpleNamespace(corrected_weights={
+            sl: {'old_weight': 0.25, 'new_weight': 0.2} for sl in ctx.bad_weight_labels}),
+        volume_check=SimpleNamespace(corrected_volumes={
+            sl: {'old_volume': 45.0, 'new_volume': 50.0} for sl in ctx.bad_volume_labels}),
+        df_check=SimpleNamespace(corrected_dfs={
+            sl: {'old_df': 200.0, 'new_df': 250.0} for sl in ctx.bad_df_labels}),
+    )
+    labels = ctx.pivot['Solution Label'].tolist()
+    ledger = correction_ledger(app.results)
+    ledger.record_drift({(sl, element): 1.01 for sl in labels})
+    # what ChangesReportDialog posts on the GUI thread before starting the report thread
+    for kind, corrections, old_key, new_key in (
+            ('weight', app.weight_check.corrected_weights, 'old_weight', 'new_weight'),
+            ('volume', app.volume_check.corrected_volumes, 'old_volume', 'new_volume'),
+            ('df', app.df_check.corrected_dfs, 'old_df', 'new_df')):
+        if corrections:
+            ledger.record(kind, None, list(corrections), replace=True,
+                          Old=[p[old_key] for p in corrections.values()], New=[p[new_key] for p in corrections.values()])
+    # the dialog's snapshot (ledger.wide) is part of the timed work
+    return lambda: _run_worker(ReportGenerationThread(app, app.results, element, ledger.wide(element)),
+                               'finished', 'error')
+
+
+def bench_report(ctx):
+    from screens.process.report import select_best_wavelengths
+    return lambda: select_best_wavelengths(ctx.pivot, ctx.data, 'Soln Conc')
+
+
+def bench_qc_verification(ctx):
+    from screens.qc_tab.qc import OutOfRangeThread
+    db_path = ctx.qc_database()
+    return lambda: _run_worker(OutOfRangeThread(db_path, 'synthetic_run', 10.0, db_path), 'out_of_range_data')
+
+
+def bench_excel_export(ctx):
+    from screens.pivot.pivot_exporter import write_pivot_workbook
+    path = os.path.join(ctx.work_dir, f"{ctx.size_name}_export.xlsx")
+    return lambda: write_pivot_workbook(ctx.pivot, path)
+
+
+BENCHMARKS = {
+    'load_tabular_csv': bench_load('tabular_csv'),
+    'load_sample_id_csv': bench_load('sample_id_csv'),
+    'load_sample_id_xlsx': bench_load('sample_id_xlsx'),
+    'load_tabular_xlsx': bench_load('tabular_xlsx'),
+    'load_cached': bench_load_cached,
+    'pivot': bench_pivot,
+    'filter': bench_filter,
+    'weight_correction': bench_weight_correction,
+    'volume_correction': bench_volume_correction,
+    'df_correction': bench_df_correction,
+    'rm_check': bench_rm_check,
+    'rm_drift': bench_rm_drift,
+    'rm_drift_all': bench_rm_drift_all,
+    'rm_navigate': bench_rm_navigate,
+    'rm_optimize_all': bench_rm_optimize_all,
+    'crm_check': bench_crm_check,
+    'change_report': bench_change_report,
+    'report': bench_report,
+    'qc_verification': bench_qc_verification,
+    'excel_export': bench_excel_export,
+}
+
+
+def measure(fn, repeat):
+    """(timings in seconds, peak traced memory in MB) of fn()."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return timings, peak / (1024 * 1024)
+
+
+def run_benchmarks(sizes, names, repeat=3, seed=0):
+    results = []
+    work_dir = tempfile.mkdtemp(prefix='icp_bench_')
+    restore_parse_cache = _use_private_parse_cache(os.path.join(work_dir, 'parsed_cache'))
+    try:
+        for size_name in sizes:
+            ctx = BenchmarkContext(size_name, work_dir, seed)
+            print(f"[{size_name}] {ctx.rows} measurements, pivot {ctx.pivot.shape[0]}x{ctx.pivot.shape[1] - 1}")
+            for name in names:
+                entry = {'size': size_name, 'rows': ctx.rows, 'benchmark': name}
+                try:
+                    timings, peak_mb = measure(BENCHMARKS[name](ctx), repeat)
+                    entry.update({
+                        'seconds_best': min(timings),
+                        'seconds_median': statistics.median(timings),
+                        'peak_mb': round(peak_mb, 2),
+                    })
+                    print(f"  {name:<22} {min(timings):9.4f}s  peak {peak_mb:8.1f} MB")
+                except Exception as e:
+                    entry['error'] = f"{type(e).__name__}: {e}"
+                    print(f"  {name:<22} FAILED: {entry['error']}")
+                results.append(entry)
+    finally:
+        restore_parse_cache()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline_path):
+    """Print time/memory ratios against an earlier results file."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['size'], r['benchmark']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path} (ratio > 1 is slower / larger):")
+    for entry in results:
+        old = baseline.get((entry['size'], entry['benchmark']))
+        if not old or 'seconds_best' not in old or 'seconds_best' not in entry:
+            continue
+        time_ratio = entry['seconds_best'] / old['seconds_best'] if old['seconds_best'] else float('inf')
+        mem_ratio = entry['peak_mb'] / old['peak_mb'] if old['peak_mb'] else float('inf')
+        print(f"  {entry['size']:<7} {entry['benchmark']:<22} time x{time_ratio:6.2f}  memory x{mem_ratio:6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for ICP processing hot paths.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'])
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--verbose', action='store_true', help="keep the modules' debug logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # the processing modules log per row at DEBUG level, which would dominate the timings
+        logging.disable(logging.INFO)
+
+    results = run_benchmarks(args.sizes, args.only, args.repeat, args.seed)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# benchmarks/synthetic_run.py
+"""Synthetic ICP runs in the shapes the instrument exports.
+
+generate_run() builds a long-format run in acquisition order: Std rows with
+Soln Conc, a base "RM" followed by "RM CHECK n" every few samples and an
+"RM CONE n" at each third of the run, OREAS/CRM reference materials,
+BLANKs and samples, each measured on every wavelength (optionally several
+times per wavelength). RM and sample values drift slowly across the run and
+a few samples get out-of-range Act Wgt / Act Vol / DF so the correction
+checks have work to do.
+
+The writers produce the three formats FileParser reads: the old tabular
+export (CSV or Excel), the Sample ID-based CSV and the Sample ID-based Excel.
+"""
+import csv
+import numpy as np
+import pandas as pd
+
+ELEMENT_LINES = [
+    ('Ag', [328.068, 338.289]), ('Al', [396.152, 394.401, 308.215]), ('As', [188.980, 193.696]),
+    ('Ba', [455.403, 233.527]), ('Be', [313.042]), ('Bi', [223.061]), ('Ca', [317.933, 315.887]),
+    ('Cd', [214.439, 228.802]), ('Ce', [413.764, 418.659]), ('Co', [228.615, 230.786]),
+    ('Cr', [267.716, 205.560]), ('Cu', [324.754, 327.395]), ('Fe', [259.940, 238.204, 234.350]),
+    ('K', [766.491]), ('La', [408.672, 379.478]), ('Li', [670.784]), ('Mg', [285.213, 279.553]),
+    ('Mn', [257.610, 259.372]), ('Mo', [202.032, 204.598]), ('Na', [589.592, 588.995]),
+    ('Nb', [309.418]), ('Ni', [231.604, 221.648]), ('P', [213.618, 178.221]), ('Pb', [220.353, 217.000]),
+    ('S', [181.972]), ('Sb', [206.834, 217.582]), ('Sc', [361.383]), ('Sn', [189.927]),
+    ('Sr', [407.771, 421.552]), ('Ti', [334.941, 336.122]), ('V', [292.401, 311.837]),
+    ('W', [207.912]), ('Y', [371.029]), ('Zn', [213.857, 206.200]), ('Zr', [343.823, 339.198]),
+]
+CRM_LABELS = ['OREAS 258', 'CRM 252', 'OREAS 906', 'OREAS 506', 'CRM 233', 'OREAS 255', 'CRM 263', 'OREAS 260']
+STD_LABELS = ['Std 0', 'Std 1', 'Std 2', 'Std 3', 'Std 4']
+TABULAR_COLUMNS = ['Solution Label', 'Element', 'Int', 'Corr Con', 'Type', 'Act Wgt', 'Act Vol', 'DF', 'Soln Conc']
+
+
+def element_lines(n_wavelengths):
+    """First n_wavelengths (symbol, 'Sym 123.456') pairs, spread across elements first."""
+    lines = []
+    depth = max(len(w) for _, w in ELEMENT_LINES)
+    for level in range(depth):
+        for symbol, wavelengths in ELEMENT_LINES:
+            if level < len(wavelengths):
+                lines.append((symbol, f"{symbol} {wavelengths[level]:.3f}"))
+    if n_wavelengths > len(lines):
+        raise ValueError(f"At most {len(lines)} wavelengths are available")
+    return lines[:n_wavelengths]
+
+
+def run_sequence(n_samples, rm_every=10, crm_every=25, blank_every=30):
+    """Solution Labels and Types in acquisition order."""
+    labels = [(s, 'Std') for s in STD_LABELS] + [('RM', 'Samp'), ('BLANK', 'Blk')]
+    check, cone = 1, 1
+    cone_at = {n_samples // 3, 2 * n_samples // 3} - {0}
+    for i in range(1, n_samples + 1):
+        labels.append((f"S-{i:05d}", 'Samp'))
+        if i in cone_at:
+            labels.append((f"RM CONE {cone}", 'Samp'))
+            cone += 1
+        elif i % rm_every == 0:
+            labels.append((f"RM CHECK {check}", 'Samp'))
+            check += 1
+        if i % crm_every == 0:
+            labels.append((CRM_LABELS[(i // crm_every - 1) % len(CRM_LABELS)], 'Samp'))
+        if i % blank_every == 0:
+            labels.append(('BLANK', 'Blk'))
+    labels.append((f"RM CHECK {check}", 'Samp'))
+    return labels
+
+
+def generate_run(n_samples=200, n_wavelengths=40, repeats=1, rm_every=10, crm_every=25,
+                 blank_every=30, bad_fraction=0.05, drift=0.08, seed=0):
+    """Long-format DataFrame of one synthetic run (columns TABULAR_COLUMNS)."""
+    rng = np.random.default_rng(seed)
+    sequence = run_sequence(n_samples, rm_every, crm_every, blank_every)
+    lines = element_lines(n_wavelengths)
+    n_labels, n_lines = len(sequence), len(lines)
+    per_label = n_lines * repeats
+
+    labels = np.repeat(np.array([s for s, _ in sequence], dtype=object), per_label)
+    types = np.repeat(np.array([t for _, t in sequence], dtype=object), per_label)
+    elements = np.tile(np.repeat(np.array([name for _, name in lines], dtype=object), repeats), n_labels)
+
+    # true grades: one level per (label, element); RMs and CRMs share theirs across the run
+    base = rng.lognormal(mean=2.0, sigma=1.2, size=(n_labels, n_lines))
+    keys = pd.Series([s if not s.startswith('S-') else f"{s}#{i}" for i, (s, _) in enumerate(sequence)])
+    rm_like = keys.str.startswith('RM') | keys.isin(CRM_LABELS)
+    shared = pd.Series(np.where(keys.str.startswith('RM'), 'RM', keys))
+    first_of = shared.groupby(shared).transform(lambda g: g.index[0]).to_numpy()
+    base[rm_like.to_numpy()] = base[first_of[rm_like.to_numpy()]]
+    base[types.reshape(n_labels, per_label)[:, 0] == 'Blk'] *= 0.01
+
+    # slow linear drift along the run, plus measurement noise
+    position = np.linspace(0.0, 1.0, n_labels)[:, None]
+    conc = base * (1.0 + drift * position) * rng.normal(1.0, 0.01, size=(n_labels, n_lines))
+    conc = np.repeat(conc, repeats, axis=1).ravel() * rng.normal(1.0, 0.005, size=n_labels * per_label)
+    sensitivity = np.tile(np.repeat(rng.uniform(50, 5000, size=n_lines), repeats), n_labels)
+
+    weight = rng.normal(0.2, 0.002, size=n_labels)
+    volume = np.full(n_labels, 50.0)
+    dilution = np.full(n_labels, 250.0)
+    bad = rng.random(n_labels) < bad_fraction
+    weight[bad] = rng.choice([0.15, 0.25, 0.18, 0.23], size=int(bad.sum()))
+    volume[rng.random(n_labels) < bad_fraction] = 25.0
+    dilution[rng.random(n_labels) < bad_fraction] = 500.0
+
+    is_std = types == 'Std'
+    df = pd.DataFrame({
+        'Solution Label': labels,
+        'Element': elements,
+        'Int': conc * sensitivity,
+        'Corr Con': conc,
+        'Type': types,
+        'Act Wgt': np.repeat(weight, per_label),
+        'Act Vol': np.repeat(volume, per_label),
+        'DF': np.repeat(dilution, per_label),
+        'Soln Conc': np.where(is_std, np.round(conc, 1), np.nan),
+    })
+    return df
+
+
+def write_tabular_csv(df, path, title="Synthetic ICP run"):
+    """Old tabular export: a one-cell title row, the header, the data and a footer row."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(f"{title}\n")
+        df.to_csv(f, index=False)
+        f.write("End of report\n")
+
+
+def write_tabular_excel(df, path, title="Synthetic ICP run"):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame([[title]]).to_excel(writer, header=False, index=False)
+        df.to_excel(writer, index=False, startrow=1)
+        pd.DataFrame([["End of report"]]).to_excel(writer, header=False, index=False, startrow=len(df) + 2)
+
+
+def _sample_id_rows(df, inline_label):
+    """Rows of the Sample ID-based export; Corr Con is in column 5 for CSV and Excel alike."""
+    conc_col = 5
+    width = conc_col + 1
+    elements = df['Element'].astype(str).str.replace(' ', '', regex=False).to_numpy()
+    labels = df['Solution Label'].to_numpy()
+    intensity = df['Int'].to_numpy()
+    conc = df['Corr Con'].to_numpy()
+    rows = [["Method File:", "synthetic.mth"], ["Calibration File:", "synthetic.cal"]]
+    previous = None
+    for i in range(len(df)):
+        if labels[i] != previous:
+            rows.append([f"Sample ID: {labels[i]}"] if inline_label else ["Sample ID:", labels[i]])
+            rows.append(["Method File:", "synthetic.mth"])
+            previous = labels[i]
+        row = [None] * width
+        row[0], row[1], row[conc_col] = elements[i], float(intensity[i]), float(conc[i])
+        rows.append(row)
+    rows.append(["End of report"])
+    return rows
+
+
+def write_sample_id_csv(df, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerows(_sample_id_rows(df, inline_label=False))
+
+
+def write_sample_id_excel(df, path):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for row in _sample_id_rows(df, inline_label=True):
+        ws.append(row)
+    wb.save(path)
+
+
+WRITERS = {
+    'tabular_csv': (write_tabular_csv, '.csv'),
+    'tabular_xlsx': (write_tabular_excel, '.xlsx'),
+    'sample_id_csv': (write_sample_id_csv, '.csv'),
+    'sample_id_xlsx': (write_sample_id_excel, '.xlsx'),
+}
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Write a synthetic ICP run in every supported export format.")
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--wavelengths', type=int, default=40)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out-dir', default='synthetic_runs')
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    run = generate_run(args.samples, args.wavelengths, args.repeats, seed=args.seed)
+    for name, (writer, ext) in WRITERS.items():
+        path = os.path.join(args.out_dir, f"run_{args.samples}x{args.wavelengths}_{name}{ext}")
+        writer(run, path)
+        print(f"{path}: {len(run)} measurements")
@@ -8,9 +8,10 @@ from PyQt6.QtGui import QStandardItemModel, QStandardItem
 import numpy as np
 import pandas as pd
 import logging
-import sqlite3
+from utils.db_pool import get_connection, transaction
 import os
 from datetime import datetime
+from utils.correction_ledger import correction_ledger
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -20,87 +21,13 @@ class ReportGenerationThread(QThread):
     finished = pyqtSignal(list)
     error = pyqtSignal(str)
 
-    def __init__(self, app, results_frame, selected_column):
+    def __init__(self, app, results_frame, selected_column, corrections):
         super().__init__()
         self.app = app
         self.results_frame = results_frame
         self.selected_column = selected_column
-
-    def get_weight_corrections(self):
-        corrections = {}
-        if hasattr(self.app, 'weight_check') and hasattr(self.app.weight_check, 'corrected_weights'):
-            corrections = self.app.weight_check.corrected_weights.copy()
-        return corrections
-
-    def get_volume_corrections(self):
-        corrections = {}
-        if hasattr(self.app, 'volume_check') and hasattr(self.app.volume_check, 'corrected_volumes'):
-            for sl, params in self.app.volume_check.corrected_volumes.items():
-                if 'old_volume' in params and 'new_volume' in params:
-                    corrections[sl] = {'old_volume': params['old_volume'], 'new_volume': params['new_volume']}
-        return corrections
-
-    def get_df_corrections(self):
-        corrections = {}
-        if hasattr(self.app, 'df_check') and hasattr(self.app.df_check, 'corrected_dfs'):
-            corrections = self.app.df_check.corrected_dfs.copy()
-        return corrections
-
-    def get_crm_corrections(self, column):
-        """استخراج ضرایب CRM از report_change"""
-        corrections = {}
-        try:
-            if hasattr(self.app.results, 'report_change'):
-                df = self.app.results.report_change
-                if df.empty or 'Element' not in df.columns:
-                    return {}
-                
-                # فقط CRM entries (دارای Scale یا Blank)
-                mask = (
-                    (df['Element'] == column) & 
-                    (df['Scale'].notna() | df['Blank'].notna())
-                )
-                
-                if mask.any():
-                    for _, row in df[mask].iterrows():
-                        sl = row['Solution Label']
-                        scale = row.get('Scale', 1.0)
-                        blank = row.get('Blank', 0.0)
-                        if pd.notna(sl):
-                            corrections[str(sl)] = {
-                                'scale': float(scale) if pd.notna(scale) else 1.0,
-                                'blank': float(blank) if pd.notna(blank) else 0.0
-                            }
-                logger.debug(f"Found {len(corrections)} CRM corrections for {column}")
-        except Exception as e:
-            logger.error(f"Error getting CRM corrections: {str(e)}")
-        
-        return corrections
-
-    def get_drift_corrections(self, column):
-        corrections = {}
-        try:
-            if hasattr(self.app.results, 'report_change'):
-                df = self.app.results.report_change
-                # *** SAFE CHECK FOR COLUMNS ***
-                if df.empty or 'Element' not in df.columns:
-                    logger.debug("report_change empty or missing 'Element' column")
-                    return {}
-                
-                mask = df['Element'] == column
-                if mask.any():
-                    for _, row in df[mask].iterrows():
-                        sl = row['Solution Label']
-                        ratio = row['Ratio']
-                        if pd.notna(ratio) and pd.notna(sl):
-                            corrections[str(sl)] = float(ratio)
-                logger.debug(f"Found {len(corrections)} drift corrections for {column}")
-            else:
-                logger.debug("No report_change attribute found")
-        except Exception as e:
-            logger.error(f"Error getting drift corrections for {column}: {str(e)}")
-        
-        return corrections
+        # snapshot of ledger.wide(selected_column), taken on the GUI thread; the thread never touches the ledger
+        self.corrections = corrections
 
     def run(self):
         try:
@@ -145,69 +72,41 @@ class ReportGenerationThread(QThread):
             orig_df['New Value'] = new_series
             orig_df = orig_df.reset_index()
 
-            # --- دریافت corrections ---
-            weight_corrections = self.get_weight_corrections()
-            volume_corrections = self.get_volume_corrections()
-            df_corrections = self.get_df_corrections()
-            crm_corrections = self.get_crm_corrections(self.selected_column)
-            drift_corrections = self.get_drift_corrections(self.selected_column)
-
-            # --- ساخت ردیف‌ها ---
-            rows = []
-            total_rows = len(orig_df)
-            for i, row in orig_df.iterrows():
-                sl = row['Solution Label']
-                orig_val = row['Original Value']
-                new_val = row['New Value']
-                
-                # Safe formatting
-                orig_text = f"{orig_val:.3f}" if pd.notna(orig_val) else "N/A"
-                new_text = f"{new_val:.3f}" if pd.notna(new_val) else "N/A"
-                
-                # Corrections
-                wp = weight_corrections.get(str(sl), {})
-                weight_text = (
-                    f"Old: {wp.get('old_weight', ''):.3f}, New: {wp.get('new_weight', ''):.3f}" 
-                    if wp and 'old_weight' in wp and 'new_weight' in wp else ""
-                )
-
-                vp = volume_corrections.get(str(sl), {})
-                volume_text = (
-                    f"Old: {vp.get('old_volume', ''):.3f}, New: {vp.get('new_volume', ''):.3f}" 
-                    if vp and 'old_volume' in vp and 'new_volume' in vp else ""
-                )
-
-                dfp = df_corrections.get(str(sl), {})
-                df_text = (
-                    f"Old: {dfp.get('old_df', ''):.3f}, New: {dfp.get('new_df', ''):.3f}" 
-                    if dfp and 'old_df' in dfp and 'new_df' in dfp else ""
-                )
-
-                cp = crm_corrections.get(str(sl), {})
-                if cp:
-                    scale = cp.get('scale', 1.0)
-                    blank = cp.get('blank', 0.0)
-                    crm_text = f"Scale: {scale:.3f}, Blank: {blank:.3f}"
-                else:
-                    crm_text = ""
-
-                dp = drift_corrections.get(str(sl), None)
-                drift_text = f"Ratio: {dp:.3f}" if isinstance(dp, (int, float)) and not pd.isna(dp) else ""
-
-                row_items = [
-                    str(sl),
-                    orig_text,
-                    new_text,
-                    weight_text,
-                    volume_text,
-                    df_text,
-                    crm_text,
-                    drift_text
-                ]
-                rows.append(row_items)
-                
-                if total_rows > 10:
-                    self.progress.emit(int((i + 1) / total_rows * 100))
+            # --- همه اصلاحات از snapshot ledger، با یک join روی Solution Label ---
+            corrections = self.corrections.reindex(orig_df['Solution Label'].astype(str))
+            self.progress.emit(50)
+
+            def column(name):
+                if name in corrections.columns:
+                    return pd.Series(corrections[name].to_numpy(dtype=float), index=orig_df.index)
+                return pd.Series(np.nan, index=orig_df.index)
+
+            def fmt(values):
+                return values.map('{:.3f}'.format)
+
+            def old_new(kind):
+                old, new = column(f"{kind} Old"), column(f"{kind} New")
+                text = "Old: " + fmt(old) + ", New: " + fmt(new)
+                return text.where(old.notna() & new.notna(), "")
+
+            scale, blank = column('crm Scale'), column('crm Blank')
+            crm_text = ("Scale: " + fmt(scale.fillna(1.0)) + ", Blank: " + fmt(blank.fillna(0.0))).where(
+                scale.notna() | blank.notna(), "")
+            ratio = column('drift Ratio')
+            drift_text = ("Ratio: " + fmt(ratio)).where(ratio.notna(), "")
+
+            report = pd.DataFrame({
+                'Solution Label': orig_df['Solution Label'].astype(str),
+                'Original Value': fmt(orig_df['Original Value']).where(orig_df['Original Value'].notna(), "N/A"),
+                'New Value': fmt(orig_df['New Value']).where(orig_df['New Value'].notna(), "N/A"),
+                'Weight Correction': old_new('weight'),
+                'Volume Correction': old_new('volume'),
+                'DF Correction': old_new('df'),
+                'CRM Calibration': crm_text,
+                'Drift Calibration': drift_text,
+            })
+            rows = report.to_numpy(dtype=object).tolist()
+            self.progress.emit(100)
 
             self.finished.emit(rows)
             logger.info(f"✅ Report generated successfully: {len(rows)} rows")
@@ -311,25 +210,67 @@ class ChangesReportDialog(QDialog):
         self.progress_dialog.setAutoClose(True)
         self.progress_dialog.setMinimumDuration(0)
 
-        self.thread = ReportGenerationThread(self.app, self.results_frame, self.selected_column)
+        ledger = correction_ledger(self.app.results)
+        self.sync_label_corrections(ledger)
+        self.thread = ReportGenerationThread(self.app, self.results_frame, self.selected_column,
+                                             ledger.wide(self.selected_column))
         self.progress_dialog.canceled.connect(self.thread.terminate)
         self.thread.progress.connect(self.progress_dialog.setValue)
         self.thread.finished.connect(self.on_report_finished)
         self.thread.error.connect(self.on_report_error)
         self.thread.start()
 
+    def get_weight_corrections(self):
+        corrections = {}
+        if hasattr(self.app, 'weight_check') and hasattr(self.app.weight_check, 'corrected_weights'):
+            corrections = self.app.weight_check.corrected_weights.copy()
+        return corrections
+
+    def get_volume_corrections(self):
+        corrections = {}
+        if hasattr(self.app, 'volume_check') and hasattr(self.app.volume_check, 'corrected_volumes'):
+            for sl, params in self.app.volume_check.corrected_volumes.items():
+                if 'old_volume' in params and 'new_volume' in params:
+                    corrections[sl] = {'old_volume': params['old_volume'], 'new_volume': params['new_volume']}
+        return corrections
+
+    def get_df_corrections(self):
+        corrections = {}
+        if hasattr(self.app, 'df_check') and hasattr(self.app.df_check, 'corrected_dfs'):
+            corrections = self.app.df_check.corrected_dfs.copy()
+        return corrections
+
+    def sync_label_corrections(self, ledger):
+        """Post the weight/volume/DF corrections of the check tabs into the ledger (element-independent).
+
+        Runs on the GUI thread before the report thread starts, since the ledger is shared app-wide.
+        """
+        sources = (
+            ('weight', self.get_weight_corrections(), 'old_weight', 'new_weight'),
+            ('volume', self.get_volume_corrections(), 'old_volume', 'new_volume'),
+            ('df', self.get_df_corrections(), 'old_df', 'new_df'),
+        )
+        for kind, corrections, old_key, new_key in sources:
+            params = [(sl, p[old_key], p[new_key]) for sl, p in corrections.items()
+                      if p and old_key in p and new_key in p]
+            labels, old, new = (list(col) for col in zip(*params)) if params else ([], [], [])
+            if not ledger.same_as(kind, None, labels, Old=old, New=new):
+                if labels:
+                    ledger.record(kind, None, labels, replace=True, Old=old, New=new)
+                else:
+                    ledger.remove(kind)
+
     def get_file_id(self):
         if not self.app.file_path:
             return None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("""
                 SELECT id FROM uploaded_files 
                 WHERE file_path = ? OR original_filename = ?
             """, (self.app.file_path, os.path.basename(self.app.file_path)))
             result = cur.fetchone()
-            conn.close()
             return result[0] if result else None
         except Exception as e:
             logger.error(f"Error finding file_id: {e}")
@@ -339,14 +280,13 @@ class ChangesReportDialog(QDialog):
         if not self.file_id:
             return None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("""
                 SELECT id FROM measurements
                 WHERE file_id = ? AND sample_id = ? AND element = ?
             """, (self.file_id, sample_id, element))
             result = cur.fetchone()
-            conn.close()
             return result[0] if result else None
         except Exception as e:
             logger.error(f"Error finding measurement_id: {e}")
@@ -380,75 +320,73 @@ class ChangesReportDialog(QDialog):
                 logger.warning("Could not determine user_id for logging changes")
                 return
 
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            for i,row_items in enumerate(rows):
-                sl = row_items[0]
-                orig_val_str = row_items[1]
-                new_val_str = row_items[2]
-                weight_text = row_items[3]
-                volume_text = row_items[4]
-                df_text = row_items[5]
-                crm_text = row_items[6]
-                drift_text = row_items[7]
-
-                # تبدیل به float یا None
-                orig_val = float(orig_val_str) if orig_val_str != "N/A" else None
-                new_val = float(new_val_str) if new_val_str != "N/A" else None
-
-                # ساخت details
-                details_parts = []
-                if weight_text: details_parts.append(f"Weight: {weight_text}")
-                if volume_text: details_parts.append(f"Volume: {volume_text}")
-                if df_text: details_parts.append(f"DF: {df_text}")
-                if crm_text: details_parts.append(f"CRM: {crm_text}")
-                if drift_text: details_parts.append(f"Drift: {drift_text}")
-                details = "; ".join(details_parts) if details_parts else "No corrections applied"
-
-                # پیدا کردن یا ایجاد measurement
-                measurement_id = self.get_measurement_id(sl, self.selected_column)
-                if not measurement_id and self.file_id:
-                    # همیشه ایجاد کنیم، حتی اگر new_val None باشد
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO measurements (file_id, sample_id, element, current_value)
-                        VALUES (?, ?, ?, ?)
-                    ''', (self.file_id, sl, self.selected_column, new_val))
-                    measurement_id = cursor.lastrowid if cursor.rowcount > 0 else self.get_measurement_id(sl, self.selected_column)
-
-                # ثبت در changes_log همیشه
-                cursor.execute('''
-                    INSERT INTO changes_log (
-                        user_id, action, entity_type, entity_id,
-                        file_path, column_name, solution_label,
-                        original_value, new_value, details, stage,pivot_index
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,?)
-                ''', (
-                    user_id,
-                    'correction',
-                    'measurement',
-                    measurement_id or 0,
-                    os.path.basename(self.app.file_path or ""),
-                    self.selected_column,
-                    sl,
-                    str(orig_val) if orig_val is not None else "N/A",
-                    str(new_val) if new_val is not None else "N/A",
-                    details,
-                    'pending_approval'
-                    ,i
-                ))
-
-                # ثبت در measurement_versions همیشه اگر measurement_id وجود داشته باشد
-                if measurement_id:
-                    next_version = self.get_next_version_number(measurement_id)
+            with transaction(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                for i,row_items in enumerate(rows):
+                    sl = row_items[0]
+                    orig_val_str = row_items[1]
+                    new_val_str = row_items[2]
+                    weight_text = row_items[3]
+                    volume_text = row_items[4]
+                    df_text = row_items[5]
+                    crm_text = row_items[6]
+                    drift_text = row_items[7]
+
+                    # تبدیل به float یا None
+                    orig_val = float(orig_val_str) if orig_val_str != "N/A" else None
+                    new_val = float(new_val_str) if new_val_str != "N/A" else None
+
+                    # ساخت details
+                    details_parts = []
+                    if weight_text: details_parts.append(f"Weight: {weight_text}")
+                    if volume_text: details_parts.append(f"Volume: {volume_text}")
+                    if df_text: details_parts.append(f"DF: {df_text}")
+                    if crm_text: details_parts.append(f"CRM: {crm_text}")
+                    if drift_text: details_parts.append(f"Drift: {drift_text}")
+                    details = "; ".join(details_parts) if details_parts else "No corrections applied"
+
+                    # پیدا کردن یا ایجاد measurement
+                    measurement_id = self.get_measurement_id(sl, self.selected_column)
+                    if not measurement_id and self.file_id:
+                        # همیشه ایجاد کنیم، حتی اگر new_val None باشد
+                        cursor.execute('''
+                            INSERT OR IGNORE INTO measurements (file_id, sample_id, element, current_value)
+                            VALUES (?, ?, ?, ?)
+                        ''', (self.file_id, sl, self.selected_column, new_val))
+                        measurement_id = cursor.lastrowid if cursor.rowcount > 0 else self.get_measurement_id(sl, self.selected_column)
+
+                    # ثبت در changes_log همیشه
                     cursor.execute('''
-                        INSERT INTO measurement_versions
-                        (measurement_id, version_number, value, changed_by, stage, reason)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (measurement_id, next_version, new_val, user_id, 'correction', details))
+                        INSERT INTO changes_log (
+                            user_id, action, entity_type, entity_id,
+                            file_path, column_name, solution_label,
+                            original_value, new_value, details, stage,pivot_index
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,?)
+                    ''', (
+                        user_id,
+                        'correction',
+                        'measurement',
+                        measurement_id or 0,
+                        os.path.basename(self.app.file_path or ""),
+                        self.selected_column,
+                        sl,
+                        str(orig_val) if orig_val is not None else "N/A",
+                        str(new_val) if new_val is not None else "N/A",
+                        details,
+                        'pending_approval'
+                        ,i
+                    ))
+
+                    # ثبت در measurement_versions همیشه اگر measurement_id وجود داشته باشد
+                    if measurement_id:
+                        next_version = self.get_next_version_number(measurement_id)
+                        cursor.execute('''
+                            INSERT INTO measurement_versions
+                            (measurement_id, version_number, value, changed_by, stage, reason)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (measurement_id, next_version, new_val, user_id, 'correction', details))
 
-            conn.commit()
-            conn.close()
             logger.info(f"Successfully saved {len(rows)} changes to database.")
         except Exception as e:
             logger.error(f"DB save error: {e}")
@@ -456,11 +394,10 @@ class ChangesReportDialog(QDialog):
 
     def get_next_version_number(self, measurement_id):
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("SELECT COALESCE(MAX(version_number), 0) + 1 FROM measurement_versions WHERE measurement_id = ?", (measurement_id,))
             next_ver = cur.fetchone()[0]
-            conn.close()
             return next_ver
         except:
             return 1
@@ -10,12 +10,12 @@ import pandas as pd
 import logging
 import re
 import random
-import sqlite3
 import numpy as np
 from xlsxwriter import Workbook
 from scipy.stats import pearsonr
 
 from .Common.Freeze_column import FreezeTableWidget
+from utils.db_pool import read_frame
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -369,10 +369,7 @@ class CompareTab(QWidget):
     def load_oreas_data(self):
         logger.debug("Loading OREAS data from crm_data.db")
         try:
-            conn = sqlite3.connect("crm_data.db")
-            query = "SELECT * FROM pivot_crm"
-            sample_df = pd.read_sql_query(query, conn)
-            conn.close()
+            sample_df = read_frame("crm_data.db", "SELECT * FROM pivot_crm")
             if "CRM ID" not in sample_df.columns:
                 logger.error("CRM ID column not found in pivot_crm table")
                 raise ValueError("CRM ID column not found in pivot_crm table")
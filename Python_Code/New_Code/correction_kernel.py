@@ -0,0 +1,61 @@
+# utils/correction_kernel.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CorrectionResult:
+    """Rows changed by a correction: their positions in the frame and the new column values."""
+
+    def __init__(self, positions, values):
+        self.positions = positions
+        self.values = values
+
+    @property
+    def corrected_rows(self):
+        return len(self.positions)
+
+    def apply(self, df, journal=None, frame_id=None):
+        """Write the new values into df (the frame the correction was computed on) in place.
+
+        With a journal, the old and new values of the changed cells are recorded under frame_id.
+        """
+        rows = df.index.to_numpy()[self.positions]
+        for column, values in self.values.items():
+            if column not in df.columns:
+                df[column] = np.nan
+            elif df[column].dtype.kind in 'iub':
+                df[column] = df[column].astype(float)
+            col = df.columns.get_loc(column)
+            if journal is not None:
+                journal.record_cells(frame_id, rows, column, df.iloc[self.positions, col].to_numpy(), values)
+            df.iloc[self.positions, col] = values
+        return df
+
+
+def sample_label_mask(df, labels, sample_type='Samp'):
+    """Rows of type `sample_type` whose Solution Label is one of `labels`."""
+    return (df['Solution Label'].isin(list(labels)) & (df['Type'] == sample_type)).to_numpy()
+
+
+def correct_by_label(df, factors, factor_column, value_column=None, sample_type='Samp'):
+    """Set factor_column to the new factor of each row's Solution Label, in one pass.
+
+    `factors` maps Solution Label -> new factor (weight, volume, DF ...). If
+    value_column is given it is rescaled by new/old factor, leaving rows with
+    an old factor of 0 unchanged. `df` is only read; apply the returned
+    CorrectionResult to write the changes.
+    """
+    mask = sample_label_mask(df, factors.keys(), sample_type)
+    positions = np.flatnonzero(mask)
+    new_factors = df['Solution Label'].iloc[positions].map(factors).to_numpy(dtype=float)
+    values = {factor_column: new_factors}
+    if value_column is not None:
+        old_factors = pd.to_numeric(df[factor_column].iloc[positions], errors='coerce').to_numpy(dtype=float)
+        old_values = pd.to_numeric(df[value_column].iloc[positions], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values[value_column] = np.where(old_factors != 0, new_factors / old_factors * old_values, old_values)
+    logger.debug(f"Correction of {factor_column} touches {len(positions)} rows")
+    return CorrectionResult(positions, values)
@@ -0,0 +1,171 @@
+# utils/correction_ledger.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('weight', 'volume', 'df', 'crm', 'drift', 'manual')
+# اصلاحات سطح نمونه (weight/volume/DF) به عنصر خاصی تعلق ندارند و با element=None ثبت می‌شوند
+LABEL_KINDS = ('weight', 'volume', 'df')
+KIND_COLUMNS = {
+    'weight': ('Old', 'New'),
+    'volume': ('Old', 'New'),
+    'df': ('Old', 'New'),
+    'crm': ('Scale', 'Blank', 'Original Value', 'New Value'),
+    'drift': ('Ratio',),
+    'manual': ('Original Value', 'New Value', 'Ratio'),
+}
+VALUE_COLUMNS = ('Old', 'New', 'Scale', 'Blank', 'Ratio', 'Original Value', 'New Value')
+COLUMNS = ('Kind', 'Solution Label', 'Element') + VALUE_COLUMNS
+
+_ANY = object()
+
+
+class CorrectionLedger:
+    """Append-only, column-wise record of the corrections applied to the data.
+
+    Entries are appended as column chunks and never rewritten. `live` maps
+    (kind, element) to {Solution Label: row} for the current entries, so the
+    latest correction of a sample is two dict lookups and replacing an
+    element's entries swaps one inner dict. Inner dicts are never edited in
+    place, which lets the undo journal track `live` like any other dict.
+    """
+
+    def __init__(self):
+        self._chunks = {name: [] for name in COLUMNS}
+        self._columns = None
+        self._size = 0
+        self.live = {}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.live.values())
+
+    @property
+    def empty(self):
+        return not any(self.live.values())
+
+    def _column(self, name):
+        if self._columns is None:
+            self._columns = {
+                col: np.concatenate(chunks) if chunks else np.empty(0, dtype=object if col in COLUMNS[:3] else float)
+                for col, chunks in self._chunks.items()
+            }
+        return self._columns[name]
+
+    def record(self, kind, element, labels, replace=False, **values):
+        """Append one entry of `kind` per label for `element` (None for label-level kinds).
+
+        `values` are VALUE_COLUMNS given as scalars or arrays aligned with
+        labels. With replace, the new entries become the only live entries
+        of (kind, element); otherwise they supersede entries of the same labels.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown correction kind '{kind}'")
+        unknown = set(values) - set(VALUE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown ledger columns: {sorted(unknown)}")
+        labels = np.asarray(labels, dtype=object).ravel()
+        n = len(labels)
+        chunk = {'Kind': np.full(n, kind, dtype=object), 'Solution Label': labels,
+                 'Element': np.full(n, element, dtype=object)}
+        for name in VALUE_COLUMNS:
+            chunk[name] = np.broadcast_to(np.asarray(values.get(name, np.nan), dtype=float), (n,)).copy()
+        for name, column in chunk.items():
+            self._chunks[name].append(column)
+        rows = range(self._size, self._size + n)
+        self._size += n
+        self._columns = None
+
+        entries = {} if replace else dict(self.live.get((kind, element), {}))
+        entries.update(zip(labels.tolist(), rows))
+        if entries:
+            self.live[(kind, element)] = entries
+        else:
+            self.live.pop((kind, element), None)
+        logger.debug(f"Ledger: {n} {kind} entries for {element}")
+        return n
+
+    def remove(self, kind, element=_ANY):
+        """Drop the live entries of `kind` (only those of `element` if given); the rows stay in the ledger."""
+        keys = [key for key in self.live if key[0] == kind and (element is _ANY or key[1] == element)]
+        for key in keys:
+            del self.live[key]
+        return len(keys)
+
+    def latest(self, kind, label, element=None):
+        """Values of the current entry of `kind` for (label, element), or None."""
+        row = self.live.get((kind, element), {}).get(label)
+        if row is None:
+            return None
+        return {name: self._column(name)[row] for name in COLUMNS}
+
+    def _rows(self, kind, element):
+        groups = [entries.values() for (k, e), entries in self.live.items()
+                  if (kind is None or k == kind) and (element is _ANY or e == element)]
+        if not groups:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate([np.fromiter(rows, dtype=np.intp, count=len(rows)) for rows in groups]))
+
+    def to_frame(self, kind=None, element=_ANY):
+        """Live entries (of `kind` / `element` if given) as a DataFrame, in the order they were recorded."""
+        rows = self._rows(kind, element)
+        return pd.DataFrame({name: self._column(name)[rows] for name in COLUMNS})
+
+    def same_as(self, kind, element, labels, **values):
+        """True when (kind, element) already holds exactly these labels and values."""
+        entries = self.live.get((kind, element), {})
+        labels = list(labels)
+        if len(entries) != len(labels) or any(label not in entries for label in labels):
+            return False
+        rows = np.fromiter((entries[label] for label in labels), dtype=np.intp, count=len(labels))
+        for name, value in values.items():
+            new = np.broadcast_to(np.asarray(value, dtype=float), (len(labels),))
+            old = self._column(name)[rows]
+            if not np.array_equal(old, new, equal_nan=True):
+                return False
+        return True
+
+    def record_drift(self, corrected_drift):
+        """Make {(Solution Label, element): ratio} the drift entries of each element it covers.
+
+        Elements whose entries are unchanged are skipped, so re-saving the
+        same coefficients does not grow the ledger.
+        """
+        by_element = {}
+        for (label, element), ratio in corrected_drift.items():
+            labels, ratios = by_element.setdefault(element, ([], []))
+            labels.append(label)
+            ratios.append(ratio)
+        for element, (labels, ratios) in by_element.items():
+            if not self.same_as('drift', element, labels, Ratio=ratios):
+                self.record('drift', element, labels, replace=True, Ratio=ratios)
+        return len(corrected_drift)
+
+    def wide(self, element):
+        """Latest entry per Solution Label (as str) for `element`, one '<kind> <column>' column per value.
+
+        Label-level kinds are included for every element; labels without a
+        correction of some kind get NaN there.
+        """
+        parts = []
+        for kind in KINDS:
+            key_element = None if kind in LABEL_KINDS else element
+            rows = self._rows(kind, key_element)
+            if not len(rows):
+                continue
+            part = pd.DataFrame({f"{kind} {name}": self._column(name)[rows] for name in KIND_COLUMNS[kind]},
+                                index=pd.Index(self._column('Solution Label')[rows].astype(str), name='Solution Label'))
+            parts.append(part[~part.index.duplicated(keep='last')])
+        if not parts:
+            return pd.DataFrame(index=pd.Index([], dtype=object, name='Solution Label'))
+        return pd.concat(parts, axis=1)
+
+
+def correction_ledger(results):
+    """The CorrectionLedger kept on the results frame, created on first use."""
+    ledger = getattr(results, 'correction_ledger', None)
+    if ledger is None:
+        ledger = CorrectionLedger()
+        results.correction_ledger = ledger
+    return ledger
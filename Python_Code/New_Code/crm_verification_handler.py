@@ -7,9 +7,12 @@ from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
 import pyqtgraph as pg
 import re
+import numpy as np
 import pandas as pd
 import logging
 from datetime import datetime
+from utils.correction_kernel import CorrectionResult
+from utils.correction_ledger import correction_ledger
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -20,6 +23,12 @@ class CRMVerificationHandler:
         # *** UNDO STACK برای CRM ***
         self.crm_undo_stack = []
         self.crm_backup_columns = {}  # ذخیره backup ستون‌ها
+        # نقشه Element -> ردیف‌های Samp در original_df (یکبار برای هر فریم ساخته می‌شود)
+        self._sample_rows_frame = None
+        self._sample_rows_len = 0
+        self._sample_rows = {}
+        # فریمی که آخرین بار به عنوان last_filtered_data منتشر شد
+        self._published_results = None
     def run_calibration(self):
         # اول: file_ranges رو از اپلیکیشن بگیر (ممکنه تازه ساخته شده باشه)
         file_ranges = getattr(self.w.app, 'file_ranges', [])
@@ -658,51 +667,34 @@ class CRMVerificationHandler:
     def undo_crm_correction(self):
         """حذف ضرایب CRM + برگرداندن مقادیر اصلی"""
         try:
-            if not hasattr(self.w.app.results, 'report_change'):
-                QMessageBox.warning(self.w, "⚠️ No Data", "No CRM corrections!")
-                return
-            
-            report_change = self.w.app.results.report_change
+            ledger = correction_ledger(self.w.app.results)
             element = self.w.selected_element
-            
+
             # پیدا کردن CRM entries
-            crm_mask = (
-                (report_change['Element'] == element) & 
-                (report_change['Scale'].notna() | report_change['Blank'].notna())
-            )
-            
-            if not crm_mask.any():
+            crm_entries = ledger.to_frame('crm', element)
+            if crm_entries.empty:
                 QMessageBox.warning(self.w, "⚠️ No Data", f"No CRM corrections for {element}!")
                 return
-            
-            # *** 1. برگرداندن مقادیر اصلی از report_change ***
-            for _, row in report_change[crm_mask].iterrows():
-                sl = row['Solution Label']
-                original_val = row['Original Value']
-                
-                # Update all_pivot_df
-                if hasattr(self.w, 'all_pivot_df') and not self.w.all_pivot_df.empty:
-                    mask = self.w.all_pivot_df['Solution Label'] == sl
-                    if mask.any():
-                        self.w.all_pivot_df.loc[mask, element] = original_val
-                
-                # Update pivot_df
-                if not self.w.pivot_df.empty:
-                    mask = self.w.pivot_df['Solution Label'] == sl
-                    if mask.any():
-                        self.w.pivot_df.loc[mask, element] = original_val
-            
-            # *** 2. حذف ضرایب از report_change ***
-            report_change = report_change[~crm_mask].reset_index(drop=True)
-            self.w.app.results.report_change = report_change
+
+            # *** 1. برگرداندن مقادیر اصلی از ledger ***
+            originals = crm_entries.drop_duplicates('Solution Label', keep='last').set_index('Solution Label')['Original Value']
+            frames = [self.w.pivot_df] if not self.w.pivot_df.empty else []
+            if hasattr(self.w, 'all_pivot_df') and not self.w.all_pivot_df.empty:
+                frames.insert(0, self.w.all_pivot_df)
+            for frame in frames:
+                restored = frame['Solution Label'].map(originals).dropna()
+                self.write_rows(frame, restored.index, element, restored.to_numpy())
+
+            # *** 2. حذف ضرایب از ledger ***
+            ledger.remove('crm', element)
             column = self.w.selected_element
             self.w.app.crm_check.restore_column(column)
             # *** 3. آپدیت Results tab ***
             if hasattr(self.w.app.results, 'show_processed_data'):
-                self.w.app.results.last_filtered_data = self.w.all_pivot_df.copy() if hasattr(self.w, 'all_pivot_df') else self.w.pivot_df.copy()
+                self.publish_results()
                 self.w.app.results.show_processed_data()
             # Success message
-            removed_count = crm_mask.sum()
+            removed_count = len(crm_entries)
             QMessageBox.information(
                 self.w, "✅ CRM Undo Successful",
                 f"✅ Removed {removed_count} CRM coefficients\n"
@@ -730,39 +722,27 @@ class CRMVerificationHandler:
                 QMessageBox.warning(self, "Error", f"Column {column_to_correct} not found!")
                 return
 
-            corrected_count = 0
-            correction_data = []
-            
-            # *** 1. BACKUP و اعمال روی pivot_df ***
-            pivot_backup = self.w.pivot_df[column_to_correct].copy()  # برای undo
-            
-            for index, row in self.w.pivot_df.iterrows():
-                solution_label = row['Solution Label']
-                current_val = row[column_to_correct]
-                if pd.notna(current_val) and self.is_numeric(current_val):
-                    val = float(current_val)
-                    if (solution_label not in self.w.excluded_from_correct and
-                        (self.w.scale_range_min is None or self.w.scale_range_max is None or
-                        self.w.scale_range_min <= val <= self.w.scale_range_max) and
-                        (not self.w.scale_above_50_cb.isChecked() or val > 50)):
-                        
-                        new_val = (val - self.w.preview_blank) * self.w.preview_scale
-                        self.w.pivot_df.at[index, column_to_correct] = new_val
-                        corrected_count += 1
-                        
-                        correction_data.append({
-                            'Solution Label': solution_label,
-                            'Element': column_to_correct,
-                            'Scale': self.w.preview_scale,
-                            'Blank': self.w.preview_blank,
-                            'Original Value': val,
-                            'New Value': new_val
-                        })
+            # *** 1. ماسک و اعمال یکجا روی pivot_df ***
+            values = pd.to_numeric(self.w.pivot_df[column_to_correct], errors='coerce').to_numpy(dtype=float)
+            mask = self.correction_mask(values, self.w.pivot_df['Solution Label'])
+            positions = np.flatnonzero(mask)
+            new_values = (values[positions] - self.w.preview_blank) * self.w.preview_scale
+            CorrectionResult(positions, {column_to_correct: new_values}).apply(self.w.pivot_df)
+            corrected_count = len(positions)
+
+            correction_data = pd.DataFrame({
+                'Solution Label': self.w.pivot_df['Solution Label'].iloc[positions].to_numpy(),
+                'Element': column_to_correct,
+                'Scale': self.w.preview_scale,
+                'Blank': self.w.preview_blank,
+                'Original Value': values[positions],
+                'New Value': new_values
+            }, index=self.w.pivot_df.index[positions])
 
             # *** 2. آپدیت GLOBAL DATA (مهم‌ترین بخش!) ***
             self.update_global_data_crm(column_to_correct, correction_data)
             
-            # *** 3. ذخیره ضرایب در report_change ***
+            # *** 3. ذخیره ضرایب در correction ledger ***
             self.save_crm_to_report_change(correction_data, column_to_correct)
             
             # *** 4. Reset controls ***
@@ -788,44 +768,86 @@ class CRMVerificationHandler:
             logger.error(f"❌ CRM Correction failed: {str(e)}")
             QMessageBox.critical(self.w, "❌ Error", f"Failed to apply CRM correction:\n{str(e)}")
 
+    def correction_mask(self, values, labels):
+        """Cells the (x - blank) * scale correction applies to: numeric, not excluded, in range and (optionally) > 50."""
+        mask = ~np.isnan(values)
+        if self.w.excluded_from_correct:
+            mask &= ~labels.isin(list(self.w.excluded_from_correct)).to_numpy()
+        if self.w.scale_range_min is not None and self.w.scale_range_max is not None:
+            mask &= (values >= self.w.scale_range_min) & (values <= self.w.scale_range_max)
+        if self.w.scale_above_50_cb.isChecked():
+            mask &= values > 50
+        return mask
+
+    def sample_rows(self, element):
+        """Index labels of the Samp/Sample rows of an element in original_df."""
+        df = self.w.original_df
+        if self._sample_rows_frame is not df or self._sample_rows_len != len(df):
+            samples = df[df['Type'].isin(['Samp', 'Sample'])]
+            self._sample_rows = {el: samples.index[idx] for el, idx in samples.groupby('Element').indices.items()}
+            self._sample_rows_frame = df
+            self._sample_rows_len = len(df)
+        return self._sample_rows.get(element, df.index[:0])
+
+    @staticmethod
+    def write_rows(df, rows, column, values):
+        """Bulk-write values into df[column] at the given index labels."""
+        if len(rows) == 0:
+            return
+        if df[column].dtype.kind in 'iub':
+            df[column] = df[column].astype(float)
+        df.loc[rows, column] = values
+
+    def publish_results(self):
+        """Hand the Results tab its own copy of the wide data and remember it for in-place updates."""
+        source = self.w.all_pivot_df if hasattr(self.w, 'all_pivot_df') else self.w.pivot_df
+        self.w.app.results.last_filtered_data = source.copy()
+        self._published_results = self.w.app.results.last_filtered_data
+
     def update_global_data_crm(self, column, correction_data):
         """🔥 آپدیت REAL DATA در همه جا"""
         try:
+            rows = correction_data.index
+            new_values = correction_data['New Value'].to_numpy(dtype=float)
+
             # *** A. آپدیت all_pivot_df (اصلی‌ترین داده Results tab) ***
-            if hasattr(self.w, 'all_pivot_df') and not self.w.all_pivot_df.empty:
-                for sl in [item['Solution Label'] for item in correction_data]:
-                    mask = self.w.all_pivot_df['Solution Label'] == sl
-                    if mask.any():
-                        old_val = self.w.all_pivot_df.loc[mask, column].iloc[0]
-                        new_val = self.w.pivot_df.loc[self.w.pivot_df['Solution Label'] == sl, column].iloc[0]
-                        self.w.all_pivot_df.loc[mask, column] = new_val
-                        logger.debug(f"Updated all_pivot_df: {sl} | {old_val} → {new_val}")
-            
+            # pivot_df برشی از all_pivot_df با همان index است، پس ردیف‌ها مستقیم نوشته می‌شوند
+            has_all_pivot = hasattr(self.w, 'all_pivot_df') and not self.w.all_pivot_df.empty
+            if has_all_pivot:
+                in_all = rows.isin(self.w.all_pivot_df.index)
+                self.write_rows(self.w.all_pivot_df, rows[in_all], column, new_values[in_all])
+                logger.debug(f"Updated {int(in_all.sum())} rows of all_pivot_df for {column}")
+
             # *** B. آپدیت last_filtered_data در ResultsFrame ***
             if hasattr(self.w.app, 'results') and self.w.app.results:
-                # کپی از all_pivot_df یا pivot_df
-                results_data = self.w.all_pivot_df.copy() if hasattr(self.w, 'all_pivot_df') else self.w.pivot_df.copy()
-                self.w.app.results.last_filtered_data = results_data
+                results = self.w.app.results
+                published = self._published_results
+                if published is not None and getattr(results, 'last_filtered_data', None) is published:
+                    # همان فریم قبلی است: فقط سلول‌های تصحیح‌شده
+                    in_results = rows.isin(published.index)
+                    self.write_rows(published, rows[in_results], column, new_values[in_results])
+                else:
+                    self.publish_results()
                 logger.debug(f"Updated results.last_filtered_data for {column}")
-            
+
             # *** C. آپدیت original_df (long format) ***
             if hasattr(self.w, 'original_df') and self.w.original_df is not None:
                 conc_col = self.get_concentration_column(self.w.original_df)
                 if conc_col:
-                    for item in correction_data:
-                        sl = item['Solution Label']
-                        mask = (
-                            (self.w.original_df['Solution Label'] == sl) & 
-                            (self.w.original_df['Element'] == column) &
-                            (self.w.original_df['Type'].isin(['Samp', 'Sample']))
-                        )
-                        if mask.any():
-                            self.w.original_df.loc[mask, conc_col] = item['New Value']
-                    
+                    sample_rows = self.sample_rows(column)
+                    # برای برچسب تکراری، آخرین مقدار برنده است (مثل حلقه قبلی)
+                    by_label = pd.Series(new_values, index=correction_data['Solution Label'].to_numpy())
+                    by_label = by_label[~by_label.index.duplicated(keep='last')]
+                    long_values = self.w.original_df.loc[sample_rows, 'Solution Label'].map(by_label).dropna()
+                    self.write_rows(self.w.original_df, long_values.index, conc_col, long_values.to_numpy())
+
                     # Sync to all_original_df
-                    if hasattr(self.w, 'all_original_df'):
-                        self.w.all_original_df.loc[self.w.original_df.index, :] = self.w.original_df
-            
+                    all_original = getattr(self.w, 'all_original_df', None)
+                    if all_original is not None and all_original is not self.w.original_df:
+                        in_all = long_values.index.isin(all_original.index)
+                        self.write_rows(all_original, long_values.index[in_all], conc_col, long_values.to_numpy()[in_all])
+                    logger.debug(f"Updated {len(long_values)} rows of original_df for {column}")
+
             # *** D. فراخوانی show_processed_data برای REFRESH فوری ***
             if hasattr(self.w.app.results, 'show_processed_data'):
                 self.w.app.results.show_processed_data()
@@ -839,33 +861,17 @@ class CRMVerificationHandler:
             logger.error(f"❌ Error updating global CRM data: {str(e)}")
 
     def save_crm_to_report_change(self, correction_data, element):
-        """ذخیره ضرایب CRM در report_change"""
+        """ذخیره ضرایب CRM در ledger اصلاحات (جایگزین ضرایب قبلی همین عنصر)"""
         try:
-            # Initialize report_change if needed
-            if not hasattr(self.w.app.results, 'report_change'):
-                self.w.app.results.report_change = pd.DataFrame(
-                    columns=['Solution Label', 'Element', 'Scale', 'Blank', 'Original Value', 'New Value']
-                )
-            
-            report_change = self.w.app.results.report_change
-            
-            # Create CRM DataFrame
-            if correction_data:
-                crm_df = pd.DataFrame(correction_data)
-                
-                # Remove existing CRM entries for this element
-                if 'Element' in report_change.columns:
-                    existing_mask = report_change['Element'] == element
-                    report_change = report_change[~existing_mask]
-                
-                # Add new CRM entries
-                report_change = pd.concat([report_change, crm_df], ignore_index=True)
-                self.w.app.results.report_change = report_change
-                
-                logger.info(f"✅ Saved {len(crm_df)} CRM coefficients to report_change for {element}")
-            
+            if len(correction_data):
+                ledger = correction_ledger(self.w.app.results)
+                ledger.record('crm', element, correction_data['Solution Label'].to_numpy(), replace=True,
+                              **{name: correction_data[name].to_numpy(dtype=float)
+                                 for name in ('Scale', 'Blank', 'Original Value', 'New Value')})
+                logger.info(f"✅ Saved {len(correction_data)} CRM coefficients to the correction ledger for {element}")
+
         except Exception as e:
-            logger.error(f"❌ Error saving CRM to report_change: {str(e)}")
+            logger.error(f"❌ Error saving CRM to the correction ledger: {str(e)}")
 
     def apply_model(self):
         """Apply the model corrections."""
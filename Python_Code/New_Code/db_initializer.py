@@ -2,8 +2,138 @@
 import sqlite3
 import logging
 
+from utils.element_store import SCHEMA as ELEMENT_SCHEMA, add_sample_counts, migrate_wide_table, rebuild_view
+
 logger = logging.getLogger(__name__)
 
+# ==================================================================
+# مهاجرت‌های نسخه‌دار: هر مهاجرت یک بار اجرا و در schema_version ثبت می‌شود.
+# فقط به انتهای لیست اضافه کنید؛ دستورات باید تکرارپذیر باشند (IF NOT EXISTS).
+# ==================================================================
+MIGRATIONS = [
+    (1, "secondary indexes for crm_data, changes_log, approvals, notifications, uploaded_files", [
+        # crm_data: فیلتر بر اساس file_name، crm_id/element، folder_name و date
+        "CREATE INDEX IF NOT EXISTS idx_crm_data_file_crm ON crm_data(file_name, crm_id)",
+        "CREATE INDEX IF NOT EXISTS idx_crm_data_crm_element_date ON crm_data(crm_id, element, date)",
+        "CREATE INDEX IF NOT EXISTS idx_crm_data_folder_file ON crm_data(folder_name, file_name)",
+        "CREATE INDEX IF NOT EXISTS idx_crm_data_date ON crm_data(date)",
+        # changes_log: join و فیلتر بر اساس file_path/column_name
+        "CREATE INDEX IF NOT EXISTS idx_changes_log_file_column ON changes_log(file_path, column_name)",
+        # approvals: LEFT JOIN approvals a ON cl.id = a.change_id
+        "CREATE INDEX IF NOT EXISTS idx_approvals_change ON approvals(change_id)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id, is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_uploaded_files_path ON uploaded_files(file_path)",
+        "CREATE INDEX IF NOT EXISTS idx_uploaded_files_archived ON uploaded_files(is_archived, created_at)",
+    ]),
+]
+
+# مهاجرت‌های excels_elements.db (schema_version جداگانه در همان فایل)
+ELEMENT_MIGRATIONS = [
+    (1, "long-format element store with interned codes, per-element stats and elements_data view",
+     ELEMENT_SCHEMA + [migrate_wide_table, rebuild_view]),
+    (2, "per-file sample counts for row-window paging", [add_sample_counts]),
+]
+
+# پرس‌وجوهای پرتکرار برنامه با پارامترهای نمونه، برای گزارش query plan
+HOT_QUERIES = {
+    'crm_data by file': ("SELECT * FROM crm_data WHERE file_name = ?", ('f',)),
+    'crm_data by crm/element': ("SELECT value, date FROM crm_data WHERE crm_id = ? AND element = ?", ('c', 'e')),
+    'crm_data by folder': ("SELECT * FROM crm_data WHERE folder_name = ? AND file_name = ?", ('d', 'f')),
+    'crm_data by date': ("SELECT COUNT(*) FROM crm_data WHERE date BETWEEN ? AND ?", ('2024-01-01', '2024-12-31')),
+    'next version number': ("SELECT COALESCE(MAX(version_number), 0) + 1 FROM measurement_versions "
+                            "WHERE measurement_id = ?", (1,)),
+    'measurement id': ("SELECT id FROM measurements WHERE file_id = ? AND sample_id = ? AND element = ?", (1, 's', 'e')),
+    'pending changes by file': ("SELECT cl.id, cl.user_id, cl.solution_label FROM changes_log cl "
+                                "LEFT JOIN approvals a ON cl.id = a.change_id "
+                                "WHERE a.id IS NULL AND cl.file_path = ? AND cl.column_name = ?", ('f', 'c')),
+    'unread notifications': ("SELECT id, message FROM notifications WHERE user_id = ? AND is_read = 0 "
+                             "AND created_at > ? ORDER BY created_at DESC LIMIT 1", (1, '2024-01-01')),
+    'file id by path': ("SELECT id FROM uploaded_files WHERE file_path = ?", ('f',)),
+}
+
+ELEMENT_HOT_QUERIES = {
+    'element history': ("SELECT v.value FROM element_values v WHERE v.element_id = "
+                        "(SELECT id FROM element_codes WHERE code = ?) ORDER BY v.file_id, v.sample_id", ('e',)),
+    'element values of file': ("SELECT DISTINCT element_id FROM element_values WHERE file_id = ?", (1,)),
+    'element files by name': ("SELECT id FROM element_files WHERE file_name = ?", ('f',)),
+    'element row page': ("SELECT file_id, sample_id FROM element_values WHERE (file_id, sample_id) >= (?, ?) "
+                         "GROUP BY file_id, sample_id ORDER BY file_id, sample_id LIMIT ?", (1, 's', 100)),
+}
+
+
+def schema_version(conn):
+    """Highest applied migration version (0 for a database without schema_version)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """Apply the migrations newer than the recorded schema version, each in its own transaction.
+
+    A migration step is an SQL string or a callable taking the connection
+    (for data moves that SQL alone cannot express). Runs ANALYZE when anything was applied so the planner sees the new
+    indexes. Returns the list of applied versions.
+    """
+    current = schema_version(conn)
+    conn.commit()
+    applied = []
+    for version, description, statements in migrations:
+        if version <= current:
+            continue
+        # BEGIN صریح تا دستورات DDL هم با ثبت نسخه در یک تراکنش باشند
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                         (version, description))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"[DB Init] Migration {version} failed: {e}")
+            raise
+        logger.info(f"[DB Init] Applied migration {version}: {description}")
+        applied.append(version)
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+
+def explain_hot_queries(conn, queries=HOT_QUERIES):
+    """EXPLAIN QUERY PLAN of each hot query: {name: [plan detail, ...]}."""
+    plans = {}
+    for name, (sql, params) in queries.items():
+        try:
+            plans[name] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.Error as e:
+            plans[name] = [f"error: {e}"]
+    return plans
+
+
+def report_query_plans(db_path, queries=HOT_QUERIES):
+    """Log the plans of queries against db_path and flag the ones that still scan a table."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        plans = explain_hot_queries(conn, queries)
+    finally:
+        conn.close()
+    for name, details in plans.items():
+        scans = [d for d in details if d.startswith('SCAN')]
+        log = logger.warning if scans else logger.info
+        log(f"[DB Plan] {name}: {' | '.join(details)}")
+    return plans
+
+
 def init_db_schema(resource_path_func):
     """
     ایجاد کامل schema دیتابیس از ابتدا
@@ -258,24 +388,29 @@ def init_db_schema(resource_path_func):
         # ==================================================================
         cur.execute("DROP TABLE IF EXISTS files")
 
+        # ستون‌هایی که ایندکس‌ها به آن‌ها نیاز دارند در دیتابیس‌های قدیمی ممکن است نباشند
+        crm_columns = [row[1] for row in cur.execute("PRAGMA table_info(crm_data)")]
+        for col in ('folder_name', 'date'):
+            if col not in crm_columns:
+                cur.execute(f"ALTER TABLE crm_data ADD COLUMN {col} TEXT")
+
         conn.commit()
+        applied = apply_migrations(conn)
+        if applied:
+            print(f"[DB Init] Applied migrations: {applied}")
         conn.close()
 
         # Initialize excels_elements.db
         conn_elements = sqlite3.connect(elements_db_path, timeout=30)
-        cur_elements = conn_elements.cursor()
-        cur_elements.execute("PRAGMA journal_mode = WAL;")
+        # fetchall تا PRAGMA (که یک ردیف برمی‌گرداند) در حال اجرا نماند و DROP TABLE مهاجرت قفل نشود
+        conn_elements.execute("PRAGMA journal_mode = WAL;").fetchall()
         print(f"[DB Init] Initializing elements database at: {elements_db_path}")
 
-        # Create elements_data table (base columns; elements added dynamically)
-        cur_elements.execute('''
-            CREATE TABLE IF NOT EXISTS elements_data (
-                sample_id TEXT,
-                file_name TEXT
-            )
-        ''')
-
+        # Long-format store; elements_data is now a view over it (an old wide table is migrated once)
         conn_elements.commit()
+        applied = apply_migrations(conn_elements, ELEMENT_MIGRATIONS)
+        if applied:
+            print(f"[DB Init] Applied element store migrations: {applied}")
         conn_elements.close()
 
         print("[DB Init] Database initialized successfully with username-based schema!")
@@ -0,0 +1,156 @@
+# utils/db_pool.py
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# هر اتصال یک بار با این تنظیمات باز می‌شود و سپس در همان thread دوباره استفاده می‌شود
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -32000),        # ~32 MB page cache
+    ("mmap_size", 268435456),      # 256 MB memory-mapped I/O
+    ("busy_timeout", 30000),       # ms; همان timeout=30 قبلی
+    ("temp_store", "MEMORY"),
+)
+# sqlite3 statements are compiled once per connection and kept in this LRU,
+# so a long-lived connection turns repeated queries into prepared-statement hits
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+def _key(db_path):
+    return os.path.abspath(db_path)
+
+
+def _state():
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+        _local.depth = {}
+    return _local
+
+
+def get_connection(db_path):
+    """Connection to db_path owned by the calling thread, opened and configured on first use.
+
+    Callers must not close it; use close_connections() when a database file
+    is replaced or the thread is about to finish.
+    """
+    state = _state()
+    key = _key(db_path)
+    conn = state.connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        state.connections[key] = conn
+        logger.debug(f"Opened pooled connection to {key} in {threading.current_thread().name}")
+    return conn
+
+
+def close_connections(db_path=None):
+    """Close the calling thread's pooled connections (only the one for db_path if given)."""
+    state = _state()
+    keys = [_key(db_path)] if db_path is not None else list(state.connections)
+    for key in keys:
+        conn = state.connections.pop(key, None)
+        if conn is not None:
+            conn.close()
+        state.depth.pop(key, None)
+
+
+@contextmanager
+def transaction(db_path):
+    """Run a block of writes on the pooled connection as one transaction.
+
+    Commits when the outermost block exits normally and rolls back if it
+    raises; nested blocks join the enclosing transaction.
+    """
+    state = _state()
+    key = _key(db_path)
+    conn = get_connection(db_path)
+    depth = state.depth.get(key, 0)
+    if depth == 0 and not conn.in_transaction:
+        # BEGIN صریح تا DDL (مثل ALTER TABLE) هم داخل همین تراکنش باشد
+        conn.execute("BEGIN")
+    state.depth[key] = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        raise
+    else:
+        if depth == 0:
+            conn.commit()
+    finally:
+        state.depth[key] = depth
+
+
+def fetch_all(db_path, sql, params=()):
+    return get_connection(db_path).execute(sql, params).fetchall()
+
+
+def fetch_one(db_path, sql, params=()):
+    return get_connection(db_path).execute(sql, params).fetchone()
+
+
+def fetch_value(db_path, sql, params=(), default=None):
+    """First column of the first row, or default when there is no row."""
+    row = fetch_one(db_path, sql, params)
+    return row[0] if row is not None else default
+
+
+def read_frame(db_path, sql, params=None):
+    return pd.read_sql_query(sql, get_connection(db_path), params=params)
+
+
+def execute(db_path, sql, params=()):
+    """Run one write statement in its own transaction and return the cursor (rowcount, lastrowid)."""
+    with transaction(db_path) as conn:
+        return conn.execute(sql, params)
+
+
+def execute_many(db_path, sql, rows):
+    with transaction(db_path) as conn:
+        return conn.executemany(sql, rows)
+
+
+def table_columns(db_path, table):
+    """Column names of table in declaration order (empty when the table does not exist)."""
+    return [row[1] for row in fetch_all(db_path, f"PRAGMA table_info({quote_identifier(table)})")]
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def bulk_insert(db_path, table, df, new_column_type=None):
+    """Insert all rows of df into table with one executemany in a single transaction.
+
+    Existing columns are read once with PRAGMA table_info. Columns of df the
+    table lacks are added as new_column_type, or rejected when it is None.
+    NaN is stored as NULL. Returns the number of inserted rows.
+    """
+    if df.empty:
+        return 0
+    with transaction(db_path) as conn:
+        # نام ستون‌ها در SQLite به بزرگی/کوچکی حروف حساس نیست
+        existing = {col.casefold() for col in table_columns(db_path, table)}
+        missing = [col for col in df.columns if str(col).casefold() not in existing]
+        if missing and new_column_type is None:
+            raise ValueError(f"Table {table} has no column(s) {missing}")
+        for col in missing:
+            conn.execute(f"ALTER TABLE {quote_identifier(table)} ADD COLUMN {quote_identifier(col)} {new_column_type}")
+        columns = ', '.join(quote_identifier(col) for col in df.columns)
+        placeholders = ', '.join('?' for _ in df.columns)
+        rows = df.astype(object).where(df.notna(), None).to_numpy().tolist()
+        conn.executemany(f"INSERT INTO {quote_identifier(table)} ({columns}) VALUES ({placeholders})", rows)
+    logger.debug(f"Bulk inserted {len(rows)} rows into {table} ({len(missing)} new columns)")
+    return len(rows)
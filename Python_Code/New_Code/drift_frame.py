@@ -12,12 +12,16 @@ import logging
 import re
 from typing import Any, Dict, List, Optional, Tuple
 from functools import partial
-from .find_rm import CheckRMThread
-from .rm_ratio import ApplySingleRM
+from utils.undo_journal import app_journal, JournalError
+from utils.correction_ledger import correction_ledger
+from .find_rm import CheckRMThread, RMSegmentIndex
+from .rm_ratio import ApplySingleRM, ApplyRMDrift, CancelToken
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+JOURNAL_SCOPE = 'check_rm'
+
 global_style = """
 QWidget {
     background-color: #F5F7FA;
@@ -95,6 +99,20 @@ QDoubleSpinBox:focus {
     border: 1px solid #2E7D32;
 }
 """
+class DriftCorrectionThread(QThread):
+    """Runs an ApplyRMDrift off the GUI thread; the frame applies the result when it finishes."""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, applier):
+        super().__init__()
+        self.applier = applier
+        self.applier.progress = lambda step, total: self.progress.emit(int(step / total * 100))
+
+    def run(self):
+        self.finished.emit(self.applier.run())
+
+
 class CheckRMFrame(QWidget):
     data_changed = pyqtSignal()
     results_update_requested = pyqtSignal(pd.DataFrame)
@@ -105,7 +123,14 @@ class CheckRMFrame(QWidget):
         self.app.check_rm_frame = self  # برای دسترسی از ApplySingleRM
         self.empty_rows_from_check = pd.DataFrame()
         self.initial_rm_df = None
-        self.undo_stack = []
+        self.journal = app_journal(app)
+        self.journal.register(f"{JOURNAL_SCOPE}.last_filtered_data", lambda: self.app.results.last_filtered_data,
+                              lambda df: setattr(self.app.results, 'last_filtered_data', df))
+        self.journal.register(f"{JOURNAL_SCOPE}.rm_df", lambda: self.rm_df)
+        self.journal.register(f"{JOURNAL_SCOPE}.all_rm_df", lambda: self.all_rm_df)
+        self.journal.register(f"{JOURNAL_SCOPE}.corrected_drift", lambda: self.corrected_drift)
+        self.journal.register(f"{JOURNAL_SCOPE}.results_drift", lambda: self.app.results.corrected_drift)
+        self.journal.register(f"{JOURNAL_SCOPE}.correction_ledger", lambda: correction_ledger(self.app.results).live)
         self.navigation_list = []
         self.current_nav_index = -1
         self.segments = []
@@ -116,6 +141,7 @@ class CheckRMFrame(QWidget):
         self.all_positions_df = None
         self.all_segments = None
         self.all_pivot_df = None
+        self.drift_thread = None
 
         # جدید: نقاطی که کاربر دستی ignore کرده
         self.ignored_pivots = set()
@@ -132,13 +158,14 @@ class CheckRMFrame(QWidget):
         self.rm_df = self.positions_df = self.pivot_df = self.initial_rm_df = None
         self.all_rm_df = self.all_initial_rm_df = self.all_positions_df = self.all_pivot_df = None
         self.all_segments = None
+        self.segment_index = None
         self.selected_element = self.current_rm_num = None
         self.elements = self.unique_rm_nums = []
         self.current_slope = 0.0
         self.original_rm_values = self.display_rm_values = np.array([])
         self.current_valid_pivot_indices = []
         self.selected_row = -1
-        self.undo_stack = []
+        self.journal.clear(JOURNAL_SCOPE)
         self.corrected_drift = {}
         self.navigation_list = []
         self.current_nav_index = -1
@@ -190,6 +217,10 @@ class CheckRMFrame(QWidget):
         self.undo_button.clicked.connect(self.undo_correction)
         self.undo_button.setEnabled(False)
         control_layout.addWidget(self.undo_button)
+        self.apply_all_button = QPushButton("Apply to All Elements")
+        self.apply_all_button.setToolTip("Apply the drift correction of the current RM to every element in one pass")
+        self.apply_all_button.clicked.connect(self.apply_to_all_elements)
+        control_layout.addWidget(self.apply_all_button)
         self.stepwise_checkbox = QCheckBox("Apply Stepwise Changes")
         control_layout.addWidget(self.stepwise_checkbox)
         left_layout.addWidget(control_frame)
@@ -464,6 +495,7 @@ class CheckRMFrame(QWidget):
         self.all_segments = results['segments']
         self.all_pivot_df = results['pivot_df'].copy(deep=True)
         self.elements = results['elements']
+        self.segment_index = results.get('segment_index')
 
         self.file_ranges = self.app.file_ranges if hasattr(self.app, 'file_ranges') else []
 
@@ -503,20 +535,13 @@ class CheckRMFrame(QWidget):
             self.segments = self._create_segments(self.positions_df)
             self.unique_rm_nums = sorted(self.rm_df['rm_num'].unique())
         else:
-            fr = self.file_ranges[index]
-            start = fr['start_pivot_row']
-            end = fr['end_pivot_row']
-
-            if 'pivot_index' in self.all_pivot_df.columns:
-                self.pivot_df = self.all_pivot_df[self.all_pivot_df['pivot_index'].between(start, end)].copy()
-                self.rm_df = self.all_rm_df[self.all_rm_df['pivot_index'].between(start, end)].copy()
-                self.initial_rm_df = self.all_initial_rm_df[self.all_initial_rm_df['pivot_index'].between(start, end)].copy()
-                self.positions_df = self.all_positions_df[self.all_positions_df['pivot_index'].between(start, end)].copy()
-            else:
-                self.pivot_df = self.all_pivot_df.iloc[start:end+1].copy()
-                self.rm_df = self.all_rm_df.iloc[start:end+1].copy()
-                self.initial_rm_df = self.all_initial_rm_df.iloc[start:end+1].copy()
-                self.positions_df = self.all_positions_df.iloc[start:end+1].copy()
+            # ردیف‌های فایل در pivot پیوسته‌اند (pivot_index == شماره ردیف)
+            start, stop = self._segment_index().file_bounds(index)
+            end = stop - 1
+            self.pivot_df = self.all_pivot_df.iloc[start:stop].copy()
+            self.rm_df = self.all_rm_df[self.all_rm_df['pivot_index'].between(start, end)].copy()
+            self.initial_rm_df = self.all_initial_rm_df[self.all_initial_rm_df['pivot_index'].between(start, end)].copy()
+            self.positions_df = self.all_positions_df[self.all_positions_df['pivot_index'].between(start, end)].copy()
 
             self.segments = self._create_segments(self.positions_df)
             self.unique_rm_nums = sorted(self.rm_df['rm_num'].unique())
@@ -547,6 +572,21 @@ class CheckRMFrame(QWidget):
             self.per_file_checkbox.setEnabled(False)
         self.current_file_index = index
 
+    def _segment_index(self):
+        """RMSegmentIndex of the loaded run; rebuilt only when the frames or files no longer match it."""
+        if self.segment_index is None or not self.segment_index.matches(self.all_pivot_df, self.all_positions_df, self.file_ranges):
+            self.segment_index = RMSegmentIndex(self.all_pivot_df, self.all_positions_df, self.file_ranges)
+        return self.segment_index
+
+    def _rows_between_rms(self, pivot_prev, pivot_curr):
+        """Rows of the current pivot view between two RMs (from the 'min' of the first to the 'max' of the second) with a value for the selected element."""
+        index = self._segment_index()
+        bounds = index.rm_bounds(pivot_prev, pivot_curr)
+        if bounds is None:
+            return self.pivot_df.iloc[0:0]
+        data = self.pivot_df.iloc[index.rows_between_original(*bounds, index.frame_view(self.pivot_df))]
+        return data[data[self.selected_element].notna()]
+
     def _create_segments(self, positions_df: pd.DataFrame) -> List[Dict[str, Any]]:
         segments = []
         for seg_id in positions_df['segment_id'].unique():
@@ -804,19 +844,7 @@ class CheckRMFrame(QWidget):
             pivot_prev = pivot_valid[i]
             pivot_curr = pivot_valid[i + 1]
 
-            min_row = self.positions_df[self.positions_df['pivot_index'] == pivot_prev]
-            max_row = self.positions_df[self.positions_df['pivot_index'] == pivot_curr]
-            if min_row.empty or max_row.empty:
-                continue
-
-            min_pos = min_row['min'].values[0]
-            max_pos = max_row['max'].values[0]
-
-            cond = (self.pivot_df['original_index'] > min_pos) & \
-                   (self.pivot_df['original_index'] < max_pos) & \
-                   self.pivot_df[self.selected_element].notna()
-
-            between_data = self.pivot_df[cond].copy().sort_values('original_index')
+            between_data = self._rows_between_rms(pivot_prev, pivot_curr)
             if between_data.empty:
                 continue
             if filter_text:
@@ -910,16 +938,7 @@ class CheckRMFrame(QWidget):
         pivot_prev = self.current_valid_pivot_indices[self.selected_row]
         pivot_curr = self.current_valid_pivot_indices[self.selected_row + 1]
 
-        min_row = self.positions_df[self.positions_df['pivot_index'] == pivot_prev]
-        max_row = self.positions_df[self.positions_df['pivot_index'] == pivot_curr]
-
-        if min_row.empty or max_row.empty: return pd.DataFrame()
-
-        min_pos = min_row['min'].values[0]
-        max_pos = max_row['max'].values[0]
-
-        cond = (self.pivot_df['original_index'] > min_pos) & (self.pivot_df['original_index'] < max_pos) & self.pivot_df[self.selected_element].notna()
-        data = self.pivot_df[cond].copy().sort_values('original_index')
+        data = self._rows_between_rms(pivot_prev, pivot_curr)
 
         filter_text = self.filter_entry.text().strip().lower()
         if filter_text:
@@ -1004,8 +1023,8 @@ class CheckRMFrame(QWidget):
         normal_mask = ~is_empty & ~np.isnan(y)
         if normal_mask.sum() == 0:
             return
-        seg_dict = dict(zip(self.positions_df['pivot_index'], self.positions_df['segment_id']))
-        unique_segs = np.unique([seg_dict.get(p, -1) for p in pivot[normal_mask]])
+        seg_ids = self._segment_index().segment_of(pivot)
+        unique_segs = np.unique(seg_ids[normal_mask])
         if self.global_optimize_checkbox.isChecked():
             first_idx = np.where(normal_mask)[0][0]
             first_val = y[first_idx]
@@ -1014,7 +1033,7 @@ class CheckRMFrame(QWidget):
             for seg_id in unique_segs:
                 if seg_id == -1:
                     continue
-                seg_mask = np.array([seg_dict.get(p, -1) == seg_id for p in pivot])
+                seg_mask = seg_ids == seg_id
                 seg_normal_mask = seg_mask & normal_mask
                 if seg_normal_mask.sum() == 0:
                     continue
@@ -1069,7 +1088,7 @@ class CheckRMFrame(QWidget):
         normal_mask = ~is_empty & ~np.isnan(y)
         if normal_mask.sum() < 2:
             return
-        seg_dict = dict(zip(self.positions_df['pivot_index'], self.positions_df['segment_id']))
+        seg_ids = self._segment_index().segment_of(pivot)
         x = pivot
         if self.global_optimize_checkbox.isChecked():
             x_n = x[normal_mask]
@@ -1080,11 +1099,11 @@ class CheckRMFrame(QWidget):
                 y_n -= slope * (x_n - first_x)
             y[normal_mask] = y_n
         else:
-            unique_segs = np.unique([seg_dict.get(p, -1) for p in pivot[normal_mask]])
+            unique_segs = np.unique(seg_ids[normal_mask])
             for seg_id in unique_segs:
                 if seg_id == -1:
                     continue
-                seg_mask = np.array([seg_dict.get(p, -1) == seg_id for p in pivot])
+                seg_mask = seg_ids == seg_id
                 seg_normal_mask = seg_mask & normal_mask
                 if seg_normal_mask.sum() < 2:
                     continue
@@ -1135,25 +1154,97 @@ class CheckRMFrame(QWidget):
         if not self.selected_element or self.current_rm_num is None:
             QMessageBox.critical(self, "Error", "No element or RM number selected.")
             return
-        self.undo_stack.append((self.app.results.last_filtered_data.copy(), self.rm_df.copy(), self.corrected_drift.copy()))
-        self.undo_button.setEnabled(True)
-        self.progress_dialog = QProgressDialog("Applying corrections...", "Cancel", 0, 100, self)
+        applier = ApplySingleRM(self.app.results.last_filtered_data, self.keyword, self.selected_element, self.current_rm_num,
+                                self.rm_df, self.initial_rm_df, self.segments, self.stepwise_checkbox.isChecked(),
+                                self._ignored_pivots())
+        self.start_drift_correction(applier, "Applying corrections...", single=True)
+
+    def apply_to_all_elements(self):
+        if not self.elements or self.current_rm_num is None:
+            QMessageBox.critical(self, "Error", "No elements or RM number available.")
+            return
+        applier = ApplyRMDrift(self.app.results.last_filtered_data, self.keyword, self.elements, self.current_rm_num,
+                               self.rm_df, self.initial_rm_df, self.segments, self.stepwise_checkbox.isChecked(),
+                               self._ignored_pivots())
+        self.start_drift_correction(applier, "Applying corrections to all elements...", single=False)
+
+    def _ignored_pivots(self):
+        rm_check = getattr(self.app, 'rm_check', None)
+        return set(rm_check.ignored_pivots) if rm_check else set()
+
+    def start_drift_correction(self, applier, label, single):
+        """Run the correction in a DriftCorrectionThread; Cancel in the progress dialog stops it between segments."""
+        if self.drift_thread is not None and self.drift_thread.isRunning():
+            QMessageBox.warning(self, "Busy", "A drift correction is already running.")
+            return
+        applier.cancel = CancelToken()
+        self.progress_dialog = QProgressDialog(label, "Cancel", 0, 100, self)
         self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-        applier = ApplySingleRM(self.app, self.keyword, self.selected_element, self.current_rm_num, self.rm_df, self.initial_rm_df, self.segments, self.stepwise_checkbox.isChecked(), self.progress_dialog)
-        results = applier.run()
+        self.progress_dialog.canceled.connect(applier.cancel.cancel)
+        self.drift_thread = DriftCorrectionThread(applier)
+        self.drift_thread.progress.connect(self.progress_dialog.setValue)
+        self.drift_thread.finished.connect(
+            partial(self.on_drift_correction_finished, self.app.results.last_filtered_data, single))
+        self.drift_thread.start()
+
+    def on_drift_correction_finished(self, source_df, single, results):
+        """Apply a finished correction in one step (data, RM values, ratios and undo entry together)."""
         self.progress_dialog.close()
+        if results.get('cancelled'):
+            QMessageBox.information(self, "Cancelled", "Drift correction cancelled; no data was changed.")
+            return
         if 'error' in results:
             QMessageBox.critical(self, "Error", results['error'])
-        else:
-            new_df = results['df']
-            self.app.results.last_filtered_data = new_df
+            return
+        if self.app.results.last_filtered_data is not source_df:
+            QMessageBox.warning(self, "Warning", "The data changed while the correction was running; the result was discarded.")
+            return
+
+        # فقط ستون‌های عناصر قبل از تغییر نگه داشته می‌شوند؛ ژورنال فقط سلول‌های تغییرکرده را ذخیره می‌کند
+        elements = results['elements']
+        before = {name: self._element_columns(frame, elements)
+                  for name, frame in (('rm_df', self.rm_df), ('all_rm_df', self.all_rm_df))}
+        drift_before = dict(self.corrected_drift)
+        results_drift_before = dict(getattr(self.app.results, 'corrected_drift', {}))
+        ledger = correction_ledger(self.app.results)
+        ledger_before = dict(ledger.live)
+
+        new_df = results['df']
+        self.app.results.last_filtered_data = new_df
+        if single:
             self.rm_df = results['rm_df']
             self.sync_rm_to_all()
-            self.corrected_drift.update(results['corrected_drift'])
-            self.save_corrected_drift()
-            self.results_update_requested.emit(new_df)
-            self.update_displays()
+        self.corrected_drift.update(results['corrected_drift'])
+        self.save_corrected_drift()
+
+        label = elements[0] if len(elements) == 1 else f"{len(elements)} elements"
+        with self.journal.group(f"Drift correction {label}", JOURNAL_SCOPE):
+            if source_df.index.equals(new_df.index) and source_df.columns.equals(new_df.columns):
+                self.journal.record_frame_diff(f"{JOURNAL_SCOPE}.last_filtered_data", source_df, new_df, elements)
+            else:
+                # the first correction sorts the frame and adds original_index/pivot_index
+                self.journal.record_replace(f"{JOURNAL_SCOPE}.last_filtered_data", source_df, new_df)
+            for name, frame in (('rm_df', self.rm_df), ('all_rm_df', self.all_rm_df)):
+                if frame is not None:
+                    self.journal.record_frame_diff(f"{JOURNAL_SCOPE}.{name}", before[name], frame, elements)
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.corrected_drift", drift_before, self.corrected_drift)
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.results_drift", results_drift_before,
+                                          getattr(self.app.results, 'corrected_drift', {}))
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.correction_ledger", ledger_before, ledger.live)
+        self.undo_button.setEnabled(self.journal.can_undo(JOURNAL_SCOPE))
+        self.results_update_requested.emit(new_df)
+        self.update_displays()
+        if single:
             QMessageBox.information(self, "Success", "Corrections applied.")
+        else:
+            QMessageBox.information(self, "Success", f"Corrections applied to {len(results['elements'])} elements.")
+
+    @staticmethod
+    def _element_columns(df, elements):
+        """{element: copy of the column} snapshot for the journal (only the columns the frame has)."""
+        if df is None:
+            return {}
+        return {el: df[el].copy() for el in elements if el in df.columns}
 
     def sync_rm_to_all(self):
         for pivot, val in zip(self.rm_df['pivot_index'], self.rm_df[self.selected_element]):
@@ -1163,24 +1254,22 @@ class CheckRMFrame(QWidget):
         try:
             if not hasattr(self.app.results, 'corrected_drift'): self.app.results.corrected_drift = {}
             self.app.results.corrected_drift.update(self.corrected_drift)
-            drift_data = [{'Solution Label': k[0], 'Element': k[1], 'Ratio': v} for k, v in self.corrected_drift.items()]
-            drift_df = pd.DataFrame(drift_data)
-            if not hasattr(self.app.results, 'report_change'): self.app.results.report_change = pd.DataFrame(columns=['Solution Label', 'Element', 'Ratio'])
-            if not drift_df.empty:
-                self.app.results.report_change = self.app.results.report_change[~self.app.results.report_change['Element'].isin(drift_df['Element'])]
-                self.app.results.report_change = pd.concat([self.app.results.report_change, drift_df], ignore_index=True)
+            correction_ledger(self.app.results).record_drift(self.corrected_drift)
         except Exception as e:
             logger.error(f"Error saving corrected_drift: {str(e)}")
 
     def undo_correction(self):
-        if self.undo_stack:
-            df, self.rm_df, self.corrected_drift = self.undo_stack.pop()
-            self.sync_rm_to_all()
-            self.app.results.last_filtered_data = df
-            self.save_corrected_drift()
+        if self.journal.can_undo(JOURNAL_SCOPE):
+            # Restore فقط سلول‌های تغییرکرده (data, rm_df, all_rm_df, corrected_drift, correction ledger)
+            try:
+                self.journal.undo(JOURNAL_SCOPE)
+            except JournalError as e:
+                logger.error(f"Drift undo failed: {e}")
+                QMessageBox.warning(self, "Warning", f"Could not undo the last correction:\n{e}")
+                return
             self.data_changed.emit(); self.app.notify_data_changed()
             self.update_displays()
-            self.undo_button.setEnabled(bool(self.undo_stack))
+            self.undo_button.setEnabled(self.journal.can_undo(JOURNAL_SCOPE))
             QMessageBox.information(self, "Success", "Last correction undone.")
             try:
                 self.app.results.reset_cache()
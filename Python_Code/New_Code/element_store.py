@@ -0,0 +1,305 @@
+# utils/element_store.py
+"""Long-format store of element measurements in excels_elements.db.
+
+Every measurement is one row (element_id, file_id, sample_id, value) of a
+WITHOUT ROWID table clustered on that key, so one element's history across
+all files is a single index range scan. Element codes are interned in
+element_codes, element_stats keeps count/min/max/sum per element up to date
+on every insert and delete, and elements_data is a wide view with one column
+per element for the consumers that still expect the old table.
+"""
+import logging
+
+import pandas as pd
+
+from utils.db_pool import fetch_all, fetch_value, get_connection, quote_identifier, read_frame, transaction
+
+logger = logging.getLogger(__name__)
+
+VIEW_NAME = "elements_data"
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS element_codes (
+        id INTEGER PRIMARY KEY,
+        code TEXT UNIQUE NOT NULL
+    )
+    """,
+    # هر آپلود یک ردیف؛ ترتیب id همان ترتیب آپلود است
+    """
+    CREATE TABLE IF NOT EXISTS element_files (
+        id INTEGER PRIMARY KEY,
+        file_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_element_files_name ON element_files(file_name)",
+    """
+    CREATE TABLE IF NOT EXISTS element_values (
+        element_id INTEGER NOT NULL REFERENCES element_codes(id),
+        file_id INTEGER NOT NULL REFERENCES element_files(id),
+        sample_id TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (element_id, file_id, sample_id)
+    ) WITHOUT ROWID
+    """,
+    # حذف فایل و شمارش نمونه‌ها بدون اسکن کل جدول
+    "CREATE INDEX IF NOT EXISTS idx_element_values_file ON element_values(file_id, sample_id)",
+    """
+    CREATE TABLE IF NOT EXISTS element_stats (
+        element_id INTEGER PRIMARY KEY REFERENCES element_codes(id),
+        n INTEGER NOT NULL,
+        min REAL,
+        max REAL,
+        total REAL,
+        total_sq REAL
+    )
+    """,
+]
+
+_STATS_SELECT = """
+    SELECT element_id, COUNT(*), MIN(value), MAX(value), SUM(value), SUM(value * value)
+    FROM element_values
+"""
+
+
+def create_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def intern_codes(conn, codes):
+    """{code: element_id} for codes, adding the ones not seen before."""
+    conn.executemany("INSERT OR IGNORE INTO element_codes (code) VALUES (?)", [(str(c),) for c in codes])
+    ids = dict(conn.execute("SELECT code, id FROM element_codes"))
+    return {code: ids[str(code)] for code in codes}
+
+
+def rebuild_view(conn):
+    """(Re)create the wide elements_data view with one column per interned element."""
+    codes = conn.execute("SELECT id, code FROM element_codes ORDER BY id").fetchall()
+    columns = "".join(
+        f",\n            MAX(CASE WHEN v.element_id = {element_id} THEN v.value END) AS {quote_identifier(code)}"
+        for element_id, code in codes
+    )
+    conn.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+    conn.execute(f"""
+        CREATE VIEW {VIEW_NAME} AS
+        SELECT v.sample_id AS sample_id, f.file_name AS file_name{columns}
+        FROM element_values v JOIN element_files f ON f.id = v.file_id
+        GROUP BY v.file_id, v.sample_id
+    """)
+
+
+def refresh_stats(conn, element_ids):
+    """Recompute element_stats of element_ids from element_values (after deletes)."""
+    element_ids = list(element_ids)
+    for start in range(0, len(element_ids), 500):
+        chunk = element_ids[start:start + 500]
+        marks = ", ".join("?" for _ in chunk)
+        conn.execute(f"DELETE FROM element_stats WHERE element_id IN ({marks})", chunk)
+        conn.execute(f"INSERT INTO element_stats {_STATS_SELECT} WHERE element_id IN ({marks}) GROUP BY element_id",
+                     chunk)
+
+
+def migrate_wide_table(conn):
+    """Move the rows of a legacy wide elements_data table into the long store and drop it.
+
+    Files keep their first-appearance order; repeated (file, sample) rows
+    are averaged like the upload pivot did.
+    """
+    kind = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (VIEW_NAME,)).fetchall()
+    if kind != [('table',)]:
+        return 0
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({VIEW_NAME})")]
+    elements = [col for col in columns if col not in ('sample_id', 'file_name')]
+    conn.execute(f"""
+        INSERT INTO element_files (file_name)
+        SELECT COALESCE(file_name, '') FROM {VIEW_NAME}
+        GROUP BY COALESCE(file_name, '') ORDER BY MIN(rowid)
+    """)
+    ids = intern_codes(conn, elements)
+    for element in elements:
+        col = quote_identifier(element)
+        conn.execute(f"""
+            INSERT INTO element_values (element_id, file_id, sample_id, value)
+            SELECT ?, f.id, w.sample_id, AVG(w.{col})
+            FROM {VIEW_NAME} w JOIN element_files f ON f.file_name = COALESCE(w.file_name, '')
+            WHERE w.sample_id IS NOT NULL AND typeof(w.{col}) IN ('real', 'integer')
+            GROUP BY f.id, w.sample_id
+        """, (ids[element],))
+    conn.execute(f"INSERT OR REPLACE INTO element_stats {_STATS_SELECT} GROUP BY element_id")
+    migrated = conn.execute("SELECT COUNT(*) FROM element_values").fetchone()[0]
+    conn.execute(f"DROP TABLE {VIEW_NAME}")
+    logger.info(f"Migrated wide {VIEW_NAME} into the long store: {len(elements)} elements, {migrated} values")
+    return migrated
+
+
+def add_sample_counts(conn):
+    """Add element_files.n_samples (rows per upload) and fill it for existing files."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(element_files)")]
+    if 'n_samples' not in columns:
+        conn.execute("ALTER TABLE element_files ADD COLUMN n_samples INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        UPDATE element_files SET n_samples = (
+            SELECT COUNT(DISTINCT sample_id) FROM element_values WHERE file_id = element_files.id
+        )
+    """)
+
+
+def store_file(db_path, file_name, values):
+    """Store one upload: values has sample_id, element and value columns (one row per pair).
+
+    File row, new element codes, all values and the element_stats upsert go
+    in one transaction; the view is rebuilt only when new elements appear.
+    """
+    values = values.dropna(subset=['sample_id', 'element', 'value'])
+    with transaction(db_path) as conn:
+        known = fetch_value(db_path, "SELECT COUNT(*) FROM element_codes")
+        samples = values['sample_id'].astype(str)
+        file_id = conn.execute("INSERT INTO element_files (file_name, n_samples) VALUES (?, ?)",
+                               (file_name, samples.nunique())).lastrowid
+        codes = values['element'].astype(str)
+        ids = intern_codes(conn, codes.unique().tolist())
+        # به ترتیب کلید درج می‌شود تا B-tree جدول WITHOUT ROWID فقط از انتها رشد کند
+        rows = pd.DataFrame({'element_id': codes.map(ids), 'file_id': file_id,
+                             'sample_id': samples, 'value': values['value'].astype(float)})
+        rows = rows.sort_values(['element_id', 'sample_id'])
+        rows = zip(*(rows[col].tolist() for col in rows.columns))
+        conn.executemany("INSERT INTO element_values (element_id, file_id, sample_id, value) VALUES (?, ?, ?, ?)", rows)
+        conn.execute(f"""
+            INSERT INTO element_stats (element_id, n, min, max, total, total_sq)
+            {_STATS_SELECT} WHERE file_id = ? GROUP BY element_id
+            ON CONFLICT(element_id) DO UPDATE SET
+                n = n + excluded.n,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max),
+                total = total + excluded.total,
+                total_sq = total_sq + excluded.total_sq
+        """, (file_id,))
+        if fetch_value(db_path, "SELECT COUNT(*) FROM element_codes") != known:
+            rebuild_view(conn)
+    logger.debug(f"Stored {len(values)} element values for {file_name} (file_id={file_id})")
+    return len(values)
+
+
+def delete_file(db_path, file_name):
+    """Remove every upload named file_name and refresh the stats of the elements it had."""
+    with transaction(db_path) as conn:
+        file_ids = [row[0] for row in conn.execute("SELECT id FROM element_files WHERE file_name = ?", (file_name,))]
+        if not file_ids:
+            return 0
+        marks = ", ".join("?" for _ in file_ids)
+        element_ids = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT element_id FROM element_values WHERE file_id IN ({marks})", file_ids)]
+        removed = conn.execute(f"DELETE FROM element_values WHERE file_id IN ({marks})", file_ids).rowcount
+        conn.execute(f"DELETE FROM element_files WHERE id IN ({marks})", file_ids)
+        refresh_stats(conn, element_ids)
+    return removed
+
+
+def element_codes(db_path):
+    """Codes of the elements that have at least one stored value, sorted."""
+    rows = fetch_all(db_path, """
+        SELECT c.code FROM element_codes c JOIN element_stats s ON s.element_id = c.id
+        WHERE s.n > 0 ORDER BY c.code
+    """)
+    return [row[0] for row in rows]
+
+
+def element_history(db_path, code):
+    """All values of one element in upload and sample order (file_name, sample_id, value)."""
+    return read_frame(db_path, """
+        SELECT f.file_name, v.sample_id, v.value
+        FROM element_values v JOIN element_files f ON f.id = v.file_id
+        WHERE v.element_id = (SELECT id FROM element_codes WHERE code = ?)
+        ORDER BY v.file_id, v.sample_id
+    """, params=(code,))
+
+
+def element_statistics(db_path):
+    """Per-element count, min, max, mean and std from element_stats."""
+    stats = read_frame(db_path, """
+        SELECT c.code AS element, s.n, s.min, s.max, s.total, s.total_sq
+        FROM element_stats s JOIN element_codes c ON c.id = s.element_id
+        ORDER BY c.code
+    """)
+    stats['mean'] = stats['total'] / stats['n']
+    variance = (stats['total_sq'] - stats['n'] * stats['mean'] ** 2) / (stats['n'] - 1)
+    stats['std'] = variance.clip(lower=0) ** 0.5
+    return stats.drop(columns=['total', 'total_sq'])
+
+
+def sample_count(db_path):
+    """Number of (file, sample) rows, i.e. rows of the elements_data view."""
+    return fetch_value(db_path, "SELECT COALESCE(SUM(n_samples), 0) FROM element_files", default=0)
+
+
+def _row_key(conn, position):
+    """(file_id, sample_id) of the row at position, or None past the last row.
+
+    The file is found from the per-file sample counts, so only the index
+    entries of that one file are skipped to reach the row.
+    """
+    skipped = 0
+    for file_id, n_samples in conn.execute("SELECT id, n_samples FROM element_files ORDER BY id").fetchall():
+        if position < skipped + n_samples:
+            row = conn.execute("""
+                SELECT DISTINCT sample_id FROM element_values WHERE file_id = ?
+                ORDER BY sample_id LIMIT 1 OFFSET ?
+            """, (file_id, position - skipped)).fetchall()
+            return (file_id, row[0][0]) if row else None
+        skipped += n_samples
+    return None
+
+
+def read_window(db_path, elements, start, stop, value_range=None, scale=1.0):
+    """Values of elements for rows [start, stop) in upload and sample order, in long format.
+
+    Returns position, file_name, sample_id, element and value (divided by
+    scale, NaN where a row has no value for the element). Rows are paged
+    from the key of row start, so only the window is read. With value_range
+    (lo, hi) the window is filtered like the old wide-frame mask
+    (df[e] >= lo) & (df[e] <= hi) over every element: a row missing one of
+    the elements compares False there and is dropped too, and the kept rows
+    keep their positions.
+    """
+    columns = ['position', 'file_name', 'sample_id', 'element', 'value']
+    conn = get_connection(db_path)
+    key = _row_key(conn, start) if elements and stop > start else None
+    if key is None:
+        return pd.DataFrame(columns=columns)
+    marks = ", ".join("?" for _ in elements)
+    params = [key[0], key[1], stop - start, start, scale, *elements]
+    where = ""
+    if value_range is not None:
+        # COUNT(value) = COUNT(*) چون SUM مقدارهای NULL را نادیده می‌گیرد
+        where = """
+            WHERE g.position IN (
+                SELECT position FROM grid GROUP BY position
+                HAVING COUNT(value) = COUNT(*) AND SUM(value BETWEEN ? AND ?) = COUNT(*)
+            )
+        """
+        params += list(value_range)
+    return read_frame(db_path, f"""
+        WITH page AS (
+            SELECT file_id, sample_id FROM element_values
+            WHERE (file_id, sample_id) >= (?, ?)
+            GROUP BY file_id, sample_id ORDER BY file_id, sample_id LIMIT ?
+        ),
+        rows AS (
+            SELECT ? + ROW_NUMBER() OVER (ORDER BY file_id, sample_id) - 1 AS position, file_id, sample_id
+            FROM page
+        ),
+        grid AS (
+            SELECT r.position, r.file_id, r.sample_id, c.code AS element, c.id AS element_id, v.value / ? AS value
+            FROM rows r
+            JOIN element_codes c ON c.code IN ({marks})
+            LEFT JOIN element_values v
+                ON v.element_id = c.id AND v.file_id = r.file_id AND v.sample_id = r.sample_id
+        )
+        SELECT g.position, f.file_name, g.sample_id, g.element, g.value
+        FROM grid g JOIN element_files f ON f.id = g.file_id
+        {where}
+        ORDER BY g.position, g.element_id
+    """, params=params)
@@ -9,12 +9,13 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, QDate, QRegularExpression
 from PyQt6.QtGui import QRegularExpressionValidator
 import pandas as pd
-import sqlite3
 import os
 import logging
 import re
 from collections import defaultdict
-from utils.load_file import FileLoaderThread
+from utils.load_file import FileLoaderThread, ParallelFileLoaderThread
+from utils.db_pool import bulk_insert, get_connection, transaction
+from utils.element_store import delete_file, store_file
 from screens.pivot.pivot_creator import PivotCreator
 import jdatetime
 logger = logging.getLogger(__name__)
@@ -410,7 +411,7 @@ class UploadDialog(QDialog):
     def load_filtered_files(self):
         try:
             db_path = self.parent().main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
+            conn = get_connection(db_path)
             cur = conn.cursor()
 
             query = """
@@ -445,7 +446,6 @@ class UploadDialog(QDialog):
 
             cur.execute(query, params)
             all_files = cur.fetchall()
-            conn.close()
 
             # فیلتر تاریخ جلالی
             jalali_from = self.jalali_from_edit.text().strip()
@@ -507,7 +507,7 @@ class UploadDialog(QDialog):
     def open_edit_dialog(self, file_id):
         try:
             db_path = self.parent().main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
+            conn = get_connection(db_path)
             cur = conn.cursor()
             cur.execute("""
                 SELECT uf.description, uf.file_type, d.id, d.name
@@ -516,7 +516,6 @@ class UploadDialog(QDialog):
                 WHERE uf.id = ?
             """, (file_id,))
             result = cur.fetchone()
-            conn.close()
 
             if not result:
                 QMessageBox.warning(self, "Error", "File not found.")
@@ -555,15 +554,13 @@ class UploadDialog(QDialog):
     def save_edit(self, file_id, new_desc, new_type, new_device_id, dialog):
         try:
             db_path = self.parent().main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE uploaded_files
-                SET description = ?, file_type = ?, device_id = ?
-                WHERE id = ?
-            """, (new_desc, new_type, new_device_id, file_id))
-            conn.commit()
-            conn.close()
+            with transaction(db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE uploaded_files
+                    SET description = ?, file_type = ?, device_id = ?
+                    WHERE id = ?
+                """, (new_desc, new_type, new_device_id, file_id))
             QMessageBox.information(self, "Success", "File metadata updated.")
             self.load_filtered_files()
             dialog.accept()
@@ -588,24 +585,15 @@ class UploadDialog(QDialog):
         try:
             db_path = self.parent().main_window.resource_path("crm_data.db")
             elements_db_path = self.parent().main_window.resource_path("excels_elements.db")
-            conn = sqlite3.connect(db_path)
-            conn_elements = sqlite3.connect(elements_db_path)
-            cur = conn.cursor()
-            cur_elements = conn_elements.cursor()
-
-            # حذف از crm_data
-            cur.execute("DELETE FROM crm_data WHERE file_name = ?", (file_name,))
+            with transaction(db_path) as conn, transaction(elements_db_path):
+                # حذف از crm_data
+                conn.execute("DELETE FROM crm_data WHERE file_name = ?", (file_name,))
 
-            # حذف از elements_data
-            cur_elements.execute("DELETE FROM elements_data WHERE file_name = ?", (file_name,))
+                # حذف مقادیر عناصر و به‌روزرسانی آمار عناصر همان فایل
+                delete_file(elements_db_path, file_name)
 
-            # حذف از uploaded_files
-            cur.execute("DELETE FROM uploaded_files WHERE id = ?", (file_id,))
-
-            conn.commit()
-            conn_elements.commit()
-            conn.close()
-            conn_elements.close()
+                # حذف از uploaded_files
+                conn.execute("DELETE FROM uploaded_files WHERE id = ?", (file_id,))
 
             QMessageBox.information(self, "Success", "File and related data deleted.")
             self.load_filtered_files()
@@ -710,11 +698,10 @@ class FileTab(QWidget):
 
         try:
             db_path = self.main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
+            conn = get_connection(db_path)
             cur = conn.cursor()
             cur.execute("SELECT id, name FROM devices ORDER BY name")
             devices = cur.fetchall()
-            conn.close()
 
             if not devices:
                 QMessageBox.warning(self, "No Devices", "No devices are registered. Contact admin.")
@@ -888,11 +875,9 @@ class FileTab(QWidget):
             QMessageBox.critical(self, "Error", f"Failed to process file:\n{str(e)}")
 
     def save_all_elements_to_db(self, df, file_path):
-        """ذخیره تمام solution_label و عناصر در excels_elements.db با ساختار pivot شده (wide format)"""
+        """ذخیره تمام solution_label و عناصر در excels_elements.db به صورت long format (یک ردیف برای هر نمونه/عنصر)"""
         try:
             elements_db_path = self.main_window.resource_path("excels_elements.db")
-            conn = sqlite3.connect(elements_db_path)
-            cursor = conn.cursor()
 
             # چک ستون‌های ضروری
             solution_col = 'Solution Label'
@@ -909,112 +894,47 @@ class FileTab(QWidget):
             df_elements['value'] = pd.to_numeric(df_elements['value'], errors='coerce')
             df_elements = df_elements.dropna(subset=['value', 'element', 'sample_id'])
 
-            # pivot به wide format با مدیریت تکراری‌ها (میانگین)
-            df_pivoted = df_elements.pivot_table(index='sample_id', columns='element', values='value', aggfunc='mean').reset_index()
-            df_pivoted['file_name'] = os.path.basename(file_path)
-
-            # چک تکراری بودن فایل
-            cursor.execute("SELECT COUNT(*) FROM elements_data WHERE file_name = ?", (df_pivoted['file_name'].iloc[0],))
-            if cursor.fetchone()[0] > 0:
-                # raise ValueError(f"File '{df_pivoted['file_name'].iloc[0]}' already exists in elements_data table.")
-                pass
-
-            # اضافه کردن ستون‌های جدید برای عناصر (اگر وجود نداشته باشند)
-            for element in df_pivoted.columns:
-                if element not in ['sample_id', 'file_name']:
-                    try:
-                        cursor.execute(f'ALTER TABLE elements_data ADD COLUMN "{element}" REAL')
-                    except sqlite3.OperationalError:
-                        pass  # ستون از قبل وجود دارد
-
-            # ذخیره ردیف‌ها
-            columns = df_pivoted.columns
-            quoted_columns = ', '.join([f'"{col}"' for col in columns])
-            placeholders = ', '.join(['?' for _ in columns])
-
-            for _, row in df_pivoted.iterrows():
-                values = tuple(row)
-                cursor.execute(f'INSERT INTO elements_data ({quoted_columns}) VALUES ({placeholders})', values)
+            # مدیریت تکراری‌ها (میانگین) مثل pivot قبلی، بدون ساختن جدول wide
+            df_long = df_elements.groupby(['sample_id', 'element'], as_index=False)['value'].mean()
 
-            conn.commit()
-
-            # WAL Checkpoint و VACUUM
-            cursor.execute("PRAGMA wal_checkpoint(FULL);")
-            conn.commit()
-            cursor.execute("VACUUM;")
-            conn.commit()
-
-            logger.info(f"Successfully imported {len(df_pivoted)} pivoted records into elements_data.")
+            # فایل، کدهای عنصر جدید، مقادیر و آمار هر عنصر در یک تراکنش
+            inserted = store_file(elements_db_path, os.path.basename(file_path), df_long)
+            logger.info(f"Successfully imported {inserted} element values into the element store.")
 
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Elements import failed: {e}")
             raise e
-        finally:
-            if conn:
-                conn.close()
 
     def safe_import_crm_data(self, df_crm_final, db_path):
-        """ذخیره امن CRM data با checkpoint و vacuum"""
-        conn = None
+        """ذخیره CRM data با یک executemany در یک تراکنش"""
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # چک تکراری بودن فایل
-            file_name = df_crm_final['file_name'].iloc[0]
-            cursor.execute("SELECT COUNT(*) FROM crm_data WHERE file_name = ?", (file_name,))
-            if cursor.fetchone()[0] > 0:
-                # raise ValueError(f"File '{file_name}' already exists in crm_data table.")
-                pass
-
-            # ذخیره داده
-            df_crm_final.to_sql('crm_data', conn, if_exists='append', index=False)
-            conn.commit()
-
-            # WAL Checkpoint
-            cursor.execute("PRAGMA wal_checkpoint(FULL);")
-            conn.commit()
-
-            # VACUUM برای بهینه‌سازی و به‌روزرسانی حجم
-            cursor.execute("VACUUM;")
-            conn.commit()
-
-            logger.info(f"CRM data imported: {len(df_crm_final)} rows. WAL checkpointed and DB vacuumed.")
-
+            inserted = bulk_insert(db_path, 'crm_data', df_crm_final)
+            logger.info(f"CRM data imported: {inserted} rows.")
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"CRM import failed: {e}")
             raise e
-        finally:
-            if conn:
-                conn.close()
 
     def save_to_db(self, upload_data, file_path):
         try:
             db_path = self.main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
+            with transaction(db_path) as conn:
+                cur = conn.cursor()
 
-            clean_name = os.path.basename(file_path).replace(" ", "_")
-            cur.execute("""
-                INSERT INTO uploaded_files 
-                (original_filename, clean_filename, file_path, device_id, file_type, description, contracts, uploaded_by, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                os.path.basename(file_path),
-                clean_name,
-                file_path,
-                upload_data["device_id"],
-                upload_data["file_type"],
-                upload_data["description"],
-                upload_data["contracts"],
-                self.main_window.user_id_from_username()
-            ))
-            conn.commit()
-            conn.close()
+                clean_name = os.path.basename(file_path).replace(" ", "_")
+                cur.execute("""
+                    INSERT INTO uploaded_files 
+                    (original_filename, clean_filename, file_path, device_id, file_type, description, contracts, uploaded_by, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+                """, (
+                    os.path.basename(file_path),
+                    clean_name,
+                    file_path,
+                    upload_data["device_id"],
+                    upload_data["file_type"],
+                    upload_data["description"],
+                    upload_data["contracts"],
+                    self.main_window.user_id_from_username()
+                ))
         except Exception as e:
             logger.error(f"Failed to save file metadata: {e}")
             QMessageBox.critical(self, "DB Error", f"Failed to save file:\n{e}")
@@ -1182,7 +1102,7 @@ class FileTab(QWidget):
 
     def load_filtered_files(self, dialog):
         try:
-            conn = sqlite3.connect(self.main_window.resource_path("crm_data.db"))
+            conn = get_connection(self.main_window.resource_path("crm_data.db"))
             cur = conn.cursor()
             query = """
                 SELECT uf.id, uf.original_filename, u.full_name, d.name, uf.file_type, 
@@ -1217,7 +1137,6 @@ class FileTab(QWidget):
 
             cur.execute(query, params)
             all_files = cur.fetchall()
-            conn.close()
 
             # فیلتر تاریخ جلالی
             jalali_from = self.jalali_from_edit.text().strip()
@@ -1279,11 +1198,10 @@ class FileTab(QWidget):
             file_id = int(self.search_table.item(row, 0).text())
             clean_name = self.search_table.item(row, 2).text()
             try:
-                conn = sqlite3.connect(self.main_window.resource_path("crm_data.db"))
+                conn = get_connection(self.main_window.resource_path("crm_data.db"))
                 cur = conn.cursor()
                 cur.execute("SELECT file_path FROM uploaded_files WHERE id = ?", (file_id,))
                 result = cur.fetchone()
-                conn.close()
                 if result and os.path.exists(result[0]):
                     file_paths.append(result[0])
                     clean_names.append(clean_name)
@@ -1299,168 +1217,164 @@ class FileTab(QWidget):
         dialog.accept()  # بستن دیالوگ انتخاب
         self.chain_load(file_paths, clean_names)
 
-    def chain_load(self, file_paths, clean_names, index=0):
-        if index >= len(file_paths):
-            # به‌روزرسانی نهایی UI پس از لود همه فایل‌ها
-            try:
-                self.main_window.notify_data_changed()
-
-                if hasattr(self.main_window, 'elements_tab') and self.main_window.elements_tab:
-                    self.main_window.elements_tab.process_blk_elements()
-
-                if hasattr(self.main_window, 'pivot_tab') and self.main_window.pivot_tab:
-                    PivotCreator(self.main_window.pivot_tab).create_pivot()  # پیوت نهایی
-
-                if hasattr(self.main_window, 'results') and hasattr(self.main_window.results, 'show_processed_data'):
-                    self.main_window.results.show_processed_data()
-
-                combined_names = ' + '.join(clean_names)
-                self.main_window.file_path_label.setText(f"Files: {combined_names}")
-                self.main_window.setWindowTitle(f"RASF Data Processor - {combined_names}")
-
-                QMessageBox.information(self, "Success", "All selected files loaded and concatenated successfully.")
-
-            except Exception as e:
-                logger.error(f"Final UI update failed after loading multiple files: {e}")
-                QMessageBox.warning(self, "Error", f"Failed to finalize UI update: {e}")
-            return
-
-        file_path = file_paths[index]
-        is_first = (index == 0)
-
-        progress_dialog = QProgressDialog(f"Loading file {index + 1}/{len(file_paths)}: {os.path.basename(file_path)}...", "Cancel", 0, 100, self)
+    def chain_load(self, file_paths, clean_names):
+        """Parse all selected files in parallel, then append them in the selected order."""
+        progress_dialog = QProgressDialog(f"Loading {len(file_paths)} files...", "Cancel", 0, 100, self)
         progress_dialog.setWindowTitle("Processing")
         progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
         progress_dialog.setMinimumDuration(0)
         progress_dialog.show()
 
-        worker = FileLoaderThread(file_path, self)
+        worker = ParallelFileLoaderThread(file_paths, self)
+        file_progress = [0] * len(file_paths)
 
-        def on_progress(value, message):
-            progress_dialog.setValue(value)
-            progress_dialog.setLabelText(f"Loading file {index + 1}/{len(file_paths)}: {os.path.basename(file_path)}..."+"\n"+message )
+        def on_progress(index, value, message):
+            file_progress[index] = value
+            progress_dialog.setValue(sum(file_progress) // len(file_paths))
+            progress_dialog.setLabelText(f"Loading file {index + 1}/{len(file_paths)}: {os.path.basename(file_paths[index])}..."+"\n"+message)
             if progress_dialog.wasCanceled():
                 worker.cancel()
 
-        def on_finished(df, loaded_file_path):
-            try:
-                if df is None or not isinstance(df, pd.DataFrame):
-                    raise ValueError("Loaded DataFrame is None or invalid")
-                if df.empty:
-                    raise ValueError("Loaded DataFrame is empty")
+        def on_finished(results):
+            progress_dialog.close()
+            # CRM detection / append-to-previous must run in the user's order
+            for index, (df, loaded_file_path, error_message) in enumerate(results):
+                if error_message:
+                    logger.error(f"Failed to load file {os.path.basename(loaded_file_path)}: {error_message}")
+                    QMessageBox.critical(self, "Error", f"Failed to load file {os.path.basename(loaded_file_path)}:\n{error_message}")
+                    return
+                if not self.append_loaded_file(df, loaded_file_path, is_first=(index == 0)):
+                    return
+            self.finish_chain_load(clean_names)
+
+        def on_error(error_message):
+            progress_dialog.close()
+            logger.error(f"Failed to load files: {error_message}")
+            QMessageBox.critical(self, "Error", f"Failed to load files:\n{error_message}")
+
+        worker.progress.connect(on_progress)
+        worker.finished.connect(on_finished)
+        worker.error.connect(on_error)
+        worker.start()
 
+    def append_loaded_file(self, df, loaded_file_path, is_first):
+        """Append one parsed file to the session; returns False if it could not be processed."""
+        try:
+            if df is None or not isinstance(df, pd.DataFrame):
+                raise ValueError("Loaded DataFrame is None or invalid")
+            if df.empty:
+                raise ValueError("Loaded DataFrame is empty")
 
-                _, clean_name = self.parse_filename(os.path.basename(loaded_file_path))
 
-                # --- مرحله ۱: محاسبه تعداد سطرهای پیوت این فایل تنها ---
-                original_data = self.main_window.data  # ذخیره وضعیت فعلی
-                original_init_data = self.main_window.init_data
+            _, clean_name = self.parse_filename(os.path.basename(loaded_file_path))
 
-                # فقط داده این فایل رو موقتاً ست کن
-                self.main_window.data = df.copy()
-                self.main_window.init_data = df.copy()
+            # --- مرحله ۱: پیوت فقط همین فایل و افزودن آن به انتهای پیوت قبلی ---
+            previous_data = None if is_first else self.main_window.data
+            if previous_data is None:
+                combined_data = df.copy()
+            else:
+                combined_data = pd.concat([previous_data, df], ignore_index=True)
 
-                # پیوت این فایل تنها رو بساز
+            pivot_row_count = 0
+            if hasattr(self.main_window, 'pivot_tab') and self.main_window.pivot_tab:
                 pivot_creator = PivotCreator(self.main_window.pivot_tab)
-                pivot_creator.create_pivot()  # هیچ چیزی return نمی‌کنه، فقط pivot_data رو پر می‌کنه
-
-                # حالا تعداد سطرهای پیوت رو از pivot_data بگیر
-                current_pivot_df = self.main_window.pivot_tab.pivot_data
-                pivot_row_count = len(current_pivot_df) if current_pivot_df is not None and not current_pivot_df.empty else 0
-
-                # fallback: اگر به هر دلیلی pivot_data ساخته نشد
-                if pivot_row_count == 0 and 'Solution Label' in df.columns:
-                    pivot_row_count = df[df['Type'].isin(['Samp', 'Sample'])]['Solution Label'].nunique()
-                print(clean_name,pivot_row_count)
-                # --- مرحله ۲: محاسبه start_pivot_row ---
-                if not hasattr(self.main_window, 'file_ranges'):
-                    self.main_window.file_ranges = []
-
-                current_start = sum(fr.get('pivot_row_count', 0) for fr in self.main_window.file_ranges)
-
-                # === CRM Detection - Your Lab's Exact Regex ===
-                crm_ids = '258|252|906|506|233|255|263|260'
-                crm_pattern = re.compile(rf'(?i)(?:^|\s)(?:CRM|OREAS)?\s*({crm_ids})(?:[a-zA-Z]{{0,2}})?\b')
-                labels = df['Solution Label'].dropna().astype(str)
-                has_crm = labels.str.contains(crm_pattern, regex=True).any()
-
-                if len(self.main_window.file_ranges) >=1 and not has_crm :
-                    prev_name=self.main_window.file_ranges[-1]["clean_name"]
-                    reply = QMessageBox.question(
-                        self,
-                        "No CRM Detected",
-                        f"<b>No CRM found</b> in:\n\n<b>{clean_name}</b>\n\n"
-                        f"Append to previous file?\n→ <b>{prev_name}</b>",
-                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                        QMessageBox.StandardButton.Yes
-                    )
-                    append_to_previous = (reply == QMessageBox.StandardButton.Yes)
-                    if append_to_previous :
-                        self.main_window.file_ranges[-1]["file_path"]+=" + "+ loaded_file_path
-                        self.main_window.file_ranges[-1]["clean_name"]+=" + "+ clean_name
-                        self.main_window.file_ranges[-1]["end_pivot_row"]+=pivot_row_count 
-                        self.main_window.file_ranges[-1]["pivot_row_count"]+=pivot_row_count
-                else:
-                    # --- مرحله ۳: ذخیره در file_ranges ---
-                    self.main_window.file_ranges.append({
-                        "file_path": loaded_file_path,
-                        "clean_name": clean_name,
-                        "start_pivot_row": current_start,
-                        "end_pivot_row": current_start + pivot_row_count - 1 if pivot_row_count > 0 else current_start,
-                        "pivot_row_count": pivot_row_count,
-                    })
-
-                logger.debug(f"[Pivot Range] {clean_name}: {pivot_row_count} rows → "
-                            f"rows {current_start}–{current_start + pivot_row_count - 1}")
-
-
-                print(self.main_window.file_ranges)
-                # --- مرحله ۴: برگرداندن داده اصلی + concat ---
-                self.main_window.data = original_data
-                self.main_window.init_data = original_init_data
-
-                if is_first:
-                    self.main_window.reset_app_state()
-                    self.main_window.data = df.copy()
-                    self.main_window.init_data = df.copy()
-                    self.main_window.file_path = loaded_file_path
-                    self.main_window.file_ranges.append({
+                pivot_row_count = pivot_creator.append_pivot(previous_data, df, combined_data)
+
+            # fallback: اگر به هر دلیلی پیوت ساخته نشد
+            if pivot_row_count == 0 and 'Solution Label' in df.columns:
+                pivot_row_count = df[df['Type'].isin(['Samp', 'Sample'])]['Solution Label'].nunique()
+            logger.debug(f"{clean_name}: {pivot_row_count} pivot rows")
+            # --- مرحله ۲: محاسبه start_pivot_row ---
+            if not hasattr(self.main_window, 'file_ranges'):
+                self.main_window.file_ranges = []
+
+            current_start = sum(fr.get('pivot_row_count', 0) for fr in self.main_window.file_ranges)
+
+            # === CRM Detection - Your Lab's Exact Regex ===
+            crm_ids = '258|252|906|506|233|255|263|260'
+            crm_pattern = re.compile(rf'(?i)(?:^|\s)(?:CRM|OREAS)?\s*({crm_ids})(?:[a-zA-Z]{{0,2}})?\b')
+            labels = df['Solution Label'].dropna().astype(str)
+            has_crm = labels.str.contains(crm_pattern, regex=True).any()
+
+            if len(self.main_window.file_ranges) >=1 and not has_crm :
+                prev_name=self.main_window.file_ranges[-1]["clean_name"]
+                reply = QMessageBox.question(
+                    self,
+                    "No CRM Detected",
+                    f"<b>No CRM found</b> in:\n\n<b>{clean_name}</b>\n\n"
+                    f"Append to previous file?\n→ <b>{prev_name}</b>",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                    QMessageBox.StandardButton.Yes
+                )
+                append_to_previous = (reply == QMessageBox.StandardButton.Yes)
+                if append_to_previous :
+                    self.main_window.file_ranges[-1]["file_path"]+=" + "+ loaded_file_path
+                    self.main_window.file_ranges[-1]["clean_name"]+=" + "+ clean_name
+                    self.main_window.file_ranges[-1]["end_pivot_row"]+=pivot_row_count 
+                    self.main_window.file_ranges[-1]["pivot_row_count"]+=pivot_row_count
+            else:
+                # --- مرحله ۳: ذخیره در file_ranges ---
+                self.main_window.file_ranges.append({
                     "file_path": loaded_file_path,
                     "clean_name": clean_name,
                     "start_pivot_row": current_start,
                     "end_pivot_row": current_start + pivot_row_count - 1 if pivot_row_count > 0 else current_start,
                     "pivot_row_count": pivot_row_count,
                 })
-                else:
-                    if self.main_window.data is None:
-                        self.main_window.data = df.copy()
-                        self.main_window.init_data = df.copy()
-                    else:
-                        self.main_window.data = pd.concat([self.main_window.data, df], ignore_index=True)
-                        self.main_window.init_data = self.main_window.data.copy()
 
-                progress_dialog.close()
-                self.chain_load(file_paths, clean_names, index + 1)
+            logger.debug(f"[Pivot Range] {clean_name}: {pivot_row_count} rows → "
+                        f"rows {current_start}–{current_start + pivot_row_count - 1}")
 
-            except Exception as e:
-                progress_dialog.close()
-                logger.error(f"Error processing file {os.path.basename(loaded_file_path)}: {e}")
-                QMessageBox.critical(self, "خطا", f"فایل پردازش نشد:\n{e}")
 
-        def on_error(error_message):
-            progress_dialog.close()
-            logger.error(f"Failed to load file {os.path.basename(file_path)}: {error_message}")
-            QMessageBox.critical(self, "Error", f"Failed to load file {os.path.basename(file_path)}:\n{error_message}")
+            # --- مرحله ۴: جایگزینی داده با داده الحاق‌شده ---
+            if is_first:
+                self.main_window.reset_app_state()
+                self.main_window.file_path = loaded_file_path
+                self.main_window.file_ranges.append({
+                "file_path": loaded_file_path,
+                "clean_name": clean_name,
+                "start_pivot_row": current_start,
+                "end_pivot_row": current_start + pivot_row_count - 1 if pivot_row_count > 0 else current_start,
+                "pivot_row_count": pivot_row_count,
+            })
+            self.main_window.data = combined_data
+            self.main_window.init_data = combined_data.copy()
 
-        worker.progress.connect(on_progress)
-        worker.finished.connect(on_finished)
-        worker.error.connect(on_error)
-        worker.start()
+            return True
+
+        except Exception as e:
+            logger.error(f"Error processing file {os.path.basename(loaded_file_path)}: {e}")
+            QMessageBox.critical(self, "خطا", f"فایل پردازش نشد:\n{e}")
+            return False
+
+    def finish_chain_load(self, clean_names):
+        """به‌روزرسانی نهایی UI پس از لود همه فایل‌ها"""
+        try:
+            self.main_window.notify_data_changed()
+
+            if hasattr(self.main_window, 'elements_tab') and self.main_window.elements_tab:
+                self.main_window.elements_tab.process_blk_elements()
+
+            if hasattr(self.main_window, 'pivot_tab') and self.main_window.pivot_tab:
+                PivotCreator(self.main_window.pivot_tab).create_pivot()  # پیوت نهایی
+
+            if hasattr(self.main_window, 'results') and hasattr(self.main_window.results, 'show_processed_data'):
+                self.main_window.results.show_processed_data()
+
+            combined_names = ' + '.join(clean_names)
+            self.main_window.file_path_label.setText(f"Files: {combined_names}")
+            self.main_window.setWindowTitle(f"RASF Data Processor - {combined_names}")
+
+            QMessageBox.information(self, "Success", "All selected files loaded and concatenated successfully.")
+
+        except Exception as e:
+            logger.error(f"Final UI update failed after loading multiple files: {e}")
+            QMessageBox.warning(self, "Error", f"Failed to finalize UI update: {e}")
 
     def load_uploaded_files_list(self):
         try:
             db_path = self.main_window.resource_path("crm_data.db")
-            conn = sqlite3.connect(db_path)
+            conn = get_connection(db_path)
             query = """
                 SELECT uf.id, uf.original_filename, u.full_name, d.name, uf.created_at, uf.is_archived
                 FROM uploaded_files uf
@@ -1470,7 +1384,6 @@ class FileTab(QWidget):
                 ORDER BY uf.created_at DESC
             """
             df = pd.read_sql_query(query, conn)
-            conn.close()
 
             self.files_table.setRowCount(len(df))
             header = self.files_table.horizontalHeader()
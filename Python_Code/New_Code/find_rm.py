@@ -1,6 +1,7 @@
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 import re
 from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import logging
 
@@ -25,6 +26,106 @@ def extract_rm_info(label, keyword="RM"):
         rm_number = int(numbers[-1])
     return rm_number, rm_type
 
+class RMSegmentIndex:
+    """Where the RMs of one CheckRMThread run sit in the sorted pivot frame.
+
+    Built once per dataset and shared by the RM views instead of re-masking
+    the whole frame on every navigation step. Pivot rows are positions
+    (pivot_index == row), so the rows between two RMs and the rows of a file
+    are contiguous slices found with a binary search:
+      rm_rows, rm_min, rm_max, rm_segment -- one entry per RM, in row order
+      file_starts, file_stops -- pivot rows of each file, half open
+    """
+
+    def __init__(self, pivot_df, positions_df, file_ranges=None):
+        self.n_rows = len(pivot_df)
+        self.original_index = pivot_df['original_index'].to_numpy()
+
+        order = np.argsort(positions_df['pivot_index'].to_numpy(), kind='stable')
+        self.rm_rows = positions_df['pivot_index'].to_numpy(dtype=np.int64)[order]
+        self.rm_min = positions_df['min'].to_numpy()[order]
+        self.rm_max = positions_df['max'].to_numpy()[order]
+        self.rm_segment = positions_df['segment_id'].to_numpy(dtype=np.int64)[order]
+
+        file_ranges = file_ranges or []
+        self.file_key = self._file_key(file_ranges)
+        self.file_starts = np.clip([int(fr['start_pivot_row']) for fr in file_ranges], 0, self.n_rows).astype(np.int64)
+        self.file_stops = np.clip([int(fr['end_pivot_row']) + 1 for fr in file_ranges], 0, self.n_rows).astype(np.int64)
+        self.file_stops = np.maximum(self.file_stops, self.file_starts)
+
+    @staticmethod
+    def _file_key(file_ranges):
+        return tuple((fr['start_pivot_row'], fr['end_pivot_row']) for fr in file_ranges or [])
+
+    def matches(self, pivot_df, positions_df, file_ranges=None):
+        """True if the index still describes these frames and files (same rows, RMs and file ranges)."""
+        return pivot_df is not None and positions_df is not None and \
+            len(pivot_df) == self.n_rows and len(positions_df) == len(self.rm_rows) and \
+            self._file_key(file_ranges) == self.file_key
+
+    # ----- files -----
+    def file_bounds(self, file_index=-1):
+        """(start, stop) pivot rows of a file; file_index -1 (or no files) is the whole run."""
+        if file_index is None or file_index < 0 or file_index >= len(self.file_starts):
+            return 0, self.n_rows
+        return int(self.file_starts[file_index]), int(self.file_stops[file_index])
+
+    def file_of(self, rows):
+        """File number of each pivot row (-1 outside every file)."""
+        rows = np.asarray(rows)
+        j = np.searchsorted(self.file_starts, rows, side='right') - 1
+        inside = j >= 0
+        inside[inside] = rows[inside] < self.file_stops[j[inside]]
+        return np.where(inside, j, -1)
+
+    # ----- RMs -----
+    def rm_position(self, pivots):
+        """Position of each pivot in the RM arrays (-1 if it is not an RM row)."""
+        pivots = np.asarray(pivots)
+        j = np.searchsorted(self.rm_rows, pivots)
+        found = j < len(self.rm_rows)
+        found[found] = self.rm_rows[j[found]] == pivots[found]
+        return np.where(found, j, -1)
+
+    def segment_of(self, pivots):
+        """segment_id of each RM pivot (-1 if it is not an RM row)."""
+        j = self.rm_position(pivots)
+        if not len(self.rm_rows):
+            return j
+        return np.where(j >= 0, self.rm_segment[np.maximum(j, 0)], -1)
+
+    def rm_bounds(self, prev_pivot, curr_pivot):
+        """(min of the opening RM, max of the closing RM) from positions_df, or None if either is not an RM."""
+        j = self.rm_position([prev_pivot, curr_pivot])
+        if (j < 0).any():
+            return None
+        return self.rm_min[j[0]], self.rm_max[j[1]]
+
+    # ----- rows between RMs -----
+    @staticmethod
+    def frame_view(frame):
+        """(start, stop) pivot rows covered by a view of the pivot frame (a contiguous block keeping its row labels)."""
+        if frame is None or frame.empty:
+            return 0, 0
+        start = int(frame.index[0])
+        return start, start + len(frame)
+
+    def _view(self, start, stop, view):
+        lo, hi = (0, self.n_rows) if view is None else view
+        start, stop = max(start, lo), min(stop, hi)
+        return slice(start - lo, max(start, stop) - lo)
+
+    def rows_between(self, prev_pivot, curr_pivot, view=None):
+        """Positions, within `view` (see frame_view; None = all rows), of the rows with prev_pivot < pivot_index < curr_pivot."""
+        return self._view(int(np.floor(prev_pivot)) + 1, int(np.ceil(curr_pivot)), view)
+
+    def rows_between_original(self, low, high, view=None):
+        """Positions, within `view`, of the rows with low < original_index < high."""
+        start = int(np.searchsorted(self.original_index, low, side='right'))
+        stop = int(np.searchsorted(self.original_index, high, side='left'))
+        return self._view(start, stop, view)
+
+
 class CheckRMThread(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal(dict)
@@ -84,6 +185,7 @@ class CheckRMThread(QThread):
             rm_df = self._add_rm_num_and_type(rm_df)
             positions_df = self._create_segment_positions(rm_df)
             segments = self._create_segments(positions_df)
+            segment_index = RMSegmentIndex(pivot_df, positions_df, getattr(self.app, 'file_ranges', None))
 
             results = {
                 'rm_df': rm_df,
@@ -91,7 +193,8 @@ class CheckRMThread(QThread):
                 'segments': segments,
                 'pivot_df': pivot_df,
                 'solution_labels': solution_labels,
-                'elements': element_cols
+                'elements': element_cols,
+                'segment_index': segment_index
             }
             self.finished.emit(results)
         except Exception as e:
@@ -106,37 +209,29 @@ class CheckRMThread(QThread):
 
     def _create_segment_positions(self, rm_df: pd.DataFrame) -> pd.DataFrame:
         rm_df = rm_df.sort_values('original_index').reset_index(drop=True)
-        positions_list = []
-        current_segment = 0
-        ref_rm_num = None
-        for idx, row in rm_df.iterrows():
-            rm_type = row['rm_type']
-            rm_num = row['rm_num']
-            if rm_type == 'Cone':
-                current_segment += 1
-                ref_rm_num = None
-            if ref_rm_num is None and rm_type in ['Base', 'Check']:
-                ref_rm_num = rm_num
-
-            min_pos = rm_df.iloc[idx-1]['original_index'] if idx > 0 else -1
-            max_pos = row['original_index']
-
-            positions_list.append({
-                'Solution Label': row['Solution Label'],
-                'row_id': row['row_id'],
-                'pivot_index': row['pivot_index'],
-                'min': min_pos,
-                'max': max_pos,
-                'rm_num': rm_num,
-                'rm_type': rm_type,
-                'segment_id': current_segment,
-                'ref_rm_num': ref_rm_num if ref_rm_num is not None else rm_num
-            })
-
-        positions_df = pd.DataFrame(positions_list)
-        if not positions_df.empty:
-            positions_df.loc[0, 'min'] = -1
-        return positions_df
+        if rm_df.empty:
+            return pd.DataFrame()
+        rm_type = rm_df['rm_type']
+        rm_num = rm_df['rm_num']
+        # هر Cone یک سگمنت جدید شروع می‌کند
+        segment_id = (rm_type == 'Cone').cumsum()
+        # مرجع سگمنت: اولین Base/Check آن (از همان ردیف به بعد)، وگرنه rm_num خود ردیف
+        ref_candidate = rm_num.where(rm_type.isin(['Base', 'Check']))
+        ref_seen = ref_candidate.notna().groupby(segment_id).cummax()
+        ref_first = ref_candidate.groupby(segment_id).transform('first')
+        ref_rm_num = ref_first.where(ref_seen, rm_num).astype(rm_num.dtype)
+
+        return pd.DataFrame({
+            'Solution Label': rm_df['Solution Label'],
+            'row_id': rm_df['row_id'],
+            'pivot_index': rm_df['pivot_index'],
+            'min': rm_df['original_index'].shift(1, fill_value=-1),
+            'max': rm_df['original_index'],
+            'rm_num': rm_num,
+            'rm_type': rm_type,
+            'segment_id': segment_id,
+            'ref_rm_num': ref_rm_num
+        })
 
     def _create_segments(self, positions_df: pd.DataFrame) -> List[Dict[str, Any]]:
         segments = []
@@ -1,15 +1,23 @@
 # utils/load_file.py
 import pandas as pd
+import numpy as np
 import csv
+import io
+import itertools
+import multiprocessing
 import os
+import queue
 import logging
 import re
 import sys
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from PyQt6.QtWidgets import (
     QFileDialog, QMessageBox, QProgressDialog
 )
 from PyQt6.QtCore import QThread, pyqtSignal, Qt
 from screens.pivot.pivot_creator import PivotCreator
+from utils.parsed_file_cache import get_parsed_file_cache
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -26,6 +34,156 @@ def split_element_name(element):
     return element
 
 
+ELEMENT_NAME_PATTERN = r'^([A-Za-z]+)(\d+\.?\d*)$'
+STREAM_CHUNK_ROWS = 20000
+NO_DATA_MARKER = "No valid data found in the file"
+
+
+def split_element_names(elements):
+    """Vectorized split_element_name over a whole Series: 'Ce140' -> 'Ce 140'."""
+    elements = pd.Series(elements, dtype=object)
+    stripped = elements.str.strip()
+    matched = stripped.str.match(ELEMENT_NAME_PATTERN).fillna(False).astype(bool)
+    return elements.mask(matched, stripped.str.replace(ELEMENT_NAME_PATTERN, r'\1 \2', regex=True))
+
+
+def _parse_float_column(values, na_strings=()):
+    """Convert raw cell values to floats; returns (values, empty_mask, invalid_mask).
+
+    Empty cells and na_strings become NaN without being flagged. A literal
+    'nan' is a NaN value like float('nan'), not an empty cell; anything else
+    float() would reject is flagged invalid.
+    """
+    raw = pd.Series(values, dtype=object)
+    text = raw.astype(str).str.strip()
+    # na_strings are matched on the unstripped cell, as read_excel does
+    empty = (raw.isna() | text.eq('') | raw.isin(na_strings)).to_numpy()
+    numbers = pd.to_numeric(text.where(~empty), errors='coerce').to_numpy(dtype=float)
+    literal_nan = text.str.lstrip('+-').str.lower().eq('nan').to_numpy()
+    return numbers, empty, np.isnan(numbers) & ~empty & ~literal_nan
+
+
+# Strings pd.read_excel reads as NaN; the original Excel parser saw these cells as empty
+EXCEL_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def _is_empty_cell(cell):
+    return cell is None or (isinstance(cell, float) and cell != cell) or (isinstance(cell, str) and cell.strip() == '')
+
+
+def _is_empty_row(row):
+    return all(_is_empty_cell(cell) for cell in row)
+
+
+def _without_last_row(rows):
+    """Yield rows except the last non-empty one (and any empty rows after it)."""
+    held = []
+    for row in rows:
+        if not _is_empty_row(row):
+            yield from held
+            held = []
+        held.append(row)
+
+
+class SampleIdColumnBuilder:
+    """Build the long-format frame of a Sample ID-based export column by column.
+
+    Rows are fed in chunks; each chunk is classified with vectorized string
+    operations and the current `Sample ID:` block is carried across chunks,
+    so no per-measurement dicts are ever created.
+    """
+
+    def __init__(self, unknown_sample="Unknown_Sample", inline_label=False,
+                 concentration_col=5, na_strings=()):
+        # CSV exports put the label in the cell after "Sample ID:", Excel exports
+        # have it inline; Corr Con is column 5 in both
+        self.unknown_sample = unknown_sample
+        self.inline_label = inline_label
+        self.concentration_col = concentration_col
+        self.na_strings = na_strings
+        self.current_sample = None
+        self.invalid_rows = 0
+        self._labels = []
+        self._elements = []
+        self._intensity = []
+        self._concentration = []
+
+    def add_rows(self, rows):
+        """Feed a chunk of raw rows (sequences of cells, CSV or Excel)."""
+        rows = [r for r in rows if len(r) > 0]
+        if not rows:
+            return
+        first = pd.Series([r[0] for r in rows], dtype=object)
+        first_text = first.where(first.notna(), '').astype(str)
+        second = pd.Series([r[1] if len(r) > 1 else None for r in rows], dtype=object)
+        col = self.concentration_col
+        conc_cells = pd.Series([r[col] if len(r) > col else None for r in rows], dtype=object)
+
+        is_sample = first_text.str.startswith("Sample ID:")
+        is_header = first_text.str.startswith("Method File:") | first_text.str.startswith("Calibration File:")
+
+        # Sample label: the next cell, or the text after "Sample ID:" when it is empty
+        inline = first_text.str.split("Sample ID:", n=1).str[1].fillna('').str.strip()
+        if self.inline_label:
+            labels = inline
+        else:
+            labels = second.where(second.notna(), '').astype(str).str.strip()
+            labels = labels.where(labels.ne(''), inline)
+        block = labels.where(is_sample).ffill()
+        if self.current_sample is not None:
+            block = block.fillna(self.current_sample)
+        if is_sample.any():
+            self.current_sample = labels[is_sample].iloc[-1]
+        if self.unknown_sample is not None:
+            block = block.fillna(self.unknown_sample)
+        else:
+            # rows outside a (non-empty) Sample ID block are dropped
+            block = block.mask(block.eq(''))
+
+        intensity, empty_int, bad_int = _parse_float_column(second, self.na_strings)
+        concentration, empty_conc, bad_conc = _parse_float_column(conc_cells, self.na_strings)
+        # مثل parser اصلی: ردیفی نگه داشته می‌شود که Int یا Corr Con خالی نباشد (حتی اگر 'nan' باشد)
+        has_value = ~(empty_int & empty_conc)
+        candidate = (~is_sample & ~is_header & block.notna() & first.notna()).to_numpy()
+        invalid = candidate & (bad_int | bad_conc)
+        if invalid.any():
+            self.invalid_rows += int(invalid.sum())
+        keep = candidate & ~invalid & has_value
+        if not keep.any():
+            return
+
+        self._labels.append(block.to_numpy(dtype=object)[keep])
+        self._elements.append(first_text.str.strip().to_numpy(dtype=object)[keep])
+        self._intensity.append(intensity[keep])
+        self._concentration.append(concentration[keep])
+
+    def __len__(self):
+        return sum(len(a) for a in self._labels)
+
+    def to_frame(self, sample_type='Sample'):
+        """Return the accumulated rows as the standard long-format DataFrame."""
+        if self.invalid_rows:
+            logger.warning(f"Skipped {self.invalid_rows} rows with invalid numeric data")
+        columns = ["Solution Label", "Element", "Int", "Corr Con", "Type"]
+        if not self._labels:
+            return pd.DataFrame(columns=columns)
+        labels = np.concatenate(self._labels)
+        df = pd.DataFrame({
+            "Solution Label": labels,
+            "Element": split_element_names(pd.Series(np.concatenate(self._elements), dtype=object)).to_numpy(),
+            "Int": np.concatenate(self._intensity),
+            "Corr Con": np.concatenate(self._concentration),
+        })
+        if sample_type is None:
+            df["Type"] = np.where(pd.Series(labels).astype(str).str.upper().str.contains("BLANK", regex=False), "Blk", "Sample")
+        else:
+            df["Type"] = sample_type
+        return df
+
+
 def resource_path(self, relative_path):
     try:
         base_path = sys._MEIPASS
@@ -34,32 +192,78 @@ def resource_path(self, relative_path):
     return os.path.join(base_path, relative_path)
 
 
-class FileLoaderThread(QThread):
-    """Worker thread to load and parse Excel/CSV files with progress updates."""
-    progress = pyqtSignal(int, str)  # Signal for progress (value, message)
-    finished = pyqtSignal(object, str)  # Signal for completion with DataFrame and file path
-    error = pyqtSignal(str)  # Signal for errors
+class _Emitter:
+    """Stand-in for a pyqtSignal so FileParser can run without Qt (e.g. in a worker process)."""
 
-    def __init__(self, file_path, parent=None, is_pivoted=False):
-        super().__init__(parent)
+    def __init__(self, callback=None):
+        self.callback = callback
+
+    def connect(self, callback):
+        self.callback = callback
+
+    def emit(self, *args):
+        if self.callback is not None:
+            self.callback(*args)
+
+
+class FileParser:
+    """Qt-free parsing core shared by FileLoaderThread and ParallelFileLoaderThread.
+
+    Reports through `progress`, `finished` and `error`, which are either
+    plain emitters or the owning thread's signals.
+    """
+
+    def __init__(self, file_path, is_pivoted=False, is_canceled=None):
         self.file_path = file_path
-        self.is_canceled = False
-        self.is_pivoted = is_pivoted  # جدید: تشخیص فایل پیوت شده
+        self.is_pivoted = is_pivoted
+        self.progress = _Emitter()
+        self.finished = _Emitter()
+        self.error = _Emitter()
+        self._cancel_check = is_canceled
+        self._canceled = False
+
+    @property
+    def is_canceled(self):
+        return self._canceled or (self._cancel_check is not None and bool(self._cancel_check()))
 
     def cancel(self):
-        """Mark the thread as canceled."""
-        self.is_canceled = True
+        self._canceled = True
 
     def run(self):
         try:
             if self.is_pivoted:
                 self.load_pivoted_directly()
-            else:
+            elif not self.load_from_cache():
                 self.load_and_parse_normal()
         except Exception as e:
             logger.error(f"Unexpected error in thread: {str(e)}")
             self.error.emit(f"Unexpected error: {str(e)}")
 
+    def load_from_cache(self):
+        """Emit the cached parse of this file if there is one; returns True on a hit."""
+        self._cache = get_parsed_file_cache()
+        self._cache_key = None
+        if self._cache is None:
+            return False
+        try:
+            self._cache_key = self._cache.cache_key(self.file_path)
+        except OSError as e:
+            logger.warning(f"Could not fingerprint {self.file_path}: {e}")
+            self._cache = None
+            return False
+        df = self._cache.load(self.file_path, key=self._cache_key)
+        if df is None:
+            return False
+        self.progress.emit(100, "Loaded from parsed-file cache")
+        self.finished.emit(df, self.file_path)
+        return True
+
+    def emit_parsed(self, df):
+        """Store a freshly parsed frame in the sidecar cache, then emit it."""
+        if getattr(self, '_cache', None) is not None:
+            self._cache.store(self.file_path, df, key=self._cache_key)
+        self.finished.emit(df, self.file_path)
+
     def load_pivoted_directly(self):
         """لود مستقیم فایل پیوت شده (wide format) بدون هیچ پردازشی"""
         try:
@@ -101,6 +305,88 @@ class FileLoaderThread(QThread):
             logger.error(f"Failed to load pivoted file: {str(e)}")
             self.error.emit(f"Failed to load pivoted file: {str(e)}")
 
+    def stream_sample_id_csv(self, progress_start=0, progress_span=100):
+        """Stream-parse a Sample ID-based CSV/.rep export into a long-format frame.
+
+        The file is read in chunks of STREAM_CHUNK_ROWS rows and fed to a
+        SampleIdColumnBuilder; progress is reported by bytes consumed.
+        The last row of the file is dropped, as in the original parser.
+        Returns None when canceled.
+        """
+        total_bytes = max(1, os.path.getsize(self.file_path))
+        builder = SampleIdColumnBuilder()
+        pending = None
+        with open(self.file_path, 'rb') as raw:
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            reader = csv.reader(text, delimiter=',', quotechar='"')
+            while True:
+                if self.is_canceled:
+                    return None
+                chunk = list(itertools.islice(reader, STREAM_CHUNK_ROWS))
+                if not chunk:
+                    break
+                if pending is not None:
+                    chunk.insert(0, pending)
+                # Hold back the last row until we know whether it is the final one
+                pending = chunk.pop()
+                builder.add_rows(chunk)
+                consumed = min(raw.tell(), total_bytes)
+                self.progress.emit(
+                    progress_start + int(progress_span * consumed / total_bytes),
+                    f"Parsing {consumed // 1024:,} / {total_bytes // 1024:,} KB"
+                )
+        logger.debug("Skipping last row of CSV")
+        return builder.to_frame()
+
+    def open_excel_rows(self):
+        """Return (row iterator, row count) for the first sheet of an Excel file.
+
+        .xlsx goes through openpyxl in read-only/values-only mode, so rows are
+        streamed straight from the XML without building a DataFrame; legacy
+        .xls (xlrd) is read once and iterated as tuples.
+        """
+        if self.file_path.lower().endswith(('.xlsx', '.xlsm')):
+            self._workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+            sheet = self._workbook.worksheets[0]
+            return sheet.iter_rows(values_only=True), sheet.max_row or 0
+        raw_data = pd.read_excel(self.file_path, header=None, engine='xlrd')
+        return raw_data.itertuples(index=False, name=None), raw_data.shape[0]
+
+    def close_workbook(self):
+        workbook = getattr(self, '_workbook', None)
+        if workbook is not None:
+            workbook.close()
+            self._workbook = None
+
+    def stream_sample_id_excel(self, rows, total_rows, progress_start=0, progress_span=100):
+        """Stream-parse a Sample ID-based Excel export through the same SampleIdColumnBuilder.
+
+        Rows before the first Sample ID are ignored, blanks get Type 'Blk' and
+        the last data row is dropped, as in the original parser.
+        Returns None when canceled.
+        """
+        builder = SampleIdColumnBuilder(unknown_sample=None, inline_label=True, na_strings=EXCEL_NA_STRINGS)
+        rows = _without_last_row(rows)
+        done = 0
+        while True:
+            if self.is_canceled:
+                return None
+            chunk = list(itertools.islice(rows, STREAM_CHUNK_ROWS))
+            if not chunk:
+                break
+            done += len(chunk)
+            builder.add_rows([
+                r for r in chunk
+                if not any(isinstance(cell, str) and NO_DATA_MARKER in cell for cell in r)
+            ])
+            if total_rows:
+                self.progress.emit(
+                    progress_start + int(progress_span * min(done, total_rows) / total_rows),
+                    f"Parsing row {done}/{total_rows}"
+                )
+        logger.debug("Skipping last row of Excel")
+        return builder.to_frame(sample_type=None)
+
     def load_and_parse_normal(self):
         """پردازش فایل‌های خام (long format) — کد قبلی شما"""
         try:
@@ -109,6 +395,8 @@ class FileLoaderThread(QThread):
 
             is_new_format = False
             preview_steps = 10
+            excel_rows = None
+            preview_rows = []
 
             # تشخیص فرمت
             if self.file_path.lower().endswith('.csv'):
@@ -125,21 +413,24 @@ class FileLoaderThread(QThread):
                     is_new_format = True
             else:
                 try:
-                    engine = 'openpyxl' if self.file_path.lower().endswith('.xlsx') else 'xlrd'
-                    preview = pd.read_excel(self.file_path, header=None, nrows=15, engine=engine)
-                    if preview.empty:
+                    # The preview rows are kept and replayed, so the workbook is opened only once
+                    excel_rows, total_rows = self.open_excel_rows()
+                    preview_rows = list(itertools.islice(excel_rows, 15))
+                    if not any(not _is_empty_row(r) for r in preview_rows):
                         self.error.emit("File is empty")
                         return
-                    first_col = preview.iloc[:, 0].astype(str)
-                    if any("Sample ID:" in str(x) for x in first_col) or any("Net Intensity" in str(x) for x in first_col):
+                    excel_rows = itertools.chain(preview_rows, excel_rows)
+                    first_col = [str(r[0]) if len(r) > 0 else '' for r in preview_rows]
+                    if any("Sample ID:" in x for x in first_col) or any("Net Intensity" in x for x in first_col):
                         is_new_format = True
-                    elif preview.shape[1] >= 4 and all(col in preview.columns for col in ["Solution Label", "Element", "Int", "Corr Con"]):
+                    elif any(all(col in [str(c).strip() for c in r] for col in ["Solution Label", "Element", "Int", "Corr Con"]) for r in preview_rows):
                         is_new_format = False
                     else:
                         is_new_format = True
                 except Exception as e:
                     logger.warning(f"Preview failed: {e}, assuming new format")
                     is_new_format = True
+                    excel_rows = None
 
             logger.debug(f"Detected format: {'NEW (Sample ID-based)' if is_new_format else 'OLD (tabular)'}")
             self.progress.emit(preview_steps, "Format detected, parsing data...")
@@ -148,181 +439,189 @@ class FileLoaderThread(QThread):
                 self.error.emit("File loading canceled by user")
                 return
 
-            data_rows = []
-            current_sample = None
             parse_steps = 70
 
             if is_new_format:
                 logger.debug("Detected new file format (Sample ID-based)")
                 if self.file_path.lower().endswith('.csv') or self.file_path.lower().endswith('.rep'):
                     try:
-                        with open(self.file_path, 'r', encoding='utf-8') as f:
-                            reader = list(csv.reader(f, delimiter=',', quotechar='"'))
-                            total_rows = len(reader)
-                            rows_per_step = max(1, total_rows // parse_steps) if total_rows > 0 else 1
-                            for idx, row in enumerate(reader):
-                                if self.is_canceled:
-                                    self.error.emit("File loading canceled by user")
-                                    return
-                                if idx == total_rows - 1:
-                                    logger.debug("Skipping last row of CSV")
-                                    continue
-                                if not row or all(cell.strip() == "" for cell in row):
-                                    continue
-                                if len(row) > 0 and row[0].startswith("Sample ID:"):
-                                    current_sample = row[1].strip()
-                                    logger.debug(f"Found Sample ID: {current_sample}")
-                                    continue
-                                if len(row) > 0 and (row[0].startswith("Method File:") or row[0].startswith("Calibration File:")):
-                                    continue
-                                if current_sample is None:
-                                    current_sample = "Unknown_Sample"
-                                element = split_element_name(row[0].strip())
-                                try:
-                                    intensity = float(row[1]) if len(row) > 1 and row[1].strip() else None
-                                    concentration = float(row[5]) if len(row) > 5 and row[5].strip() else None
-                                    if intensity is not None or concentration is not None:
-                                        data_rows.append({
-                                            "Solution Label": current_sample,
-                                            "Element": element,
-                                            "Int": intensity,
-                                            "Corr Con": concentration,
-                                            "Type": 'Sample'
-                                        })
-                                except Exception as e:
-                                    logger.warning(f"Invalid data for element {element} in sample {current_sample}: {str(e)}")
-                                    continue
-                                if idx % rows_per_step == 0:
-                                    progress = preview_steps + (idx // rows_per_step)
-                                    self.progress.emit(min(progress, preview_steps + parse_steps), f"Parsing row {idx}/{total_rows}")
+                        df = self.stream_sample_id_csv(preview_steps, parse_steps)
                     except Exception as e:
                         logger.error(f"Failed to parse CSV: {str(e)}")
                         self.error.emit(f"Failed to parse CSV: {str(e)}")
                         return
                 else:
                     try:
-                        engine = 'openpyxl' if self.file_path.lower().endswith('.xlsx') else 'xlrd'
-                        raw_data = pd.read_excel(self.file_path, header=None, engine=engine)
-                        total_rows = raw_data.shape[0]
-                        rows_per_step = max(1, total_rows // parse_steps) if total_rows > 0 else 1
-                        for index, row in raw_data.iterrows():
-                            if self.is_canceled:
-                                self.error.emit("File loading canceled by user")
-                                return
-                            if index == total_rows - 1:
-                                logger.debug("Skipping last row of Excel")
-                                continue
-                            row_list = row.tolist()
-                            if any("No valid data found in the file" in str(cell) for cell in row_list):
-                                continue
-                            if isinstance(row[0], str) and row[0].startswith("Sample ID:"):
-                                current_sample = row[0].split("Sample ID:")[1].strip()
-                                logger.debug(f"Found Sample ID: {current_sample}")
-                                continue
-                            if isinstance(row[0], str) and (row[0].startswith("Method File:") or row[0].startswith("Calibration File:")):
-                                continue
-                            if current_sample and pd.notna(row[0]):
-                                element = split_element_name(str(row[0]).strip())
-                                try:
-                                    intensity = float(row[1]) if pd.notna(row[1]) else None
-                                    concentration = float(row[5]) if pd.notna(row[5]) else None
-                                    if intensity is not None or concentration is not None:
-                                        type_value = "Blk" if "BLANK" in current_sample.upper() else "Sample"
-                                        data_rows.append({
-                                            "Solution Label": current_sample,
-                                            "Element": element,
-                                            "Int": intensity,
-                                            "Corr Con": concentration,
-                                            "Type": type_value
-                                        })
-                                except Exception as e:
-                                    logger.warning(f"Invalid data for element {element} in sample {current_sample}: {str(e)}")
-                                    continue
-                            if index % rows_per_step == 0:
-                                progress = preview_steps + (index // rows_per_step)
-                                self.progress.emit(min(progress, preview_steps + parse_steps), f"Parsing row {index}/{total_rows}")
+                        if excel_rows is None:
+                            excel_rows, total_rows = self.open_excel_rows()
+                        df = self.stream_sample_id_excel(excel_rows, total_rows, preview_steps, parse_steps)
                     except Exception as e:
                         logger.error(f"Failed to parse Excel: {str(e)}")
                         self.error.emit(f"Failed to parse Excel: {str(e)}")
                         return
-            else:
-                logger.debug("Detected previous file format (tabular)")
-                if self.file_path.lower().endswith('.csv') or self.file_path.lower().endswith('.rep')  :
-                    try:
-                        temp_df = pd.read_csv(self.file_path, header=None, nrows=1, on_bad_lines='skip')
-                        if temp_df.iloc[0].notna().sum() == 1:
-                            df = pd.read_csv(self.file_path, header=1, on_bad_lines='skip')
-                        else:
-                            df = pd.read_csv(self.file_path, header=0, on_bad_lines='skip')
-                    except Exception as e:
-                        logger.error(f"Failed to read CSV as tabular: {str(e)}")
-                        self.error.emit(f"Could not parse CSV as tabular format: {str(e)}")
-                        return
-                else:
-                    try:
-                        engine = 'openpyxl' if self.file_path.lower().endswith('.xlsx') else 'xlrd'
-                        temp_df = pd.read_excel(self.file_path, header=None, nrows=1, engine=engine)
-                        if temp_df.iloc[0].notna().sum() == 1:
-                            df = pd.read_excel(self.file_path, header=1, engine=engine)
-                        else:
-                            df = pd.read_excel(self.file_path, header=0, engine=engine)
-                    except Exception as e:
-                        logger.error(f"Failed to read Excel as tabular: {str(e)}")
-                        self.error.emit(f"Could not parse Excel as tabular format: {str(e)}")
-                        return
-
-                self.progress.emit(preview_steps + parse_steps // 2, "Reading tabular data...")
-                if self.is_canceled:
+                if df is None:
                     self.error.emit("File loading canceled by user")
                     return
+                if df.empty:
+                    logger.error(" No valid data rows were parsed")
+                    self.error.emit("No valid data found in the file")
+                    return
+                self.progress.emit(preview_steps + parse_steps, f"Parsed {len(df)} measurements")
+                self.emit_parsed(df)
+                return
 
-                df = df.iloc[:-1]
-                expected_columns = ["Solution Label", "Element", "Int", "Corr Con"]
-                column_mapping = {"Sample ID": "Solution Label"}
-                df.rename(columns=column_mapping, inplace=True)
-
-                if not all(col in df.columns for col in expected_columns):
-                    missing = set(expected_columns) - set(df.columns)
-                    logger.error(f"Missing columns in tabular format: {missing}")
-                    self.error.emit(f"Required columns missing: {', '.join(missing)}")
+            logger.debug("Detected previous file format (tabular)")
+            if self.file_path.lower().endswith('.csv') or self.file_path.lower().endswith('.rep')  :
+                try:
+                    temp_df = pd.read_csv(self.file_path, header=None, nrows=1, on_bad_lines='skip')
+                    if temp_df.iloc[0].notna().sum() == 1:
+                        df = pd.read_csv(self.file_path, header=1, on_bad_lines='skip')
+                    else:
+                        df = pd.read_csv(self.file_path, header=0, on_bad_lines='skip')
+                except Exception as e:
+                    logger.error(f"Failed to read CSV as tabular: {str(e)}")
+                    self.error.emit(f"Could not parse CSV as tabular format: {str(e)}")
+                    return
+            else:
+                try:
+                    self.close_workbook()
+                    engine = 'openpyxl' if self.file_path.lower().endswith('.xlsx') else 'xlrd'
+                    # header row from the preview: a lone title cell means the header is on row 2
+                    first_row = preview_rows[0] if preview_rows else ()
+                    header = 1 if sum(not _is_empty_cell(c) for c in first_row) == 1 else 0
+                    df = pd.read_excel(self.file_path, header=header, engine=engine)
+                except Exception as e:
+                    logger.error(f"Failed to read Excel as tabular: {str(e)}")
+                    self.error.emit(f"Could not parse Excel as tabular format: {str(e)}")
                     return
 
-                total_rows = df.shape[0]
-                rows_per_step = max(1, total_rows // (parse_steps // 2)) if total_rows > 0 else 1
-                df['Element'] = df['Element'].apply(split_element_name)
-                for idx in range(total_rows):
-                    if self.is_canceled:
-                        self.error.emit("File loading canceled by user")
-                        return
-                    if idx % rows_per_step == 0:
-                        progress = preview_steps + parse_steps // 2 + (idx // rows_per_step)
-                        self.progress.emit(min(progress, preview_steps + parse_steps), f"Processing row {idx}/{total_rows}")
-                if 'Type' not in df.columns:
-                    df['Type'] = df['Solution Label'].apply(lambda x: "Blk" if "BLANK" in str(x).upper() else "Sample")
-                self.finished.emit(df, self.file_path)
+            self.progress.emit(preview_steps + parse_steps // 2, "Reading tabular data...")
+            if self.is_canceled:
+                self.error.emit("File loading canceled by user")
                 return
 
-            if not data_rows and is_new_format:
-                logger.error(" No valid data rows were parsed")
-                self.error.emit("No valid data found in the file")
+            df = df.iloc[:-1]
+            expected_columns = ["Solution Label", "Element", "Int", "Corr Con"]
+            column_mapping = {"Sample ID": "Solution Label"}
+            df.rename(columns=column_mapping, inplace=True)
+
+            if not all(col in df.columns for col in expected_columns):
+                missing = set(expected_columns) - set(df.columns)
+                logger.error(f"Missing columns in tabular format: {missing}")
+                self.error.emit(f"Required columns missing: {', '.join(missing)}")
                 return
 
-            df = pd.DataFrame(data_rows, columns=["Solution Label", "Element", "Int", "Corr Con", "Type"])
-            total_rows = df.shape[0]
-            rows_per_step = max(1, total_rows // (parse_steps // 2)) if total_rows > 0 else 1
-            for idx in range(total_rows):
-                if self.is_canceled:
-                    self.error.emit("File loading canceled by user")
-                    return
-                df.loc[idx, 'Element'] = split_element_name(df.loc[idx, 'Element'])
-                if idx % rows_per_step == 0:
-                    progress = preview_steps + parse_steps // 2 + (idx // rows_per_step)
-                    self.progress.emit(min(progress, preview_steps + parse_steps), f"Processing row {idx}/{total_rows}")
-            self.finished.emit(df, self.file_path)
+            df['Element'] = split_element_names(df['Element'])
+            self.progress.emit(preview_steps + parse_steps, f"Processed {len(df)} rows")
+            if 'Type' not in df.columns:
+                df['Type'] = df['Solution Label'].apply(lambda x: "Blk" if "BLANK" in str(x).upper() else "Sample")
+            self.emit_parsed(df)
 
         except Exception as e:
             logger.error(f"Unexpected error in thread: {str(e)}")
             self.error.emit(f"Unexpected error: {str(e)}")
+        finally:
+            self.close_workbook()
+
+class FileLoaderThread(QThread):
+    """Worker thread to load and parse Excel/CSV files with progress updates."""
+    progress = pyqtSignal(int, str)  # Signal for progress (value, message)
+    finished = pyqtSignal(object, str)  # Signal for completion with DataFrame and file path
+    error = pyqtSignal(str)  # Signal for errors
+
+    def __init__(self, file_path, parent=None, is_pivoted=False):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.is_canceled = False
+        self.is_pivoted = is_pivoted  # جدید: تشخیص فایل پیوت شده
+
+    def cancel(self):
+        """Mark the thread as canceled."""
+        self.is_canceled = True
+
+    def run(self):
+        parser = FileParser(self.file_path, self.is_pivoted, is_canceled=lambda: self.is_canceled)
+        parser.progress = self.progress
+        parser.finished = self.finished
+        parser.error = self.error
+        parser.run()
+
+
+def parse_file_worker(index, file_path, progress_queue=None, cancel_event=None):
+    """Parse one file in a worker process; returns (index, df, error_message)."""
+    result = {}
+    parser = FileParser(file_path, is_canceled=cancel_event.is_set if cancel_event is not None else None)
+    if progress_queue is not None:
+        parser.progress.callback = lambda value, message: progress_queue.put((index, value, message))
+    parser.finished.callback = lambda df, path: result.setdefault('df', df)
+    parser.error.callback = lambda message: result.setdefault('error', message)
+    parser.run()
+    return index, result.get('df'), result.get('error')
+
+
+class ParallelFileLoaderThread(QThread):
+    """Parse several files at once in a process pool (bounded by CPU count).
+
+    Emits per-file progress while running and, when every file is done,
+    one list of (df, file_path, error_message) in the order of file_paths.
+    """
+    progress = pyqtSignal(int, int, str)  # file index, value, message
+    finished = pyqtSignal(object)  # list of (df, file_path, error_message)
+    error = pyqtSignal(str)
+
+    def __init__(self, file_paths, parent=None, max_workers=None):
+        super().__init__(parent)
+        self.file_paths = list(file_paths)
+        self.max_workers = max_workers or min(len(self.file_paths), os.cpu_count() or 1)
+        self.is_canceled = False
+
+    def cancel(self):
+        """Mark the thread as canceled; running workers stop at their next check."""
+        self.is_canceled = True
+
+    def run(self):
+        try:
+            # spawn: forking a process that runs a Qt event loop is not safe
+            context = multiprocessing.get_context('spawn')
+            with context.Manager() as manager:
+                progress_queue = manager.Queue()
+                cancel_event = manager.Event()
+                results = [None] * len(self.file_paths)
+                with ProcessPoolExecutor(max_workers=max(1, self.max_workers), mp_context=context) as executor:
+                    pending = {
+                        executor.submit(parse_file_worker, i, path, progress_queue, cancel_event)
+                        for i, path in enumerate(self.file_paths)
+                    }
+                    while pending:
+                        done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            if future.cancelled():
+                                continue
+                            index, df, error_message = future.result()
+                            results[index] = (df, self.file_paths[index], error_message)
+                            self.progress.emit(index, 100, error_message or "Parsed")
+                        self._drain_progress(progress_queue)
+                        if self.is_canceled and not cancel_event.is_set():
+                            cancel_event.set()
+                            for future in pending:
+                                future.cancel()
+                    self._drain_progress(progress_queue)
+
+            if self.is_canceled:
+                self.error.emit("File loading canceled by user")
+                return
+            self.finished.emit(results)
+        except Exception as e:
+            logger.error(f"Parallel file loading failed: {str(e)}")
+            self.error.emit(f"Unexpected error: {str(e)}")
+
+    def _drain_progress(self, progress_queue):
+        while True:
+            try:
+                index, value, message = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.progress.emit(index, value, message)
 
 
 def load_additional(app, file_path=None):
@@ -382,23 +681,16 @@ def load_additional(app, file_path=None):
             # Get clean file name (e.g. "1403-11-20 MASS")
             _, clean_name = app.file_tab.parse_filename(os.path.basename(additional_file_path))
 
-            # Save current data state so we can restore it later
-            original_data = app.data
-            original_init_data = app.init_data
-
-            # Temporarily set ONLY this new file as the app data → pivot will be built from it alone
-            app.data = df.copy()
-            app.init_data = df.copy()
-
-            # Build pivot for this single file
-            pivot_creator = PivotCreator(app.pivot_tab)
-            pivot_creator.create_pivot()                     # returns nothing, just fills pivot_tab.pivot_data
-
-            # Get the real number of rows this file contributes to the final pivot table
-            current_pivot_df = app.pivot_tab.pivot_data
-            if current_pivot_df is not None and not current_pivot_df.empty:
-                pivot_row_count = len(current_pivot_df)
+            # Append the new file to the full dataset
+            previous_data = app.data
+            if previous_data is None:
+                combined = df.copy()
             else:
+                combined = pd.concat([previous_data, df], ignore_index=True)
+
+            # Pivot only this file and append its block to the existing pivot
+            pivot_row_count = PivotCreator(app.pivot_tab).append_pivot(previous_data, df, combined)
+            if pivot_row_count == 0:
                 # Fallback if pivot failed for some reason
                 samp_df = df[df['Type'].isin(['Samp', 'Sample'])]
                 pivot_row_count = samp_df['Solution Label'].nunique() if 'Solution Label' in samp_df.columns else 0
@@ -421,18 +713,10 @@ def load_additional(app, file_path=None):
             logger.debug(f"[Load Additional] {clean_name} → {pivot_row_count} pivot rows "
                         f"(rows {start_row_in_pivot}–{start_row_in_pivot + pivot_row_count - 1})")
 
-            # Restore original full dataset and append the new file
-            app.data = original_data
-            app.init_data = original_init_data
-
-            if app.data is None:
-                app.data = df.copy()
-                app.init_data = df.copy()
-            else:
-                app.data = pd.concat([app.data, df], ignore_index=True)
-                app.init_data = app.data.copy()
+            app.data = combined
+            app.init_data = combined.copy()
 
-            # Final UI update – rebuild full pivot with all files
+            # Final UI update – the combined pivot is already cached, so this does not re-pivot
             app.notify_data_changed()
             if hasattr(app, 'elements_tab') and app.elements_tab:
                 app.elements_tab.process_blk_elements()
@@ -1,7 +1,7 @@
 # screens/login_window.py
 import os
 import sys
-import sqlite3
+from utils.db_pool import get_connection, transaction
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import QPixmap, QFont, QIcon, QColor
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer
@@ -51,24 +51,21 @@ class LoginWindow(QWidget):
         ]
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cur = conn.cursor()
-
-            for username, password, full_name, position, role in default_users:
-                cur.execute("""
-                    INSERT OR IGNORE INTO users 
-                    (username, password, full_name, position, role, remember_me, is_active)
-                    VALUES (?, ?, ?, ?, ?, 0, 1)
-                """, (username, password, full_name, position, role))
-
-            conn.commit()
-            conn.close()
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
+
+                for username, password, full_name, position, role in default_users:
+                    cur.execute("""
+                        INSERT OR IGNORE INTO users 
+                        (username, password, full_name, position, role, remember_me, is_active)
+                        VALUES (?, ?, ?, ?, ?, 0, 1)
+                    """, (username, password, full_name, position, role))
         except Exception as e:
             print(f"Failed to create default users: {e}")
 
     def check_remembered_user(self):
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("""
                 SELECT id, username, full_name, position, role 
@@ -77,7 +74,6 @@ class LoginWindow(QWidget):
                 LIMIT 1
             """)
             user = cur.fetchone()
-            conn.close()
 
             if user:
                 user_id, username, name, pos, role = user
@@ -197,7 +193,7 @@ class LoginWindow(QWidget):
             return
 
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("""
                 SELECT id, full_name, position, role 
@@ -213,13 +209,11 @@ class LoginWindow(QWidget):
 
                 cur.execute("UPDATE users SET remember_me = ? WHERE username = ?", (remember, username))
                 conn.commit()
-                conn.close()
 
                 QMessageBox.information(self, "Success", f"Welcome back, {name}!")
                 self.login_successful.emit(username, name, pos, str(user_id))
                 self.close()
             else:
-                conn.close()
                 QMessageBox.critical(self, "Error", "Invalid username or password.")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Database error:\n{e}")
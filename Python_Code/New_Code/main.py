@@ -1,6 +1,7 @@
 # main.py
 import sys
 import logging
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from screens.login_window import LoginWindow
 from app import MainWindow  # تغییر: از main_window.py ایمپورت کن
@@ -8,6 +9,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes of the parallel file loader (frozen builds)
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
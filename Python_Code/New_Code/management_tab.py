@@ -1,5 +1,5 @@
 # screens/management/management_tab.py
-import sqlite3
+from utils.db_pool import get_connection, transaction
 import pandas as pd
 import logging
 from PyQt6.QtWidgets import (
@@ -177,9 +177,8 @@ class ManagementTab(QWidget):
 
     def load_files_combo(self):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             df = pd.read_sql_query("SELECT id, file_path FROM uploaded_files WHERE is_archived = 0", conn)
-            conn.close()
             self.file_combo.clear()
             for _, row in df.iterrows():
                 self.file_combo.addItem(row['file_path'], row['id'])
@@ -191,7 +190,7 @@ class ManagementTab(QWidget):
         if not file_id:
             return
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT mv.id, mv.version_number, mv.value, COALESCE(u.full_name, u.username),
                        mv.change_date, mv.stage, mv.reason
@@ -202,7 +201,6 @@ class ManagementTab(QWidget):
                 ORDER BY mv.change_date DESC
             """
             df = pd.read_sql_query(query, conn, params=(file_id,))
-            conn.close()
 
             model = QStandardItemModel()
             model.setHorizontalHeaderLabels([
@@ -232,30 +230,28 @@ class ManagementTab(QWidget):
         if reply != QMessageBox.StandardButton.Yes:
             return
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cur = conn.cursor()
-            cur.execute("SELECT measurement_id FROM measurement_versions WHERE id = ?", (version_id,))
-            meas_id = cur.fetchone()[0]
-            cur.execute("UPDATE measurements SET current_value = ? WHERE id = ?", (value, meas_id))
-            cur.execute("""
-                INSERT INTO changes_log (user_id, action, entity_type, entity_id, details, stage)
-                VALUES (?, 'restore', 'measurement', ?, ?, 'versioning')
-            """, (self.user_id, meas_id, f"Restored from version {version_id}"))
-
-            cur.execute("SELECT file_id FROM measurements WHERE id = ?", (meas_id,))
-            file_id = cur.fetchone()[0]
-            cur.execute("SELECT file_path FROM uploaded_files WHERE id = ?", (file_id,))
-            file_path = cur.fetchone()[0] if cur.rowcount > 0 else 'unknown'
-
-            message = f"User {self.app.user_name or 'unknown'} restored a version on file '{file_path}'."
-            cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
-            for (manager_id,) in cur.fetchall():
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT measurement_id FROM measurement_versions WHERE id = ?", (version_id,))
+                meas_id = cur.fetchone()[0]
+                cur.execute("UPDATE measurements SET current_value = ? WHERE id = ?", (value, meas_id))
                 cur.execute("""
-                    INSERT INTO notifications (user_id, message, type, related_entity_id)
-                    VALUES (?, ?, ?, ?)
-                """, (manager_id, message, "system", meas_id))
-            conn.commit()
-            conn.close()
+                    INSERT INTO changes_log (user_id, action, entity_type, entity_id, details, stage)
+                    VALUES (?, 'restore', 'measurement', ?, ?, 'versioning')
+                """, (self.user_id, meas_id, f"Restored from version {version_id}"))
+
+                cur.execute("SELECT file_id FROM measurements WHERE id = ?", (meas_id,))
+                file_id = cur.fetchone()[0]
+                cur.execute("SELECT file_path FROM uploaded_files WHERE id = ?", (file_id,))
+                file_path = cur.fetchone()[0] if cur.rowcount > 0 else 'unknown'
+
+                message = f"User {self.app.user_name or 'unknown'} restored a version on file '{file_path}'."
+                cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
+                for (manager_id,) in cur.fetchall():
+                    cur.execute("""
+                        INSERT INTO notifications (user_id, message, type, related_entity_id)
+                        VALUES (?, ?, ?, ?)
+                    """, (manager_id, message, "system", meas_id))
             QMessageBox.information(self, "Success", "Data restored successfully!")
             self.app.results_frame.data_changed()
         except Exception as e:
@@ -274,21 +270,19 @@ class ManagementTab(QWidget):
         if reply != QMessageBox.StandardButton.Yes:
             return
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cur = conn.cursor()
-            cur.execute("SELECT file_path, uploaded_by FROM uploaded_files WHERE id = ?", (file_id,))
-            file_path, uploaded_by = cur.fetchone()
-            cur.execute("UPDATE uploaded_files SET is_archived = 1 WHERE id = ?", (file_id,))
-            message = f"File '{file_path}' was archived by {self.app.user_name}."
-            if uploaded_by:
-                cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
-                            (uploaded_by, message, "system", file_id))
-            cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
-            for (manager_id,) in cur.fetchall():
-                cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
-                            (manager_id, message, "system", file_id))
-            conn.commit()
-            conn.close()
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT file_path, uploaded_by FROM uploaded_files WHERE id = ?", (file_id,))
+                file_path, uploaded_by = cur.fetchone()
+                cur.execute("UPDATE uploaded_files SET is_archived = 1 WHERE id = ?", (file_id,))
+                message = f"File '{file_path}' was archived by {self.app.user_name}."
+                if uploaded_by:
+                    cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
+                                (uploaded_by, message, "system", file_id))
+                cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
+                for (manager_id,) in cur.fetchall():
+                    cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
+                                (manager_id, message, "system", file_id))
             QMessageBox.information(self, "Success", "File archived!")
             self.load_files_combo()
             self.load_archived_files()
@@ -319,7 +313,7 @@ class ManagementTab(QWidget):
 
     def load_archived_files(self):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT uf.id, uf.file_path, uf.created_at AS upload_date, COALESCE(u.full_name, u.username) AS uploaded_by
                 FROM uploaded_files uf
@@ -328,7 +322,6 @@ class ManagementTab(QWidget):
                 ORDER BY uf.created_at DESC
             """
             df = pd.read_sql_query(query, conn)
-            conn.close()
 
             model = QStandardItemModel()
             model.setHorizontalHeaderLabels(["ID", "File Path", "Upload Date", "Uploaded By"])
@@ -355,21 +348,19 @@ class ManagementTab(QWidget):
         reply = QMessageBox.question(self, "Restore", "Restore this file to active?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                conn = sqlite3.connect(self.db_path, timeout=30)
-                cur = conn.cursor()
-                cur.execute("SELECT file_path, uploaded_by FROM uploaded_files WHERE id = ?", (file_id,))
-                file_path, uploaded_by = cur.fetchone()
-                cur.execute("UPDATE uploaded_files SET is_archived = 0 WHERE id = ?", (file_id,))
-                message = f"File '{file_path}' was restored by {self.app.user_name}."
-                if uploaded_by:
-                    cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
-                                (uploaded_by, message, "system", file_id))
-                cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
-                for (manager_id,) in cur.fetchall():
-                    cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
-                                (manager_id, message, "system", file_id))
-                conn.commit()
-                conn.close()
+                with transaction(self.db_path) as conn:
+                    cur = conn.cursor()
+                    cur.execute("SELECT file_path, uploaded_by FROM uploaded_files WHERE id = ?", (file_id,))
+                    file_path, uploaded_by = cur.fetchone()
+                    cur.execute("UPDATE uploaded_files SET is_archived = 0 WHERE id = ?", (file_id,))
+                    message = f"File '{file_path}' was restored by {self.app.user_name}."
+                    if uploaded_by:
+                        cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
+                                    (uploaded_by, message, "system", file_id))
+                    cur.execute("SELECT id FROM users WHERE role = 'lab_manager'")
+                    for (manager_id,) in cur.fetchall():
+                        cur.execute("INSERT INTO notifications (user_id, message, type, related_entity_id) VALUES (?, ?, ?, ?)",
+                                    (manager_id, message, "system", file_id))
                 QMessageBox.information(self, "Success", "File restored!")
                 self.load_archived_files()
                 self.load_files_combo()
@@ -408,7 +399,7 @@ class ManagementTab(QWidget):
 
     def load_notifications(self):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT n.id, n.message, n.type, n.created_at, n.is_read,
                     CASE
@@ -427,7 +418,6 @@ class ManagementTab(QWidget):
                 ORDER BY n.created_at DESC
             """
             df = pd.read_sql_query(query, conn, params=(self.user_id,))
-            conn.close()
 
             model = QStandardItemModel()
             model.setHorizontalHeaderLabels([
@@ -467,11 +457,9 @@ class ManagementTab(QWidget):
             return
         notif_id = self.notif_table.model().index(index.row(), 0).data()
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cur = conn.cursor()
-            cur.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
-            conn.commit()
-            conn.close()
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
             self.load_notifications()
             QMessageBox.information(self, "Success", "Notification marked as read.")
         except Exception as e:
@@ -503,7 +491,7 @@ class ManagementTab(QWidget):
 
     def load_workflow(self):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT
                     uf.id AS file_id,
@@ -528,7 +516,6 @@ class ManagementTab(QWidget):
                 ORDER BY timestamp DESC
             """
             df = pd.read_sql_query(query, conn)
-            conn.close()
 
             model = QStandardItemModel()
             model.setHorizontalHeaderLabels(["Event", "Time"])
@@ -565,12 +552,11 @@ class ManagementTab(QWidget):
 
     def show_upload_details(self, file_path):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
             cur.execute("SELECT contracts FROM uploaded_files WHERE file_path = ?", (file_path,))
             result = cur.fetchone()
             contracts = result[0] if result else "No contracts found"
-            conn.close()
             dialog = QDialog(self)
             dialog.setWindowTitle("Upload Details")
             layout = QVBoxLayout()
@@ -653,7 +639,7 @@ class ManagementTab(QWidget):
 
     def load_elements_for_file(self, file_path, combo, table):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT DISTINCT column_name FROM changes_log cl
                 LEFT JOIN approvals a ON cl.id = a.change_id
@@ -663,7 +649,6 @@ class ManagementTab(QWidget):
                 ORDER BY column_name
             """
             df = pd.read_sql_query(query, conn, params=(file_path,))
-            conn.close()
             current = combo.currentText()
             combo.blockSignals(True)
             combo.clear()
@@ -682,7 +667,7 @@ class ManagementTab(QWidget):
 
     def load_pending_approvals_for_file(self, file_path, table, element=None):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT
                     cl.pivot_index,
@@ -705,7 +690,6 @@ class ManagementTab(QWidget):
                 params += (element,)
             query += " ORDER BY CAST(cl.pivot_index AS INTEGER) ASC"
             df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
 
             model = QStandardItemModel()
             headers = ["ID", "Time", "User", "Sample", "Old", "New", "Details"]
@@ -744,72 +728,65 @@ class ManagementTab(QWidget):
 
     def _handle_element_approval(self, file_path, element, status, comment):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cur = conn.cursor()
-
-            filename = os.path.basename(file_path)
-            cur.execute("""
-                SELECT id FROM uploaded_files 
-                WHERE original_filename = ? OR file_path LIKE ? OR file_path LIKE ?
-            """, (filename, f"%{filename}", f"%/{filename}"))
-            result = cur.fetchone()
-            if not result:
-                QMessageBox.critical(self, "Error", f"File not found: {filename}")
-                conn.close()
-                return
-            file_id = result[0]
-
-            query = """
-                SELECT cl.id, cl.user_id, cl.solution_label
-                FROM changes_log cl
-                LEFT JOIN approvals a ON cl.id = a.change_id
-                WHERE a.id IS NULL
-                AND cl.action IN ('update', 'correction')
-                AND cl.file_path = ?
-            """
-            params = (file_path,)
-            if element:
-                query += " AND cl.column_name = ?"
-                params += (element,)
-
-            cur.execute(query, params)
-            changes = cur.fetchall()
-
-            if not changes:
-                QMessageBox.information(self, "Info", "No pending changes found.")
-                conn.close()
-                return
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
 
-            for change_id, user_id, solution_label in changes:
+                filename = os.path.basename(file_path)
                 cur.execute("""
-                    INSERT INTO approvals (change_id, approved_by, status, comments)
-                    VALUES (?, ?, ?, ?)
-                """, (change_id, self.user_id, status, comment))
-
-            user_ids = {user_id for _, user_id, _ in changes}
-            for user_id in user_ids:
-                message = f"Your changes on file '{filename}' were {status}."
-                if status == "rejected" and comment:
-                    message += f" Reason: {comment}"
-                cur.execute("""
-                    INSERT INTO notifications (user_id, message, type, related_entity_id)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, message, f"change_{status}", file_id))
-
-            conn.commit()
-            conn.close()
+                    SELECT id FROM uploaded_files 
+                    WHERE original_filename = ? OR file_path LIKE ? OR file_path LIKE ?
+                """, (filename, f"%{filename}", f"%/{filename}"))
+                result = cur.fetchone()
+                if not result:
+                    QMessageBox.critical(self, "Error", f"File not found: {filename}")
+                    return
+                file_id = result[0]
+
+                query = """
+                    SELECT cl.id, cl.user_id, cl.solution_label
+                    FROM changes_log cl
+                    LEFT JOIN approvals a ON cl.id = a.change_id
+                    WHERE a.id IS NULL
+                    AND cl.action IN ('update', 'correction')
+                    AND cl.file_path = ?
+                """
+                params = (file_path,)
+                if element:
+                    query += " AND cl.column_name = ?"
+                    params += (element,)
+
+                cur.execute(query, params)
+                changes = cur.fetchall()
+
+                if not changes:
+                    QMessageBox.information(self, "Info", "No pending changes found.")
+                    return
+
+                for change_id, user_id, solution_label in changes:
+                    cur.execute("""
+                        INSERT INTO approvals (change_id, approved_by, status, comments)
+                        VALUES (?, ?, ?, ?)
+                    """, (change_id, self.user_id, status, comment))
+
+                user_ids = {user_id for _, user_id, _ in changes}
+                for user_id in user_ids:
+                    message = f"Your changes on file '{filename}' were {status}."
+                    if status == "rejected" and comment:
+                        message += f" Reason: {comment}"
+                    cur.execute("""
+                        INSERT INTO notifications (user_id, message, type, related_entity_id)
+                        VALUES (?, ?, ?, ?)
+                    """, (user_id, message, f"change_{status}", file_id))
             QMessageBox.information(self, "Success", f"{status.capitalize()} applied to {len(changes)} change(s).")
             self.load_workflow()
             self.load_notifications()
 
         except Exception as e:
-            if 'conn' in locals():
-                conn.close()
             QMessageBox.critical(self, "Error", f"Operation failed:\n{e}")
 
     def plot_old_new(self, file_path, element=None):
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT cl.solution_label, cl.original_value, cl.new_value
                 FROM changes_log cl
@@ -821,7 +798,6 @@ class ManagementTab(QWidget):
                 query += " AND cl.column_name = ?"
                 params += (element,)
             df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
             df['original_value'] = pd.to_numeric(df['original_value'], errors='coerce')
             df['new_value'] = pd.to_numeric(df['new_value'], errors='coerce')
             df = df.dropna()
@@ -850,7 +826,7 @@ class ManagementTab(QWidget):
     def plot_calib(self, file_path, element=None):
         print("omid ", element)
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn = get_connection(self.db_path)
             cur = conn.cursor()
 
             # --- پیدا کردن file_id ---
@@ -863,7 +839,6 @@ class ManagementTab(QWidget):
             file_id = result[0] if result else None
             if not file_id:
                 QMessageBox.warning(self, "Warning", f"File ID not found:\n{file_path}")
-                conn.close()
                 return
 
             # --- تعیین عنصر ---
@@ -880,7 +855,6 @@ class ManagementTab(QWidget):
             crm_df = pd.read_sql_query(query_crm, conn, params=(file_id,))
             if crm_df.empty:
                 QMessageBox.information(self, "Info", "No CRM selected.")
-                conn.close()
                 return
 
             # --- دریافت مقادیر اندازه‌گیری شده ---
@@ -891,7 +865,6 @@ class ManagementTab(QWidget):
             measured_df = pd.read_sql_query(query_measured, conn, params=(file_id, element or ''))
             if measured_df.empty:
                 QMessageBox.information(self, "Info", f"No data for '{element or 'element'}'.")
-                conn.close()
                 return
 
             measured_df['measured'] = pd.to_numeric(measured_df['measured'], errors='coerce')
@@ -901,7 +874,6 @@ class ManagementTab(QWidget):
             data = pd.merge(measured_df, crm_df, on='solution_label', how='inner')
             if data.empty:
                 QMessageBox.information(self, "Info", "No overlapping samples with CRM.")
-                conn.close()
                 return
 
             # --- استخراج CRM ID و روش ---
@@ -939,7 +911,6 @@ class ManagementTab(QWidget):
 
             if not certified_values:
                 QMessageBox.information(self, "Info", f"No certified value for '{base_element}'.")
-                conn.close()
                 return
 
             # --- آماده‌سازی داده ---
@@ -980,7 +951,6 @@ class ManagementTab(QWidget):
 
             if not plot_data:
                 QMessageBox.information(self, "Info", "No valid data to plot.")
-                conn.close()
                 return
 
             df_plot = pd.DataFrame(plot_data)
@@ -1123,12 +1093,9 @@ class ManagementTab(QWidget):
 
             plot_dialog.resize(1000, 650)
             plot_dialog.exec()
-            conn.close()
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Plot failed:\n{str(e)}")
-            if 'conn' in locals():
-                conn.close()
 
     def plot_drift(self, file_path, element_combo, approvals_table):
         element = element_combo.currentText()
@@ -274,7 +274,11 @@ class MasterVerificationWindow(QWidget):
         bottom_h = QHBoxLayout()
         self.auto_flat_btn = QPushButton("Auto Flat"); bottom_h.addWidget(self.auto_flat_btn)
         self.auto_zero_slope_btn = QPushButton("Auto Zero Slope"); bottom_h.addWidget(self.auto_zero_slope_btn)
+        self.flat_all_btn = QPushButton("Flat All Elements"); bottom_h.addWidget(self.flat_all_btn)
+        self.zero_slope_all_btn = QPushButton("Zero Slope All Elements"); bottom_h.addWidget(self.zero_slope_all_btn)
         self.undo_rm_btn = QPushButton("Undo RM"); bottom_h.addWidget(self.undo_rm_btn)
+        self.redo_rm_btn = QPushButton("Redo RM"); bottom_h.addWidget(self.redo_rm_btn)
+        self.apply_all_rm_btn = QPushButton("Apply All Elements"); bottom_h.addWidget(self.apply_all_rm_btn)
         rm_l.addLayout(bottom_h)
         controls_layout.addWidget(rm_gb)
 
@@ -432,20 +436,13 @@ class MasterVerificationWindow(QWidget):
             self.segments = self._create_segments(self.positions_df)
             self.unique_rm_nums = sorted(self.rm_df['rm_num'].unique())
         else:
-            fr = self.file_ranges[index]
-            start = fr['start_pivot_row']
-            end = fr['end_pivot_row']
-
-            if 'pivot_index' in self.all_pivot_df.columns:
-                self.pivot_df = self.all_pivot_df[self.all_pivot_df['pivot_index'].between(start, end)].copy()
-                self.rm_df = self.all_rm_df[self.all_rm_df['pivot_index'].between(start, end)].copy()
-                self.initial_rm_df = self.all_initial_rm_df[self.all_initial_rm_df['pivot_index'].between(start, end)].copy()
-                self.positions_df = self.all_positions_df[self.all_positions_df['pivot_index'].between(start, end)].copy()
-            else:
-                self.pivot_df = self.all_pivot_df.iloc[start:end+1].copy()
-                self.rm_df = self.all_rm_df.iloc[start:end+1].copy()
-                self.initial_rm_df = self.all_initial_rm_df.iloc[start:end+1].copy()
-                self.positions_df = self.all_positions_df.iloc[start:end+1].copy()
+            # ردیف‌های فایل در pivot پیوسته‌اند (pivot_index == شماره ردیف)
+            start, stop = self.rm_handler.segment_index().file_bounds(index)
+            end = stop - 1
+            self.pivot_df = self.all_pivot_df.iloc[start:stop].copy()
+            self.rm_df = self.all_rm_df[self.all_rm_df['pivot_index'].between(start, end)].copy()
+            self.initial_rm_df = self.all_initial_rm_df[self.all_initial_rm_df['pivot_index'].between(start, end)].copy()
+            self.positions_df = self.all_positions_df[self.all_positions_df['pivot_index'].between(start, end)].copy()
 
             self.segments = self._create_segments(self.positions_df)
             self.unique_rm_nums = sorted(self.rm_df['rm_num'].unique())
@@ -490,6 +487,8 @@ class MasterVerificationWindow(QWidget):
         self.scale_slider.valueChanged.connect(self.crm_handler.update_preview_params)
         self.auto_flat_btn.clicked.connect(self.rm_handler.auto_optimize_to_flat)
         self.auto_zero_slope_btn.clicked.connect(self.rm_handler.auto_optimize_slope_to_zero)
+        self.flat_all_btn.clicked.connect(lambda: self.rm_handler.auto_optimize_all('flat'))
+        self.zero_slope_all_btn.clicked.connect(lambda: self.rm_handler.auto_optimize_all('zero'))
         self.run_rm_btn.clicked.connect(self.rm_handler.start_check_rm_thread)
         self.rm_table.clicked.connect(self.rm_handler.on_table_row_clicked)
         self.rm_table.customContextMenuRequested.connect(self.rm_handler.show_rm_context_menu)
@@ -501,6 +500,8 @@ class MasterVerificationWindow(QWidget):
         self.filter_solution_edit.textChanged.connect(self.rm_handler.on_filter_changed)
         self.apply_slope_btn.clicked.connect(self.rm_handler.apply_slope_from_spin)
         self.undo_rm_btn.clicked.connect(self.rm_handler.undo_changes)
+        self.redo_rm_btn.clicked.connect(self.rm_handler.redo_changes)
+        self.apply_all_rm_btn.clicked.connect(self.rm_handler.apply_to_all_elements)
         self.file_selector.currentIndexChanged.connect(self.rm_handler.on_file_changed)
         
 
@@ -8,17 +8,18 @@ from PyQt6.QtWidgets import (
     QTableView, QHeaderView, QPushButton, QStatusBar, QMessageBox,
     QFileDialog, QComboBox, QToolBar, QProgressDialog, QLineEdit, QDialog
 )
-from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal, QThread, pyqtSlot
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal, QThread, pyqtSlot, QTimer
 from PyQt6.QtGui import QKeySequence, QAction, QColor
 import pyqtgraph as pg
 import pyqtgraph.exporters
 import os
-import time
 import logging
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from utils.element_store import element_codes, element_statistics, read_window, sample_count
+from utils.db_pool import close_connections
 
 # تنظیم لاگ برای دیباگینگ
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', filename='app.log')
@@ -28,6 +29,11 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 TABLE_NAME = "elements_data"
 SAMPLE_ID_COL = "SAMPLE ID"
 ESI_CODE_COL = "ESI CODE"
+VALUE_SCALE = 10000
+# تعداد ردیف‌هایی که در هر بار از دیتابیس خوانده می‌شود (پنجره قابل مشاهده نمودار/جدول)
+WINDOW_ROWS = 2000
+# نمودارهای توزیع روی کل تاریخچه عنصر رسم می‌شوند، نه فقط پنجره ردیف‌ها
+DISTRIBUTION_PLOTS = ("Histogram", "Box Plot")
 
 # -------------------------
 class PandasModel(QAbstractTableModel):
@@ -98,34 +104,27 @@ class DataLoaderThread(QThread):
     error = pyqtSignal(str)
     progress = pyqtSignal(int)
 
-    def __init__(self, db_path, elements, parent=None):
+    def __init__(self, db_path, elements, current_range, parent=None):
         super().__init__(parent)
         self.db_path = db_path
         self.elements = elements
+        self.current_range = current_range
 
     def run(self):
-        data = {}
-        total = len(self.elements)
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            for i, elem in enumerate(self.elements):
-                try:
-                    q = f"SELECT [{elem}] FROM {TABLE_NAME}"
-                    df = pd.read_sql(q, conn)
-                    y_vals = pd.to_numeric(df[elem], errors='coerce').dropna().values / 10000
-                    x_idx = np.arange(len(y_vals)).tolist()
-                    if len(y_vals) == 0:
-                        logging.warning(f"No valid data for element {elem}")
-                        continue
-                    data[elem] = (x_idx, y_vals)
-                    logging.debug(f"Loaded {elem}: {len(y_vals)} points, sample y_vals={y_vals[:5]}")
-                    time.sleep(0.1)  # Simulate delay
-                except Exception as e:
-                    logging.error(f"Error loading {elem}: {e}")
-                    self.error.emit(f"Error loading {elem}: {str(e)}")
-                    return
-                self.progress.emit(int((i + 1) / total * 100))
+            # همه عناصر انتخاب‌شده با یک query و فقط ردیف‌های پنجره فعلی
+            min_idx, max_idx = self.current_range
+            df = read_window(self.db_path, self.elements, min_idx, max_idx, scale=VALUE_SCALE)
+            self.progress.emit(50)
+            data = {}
+            df = df.dropna(subset=['value'])
+            for elem, group in df.groupby('element', sort=False):
+                data[elem] = (group['position'].to_numpy(), group['value'].to_numpy(dtype=float))
+                logging.debug(f"Loaded {elem}: {len(group)} points in rows {min_idx}-{max_idx}")
+            for elem in self.elements:
+                if elem not in data:
+                    logging.warning(f"No valid data for element {elem}")
+            self.progress.emit(100)
             if not data:
                 logging.warning("No valid data loaded for any elements")
                 self.error.emit("No valid data found for selected elements")
@@ -134,8 +133,8 @@ class DataLoaderThread(QThread):
             logging.error(f"Database error: {e}")
             self.error.emit(str(e))
         finally:
-            if conn:
-                conn.close()
+            # اتصال pool متعلق به همین thread است
+            close_connections(self.db_path)
 
 # -------------------------
 class TableLoaderThread(QThread):
@@ -152,41 +151,29 @@ class TableLoaderThread(QThread):
         self.y_range = y_range
 
     def run(self):
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cols = ", ".join([f"[{c}]" for c in self.elements])
-            if self.has_sample_id:
-                cols = f"[{SAMPLE_ID_COL}], {cols}"
-            q = f"SELECT {cols} FROM {TABLE_NAME}"
-            df = pd.read_sql(q, conn)
-            for c in df.columns:
-                if c != SAMPLE_ID_COL:
-                    df[c] = pd.to_numeric(df[c], errors='coerce') / 10000
+            # پنجره ردیف‌ها و فیلتر بازه Y هر دو در SQL اعمال می‌شوند
             min_idx, max_idx = self.current_range
-            max_idx = min(max_idx, len(df))
-            df_slice = df.iloc[min_idx:max_idx].copy()
-
-            # اعمال فیلتر بازه Y اگر لازم باشد
+            df = read_window(self.db_path, self.elements, min_idx, max_idx,
+                             value_range=self.y_range, scale=VALUE_SCALE)
+            self.progress.emit(50)
+            df_slice = df.pivot(index='position', columns='element', values='value')
+            df_slice = df_slice.reindex(columns=[e for e in self.elements if e in df_slice.columns]).astype(float)
+            if self.has_sample_id:
+                df_slice.insert(0, SAMPLE_ID_COL, df.groupby('position', sort=True)['sample_id'].first())
+            df_slice.columns.name = None
+            df_slice.index.name = None
             if self.y_range:
-                min_y, max_y = self.y_range
-                mask = True
-                for elem in self.elements:
-                    if elem in df_slice:
-                        mask &= (df_slice[elem] >= min_y) & (df_slice[elem] <= max_y)
-                df_slice = df_slice[mask].reset_index(drop=True)
+                df_slice = df_slice.reset_index(drop=True)
 
             logging.debug(f"Table data loaded: {len(df_slice)} rows, columns={df_slice.columns.tolist()}")
-            for i in range(101):
-                time.sleep(0.01)
-                self.progress.emit(i)
+            self.progress.emit(100)
             self.dataLoaded.emit(df_slice)
         except Exception as e:
             logging.error(f"Table load error: {e}")
             self.error.emit(str(e))
         finally:
-            if conn:
-                conn.close()
+            close_connections(self.db_path)
 
 # -------------------------
 class VisLoaderThread(QThread):
@@ -237,12 +224,15 @@ class VisLoaderThread(QThread):
 # -------------------------
 class PlotArea(QWidget):
     statusMessage = pyqtSignal(str)
+    windowChanged = pyqtSignal()
 
     def __init__(self, db_path, elements, parent=None):
         super().__init__(parent)
         self.db_path = db_path
         self.elements = elements
         self.data_cache = {}
+        self.history_cache = {}  # همه ردیف‌های هر عنصر، برای Histogram / Box Plot
+        self._loading_history = False
         self.total_rows = self._get_total_rows()
         self.has_sample_id = self._check_sample_id_column()
         self.sample_ids = self._load_sample_ids() if self.has_sample_id else []
@@ -296,6 +286,12 @@ class PlotArea(QWidget):
         self.plot_widget.setLabel("left", "Concentration (divided by 10,000)")
         self.plot_widget.setMouseEnabled(x=True, y=True)
         self.plot_widget.scene().sigMouseClicked.connect(self.on_mouse_clicked)
+        # با جابه‌جایی/زوم، پنجره ردیف‌ها (بعد از مکث کوتاه) دوباره از دیتابیس خوانده می‌شود
+        self.window_timer = QTimer(self)
+        self.window_timer.setSingleShot(True)
+        self.window_timer.setInterval(200)
+        self.window_timer.timeout.connect(self._load_visible_window)
+        self.plot_widget.sigXRangeChanged.connect(lambda *_: self.window_timer.start())
         layout.addWidget(self.plot_widget)
 
         # Range Selector UI
@@ -338,7 +334,8 @@ class PlotArea(QWidget):
 
         self.current_elements = []
         self.current_y_range = (0.0, 1.0)
-        self.current_range = (0, self.total_rows)
+        self.current_range = self._latest_window()
+        self._keep_view = False
         self.loader_thread = None
         self.progress_dialog = None
         self.info_text = pg.TextItem("", anchor=(0, 0), color=(0, 0, 0))
@@ -351,21 +348,50 @@ class PlotArea(QWidget):
         self.vis_progress = None
 
     def _get_total_rows(self):
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            q = f"SELECT COUNT(*) AS cnt FROM {TABLE_NAME}"
-            df = pd.read_sql(q, conn)
-            total = int(df['cnt'].iloc[0])
+            total = sample_count(self.db_path)
             logging.debug(f"Total rows in database: {total}")
             return total
         except Exception as e:
             logging.error(f"Error getting total rows: {e}")
             self.statusMessage.emit(f"Error accessing database: {str(e)}")
             return 0
-        finally:
-            if conn:
-                conn.close()
+
+    def _latest_window(self):
+        """آخرین WINDOW_ROWS ردیف (جدیدترین داده‌ها)"""
+        return (max(0, self.total_rows - WINDOW_ROWS), self.total_rows)
+
+    def _distribution_plot(self):
+        return self.plot_type_combo.currentText() in DISTRIBUTION_PLOTS
+
+    def _plot_cache(self):
+        """Values the current plot type draws: full history for distributions, else the row window."""
+        return self.history_cache if self._distribution_plot() else self.data_cache
+
+    def _set_window(self, current_range):
+        if current_range != self.current_range:
+            self.current_range = current_range
+            self.data_cache.clear()
+            self.windowChanged.emit()
+
+    def _load_visible_window(self):
+        if not self.current_elements or self.x_axis_combo.currentText() != "Index":
+            return
+        if self._distribution_plot():
+            return
+        x0, x1 = self.plot_widget.viewRange()[0]
+        lo = max(0, int(np.floor(x0)))
+        hi = min(self.total_rows, int(np.ceil(x1)) + 1)
+        min_idx, max_idx = self.current_range
+        slack = (max_idx - min_idx) // 10 + 1
+        if lo >= hi or (lo >= min_idx - slack and hi <= max_idx + slack):
+            return
+        # بازه قابل مشاهده به اضافه نصف عرض آن در هر طرف، برای پیمایش روان
+        margin = (hi - lo) // 2
+        self._set_window((max(0, lo - margin), min(self.total_rows, hi + margin)))
+        logging.debug(f"Loading row window {self.current_range} for view [{x0:.1f}, {x1:.1f}]")
+        self._keep_view = True
+        self.load_data_for_elements(self.current_elements)
 
     def _check_sample_id_column(self):
         conn = None
@@ -405,16 +431,16 @@ class PlotArea(QWidget):
                 conn.close()
 
     def _update_y_range(self):
-        y_min = float('inf')
-        y_max = float('-inf')
-        for elem in self.current_elements:
-            if elem in self.data_cache:
-                _, y_vals = self.data_cache[elem]
-                if len(y_vals) > 0:
-                    y_min = min(y_min, np.min(y_vals))
-                    y_max = max(y_max, np.max(y_vals))
-        if y_min == float('inf') or y_max == float('-inf'):
-            y_min, y_max = 0.0, 1.0
+        # کمینه/بیشینه کل تاریخچه از element_stats؛ با جابه‌جایی پنجره تغییر نمی‌کند
+        y_min, y_max = 0.0, 1.0
+        try:
+            stats = element_statistics(self.db_path)
+            stats = stats[stats['element'].isin(self.current_elements)]
+            if not stats.empty:
+                y_min = stats['min'].min() / VALUE_SCALE
+                y_max = stats['max'].max() / VALUE_SCALE
+        except Exception as e:
+            logging.error(f"Error reading element statistics: {e}")
         self.y_min_global = y_min
         self.y_max_global = y_max
 
@@ -467,41 +493,61 @@ class PlotArea(QWidget):
         self.max_y_slider.setValue(self.max_y_slider.maximum())
         self.min_y_label.setText(f"Min: {self.y_min_global:.2f}")
         self.max_y_label.setText(f"Max: {self.y_max_global:.2f}")
-        self.current_range = (0, self.total_rows)
         logging.debug("Resetting Y range")
+        self._set_window(self._latest_window())
+        if self.current_elements and any(el not in self._plot_cache() for el in self.current_elements):
+            self.load_data_for_elements(self.current_elements)
+            return
         self.plot_elements(self.current_elements)
         self.fit_data()
 
     def load_data_for_elements(self, elements):
         self.current_elements = elements or []
-        missing = [el for el in elements if el not in self.data_cache]
+        cache = self._plot_cache()
+        missing = [el for el in elements if el not in cache]
         if not missing:
             logging.debug("No missing elements, plotting directly")
             self._update_y_range()
             self.plot_elements(elements)
             return
 
-        self.progress_dialog = QProgressDialog("Loading data...", "Cancel", 0, 100, self)
-        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-        self.progress_dialog.show()
-
-        self.loader_thread = DataLoaderThread(self.db_path, missing)
-        self.loader_thread.progress.connect(self.progress_dialog.setValue)
+        progress_dialog = QProgressDialog("Loading data...", "Cancel", 0, 100, self)
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.show()
+        self.progress_dialog = progress_dialog
+
+        # با parent، thread قبلی (مثلاً پنجره‌ای که کاربر از آن رد شده) تا پایان اجرا می‌شود و نتیجه‌اش نادیده گرفته می‌شود
+        self._loading_history = cache is self.history_cache
+        window = (0, self.total_rows) if self._loading_history else self.current_range
+        self.loader_thread = DataLoaderThread(self.db_path, missing, window, self)
+        self.loader_thread.progress.connect(progress_dialog.setValue)
+        self.loader_thread.finished.connect(progress_dialog.hide)
         self.loader_thread.dataLoaded.connect(self.on_data_loaded)
         self.loader_thread.error.connect(self.on_load_error)
         self.loader_thread.start()
 
     @pyqtSlot(dict)
     def on_data_loaded(self, data):
-        self.data_cache.update(data)
+        if self.sender() is not self.loader_thread:
+            return
+        cache = self.history_cache if self._loading_history else self.data_cache
+        cache.update(data)
         self.progress_dialog.hide()
+        logging.debug(f"Data loaded, cache keys: {list(cache.keys())}")
+        if self._keep_view:
+            # پنجره جدید هنگام پیمایش: بازه Y و محدوده دید کاربر حفظ می‌شود
+            self._keep_view = False
+            self.plot_elements(self.current_elements, fit=False)
+            return
         self._update_y_range()
-        logging.debug(f"Data loaded, cache keys: {list(self.data_cache.keys())}")
         self.plot_elements(self.current_elements)
         self.fit_data()
 
     @pyqtSlot(str)
     def on_load_error(self, msg):
+        if self.sender() is not self.loader_thread:
+            return
+        self._keep_view = False
         self.progress_dialog.hide()
         QMessageBox.critical(self, "Load Error", msg)
         logging.error(f"Data load error: {msg}")
@@ -509,11 +555,15 @@ class PlotArea(QWidget):
     def refresh_plot(self):
         self.plot_widget.setLabel("bottom", self.x_axis_combo.currentText())
         logging.debug("Refreshing plot")
+        if self.current_elements and any(el not in self._plot_cache() for el in self.current_elements):
+            # تغییر بین نمودار پنجره‌ای و نمودار توزیع (کل تاریخچه)
+            self.load_data_for_elements(self.current_elements)
+            return
         self._update_y_range()
         self.plot_elements(self.current_elements)
         self.fit_data()
 
-    def plot_elements(self, elements):
+    def plot_elements(self, elements, fit=True):
         self.current_elements = elements or []
         self.plot_widget.clear()
         plot_type = self.plot_type_combo.currentText()
@@ -526,37 +576,33 @@ class PlotArea(QWidget):
 
         colors = [(200, 50, 50), (50, 180, 50), (50, 50, 200), (200, 120, 0), (150, 50, 150), (50, 180, 180), (100, 100, 100)]
         gray = (150, 150, 150)
-        min_idx, max_idx_excl = self.current_range
         legend = self.plot_widget.addLegend(offset=(10, 10)) if plot_type not in ["Histogram", "Box Plot"] else None
         self.plot_items = []
         any_data_plotted = False
         min_y, max_y = self.current_y_range
+        cache = self._plot_cache()
 
         for i, elem in enumerate(elements):
-            if elem not in self.data_cache:
+            if elem not in cache:
                 logging.warning(f"Element {elem} not in cache")
                 continue
-            x_idx, y_vals = self.data_cache[elem]
+            # Line/Scatter/Bar: فقط ردیف‌های پنجره فعلی؛ Histogram/Box Plot: کل تاریخچه. x شماره ردیف در کل تاریخچه است
+            indices, y_vals = cache[elem]
             if len(y_vals) == 0:
                 logging.warning(f"No data for element {elem}")
                 continue
 
-            max_idx_excl = min(max_idx_excl, len(y_vals)) if max_idx_excl > 0 else len(y_vals)
-            min_idx = min(min_idx, len(y_vals))
-
-            y_vals_slice = y_vals[min_idx:max_idx_excl]
-            indices = np.arange(min_idx, max_idx_excl)
             if x_type == "Index":
                 x_all = indices
             else:
-                if len(self.sample_ids) < len(y_vals):
-                    logging.warning(f"Sample IDs length ({len(self.sample_ids)}) is less than data length ({len(y_vals)})")
+                if len(self.sample_ids) <= indices.max():
+                    logging.warning(f"Sample IDs length ({len(self.sample_ids)}) is less than data length ({indices.max() + 1})")
                     continue
-                x_all = np.array(self.sample_ids)[indices].tolist()
+                x_all = np.array(self.sample_ids)[indices]
 
             # همه نقاط
             x = x_all
-            y = y_vals_slice
+            y = y_vals
 
             if len(x) == 0 or len(y) == 0:
                 logging.warning(f"No data for element {elem}")
@@ -659,10 +705,12 @@ class PlotArea(QWidget):
             self.statusMessage.emit("No valid data to plot in the selected Y range.")
             logging.warning("No valid data plotted")
         else:
-            self.statusMessage.emit(f"Plotted {len(elements)} element(s) with {plot_type}.")
+            scope = f" over all {self.total_rows} rows" if plot_type in DISTRIBUTION_PLOTS else ""
+            self.statusMessage.emit(f"Plotted {len(elements)} element(s) with {plot_type}{scope}.")
 
         self.plot_widget.addItem(self.info_text)
-        self.fit_data()
+        if fit:
+            self.fit_data()
 
     def fit_data(self):
         if not self.plot_items:
@@ -711,7 +759,7 @@ class PlotArea(QWidget):
                 dist = (x_val_i - x_val)**2 + (y[i] - y_val)**2
                 if dist < closest_dist:
                     closest_dist = dist
-                    actual_idx = min_idx + i
+                    actual_idx = int(x[i]) if x_type == "Index" else min_idx + i
                     closest_sample_id = self.sample_ids[actual_idx] if self.has_sample_id and actual_idx < len(self.sample_ids) else f"Index {actual_idx}"
                     closest_idx = actual_idx
 
@@ -754,7 +802,7 @@ class PlotArea(QWidget):
         self.progress_dialog.show()
 
         self.table_loader_thread = TableLoaderThread(
-            self.db_path, self.current_elements, self.current_range, self.has_sample_id, self.current_y_range
+            self.db_path, self.current_elements, self.current_range, self.has_sample_id, self.current_y_range, self
         )
         self.table_loader_thread.progress.connect(self.progress_dialog.setValue)
         self.table_loader_thread.dataLoaded.connect(lambda df: self._save_dataset(df, file_path))
@@ -802,9 +850,6 @@ class PlotArea(QWidget):
 
     @pyqtSlot(dict)
     def on_vis_loaded(self, data):
-        # برای جلوگیری از بسته شدن سریع پروگرس، کمی تأخیر مصنوعی اضافه می‌کنیم (اختیاری, اما برای بهبود تجربه کاربر)
-        time.sleep(0.5)  # تأخیر کوتاه برای همگام‌سازی
-
         dialog = QDialog(self)
         dialog.setWindowTitle("Additional Visualizations")
         layout = QVBoxLayout(dialog)
@@ -902,6 +947,7 @@ class MinMaxTab(QWidget):
         # Plot
         self.plot_area = PlotArea(self.db_path, self.elements, self)
         self.plot_area.statusMessage.connect(self.show_status)
+        self.plot_area.windowChanged.connect(self.load_table)
         splitter.addWidget(self.plot_area)
         splitter.setStretchFactor(1, 3)
 
@@ -982,36 +1028,15 @@ class MinMaxTab(QWidget):
         # view_menu.addAction(toggle_table_act)
 
     def _load_elements_from_db(self):
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
-            columns = [row[1] for row in cursor.fetchall()]
-            excluded_columns = {SAMPLE_ID_COL, ESI_CODE_COL}
-            valid_elements = []
-
-            for col in columns:
-                if col not in excluded_columns:
-                    query = f"SELECT [{col}] FROM {TABLE_NAME} WHERE [{col}] IS NOT NULL LIMIT 1"
-                    df = pd.read_sql(query, conn)
-                    if not df.empty:
-                        try:
-                            pd.to_numeric(df[col].iloc[0], errors='raise')
-                            valid_elements.append(col)
-                        except (ValueError, TypeError):
-                            logging.debug(f"Column {col} does not contain valid numeric data")
-                            continue
-
+            # کدهای عنصر از element_codes/element_stats؛ بدون خواندن ستون‌ها از view
+            valid_elements = element_codes(self.db_path)
             logging.debug(f"Loaded valid elements from database: {valid_elements}")
-            return sorted(valid_elements)
+            return valid_elements
         except Exception as e:
             logging.error(f"Error loading elements from database: {e}")
             # self.status.showMessage(f"Error loading elements: {str(e)}", 5000)
             return []
-        finally:
-            if conn:
-                conn.close()
 
     def filter_elements(self, text):
         for i in range(self.list_widget.count()):
@@ -1032,20 +1057,25 @@ class MinMaxTab(QWidget):
         self.color_element_combo.clear()
         if elements:
             self.color_element_combo.addItems(elements)
+        self.load_table(elements)
 
+    def load_table(self, elements=None):
+        """جدول برای پنجره ردیف‌های فعلی نمودار و بازه Y آن"""
+        if elements is None:
+            elements = [it.text() for it in self.list_widget.selectedItems()]
         if elements:
             progress_dialog = QProgressDialog("Loading table data...", "Cancel", 0, 100, self)
             progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
             progress_dialog.show()
 
             self.table_loader_thread = TableLoaderThread(
-                self.db_path, elements, self.plot_area.current_range, self.plot_area.has_sample_id, self.plot_area.current_y_range
+                self.db_path, elements, self.plot_area.current_range, self.plot_area.has_sample_id, self.plot_area.current_y_range,
+                self
             )
             self.table_loader_thread.progress.connect(progress_dialog.setValue)
             self.table_loader_thread.dataLoaded.connect(self.on_table_data_loaded)
-            self.table_loader_thread.dataLoaded.connect(progress_dialog.hide)
             self.table_loader_thread.error.connect(self.on_table_load_error)
-            self.table_loader_thread.error.connect(progress_dialog.hide)
+            self.table_loader_thread.finished.connect(progress_dialog.hide)
             self.table_loader_thread.start()
         else:
             self.table_model.setDataFrame(pd.DataFrame())
@@ -1053,6 +1083,8 @@ class MinMaxTab(QWidget):
 
     @pyqtSlot(pd.DataFrame)
     def on_table_data_loaded(self, df):
+        if self.sender() is not self.table_loader_thread:
+            return
         self.current_df = df
         self.table_model.setDataFrame(df)
         if not df.empty:
@@ -1141,6 +1173,7 @@ class MinMaxTab(QWidget):
                 self.plot_area.x_axis_combo.clear()
                 self.plot_area.x_axis_combo.addItems(["Index", "Sample ID"] if self.plot_area.has_sample_id else ["Index"])
                 self.plot_area.data_cache.clear()
+                self.plot_area.history_cache.clear()
                 self.plot_area.reset_range()
 
                 self.list_widget.clear()
@@ -1,5 +1,5 @@
 # screens/notifications/notification_tab.py
-import sqlite3
+from utils.db_pool import get_connection, transaction
 import pandas as pd
 import logging
 from PyQt6.QtWidgets import (
@@ -47,7 +47,7 @@ class NotificationTab(QWidget):
     def load_notifications(self):
             """بارگذاری نوتیفیکیشن‌ها از دیتابیس"""
             try:
-                conn = sqlite3.connect(self.db_path, timeout=30)
+                conn = get_connection(self.db_path)
                 query = """
                     SELECT 
                         n.id,
@@ -78,7 +78,6 @@ class NotificationTab(QWidget):
                     ORDER BY n.created_at DESC
                 """
                 df = pd.read_sql_query(query, conn, params=(self.user_id,))
-                conn.close()
 
                 model = QStandardItemModel()
                 model.setHorizontalHeaderLabels([
@@ -126,11 +125,9 @@ class NotificationTab(QWidget):
 
         notif_id = self.notif_table.model().index(index.row(), 0).data()
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cur = conn.cursor()
-            cur.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
-            conn.commit()
-            conn.close()
+            with transaction(self.db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notif_id,))
 
             self.load_notifications()
             QMessageBox.information(self, "Success", "Notification marked as read.")
@@ -0,0 +1,135 @@
+# utils/parsed_file_cache.py
+import os
+import sys
+import hashlib
+import logging
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; without it the cache is simply disabled
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the parser output changes so stale sidecars are not reused
+PARSER_VERSION = 4
+CACHE_DIR_NAME = "parsed_cache"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+HASH_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def default_cache_dir():
+    """parsed_cache next to the app's databases, resolved when the cache is first used.
+
+    Same base as the app's resource_path (the working directory), except in a
+    frozen build, where it is the executable's folder so the cache survives
+    restarts from another directory.
+    """
+    base = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.abspath(".")
+    return os.path.join(base, CACHE_DIR_NAME)
+
+
+class ParsedFileCache:
+    """Feather sidecars of parsed instrument files (long-format DataFrames).
+
+    Entries are keyed by path + size + mtime + a hash of the file content, so
+    an edited or replaced file never hits a stale entry. Hits are read straight
+    into a pandas DataFrame; the directory is trimmed to `max_bytes`, oldest
+    use first.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, file_path):
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{PARSER_VERSION}|{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    def load(self, file_path, key=None):
+        """Return the cached DataFrame for file_path, or None on a miss."""
+        try:
+            path = self._entry_path(key or self.cache_key(file_path))
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            # conversion to pandas copies every column anyway, so the file is not memory-mapped (and stays deletable on Windows)
+            df = feather.read_feather(path)
+            os.utime(path)  # mark as recently used for eviction
+            self.hits += 1
+            logger.debug(f"Parsed-file cache hit for {file_path}")
+            return df
+        except Exception as e:
+            logger.warning(f"Parsed-file cache read failed for {file_path}: {e}")
+            self.misses += 1
+            return None
+
+    def store(self, file_path, df, key=None):
+        """Write df as the sidecar of file_path; failures only disable caching for it."""
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(key or self.cache_key(file_path))
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            # uncompressed: a hit is a plain read with no decompression pass
+            feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+            self.evict()
+        except Exception as e:
+            logger.warning(f"Could not cache parsed data for {file_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.feather'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                logger.warning(f"Could not evict {path}: {e}")
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.feather'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+_cache = None
+
+
+def get_parsed_file_cache():
+    """Shared cache instance, or None when pyarrow is not installed.
+
+    ICP_PARSE_CACHE_DIR and ICP_PARSE_CACHE_MAX_MB override the defaults.
+    """
+    global _cache
+    if feather is None:
+        return None
+    if _cache is None:
+        cache_dir = os.environ.get("ICP_PARSE_CACHE_DIR") or default_cache_dir()
+        max_mb = os.environ.get("ICP_PARSE_CACHE_MAX_MB")
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        _cache = ParsedFileCache(cache_dir, max_bytes)
+    return _cache
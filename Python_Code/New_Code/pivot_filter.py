@@ -0,0 +1,112 @@
+# screens/pivot/pivot_filter.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Joins the cells of a row in the search index; never typed in the search box
+TEXT_SEPARATOR = '\x1f'
+
+
+class PivotFilterIndex:
+    """Filter/search index over one version of the pivot table.
+
+    Built once per pivot frame: numeric columns become float arrays and
+    Solution Labels are factorized, so min/max/selected-value filters are
+    plain NumPy boolean masks. The lowercased search text of every row
+    (label plus formatted values) is built on the first search and kept
+    until the decimal setting changes.
+    """
+
+    def __init__(self, pivot_df):
+        self.source = pivot_df
+        self.columns = list(pivot_df.columns)
+        self.n_rows = len(pivot_df)
+        self.labels = pivot_df['Solution Label'].to_numpy(dtype=object)
+        codes, uniques = pd.factorize(self.labels)
+        self.label_codes, self.label_values = codes, pd.Index(uniques, dtype=object)
+        self.numeric = {
+            col: pd.to_numeric(pivot_df[col], errors='coerce').to_numpy(dtype=float)
+            for col in self.columns if col != 'Solution Label'
+        }
+        self._text = None
+        self._text_decimals = None
+
+    def isin(self, col, values):
+        """Rows whose value in `col` is one of `values` (NaN matches NaN, as in pandas)."""
+        if col == 'Solution Label':
+            wanted = self.label_values.get_indexer(pd.Index(list(values), dtype=object))
+            mask = np.isin(self.label_codes, wanted[wanted >= 0])
+            if any(pd.isna(v) for v in values):
+                mask |= self.label_codes < 0
+            return mask
+        data = self.numeric[col]
+        numbers = pd.to_numeric(pd.Series(list(values), dtype=object), errors='coerce').to_numpy(dtype=float)
+        mask = np.isin(data, numbers[~np.isnan(numbers)])
+        if any(pd.isna(v) for v in values):
+            mask |= np.isnan(data)
+        return mask
+
+    def column_mask(self, col, filt):
+        """Mask for one column filter {'min_val', 'max_val', 'selected_values'}."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        if col != 'Solution Label':
+            data = self.numeric[col]
+            missing = np.isnan(data)
+            with np.errstate(invalid='ignore'):
+                if filt.get('min_val') is not None:
+                    mask &= (data >= filt['min_val']) | missing
+                if filt.get('max_val') is not None:
+                    mask &= (data <= filt['max_val']) | missing
+        if filt.get('selected_values'):
+            mask &= self.isin(col, filt['selected_values'])
+        return mask
+
+    def text_index(self, decimals):
+        """Lowercased 'label<sep>value<sep>...' per row, with values formatted as displayed."""
+        if self._text is None or self._text_decimals != decimals:
+            fmt = f"{{:.{decimals}f}}"
+            cells = [['' if pd.isna(v) else str(v) for v in self.labels]]
+            for data in self.numeric.values():
+                cells.append([fmt.format(x) if x == x else '' for x in data.tolist()])
+            self._text = pd.Series([TEXT_SEPARATOR.join(row) for row in zip(*cells)], dtype=object).str.lower()
+            self._text_decimals = decimals
+            logger.debug(f"Built pivot search index for {self.n_rows} rows ({decimals} decimals)")
+        return self._text
+
+    def search_mask(self, text, decimals):
+        return self.text_index(decimals).str.contains(text.lower(), regex=False).to_numpy(dtype=bool)
+
+    def mask(self, filters, search_text='', row_filter_values=None, decimals=1):
+        """Combined mask of column filters, search text and row filters."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for col, filt in filters.items():
+            if col in self.columns:
+                mask &= self.column_mask(col, filt)
+        if search_text:
+            mask &= self.search_mask(search_text, decimals)
+        for field, values in (row_filter_values or {}).items():
+            if field in self.columns:
+                selected = [k for k, v in values.items() if v]
+                if selected:
+                    mask &= self.isin(field, selected)
+        return mask
+
+    def view(self, mask, columns=None, file_ranges=None):
+        """DataFrame of the rows in `mask` (numeric columns as floats) plus a file_name column.
+
+        file_name comes from each row's position in the full pivot, so it stays
+        right when filters hide rows of earlier files.
+        """
+        positions = np.flatnonzero(mask)
+        columns = columns or self.columns
+        data = {}
+        for col in columns:
+            data[col] = self.labels[positions] if col == 'Solution Label' else self.numeric[col][positions]
+        df = pd.DataFrame(data, columns=columns)
+        file_names = np.full(self.n_rows, None, dtype=object)
+        for file in file_ranges or []:
+            file_names[file['start_pivot_row']:file['end_pivot_row'] + 1] = file['clean_name']
+        df['file_name'] = file_names[positions]
+        return df
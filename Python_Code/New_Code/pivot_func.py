@@ -0,0 +1,232 @@
+# utils/pivot_func.py
+import re
+import math
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PIVOT_SOURCE_COLUMNS = ['Solution Label', 'Element', 'Type', 'Int', 'Corr Con']
+
+
+def gcd_list(numbers):
+    if not numbers:
+        return 1
+    return reduce(math.gcd, numbers)
+
+
+def label_key(x):
+    """Natural sort key: 'Fe 259.9' -> ('fe', 259), 'OREAS 258' -> ('oreas', 258)."""
+    s = str(x).replace(' ', '')
+    m = re.search(r'(\d+)', s)
+    return (s.lower() if not m else s[:m.start()].lower(), int(m.group(1)) if m else 0)
+
+
+class PivotResult:
+    """Wide pivot frame plus the ordering metadata the pivot/result tabs keep."""
+
+    def __init__(self, pivot_df, element_order, solution_label_order, has_repeats, set_sizes):
+        self.pivot_df = pivot_df
+        self.element_order = element_order
+        self.solution_label_order = solution_label_order
+        self.has_repeats = has_repeats
+        self.set_sizes = set_sizes
+
+
+def build_pivot(samples, value_col, oxide_factors=None):
+    """Pivot long-format sample rows into one row per measurement set.
+
+    `samples` must already be restricted to Sample rows and have a clean
+    'Solution Label' column. Semantics match the original dict-based code:
+    - set size per label = rows // gcd(element counts)
+    - if an element repeats inside a set, columns become Element_1, Element_2, ...
+      and rows are (label, set number); otherwise rows are (label, n-th occurrence)
+    - rows keep the order of their first measurement, elements are natural-sorted
+    Everything is done with factorize/cumcount and NumPy index arithmetic.
+    """
+    n = len(samples)
+    labels = samples['Solution Label'].to_numpy(dtype=object)
+    raw_codes, raw_elements = pd.factorize(samples['Element'].astype(str))
+    elements = np.array([e.split('_')[0] for e in raw_elements], dtype=object)[raw_codes]
+    values = samples[value_col].to_numpy()
+
+    sl_codes, sl_uniques = pd.factorize(labels)
+    el_codes, _ = pd.factorize(elements)
+    pos = pd.Series(sl_codes).groupby(sl_codes).cumcount().to_numpy()
+
+    # set size per Solution Label via GCD of element counts
+    totals = np.bincount(sl_codes, minlength=len(sl_uniques))
+    pair_counts = pd.Series(np.ones(n, dtype=np.int64)).groupby([sl_codes, el_codes]).sum()
+    gcds = pair_counts.groupby(level=0).agg(lambda v: int(np.gcd.reduce(v.to_numpy())))
+    gcds = gcds.reindex(range(len(sl_uniques)), fill_value=1).to_numpy()
+    sizes = totals // np.maximum(gcds, 1)
+
+    group_id = pos // sizes[sl_codes]
+    keys = pd.DataFrame({'sl': sl_codes, 'gid': group_id, 'el': el_codes})
+    has_repeats = bool(keys.duplicated().any())
+
+    if has_repeats:
+        grouped = keys.groupby(['sl', 'gid', 'el'], sort=False)
+        occ = grouped.cumcount().to_numpy() + 1
+        occ_total = grouped['el'].transform('size').to_numpy()
+        element_series = pd.Series(elements, dtype=object)
+        cols = element_series.where(occ_total <= 1, element_series + '_' + pd.Series(occ).astype(str)).to_numpy(dtype=object)
+        row_sub = group_id
+    else:
+        cols = elements
+        row_sub = pd.Series(sl_codes).groupby([sl_codes, el_codes]).cumcount().to_numpy()
+
+    # rows in order of their first record
+    row_codes, _ = pd.factorize(sl_codes.astype(np.int64) * (int(row_sub.max()) + 1) + row_sub)
+    n_rows = int(row_codes.max()) + 1
+    first_record = np.full(n_rows, n, dtype=np.int64)
+    np.minimum.at(first_record, row_codes, np.arange(n))
+    row_labels = labels[first_record]
+
+    # column order as pandas builds it from row dicts: row by row, record order inside a row
+    by_row = np.argsort(row_codes, kind='stable')
+    col_codes_sorted, col_names = pd.factorize(cols[by_row])
+    col_codes = np.empty(n, dtype=np.int64)
+    col_codes[by_row] = col_codes_sorted
+    col_names = list(col_names)
+
+    if np.issubdtype(values.dtype, np.number):
+        grid = np.full((n_rows, len(col_names)), np.nan, dtype=float)
+    else:
+        grid = np.full((n_rows, len(col_names)), np.nan, dtype=object)
+    grid[row_codes, col_codes] = values
+
+    if has_repeats:
+        cells_per_row = np.bincount(row_codes, minlength=n_rows)
+        full_rows = np.flatnonzero(cells_per_row >= sizes[sl_codes[first_record]])
+        order_row = full_rows[0] if len(full_rows) else 0
+        row_cols = col_codes_sorted[row_codes[by_row] == order_row]
+        element_order = sorted([col_names[c] for c in row_cols], key=label_key)
+    else:
+        element_order = sorted(col_names, key=label_key)
+    solution_label_order = sorted(sl_uniques, key=label_key)
+
+    pivot_df = pd.DataFrame(grid, columns=col_names)
+    pivot_df.insert(0, 'Solution Label', row_labels)
+
+    if oxide_factors is not None:
+        renamed = {}
+        for k in col_names:
+            pivot_df[k] = pd.to_numeric(pivot_df[k], errors='coerce')
+            elem = k.split('_')[0]
+            suffix = '_' + k.split('_', 1)[1] if '_' in k and has_repeats else ''
+            if elem in oxide_factors:
+                oxide, factor = oxide_factors[elem]
+                pivot_df[k] = pivot_df[k] * factor
+                renamed[k] = f"{oxide}{suffix}" if suffix else oxide
+        pivot_df = pivot_df.rename(columns=renamed)
+
+    pivot_df = order_pivot_columns(pivot_df, element_order)
+    set_sizes = dict(zip(sl_uniques, sizes.tolist()))
+    return PivotResult(pivot_df, element_order, solution_label_order, has_repeats, set_sizes)
+
+
+def order_pivot_columns(pivot_df, element_order):
+    """'Solution Label', then element_order, then any remaining columns as they are."""
+    ordered = ['Solution Label'] + [c for c in element_order if c in pivot_df.columns]
+    placed = set(ordered)
+    missing = [c for c in pivot_df.columns if c not in placed]
+    return pivot_df[ordered + missing]
+
+
+def can_append_pivot(base, block):
+    """True if stacking `block` under `base` gives exactly build_pivot of the combined rows.
+
+    That holds only when the two share no Solution Label (a shared label
+    continues its occurrence/set numbering and set sizes across files) and
+    neither uses the Element_N layout (its column names and element order
+    depend on the whole dataset).
+    """
+    if base is None or block is None:
+        return True
+    if base.has_repeats or block.has_repeats:
+        return False
+    return set(base.set_sizes).isdisjoint(block.set_sizes)
+
+
+def append_pivot(base, block):
+    """Append the pivot block of one more file below an existing pivot.
+
+    Callers must check can_append_pivot first; each file's rows then stay
+    contiguous, so the block's row count is exactly the file's range in the
+    combined table. Either argument may be None.
+    """
+    if base is None:
+        return block
+    if block is None:
+        return base
+    pivot_df = pd.concat([base.pivot_df, block.pivot_df], ignore_index=True, sort=False)
+    known = set(base.element_order)
+    element_order = sorted(base.element_order + [c for c in block.element_order if c not in known], key=label_key)
+    solution_label_order = sorted(
+        dict.fromkeys(list(base.solution_label_order) + list(block.solution_label_order)), key=label_key
+    )
+    return PivotResult(
+        order_pivot_columns(pivot_df, element_order), element_order, solution_label_order,
+        False, {**base.set_sizes, **block.set_sizes}
+    )
+
+
+def dataset_fingerprint(df, columns=PIVOT_SOURCE_COLUMNS):
+    """Content hash of the columns a pivot depends on (changes on any edit)."""
+    cols = [c for c in columns if c in df.columns]
+    hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    digest = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    digest.update(str((len(df), cols)).encode())
+    return digest.hexdigest()
+
+
+class PivotCache:
+    """LRU cache of PivotResult objects keyed by (dataset fingerprint, pivot options).
+
+    Frames are copied on the way in and out, so callers may edit the pivot
+    they get back without corrupting the cache.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        logger.debug(f"Pivot cache hit ({self.hits} hits / {self.misses} misses)")
+        return self._copy(result)
+
+    def put(self, key, result):
+        self._entries[key] = self._copy(result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    @staticmethod
+    def _copy(result):
+        return PivotResult(
+            result.pivot_df.copy(), list(result.element_order), list(result.solution_label_order),
+            result.has_repeats, dict(result.set_sizes)
+        )
+
+
+# Shared by PivotCreator and ResultsFrame
+pivot_cache = PivotCache(maxsize=16)
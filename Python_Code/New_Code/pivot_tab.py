@@ -7,6 +7,7 @@ from PyQt6.QtGui import QFont, QPixmap, QColor
 from PyQt6.QtCore import Qt
 from .pivot_table_model import PivotTableModel
 from .pivot_creator import PivotCreator
+from .pivot_filter import PivotFilterIndex
 from .pivot_exporter import PivotExporter
 from .oxide_factors import oxide_factors
 import pandas as pd
@@ -107,6 +108,7 @@ class PivotTab(QWidget):
         self.column_widths = {}
         self.cached_formatted = {}
         self.current_view_df = None
+        self._filter_index = None
         self._inline_duplicates = {}
         self._inline_duplicates_display = {}
         self.current_plot_dialog = None
@@ -141,7 +143,7 @@ class PivotTab(QWidget):
         self.decimal_places.addItems(["0", "1", "2", "3"])
         self.decimal_places.setCurrentText("1")
         self.decimal_places.setFixedWidth(40)
-        self.decimal_places.currentTextChanged.connect(self.update_pivot_display)
+        self.decimal_places.currentTextChanged.connect(self.on_decimal_places_changed)
         subtab_layout.addWidget(self.decimal_places)
         
         self.use_int_var.toggled.connect(self.pivot_creator.create_pivot)
@@ -288,6 +290,20 @@ class PivotTab(QWidget):
         except (ValueError, TypeError):
             return "" if pd.isna(x) or x is None else str(x)
 
+    def current_decimals(self):
+        try:
+            return int(self.decimal_places.currentText())
+        except ValueError:
+            return 1
+
+    def on_decimal_places_changed(self):
+        # بدون جستجو فقط فرمت سلول‌ها عوض می‌شود
+        model = self.table_view.model()
+        if isinstance(model, PivotTableModel) and not self.search_var.text().strip():
+            model.refresh_decimals()
+        else:
+            self.update_pivot_display()
+
     def update_duplicate_threshold(self):
         try:
             self.duplicate_threshold = float(self.duplicate_threshold_edit.text())
@@ -373,66 +389,19 @@ class PivotTab(QWidget):
             self.table_view.frozenTableView.setModel(None)
             return
 
-        # Convert potentially numeric columns to numeric type
-        df = self.pivot_data.copy()
-        for col in df.columns:
-            if col != 'Solution Label':
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                    # self.logger.debug(f"Converted column {col} to numeric")
-                except Exception as e:
-                    self.logger.debug(f"Column {col} not converted to numeric: {str(e)}")
-
-        self.logger.debug(f"Pivot data shape before filtering: {df.shape}")
-
-        # Apply filters
-        mask = pd.Series(True, index=df.index)  # Initialize mask with all True
-        for col, filt in self.filters.items():
-            if col in df.columns:
-                col_data = pd.to_numeric(df[col], errors='coerce') if col != 'Solution Label' else df[col]
-                if 'min_val' in filt and filt['min_val'] is not None:
-                    try:
-                        min_mask = (col_data >= filt['min_val']) | col_data.isna()
-                        mask = mask & min_mask
-                        self.logger.debug(f"Applied min filter {filt['min_val']} on column {col}, rows left: {mask.sum()}")
-                    except Exception as e:
-                        self.logger.error(f"Error applying min filter on {col}: {str(e)}")
-                if 'max_val' in filt and filt['max_val'] is not None:
-                    try:
-                        max_mask = (col_data <= filt['max_val']) | col_data.isna()
-                        mask = mask & max_mask
-                        self.logger.debug(f"Applied max filter {filt['max_val']} on column {col}, rows left: {mask.sum()}")
-                    except Exception as e:
-                        self.logger.error(f"Error applying max filter on {col}: {str(e)}")
-                if 'selected_values' in filt and filt['selected_values']:
-                    try:
-                        selected_values = filt['selected_values']  # No conversion for non-numeric
-                        selected_mask = col_data.isin(selected_values)
-                        mask = mask & selected_mask
-                        self.logger.debug(f"Applied selected values filter on column {col}: {selected_values}, rows left: {mask.sum()}")
-                    except Exception as e:
-                        self.logger.error(f"Error applying selected values filter on {col}: {str(e)}")
-
-        # Apply combined mask
-        try:
-            df = df[mask]
-            self.logger.debug(f"Data shape after all filters: {df.shape}")
-        except Exception as e:
-            self.logger.error(f"Error applying combined filter mask: {str(e)}")
-            df = self.pivot_data.copy()  # Fallback to original if error
+        # Numeric arrays / label codes are built once per pivot version
+        if self._filter_index is None or self._filter_index.source is not self.pivot_data:
+            self._filter_index = PivotFilterIndex(self.pivot_data)
+        index = self._filter_index
+        self.logger.debug(f"Pivot data shape before filtering: {self.pivot_data.shape}")
 
         s = self.search_var.text().strip().lower()
-        if s:
-            search_mask = df.apply(lambda r: r.astype(str).str.lower().str.contains(s, na=False).any(), axis=1)
-            df = df[search_mask]
-            self.logger.debug(f"Applied search filter '{s}', rows left: {len(df)}")
-
-        for field, values in self.row_filter_values.items():
-            if field in df.columns:
-                selected = [k for k, v in values.items() if v]
-                if selected:
-                    df = df[df[field].isin(selected)]
-                    self.logger.debug(f"Applied row filter on {field}: {selected}, rows left: {len(df)}")
+        try:
+            mask = index.mask(self.filters, s, self.row_filter_values, self.current_decimals())
+        except Exception as e:
+            self.logger.error(f"Error applying filters: {str(e)}")
+            mask = np.ones(index.n_rows, dtype=bool)
+        self.logger.debug(f"Rows left after filters and search '{s}': {int(mask.sum())}")
 
         selected_cols = ['Solution Label']
         if self.use_oxide_var.isChecked():
@@ -440,25 +409,14 @@ class PivotTab(QWidget):
                 if field == 'Element':
                     selected_cols.extend([
                         oxide_factors[el][0] for el, v in values.items()
-                        if v and el in oxide_factors and oxide_factors[el][0] in df.columns
+                        if v and el in oxide_factors and oxide_factors[el][0] in index.columns
                     ])
         else:
             for field, values in self.column_filter_values.items():
                 if field == 'Element':
-                    selected_cols.extend([k for k, v in values.items() if k in df.columns])
-
-        if len(selected_cols) > 1:
-            df = df[selected_cols]
- 
-        df = df.reset_index(drop=True)
-        df['file_name'] = None
-        for file in self.app.file_ranges:
-            start = file['start_pivot_row']
-            end = file['end_pivot_row']
-            clean_name = file['clean_name']
-            mask = df.index[(df.index >= start) & (df.index <= end)]
-            if len(mask) > 0:
-                df.loc[mask, 'file_name'] = clean_name
+                    selected_cols.extend([k for k, v in values.items() if k in index.columns])
+
+        df = index.view(mask, selected_cols if len(selected_cols) > 1 else None, self.app.file_ranges)
 
         self.current_view_df = df
         self.logger.debug(f"Current view data shape: {df.shape}")
@@ -474,9 +432,14 @@ class PivotTab(QWidget):
             if sol_label in self._inline_duplicates_display:
                 combined_rows.append((sol_label, self._inline_duplicates_display[sol_label]))
 
-        model = PivotTableModel(self, df, combined_rows)
-        self.table_view.setModel(model)
-        self.table_view.frozenTableView.setModel(model)
+        # Only the filters changed: refill the current model instead of replacing it
+        model = self.table_view.model()
+        if isinstance(model, PivotTableModel):
+            model.set_data(df, combined_rows)
+        else:
+            model = PivotTableModel(self, df, combined_rows)
+            self.table_view.setModel(model)
+            self.table_view.frozenTableView.setModel(model)
         self.table_view.update_frozen_columns()
         self.table_view.model().layoutChanged.emit()
         self.table_view.frozenTableView.model().layoutChanged.emit()
@@ -608,6 +571,7 @@ class PivotTab(QWidget):
         self.element_order = None
         self.column_widths.clear()
         self.cached_formatted.clear()
+        self._filter_index = None
         self._inline_duplicates.clear()
         self._inline_duplicates_display.clear()
         self.filters.clear()
@@ -1,18 +1,39 @@
 from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
 from PyQt6.QtGui import QColor
 import pandas as pd
+import numpy as np
 import logging
 
+# Rows are formatted lazily in blocks of this size, one column at a time
+FORMAT_BLOCK_ROWS = 256
+
+# Row kinds in the row map
+ROW_PIVOT, ROW_CRM, ROW_DIFF = 0, 1, 2
+
+# Background palette; rows/cells store an index into it
+BACKGROUNDS = [QColor("#f9f9f9"), QColor("white"), QColor("#FFF5E4"),
+               QColor("#ECFFC4"), QColor("#FFCCCC"), QColor("#E6E6FA")]
+BG_EVEN, BG_ODD, BG_CRM, BG_IN_RANGE, BG_OUT_RANGE, BG_DIFF = range(6)
+DIFF_TAG_BACKGROUNDS = {'in_range': BG_IN_RANGE, 'out_range': BG_OUT_RANGE}
+
+
 class PivotTableModel(QAbstractTableModel):
-    """Custom table model for pivot table, optimized for large datasets with editable cells."""
+    """Custom table model for pivot table, optimized for large datasets with editable cells.
+
+    Columns are kept as NumPy arrays, the view rows (pivot rows plus inline
+    CRM/duplicate rows) as flat index arrays, and display strings are
+    formatted per block of rows and cached until the decimal setting changes,
+    so painting a cell is a couple of array lookups.
+    """
     def __init__(self, pivot_tab, df=None, crm_rows=None):
         super().__init__()
         self.logger = logging.getLogger(__name__)
         self.pivot_tab = pivot_tab
         self._df = df if df is not None else pd.DataFrame()
         self._crm_rows = crm_rows if crm_rows is not None else []
-        self._row_info = []
         self._column_widths = {}
+        self._decimals = self.current_decimals()
+        self._load_columns()
         self._build_row_info()
 
     def set_data(self, df, crm_rows=None):
@@ -20,90 +41,151 @@ class PivotTableModel(QAbstractTableModel):
         self.beginResetModel()
         self._df = df.copy()
         self._crm_rows = crm_rows if crm_rows is not None else []
+        self._decimals = self.current_decimals()
+        self._load_columns()
         self._build_row_info()
         self.endResetModel()
 
+    def current_decimals(self):
+        """Decimal places from the results frame's combo, else the pivot tab's own, else 1."""
+        for combo in (getattr(getattr(self.pivot_tab, 'results_frame', None), 'decimal_combo', None),
+                      getattr(self.pivot_tab, 'decimal_places', None)):
+            try:
+                return int(combo.currentText())
+            except (AttributeError, ValueError):
+                continue
+        return 1
+
+    def refresh_decimals(self):
+        """Re-read the decimal setting; drops the formatted cache only if it changed."""
+        decimals = self.current_decimals()
+        if decimals == self._decimals:
+            return
+        self._decimals = decimals
+        self._formatted.clear()
+        if self.rowCount() and self.columnCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1),
+                                  [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole])
+
+    def _load_columns(self):
+        self._columns = [str(c) for c in self._df.columns]
+        self._raw = [self._df.iloc[:, i].to_numpy(dtype=object) for i in range(self._df.shape[1])]
+        self._numeric = []
+        for name, raw in zip(self._columns, self._raw):
+            if name == "Solution Label":
+                self._numeric.append(None)
+            else:
+                self._numeric.append(pd.to_numeric(pd.Series(raw), errors='coerce').to_numpy(dtype=float))
+        self._alignments = [
+            Qt.AlignmentFlag.AlignLeft if name == "Solution Label" else Qt.AlignmentFlag.AlignCenter
+            for name in self._columns
+        ]
+        self._formatted = {}
+
     def _build_row_info(self):
-        self._row_info = []
-        for row_idx in range(len(self._df)):
-            self._row_info.append({'type': 'pivot', 'index': row_idx})
-            sol_label = self._df.iloc[row_idx]['Solution Label']
-            for grp_idx, (sl, cdata) in enumerate(self._crm_rows):
-                if sl == sol_label:
-                    for sub in range(len(cdata)):
-                        self._row_info.append({'type': 'crm', 'group': grp_idx, 'sub': sub})
-                    break
+        """Flat row map: kind / pivot row / CRM group / sub-row per view row, plus backgrounds."""
+        n_pivot = len(self._df)
+        # first group per Solution Label, as the original linear search found it
+        group_by_label = {}
+        for grp_idx, (sl, _) in enumerate(self._crm_rows):
+            group_by_label.setdefault(sl, grp_idx)
+        labels = (self._df['Solution Label'].tolist()
+                  if 'Solution Label' in self._df.columns else [None] * n_pivot)
+        first_row_by_label = {}
+        for row_idx, label in enumerate(labels):
+            first_row_by_label.setdefault(label, row_idx)
+
+        kinds, pivot_rows, groups, subs = [], [], [], []
+        self._cell_backgrounds = {}
+        for row_idx, label in enumerate(labels):
+            kinds.append(ROW_PIVOT)
+            pivot_rows.append(row_idx)
+            groups.append(-1)
+            subs.append(-1)
+            grp_idx = group_by_label.get(label)
+            if grp_idx is None:
+                continue
+            # sub-rows come in pairs: CRM/duplicate row, then its Diff (%) row
+            for sub, (_, tags) in enumerate(self._crm_rows[grp_idx][1]):
+                if sub % 2 == 1:
+                    if tags:
+                        self._cell_backgrounds[len(kinds)] = self._diff_backgrounds(tags)
+                    kinds.append(ROW_DIFF)
+                else:
+                    kinds.append(ROW_CRM)
+                pivot_rows.append(first_row_by_label[label])
+                groups.append(grp_idx)
+                subs.append(sub)
+
+        self._row_kind = np.array(kinds, dtype=np.int8)
+        self._row_pivot = np.array(pivot_rows, dtype=np.int64)
+        self._row_group = np.array(groups, dtype=np.int64)
+        self._row_sub = np.array(subs, dtype=np.int64)
+        self._row_background = np.where(self._row_pivot % 2 == 0, BG_EVEN, BG_ODD)
+        self._row_background[self._row_kind == ROW_CRM] = BG_CRM
+
+    def _diff_backgrounds(self, tags):
+        """Per-cell colours of a diff row; tags are a list by column position or a dict by column name."""
+        if isinstance(tags, dict):
+            cell_tags = [tags.get(name, tags.get(i)) for i, name in enumerate(self._columns)]
+        else:
+            cell_tags = [tags[i] if i < len(tags) else None for i in range(len(self._columns))]
+        return np.array([DIFF_TAG_BACKGROUNDS.get(tag, BG_DIFF) for tag in cell_tags])
+
+    def _format_block(self, block, col):
+        """Display strings for one column of one block of view rows."""
+        start = block * FORMAT_BLOCK_ROWS
+        stop = min(start + FORMAT_BLOCK_ROWS, len(self._row_kind))
+        pivot_rows = self._row_pivot[start:stop]
+        raw = self._raw[col][pivot_rows]
+        numeric = self._numeric[col]
+        fmt = f"{{:.{self._decimals}f}}"
+        if numeric is None:
+            strings = ["" if pd.isna(v) else str(v) for v in raw]
+        else:
+            strings = [
+                fmt.format(n) if n == n else ("" if pd.isna(v) else str(v))
+                for n, v in zip(numeric[pivot_rows], raw)
+            ]
+        for offset in np.flatnonzero(self._row_kind[start:stop] != ROW_PIVOT):
+            row = start + offset
+            row_data = self._crm_rows[self._row_group[row]][1][self._row_sub[row]][0]
+            value = row_data[col] if col < len(row_data) else None
+            strings[offset] = str(value) if value else ""
+        return strings
+
+    def display_text(self, row, col):
+        block = row // FORMAT_BLOCK_ROWS
+        strings = self._formatted.get((block, col))
+        if strings is None:
+            strings = self._format_block(block, col)
+            self._formatted[(block, col)] = strings
+        return strings[row - block * FORMAT_BLOCK_ROWS]
 
     def rowCount(self, parent=QModelIndex()):
-        return len(self._row_info)
+        return len(self._row_kind)
 
     def columnCount(self, parent=QModelIndex()):
-        return self._df.shape[1]
+        return len(self._columns)
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
-        if not index.isValid() or index.row() >= len(self._row_info):
+        if not index.isValid() or index.row() >= len(self._row_kind):
             return None
 
         row = index.row()
         col = index.column()
-        col_name = self._df.columns[col]
-        info = self._row_info[row]
-
-        is_crm_row = False
-        is_diff_row = False
-        crm_row_data = None
-        tags = None
-        pivot_row = row
-
-        if info['type'] == 'pivot':
-            pivot_row = info['index']
-        else:
-            grp = info['group']
-            sub = info['sub']
-            _, crm_data = self._crm_rows[grp]
-            if sub == 0:
-                is_crm_row = True
-                crm_row_data = crm_data[0][0]
-                tags = crm_data[0][1]
-            elif sub == 1:
-                is_diff_row = True
-                crm_row_data = crm_data[1][0]
-                tags = crm_data[1][1]
-            pivot_row = self._df.index[self._df['Solution Label'] == self._crm_rows[grp][0]].tolist()[0]
 
         if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.EditRole:
-            # استفاده از self.pivot_tab.results_frame.decimal_combo برای تعداد اعشار
-            try:
-                dec = int(self.pivot_tab.results_frame.decimal_combo.currentText())
-            except (AttributeError, ValueError):
-                self.logger.warning("decimal_combo not available or invalid, using default decimal places (1)")
-                dec = 1  # مقدار پیش‌فرض در صورت عدم وجود decimal_combo
-
-            if is_crm_row or is_diff_row:
-                value = crm_row_data[col]
-                return str(value) if value else ""
-            else:
-                value = self._df.iloc[pivot_row, col]
-                if col_name != "Solution Label" and pd.notna(value):
-                    try:
-                        return f"{float(value):.{dec}f}"
-                    except (ValueError, TypeError):
-                        return "" if pd.isna(value) else str(value)
-                return str(value) if pd.notna(value) else ""
+            return self.display_text(row, col)
 
         elif role == Qt.ItemDataRole.BackgroundRole:
-            if is_crm_row:
-                return QColor("#FFF5E4")
-            elif is_diff_row and tags:
-                if tags[col] == "in_range":
-                    return QColor("#ECFFC4")
-                elif tags[col] == "out_range":
-                    return QColor("#FFCCCC")
-                return QColor("#E6E6FA")
-            return QColor("#f9f9f9") if pivot_row % 2 == 0 else QColor("white")
+            cells = self._cell_backgrounds.get(row)
+            if cells is not None:
+                return BACKGROUNDS[cells[col]]
+            return BACKGROUNDS[self._row_background[row]]
 
         elif role == Qt.ItemDataRole.TextAlignmentRole:
-            return Qt.AlignmentFlag.AlignLeft if col_name == "Solution Label" else Qt.AlignmentFlag.AlignCenter
+            return self._alignments[col]
 
         return None
 
@@ -121,14 +203,13 @@ class PivotTableModel(QAbstractTableModel):
 
         row = index.row()
         col = index.column()
-        col_name = self._df.columns[col]
-        info = self._row_info[row]
+        col_name = self._columns[col]
         self.logger.debug(f"setData called for row {row}, col {col} ({col_name}), value: '{value}'")
 
         try:
-            if info['type'] == 'pivot':
+            if self._row_kind[row] == ROW_PIVOT:
                 # Get the solution label from the view
-                solution_label = self._df.iloc[info['index']]['Solution Label']
+                solution_label = self._df['Solution Label'].iat[self._row_pivot[row]]
                 # Find the row in the full pivot_data
                 full_df = self.pivot_tab.results_frame.last_filtered_data
                 full_row_idx = full_df[full_df['Solution Label'] == solution_label].index
@@ -151,6 +232,7 @@ class PivotTableModel(QAbstractTableModel):
                         except ValueError:
                             self.logger.warning(f"Invalid numeric value '{value}' for column {col_name}")
                             return False
+                self._formatted.pop((row // FORMAT_BLOCK_ROWS, col), None)
             else:
                 self.logger.warning("Editing CRM rows is not allowed")
                 return False
@@ -170,9 +252,9 @@ class PivotTableModel(QAbstractTableModel):
     def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
         if role == Qt.ItemDataRole.DisplayRole:
             if orientation == Qt.Orientation.Horizontal:
-                return str(self._df.columns[section])
+                return self._columns[section]
             return str(section + 1)
         return None
 
     def set_column_width(self, col, width):
-        self._column_widths[col] = width
\ No newline at end of file
+        self._column_widths[col] = width
@@ -6,6 +6,7 @@ from datetime import datetime
 import pandas as pd
 import numpy as np
 from PyQt6.QtWidgets import QFileDialog, QMessageBox, QCheckBox
+from utils.undo_journal import app_journal
 
 logger = logging.getLogger(__name__)
 
@@ -69,7 +70,7 @@ def save_project(app,save_path):
             'rm_check': [
                 'rm_df', 'positions_df', 'original_df', 'corrected_df', 'pivot_df',
                 'initial_rm_df', 'empty_rows_from_check', 'corrected_drift',
-                'undo_stack', 'navigation_list', 'current_nav_index',
+                'navigation_list', 'current_nav_index',
                 'selected_element', 'current_label', 'elements', 'solution_labels',
                 'selected_row', 'original_rm_values', 'display_rm_values',
                 'current_valid_row_ids', 'current_slope', 'keyword',
@@ -204,7 +205,6 @@ def save_project(app,save_path):
                         if hasattr(tab_obj, 'rm_handler'):
                             handler = tab_obj.rm_handler
                             state['rm_drift_handler_state'] = {
-                                'undo_stack': handler.undo_stack,
                                 'manual_corrections': handler.manual_corrections,
                                 'ignored_pivots': list(handler.ignored_pivots),
                             }
@@ -244,6 +244,8 @@ def load_project(app):
 
         # Full reset
         app.reset_app_state()
+        # undo steps are not saved in projects; the ones of the previous session refer to replaced data
+        app_journal(app).clear()
 
         # Restore main data
         main_state = project_data.get('main_window', {})
@@ -379,12 +381,6 @@ def load_project(app):
                         tab_obj.stepwise_checkbox.setChecked(state['stepwise_state'])
                     if 'keyword' in state and hasattr(tab_obj, 'keyword_entry') and hasattr(tab_obj.keyword_entry, 'setText'):
                         tab_obj.keyword_entry.setText(state['keyword'])
-                    if 'undo_stack' in state:
-                        restored = []
-                        for cdf, rdf, cdrift in state['undo_stack']:
-                            restored.append((cdf.copy(deep=True), rdf.copy(deep=True), cdrift.copy()))
-                        tab_obj.undo_stack = restored
-                        tab_obj.undo_button.setEnabled(len(restored) > 0)
 
                     if 'elements' in state and 'solution_labels' in state:
                         tab_obj.elements = state['elements']
@@ -1,5 +1,5 @@
 import sys
-import sqlite3
+from utils.db_pool import get_connection, read_frame, fetch_all, fetch_one, transaction, close_connections
 import pandas as pd
 import re
 import logging
@@ -153,23 +153,17 @@ class LoadDeleteFilesDialogThread(QThread):
             logger.info(f"Loading {len(self.file_names)} unique files for deletion dialog")
             self.progress_updated.emit(10)
           
-            # Single database connection for all queries
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-          
             total_files = len(self.file_names)
             processed = 0
           
             # Use IN clause for better performance instead of individual queries
             placeholders = ','.join(['?'] * total_files)
-            cursor.execute(f"""
+            results = fetch_all(self.db_path, f"""
                 SELECT file_name, COUNT(*) as record_count
                 FROM crm_data
                 WHERE file_name IN ({placeholders})
                 GROUP BY file_name
             """, self.file_names)
-          
-            results = cursor.fetchall()
             self.progress_updated.emit(80)
           
             # Create record_counts dictionary from results
@@ -181,7 +175,6 @@ class LoadDeleteFilesDialogThread(QThread):
                 if file_name not in self.record_counts:
                     self.record_counts[file_name] = 0
           
-            conn.close()
             self.progress_updated.emit(100)
           
             logger.info(f"Loaded record counts for {len(self.record_counts)} files")
@@ -191,6 +184,9 @@ class LoadDeleteFilesDialogThread(QThread):
             logger.error(f"Error loading delete files dialog: {str(e)}")
             self.error_occurred.emit(f"Failed to load files for deletion: {str(e)}")
             self.progress_updated.emit(100)
+        finally:
+            # اتصال pool متعلق به همین thread است
+            close_connections(self.db_path)
 
 class DeleteFilesDialog(QDialog):
     def __init__(self, parent=None, file_names=None, db_path=None):
@@ -387,9 +383,7 @@ class DataLoaderThread(QThread):
             logger.debug(f"Loading data from {self.db_path}")
             self.progress_updated.emit(20)
             print("omidam :",self.db_path)
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query("SELECT * FROM crm_data", conn)
-            conn.close()
+            df = read_frame(self.db_path, "SELECT * FROM crm_data")
             self.progress_updated.emit(60)
             if 'date' not in df.columns or df['date'].isna().all():
                 df['date'] = df['file_name'].apply(extract_date)
@@ -412,6 +406,9 @@ class DataLoaderThread(QThread):
         except Exception as e:
             logger.error(f"Data loading error: {str(e)}")
             self.error_occurred.emit(f"Failed to load data: {str(e)}")
+        finally:
+            # اتصال pool متعلق به همین thread است
+            close_connections(self.db_path)
 
 class FilterThread(QThread):
     filtered_data = pyqtSignal(pd.DataFrame, pd.DataFrame)
@@ -655,9 +652,7 @@ class OutOfRangeThread(QThread):
         try:
             self.progress_updated.emit(20)
             logger.info(f"Starting OutOfRangeThread for file: {self.file_name}")
-            conn = sqlite3.connect(self.ver_db_path)
-            df = pd.read_sql_query("SELECT * FROM crm_data WHERE file_name = ?", conn, params=(self.file_name,))
-            conn.close()
+            df = read_frame(self.ver_db_path, "SELECT * FROM crm_data WHERE file_name = ?", params=(self.file_name,))
             crm_df = df[df['crm_id'] != 'BLANK'].copy()
             blank_df = df[df['crm_id'] == 'BLANK'].copy()
             crm_df['norm_crm_id'] = crm_df['crm_id'].apply(self.normalize_crm_id)
@@ -712,6 +707,9 @@ class OutOfRangeThread(QThread):
             logger.error(f"Error computing out of range for {self.file_name}: {str(e)}")
             self.out_of_range_data.emit(pd.DataFrame())
             self.progress_updated.emit(100)
+        finally:
+            # اتصال pool متعلق به همین thread است
+            close_connections(self.ver_db_path)
 
     def normalize_crm_id(self, crm_id):
         """Extract numeric part from CRM ID (e.g., 'CRM 258b' → '258')."""
@@ -741,21 +739,18 @@ class OutOfRangeThread(QThread):
             self.verification_cache[cache_key] = None
             return None
         try:
-            conn = sqlite3.connect(self.ver_db_path)
-            cursor = conn.cursor()
+            cursor = get_connection(self.ver_db_path).cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = [row[0] for row in cursor.fetchall()]
             table_name = "oreas_hs j" if re.match(r'(?i)oreas', crm_id) else "pivot_crm"
             if table_name not in tables:
                 logger.error(f"Table {table_name} does not exist in database")
-                conn.close()
                 self.verification_cache[cache_key] = None
                 return None
             cursor.execute(f"PRAGMA table_info({table_name})")
             cols = [x[1] for x in cursor.fetchall()]
             if 'CRM ID' not in cols:
                 logger.error(f"Column 'CRM ID' not found in {table_name}")
-                conn.close()
                 self.verification_cache[cache_key] = None
                 return None
             element_base = element.split()[0] if ' ' in element else element
@@ -767,7 +762,6 @@ class OutOfRangeThread(QThread):
             crm_data = cursor.fetchall()
             if not crm_data:
                 logger.warning(f"No CRM data found for {crm_id}")
-                conn.close()
                 self.verification_cache[cache_key] = None
                 return None
             for row in crm_data:
@@ -791,9 +785,6 @@ class OutOfRangeThread(QThread):
             logger.error(f"Error querying verification database: {str(e)}")
             self.verification_cache[cache_key] = None
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     def select_best_blank(self, crm_row, blank_df, ver_value):
         if blank_df.empty or ver_value is None:
@@ -1204,17 +1195,45 @@ class QCTab(QWidget):
     def create_settings_table(self):
         """ایجاد جدول تنظیمات در دیتابیس اگر وجود نداشته باشد."""
         try:
-            conn = sqlite3.connect(self.crm_db_path)
-            cursor = conn.cursor()
-            # بررسی وجود جدول settings
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
-            if cursor.fetchone():
-                logger.debug("Settings table already exists")
-            else:
-                # ایجاد جدول جدید
-                cursor.execute("""
-                    CREATE TABLE settings (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+            with transaction(self.crm_db_path) as conn:
+                # بررسی وجود جدول settings
+                if conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'").fetchone():
+                    logger.debug("Settings table already exists")
+                else:
+                    # ایجاد جدول جدید
+                    conn.execute("""
+                        CREATE TABLE settings (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            device TEXT,
+                            element TEXT,
+                            crm_id TEXT,
+                            from_date TEXT,
+                            to_date TEXT,
+                            percentage TEXT,
+                            best_wl_checked INTEGER,
+                            apply_blank_checked INTEGER
+                        )
+                    """)
+                    logger.debug("Settings table created")
+                    # درج ردیف پیش‌فرض
+                    conn.execute("""
+                        INSERT INTO settings (
+                            device, element, crm_id, from_date, to_date,
+                            percentage, best_wl_checked, apply_blank_checked
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, ("All Devices", "All Elements", "All CRM IDs", "", "", "10", 1, 0))
+                    logger.info("Settings table initialized with default values")
+        except Exception as e:
+            logger.error(f"Error creating settings table: {str(e)}")
+            raise
+
+    def create_settings_table(self):
+        """ایجاد جدول تنظیمات در دیتابیس اگر وجود نداشته باشد."""
+        try:
+            with transaction(self.crm_db_path) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS settings (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
                         device TEXT,
                         element TEXT,
                         crm_id TEXT,
@@ -1225,61 +1244,21 @@ class QCTab(QWidget):
                         apply_blank_checked INTEGER
                     )
                 """)
-                logger.debug("Settings table created")
-                # درج ردیف پیش‌فرض
-                cursor.execute("""
-                    INSERT INTO settings (
-                        device, element, crm_id, from_date, to_date,
-                        percentage, best_wl_checked, apply_blank_checked
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, ("All Devices", "All Elements", "All CRM IDs", "", "", "10", 1, 0))
-                logger.info("Settings table initialized with default values")
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Error creating settings table: {str(e)}")
-            raise
-        finally:
-            conn.close()
-
-    def create_settings_table(self):
-        """ایجاد جدول تنظیمات در دیتابیس اگر وجود نداشته باشد."""
-        try:
-            conn = sqlite3.connect(self.crm_db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    device TEXT,
-                    element TEXT,
-                    crm_id TEXT,
-                    from_date TEXT,
-                    to_date TEXT,
-                    percentage TEXT,
-                    best_wl_checked INTEGER,
-                    apply_blank_checked INTEGER
-                )
-            """)
-            # بررسی وجود ردیف
-            cursor.execute("SELECT COUNT(*) FROM settings WHERE id = 1")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("""
-                    INSERT INTO settings (
-                        id, device, element, crm_id, from_date, to_date,
-                        percentage, best_wl_checked, apply_blank_checked
-                    ) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, ("mass", "", "", "", "", "10", 1, 0))
-            conn.commit()
+                # بررسی وجود ردیف
+                if conn.execute("SELECT COUNT(*) FROM settings WHERE id = 1").fetchone()[0] == 0:
+                    conn.execute("""
+                        INSERT INTO settings (
+                            id, device, element, crm_id, from_date, to_date,
+                            percentage, best_wl_checked, apply_blank_checked
+                        ) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, ("mass", "", "", "", "", "10", 1, 0))
             logger.info("Settings table initialized")
         except Exception as e:
             logger.error(f"Error creating settings table: {str(e)}")
-        finally:
-            conn.close()
 
     def save_settings(self):
         """ذخیره تنظیمات فعلی در دیتابیس."""
         try:
-            conn = sqlite3.connect(self.crm_db_path)
-            cursor = conn.cursor()
             # اعتبارسنجی تاریخ
             from_date = self.from_date_edit.text().strip()
             if from_date and not validate_jalali_date(from_date):
@@ -1291,35 +1270,29 @@ class QCTab(QWidget):
             percentage = self.percentage_edit.text().strip()
             if not validate_percentage(percentage):
                 percentage = "10"
-            cursor.execute("""
-                UPDATE settings SET
-                    device = ?, element = ?, crm_id = ?, from_date = ?, to_date = ?,
-                    percentage = ?, best_wl_checked = ?, apply_blank_checked = ?
-                WHERE id = 1
-            """, (
-                self.device_combo.currentText(),
-                self.selected_element,
-                self.crm_combo.currentText(),
-                from_date,
-                to_date,
-                percentage,
-                1 if self.best_wl_check.isChecked() else 0,
-                1 if self.apply_blank_check.isChecked() else 0
-            ))
-            conn.commit()
+            with transaction(self.crm_db_path) as conn:
+                conn.execute("""
+                    UPDATE settings SET
+                        device = ?, element = ?, crm_id = ?, from_date = ?, to_date = ?,
+                        percentage = ?, best_wl_checked = ?, apply_blank_checked = ?
+                    WHERE id = 1
+                """, (
+                    self.device_combo.currentText(),
+                    self.selected_element,
+                    self.crm_combo.currentText(),
+                    from_date,
+                    to_date,
+                    percentage,
+                    1 if self.best_wl_check.isChecked() else 0,
+                    1 if self.apply_blank_check.isChecked() else 0
+                ))
             logger.debug("Settings saved to database")
         except Exception as e:
             logger.error(f"Error saving settings: {str(e)}")
-        finally:
-            conn.close()
 
     def load_settings(self):
         try:
-            conn = sqlite3.connect(self.crm_db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM settings WHERE id = 1")
-            row = cursor.fetchone()
-            conn.close()
+            row = fetch_one(self.crm_db_path, "SELECT * FROM settings WHERE id = 1")
             if not row:
                 logger.warning("No settings found")
                 return
@@ -1588,11 +1561,7 @@ class QCTab(QWidget):
                 'apply_blank_checked': 1 if self.apply_blank_check.isChecked() else 0
             }
             # بررسی تغییرات با تنظیمات قبلی
-            conn = sqlite3.connect(self.crm_db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM settings WHERE id = 1")
-            saved_settings = cursor.fetchone()
-            conn.close()
+            saved_settings = fetch_one(self.crm_db_path, "SELECT * FROM settings WHERE id = 1")
             if saved_settings:
                 saved_settings_dict = {
                     'device': saved_settings[1],
@@ -1810,14 +1779,12 @@ class QCTab(QWidget):
             self.verification_cache[cache_key] = None
             return None
         try:
-            conn = sqlite3.connect(self.ver_db_path)
-            cursor = conn.cursor()
+            cursor = get_connection(self.ver_db_path).cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = [row[0] for row in cursor.fetchall()]
             table_name = "oreas_hs j" if re.match(r'(?i)oreas', crm_id) else "pivot_crm"
             if table_name not in tables:
                 logger.error(f"Table {table_name} does not exist in database")
-                conn.close()
                 QMessageBox.critical(self, "Error", f"Table {table_name} does not exist")
                 self.verification_cache[cache_key] = None
                 return None
@@ -1825,7 +1792,6 @@ class QCTab(QWidget):
             cols = [x[1] for x in cursor.fetchall()]
             if 'CRM ID' not in cols:
                 logger.error(f"Column 'CRM ID' not found in {table_name}")
-                conn.close()
                 QMessageBox.critical(self, "Error", f"Column 'CRM ID' not found")
                 self.verification_cache[cache_key] = None
                 return None
@@ -1838,7 +1804,6 @@ class QCTab(QWidget):
             crm_data = cursor.fetchall()
             if not crm_data:
                 logger.warning(f"No CRM data found for {crm_id}")
-                conn.close()
                 self.verification_cache[cache_key] = None
                 return None
             for row in crm_data:
@@ -1863,9 +1828,6 @@ class QCTab(QWidget):
             QMessageBox.critical(self, "Error", f"Error querying database: {str(e)}")
             self.verification_cache[cache_key] = None
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     def select_best_blank(self, crm_row, blank_df, ver_value):
         if blank_df.empty or ver_value is None:
@@ -2035,25 +1997,22 @@ class QCTab(QWidget):
         if dialog.exec() == QDialog.Accepted:
             updated_record = dialog.get_updated_record()
             try:
-                conn = sqlite3.connect(self.crm_db_path)
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE crm_data
-                    SET crm_id = ?, solution_label = ?, element = ?, value = ?, date = ?
-                    WHERE id = ?
-                    """,
-                    (
-                        updated_record['crm_id'],
-                        updated_record['solution_label'],
-                        updated_record['element'],
-                        updated_record['value'],
-                        updated_record['date'],
-                        record['id']
+                with transaction(self.crm_db_path) as conn:
+                    conn.execute(
+                        """
+                        UPDATE crm_data
+                        SET crm_id = ?, solution_label = ?, element = ?, value = ?, date = ?
+                        WHERE id = ?
+                        """,
+                        (
+                            updated_record['crm_id'],
+                            updated_record['solution_label'],
+                            updated_record['element'],
+                            updated_record['value'],
+                            updated_record['date'],
+                            record['id']
+                        )
                     )
-                )
-                conn.commit()
-                conn.close()
                 logger.info(f"Updated record ID {record['id']} with new values: {updated_record}")
                 self.load_data_thread()
                 self.status_label.setText("Record updated successfully")
@@ -3,6 +3,7 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtGui import QBrush, QColor
 from PyQt6.QtCore import Qt, QAbstractTableModel, QThread, pyqtSignal
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 import logging
@@ -72,6 +73,95 @@ global_style = """
     }
 """
 
+
+def wavelength_element(col):
+    """Element name of a pivot column (trailing '_1', '_2', ... removed)."""
+    return col[:-2] if len(col) >= 2 and col[-2] == '_' else col
+
+
+def calibration_bounds(original_df, wavelength_columns, concentration_column):
+    """Calibration range of each wavelength from the Std rows, with one groupby over Element.
+
+    Returns ({column: "[min to max]"}, min array, max array); the arrays are
+    read back from the rounded strings so selection matches what is displayed.
+    """
+    ranges = {col: "[0 to 0]" for col in wavelength_columns}
+    if concentration_column is not None:
+        std = original_df.loc[original_df['Type'] == 'Std', ['Element', concentration_column]]
+        # فقط مقادیر اعشاری نامنفی ساده (مثل 12.5) به عنوان استاندارد پذیرفته می‌شوند
+        text = std[concentration_column].astype(str)
+        valid = text.str.replace('.', '', n=1, regex=False).str.isdigit()
+        values = pd.to_numeric(text[valid], errors='coerce')
+        bounds = values.groupby(std.loc[valid, 'Element']).agg(['min', 'max'])
+        for col in wavelength_columns:
+            element_name = wavelength_element(col)
+            if element_name in bounds.index:
+                low, high = bounds.loc[element_name]
+                if pd.notna(low):
+                    ranges[col] = f"[{low:.2f} to {high:.2f}]"
+
+    parts = [ranges[col].strip('[]').split(' to ') for col in wavelength_columns]
+    cal_min = np.array([float(low) for low, _ in parts], dtype=float)
+    cal_max = np.array([float(high) for _, high in parts], dtype=float)
+    return ranges, cal_min, cal_max
+
+
+def sample_concentrations(original_df, concentration_column, labels, element_names):
+    """Concentration matrix (labels x element_names) from the first Sample row of each (label, element)."""
+    samples = original_df.loc[original_df['Type'].isin(['Sample', 'Samp']),
+                              ['Solution Label', 'Element', concentration_column]]
+    samples = samples.drop_duplicates(['Solution Label', 'Element'], keep='first')
+    index = pd.Series(pd.to_numeric(samples[concentration_column], errors='coerce').to_numpy(dtype=float),
+                      index=pd.MultiIndex.from_frame(samples[['Solution Label', 'Element']]))
+    wide = index.unstack('Element')
+    return wide.reindex(index=pd.Index(labels), columns=pd.Index(element_names)).to_numpy(dtype=float)
+
+
+def select_best_wavelengths(pivot_data, original_df, concentration_column):
+    """Pick, for every pivot row and base element, the wavelength whose sample concentration is closest to its calibration range.
+
+    A wavelength inside its range has distance 0; wavelengths without a
+    numeric concentration or pivot value are skipped, and ties go to the
+    first wavelength in column order. Returns (base_elements,
+    calibration_ranges, best_wavelengths_per_row, selected_columns).
+    """
+    base_elements = defaultdict(list)
+    wavelength_columns = [col for col in pivot_data.columns if col != 'Solution Label']
+    for col in wavelength_columns:
+        base_elements[col.split()[0]].append(col)
+
+    calibration_ranges, cal_min, cal_max = calibration_bounds(original_df, wavelength_columns, concentration_column)
+    best_wavelengths_per_row = {row: {} for row in range(len(pivot_data))}
+    selected_columns = ['Solution Label']
+    if concentration_column is None or not wavelength_columns:
+        return base_elements, calibration_ranges, best_wavelengths_per_row, selected_columns
+
+    conc = sample_concentrations(original_df, concentration_column, pivot_data['Solution Label'],
+                                 [wavelength_element(col) for col in wavelength_columns])
+    corr_con = pivot_data[wavelength_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    # فاصله تا بازه کالیبراسیون؛ خانه‌های بدون غلظت یا Corr Con معتبر NaN می‌شوند
+    distance = np.minimum(np.abs(conc - cal_min), np.abs(conc - cal_max))
+    distance[(cal_min <= conc) & (conc <= cal_max)] = 0.0
+    distance[np.isnan(conc) | np.isnan(corr_con)] = np.nan
+
+    column_pos = {col: pos for pos, col in enumerate(wavelength_columns)}
+    first_pick = {}
+    for base_idx, (base_elem, wavelengths) in enumerate(base_elements.items()):
+        block = distance[:, [column_pos[wl] for wl in wavelengths]]
+        rows = np.flatnonzero(~np.isnan(block).all(axis=1))
+        if not len(rows):
+            continue
+        best = np.nanargmin(block[rows], axis=1)
+        for row, pick in zip(rows.tolist(), best.tolist()):
+            best_wavelengths_per_row[row][base_elem] = wavelengths[pick]
+        # ترتیب selected_columns: اولین سطری که هر طول موج در آن انتخاب شده
+        for pick in np.unique(best).tolist():
+            first_pick[wavelengths[pick]] = (int(rows[np.argmax(best == pick)]), base_idx)
+    selected_columns += sorted(first_pick, key=first_pick.get)
+    return base_elements, calibration_ranges, best_wavelengths_per_row, selected_columns
+
+
 class LoadReportThread(QThread):
     """Thread for loading report data asynchronously."""
     progress = pyqtSignal(int)
@@ -280,153 +370,30 @@ class ReportTab(QWidget):
             # self.logger.warning("Neither 'Soln Conc' nor 'Corr Con' found in DataFrame")
             return None
 
+    def get_original_df(self):
+        """Original long-format DataFrame from pivot_tab, falling back to app.data."""
+        pivot_tab = getattr(self.results_frame, 'pivot_tab', self.results_frame)
+        original_df = getattr(pivot_tab, 'original_df', None)
+        return original_df if original_df is not None else getattr(self.app, 'data', None)
+
     def generate_report_data(self):
         """Generate report DataFrame and select best wavelengths per row."""
         pivot_tab = getattr(self.results_frame, 'pivot_tab', self.results_frame)
         pivot_data = getattr(pivot_tab, 'last_filtered_data', None)
-        original_df = getattr(pivot_tab, 'original_df', None) or getattr(self.app, 'data', None)
+        original_df = self.get_original_df()
 
         if pivot_data is None or original_df is None:
             self.logger.warning("Pivot data or original DataFrame is None")
             return None
 
-        # Group columns by base element
-        self.base_elements = defaultdict(list)
-        for col in pivot_data.columns:
-            if col != 'Solution Label':
-                base_elem = col.split()[0]
-                self.base_elements[base_elem].append(col)
-
-        # Calculate calibration ranges for each wavelength
-        self.calibration_ranges = {}
-        concentration_column = self.get_concentration_column(original_df) if original_df is not None else None
+        concentration_column = self.get_concentration_column(original_df)
         if concentration_column is None:
             self.logger.warning("No valid concentration column found, setting all calibration ranges to [0 to 0]")
-            for col in pivot_data.columns:
-                if col != 'Solution Label':
-                    self.calibration_ranges[col] = "[0 to 0]"
-        else:
-            for col in pivot_data.columns:
-                if col != 'Solution Label':
-                    # Extract base element name (check for '_' in last two characters)
-                    element_name = col[:-2] if len(col) >= 2 and col[-2] == '_' else col
-                    std_data = original_df[
-                        (original_df['Type'] == 'Std') & 
-                        (original_df['Element'] == element_name)
-                    ][concentration_column]
-                    # Filter valid numeric values
-                    std_data_numeric = [float(x) for x in std_data if isinstance(x, (int, float, str)) and str(x).replace('.', '', 1).isdigit()]
-                    if not std_data_numeric:
-                        self.calibration_ranges[col] = "[0 to 0]"
-                    else:
-                        calibration_min = min(std_data_numeric)
-                        calibration_max = max(std_data_numeric)
-                        # Format calibration range as string
-                        self.calibration_ranges[col] = f"[{calibration_min:.2f} to {calibration_max:.2f}]"
-        # Select best wavelength for each base element per row
-        self.best_wavelengths_per_row = {}
-        self.selected_columns = ['Solution Label']
-
-        for row in range(len(pivot_data)):
-            self.best_wavelengths_per_row[row] = {}
-            row_label = pivot_data.index[row]
-            for base_elem, wavelengths in self.base_elements.items():
-                best_wavelength = self.select_best_wavelength_for_row(row, base_elem, wavelengths, pivot_data)
-                if best_wavelength:
-                    self.best_wavelengths_per_row[row][base_elem] = best_wavelength
-                    if best_wavelength not in self.selected_columns:
-                        self.selected_columns.append(best_wavelength)
-
+        (self.base_elements, self.calibration_ranges,
+         self.best_wavelengths_per_row, self.selected_columns) = select_best_wavelengths(
+            pivot_data, original_df, concentration_column)
         return pivot_data.copy()
 
-    def select_best_wavelength_for_row(self, row, base_elem, wavelengths, pivot_data):
-        """Select the best wavelength for a base element in a specific row based on concentration."""
-        if not wavelengths:
-            return None
-
-        valid_wavelengths = []
-        distances = []
-        # Use the 'Solution Label' column from pivot_data instead of index
-        row_label = pivot_data['Solution Label'].iloc[row]
-        
-        # Access original_df from pivot_tab or app
-        pivot_tab = getattr(self.results_frame, 'pivot_tab', self.results_frame)
-        original_df = getattr(pivot_tab, 'original_df', None) or getattr(self.app, 'data', None)
-        
-        if original_df is None:
-            self.logger.warning(f"No original DataFrame available for row {row_label}")
-            return None
-
-        # Filter original_df for the specific Solution Label and Sample/Samp type
-        df_subset = original_df[
-            (original_df['Solution Label'] == row_label) &
-            (original_df['Type'].isin(['Sample', 'Samp']))
-        ]
-
-        # Determine which concentration column to use
-        conc_column = self.get_concentration_column(df_subset)
-        if conc_column is None:
-            self.logger.warning(f"No valid concentration column for {row_label}")
-            return None
-
-        for wl in wavelengths:
-            # Extract base element name (remove trailing '_1', '_2', etc.)
-            element_name = wl[:-2] if len(wl) >= 2 and wl[-2] == '_' else wl
-
-            # Get concentration from df_subset for this Solution Label and Element
-            conc_data = df_subset[df_subset['Element'] == element_name][conc_column]
-            if conc_data.empty:
-                self.logger.debug(f"No {conc_column} data for {row_label}, {element_name}")
-                continue
-
-            # Use the first concentration value (assuming one per Solution Label and Element)
-            conc = conc_data.iloc[0]
-            if pd.isna(conc) or not self.is_numeric(conc):
-                self.logger.debug(f"Invalid {conc_column} for {row_label}, {element_name}: {conc}")
-                continue
-
-            try:
-                conc = float(conc)
-            except (ValueError, TypeError):
-                self.logger.debug(f"Cannot convert {conc_column} to float for {row_label}, {element_name}: {conc}")
-                continue
-
-            # Get calibration range for the wavelength
-            cal_range = self.calibration_ranges.get(wl, "[0 to 0]")
-            try:
-                range_parts = cal_range.strip('[]').split(' to ')
-                if len(range_parts) != 2:
-                    self.logger.warning(f"Invalid calibration range format for {wl}: {cal_range}")
-                    continue
-                cal_min = float(range_parts[0])
-                cal_max = float(range_parts[1])
-            except (ValueError, TypeError, IndexError) as e:
-                self.logger.warning(f"Failed to parse calibration range for {wl}: {cal_range}, error: {str(e)}")
-                cal_min, cal_max = 0, float('inf')
-
-            if cal_min == float('inf') or cal_max == float('-inf'):
-                continue
-
-            # Get Corr Con from pivot_data to display
-            corr_con = pivot_data.iloc[row][wl]
-            if pd.isna(corr_con) or not self.is_numeric(corr_con):
-                self.logger.debug(f"Invalid Corr Con for {row_label}, {wl}: {corr_con}")
-                continue
-
-            # Compare concentration against calibration range
-            if cal_min <= conc <= cal_max:
-                valid_wavelengths.append((wl, corr_con, 0))  # Store Corr Con for display
-            else:
-                distance = min(abs(conc - cal_min), abs(conc - cal_max))
-                distances.append((wl, corr_con, distance))  # Store Corr Con for display
-
-        if len(valid_wavelengths) == 1:
-            return valid_wavelengths[0][0]
-        elif valid_wavelengths or distances:
-            candidates = valid_wavelengths + distances
-            return min(candidates, key=lambda x: x[2])[0]  # Select wavelength with minimum distance
-        return None
-
     def update_report_display(self):
         """Update the report table display with one wavelength per row highlighted."""
         if self.report_data is None or self.report_data.empty:
@@ -5,9 +5,150 @@ import re
 import numpy as np
 from scipy.optimize import differential_evolution
 from scipy.special import huber
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
 
+# نتایج تحلیل تصمیم برای هر (عنصر، مجموعه CRM) نگه داشته می‌شوند تا تغییر ستون‌ها دوباره بهینه‌سازی نکند
+_DECISION_CACHE = OrderedDict()
+DECISION_CACHE_SIZE = 32
+# مقیاس‌های کاندید: تا سقف (تعداد کاندید × تعداد CRM) نقاط شکست دقیق، بیشتر از آن شبکه یکنواخت
+MAX_SCALE_CANDIDATES = 20000
+MAX_SWEEP_WORK = 1000000
+
+
+def max_overlap(starts, ends):
+    """Sweep over interval endpoints: the most closed intervals [starts, ends] sharing a point.
+
+    Row-wise for 2-D input (one set of intervals per row). Returns
+    (count, point, region_low, region_high): the best count and, among the
+    regions reaching it, the one nearest 0 with its point nearest 0.
+    """
+    starts, ends = np.atleast_2d(starts), np.atleast_2d(ends)
+    valid = starts <= ends
+    points = np.concatenate([np.where(valid, starts, np.inf), np.where(valid, ends, np.inf)], axis=1)
+    deltas = np.concatenate([valid, valid], axis=1).astype(np.int64)
+    deltas[:, starts.shape[1]:] *= -1
+    # شروع‌ها اول آمده‌اند و مرتب‌سازی پایدار است: در نقطه‌های برابر شروع قبل از پایان (بازه‌ها بسته‌اند)
+    order = np.argsort(points, axis=1, kind='stable')
+    points = np.take_along_axis(points, order, axis=1)
+    counts = np.cumsum(np.take_along_axis(deltas, order, axis=1), axis=1)
+    best = counts.max(axis=1)
+    low, high = points[:, :-1], points[:, 1:]
+    is_best = (counts[:, :-1] == best[:, None]) & (best[:, None] > 0)
+    with np.errstate(invalid='ignore'):
+        nearest = np.clip(0.0, low, high)
+    k = np.argmin(np.where(is_best, np.abs(nearest), np.inf), axis=1)
+    rows = np.arange(len(best))
+    found = best > 0
+    point = np.where(found, nearest[rows, k], 0.0)
+    return best, point, np.where(found, low[rows, k], 0.0), np.where(found, high[rows, k], 0.0)
+
+
+def count_in_range(x, lower, upper, blank_adjust=0.0, scale=1.0):
+    """How many CRMs land in [lower, upper] after (x + blank_adjust) * scale."""
+    adjusted = (x + blank_adjust) * scale
+    return int(((lower <= adjusted) & (adjusted <= upper)).sum())
+
+
+def sweep_blank_adjust(x, lower, upper, bounds, scales):
+    """Best blank adjustment (within bounds) for each scale > 0 in `scales`; returns (points, counts).
+
+    Counts are re-checked on the adjusted values, so a point on the edge of a
+    band that rounding pushes out is replaced by the middle of its region.
+    """
+    s = np.asarray(scales, dtype=float)[:, None]
+    starts = np.maximum(lower / s - x, bounds[0])
+    ends = np.minimum(upper / s - x, bounds[1])
+    _, point, low, high = max_overlap(starts, ends)
+    middle = (low + high) / 2
+
+    def counts(adjust):
+        adjusted = (x + adjust[:, None]) * s
+        return ((lower <= adjusted) & (adjusted <= upper)).sum(axis=1)
+
+    at_point, at_middle = counts(point), counts(middle)
+    return np.where(at_middle > at_point, middle, point), np.maximum(at_point, at_middle)
+
+
+def best_blank_adjust(x, lower, upper, bounds, scale=1.0):
+    """Exact blank adjustment (within bounds) that puts the most CRMs in range at a fixed scale > 0."""
+    points, counts = sweep_blank_adjust(x, lower, upper, bounds, [scale])
+    return float(points[0]), int(counts[0])
+
+
+def scale_candidates(x, lower, upper, scale_bounds):
+    """Scales where the best in-range count can change, plus 1 and the bounds.
+
+    The band of blank adjustments that puts CRM i in range is
+    [lower_i / s - x_i, upper_i / s - x_i]; overlaps only change where the
+    start of one band meets the end of another: s = (lower_i - upper_j) / (x_i - x_j).
+    When those exceed the work budget an even grid over the bounds is used.
+    """
+    fixed = np.array([1.0, scale_bounds[0], scale_bounds[1]])
+    n = len(x)
+    limit = min(MAX_SCALE_CANDIDATES, max(1000, MAX_SWEEP_WORK // max(n, 1)))
+    if n * n <= 20 * limit:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = (lower[:, None] - upper[None, :]) / (x[:, None] - x[None, :])
+        s = np.unique(s[np.isfinite(s) & (s >= scale_bounds[0]) & (s <= scale_bounds[1])])
+        if 3 * len(s) <= limit:
+            # دو طرف هر نقطه شکست هم، چون در خود نقطه گرد کردن ممکن است تماس دو بازه را از دست بدهد
+            s = np.clip(np.concatenate([s, s * (1 - 1e-9), s * (1 + 1e-9)]), *scale_bounds)
+            return np.concatenate([fixed, s])
+    return np.concatenate([fixed, np.linspace(scale_bounds[0], scale_bounds[1], limit)])
+
+
+def best_blank_and_scale(x, lower, upper, blank_bounds, scale_bounds, total, chunk=256):
+    """Minimize -in_range + 10 * |scale - 1| / total over blank adjustment and scale.
+
+    For each candidate scale the best blank adjustment is an exact sweep;
+    the candidates cover every scale where the best count can change, so
+    the optimum is exact within the candidate budget (scale 1 wins ties).
+    """
+    candidates = scale_candidates(x, lower, upper, scale_bounds)
+    best = (np.inf, 0.0, 1.0, 0)
+    for i in range(0, len(candidates), chunk):
+        s = candidates[i:i + chunk]
+        points, counts = sweep_blank_adjust(x, lower, upper, blank_bounds, s)
+        objective = -counts + 10 * np.abs(s - 1) / total
+        k = int(np.argmin(objective))
+        if objective[k] < best[0]:
+            best = (objective[k], float(points[k]), float(s[k]), int(counts[k]))
+    return best[1:]
+
+
+def range_distances(x, lower, upper, blank_adjust=0.0, scale=1.0):
+    """Distance of each adjusted CRM value to its [lower, upper] band (0 inside); works on batches of parameters."""
+    adjusted = (x + np.asarray(blank_adjust, dtype=float)[..., None]) * np.asarray(scale, dtype=float)[..., None]
+    return np.maximum(lower - adjusted, 0.0) + np.maximum(adjusted - upper, 0.0)
+
+
+def best_sse_blank_and_scale(x, cert, mean_abs, blank_bounds, scale_bounds=None):
+    """Closed-form minimum of mean((x + a) * s - cert)^2 + 0.1 * |s - 1| * mean_abs.
+
+    For a fixed scale the best a is mean(cert / s - x); what remains is a
+    convex quadratic in s with a kink at 1. Without scale_bounds the scale is 1.
+    """
+    def blank_for(s):
+        return float(np.clip(np.mean(cert / s - x), *blank_bounds))
+
+    if scale_bounds is None:
+        return blank_for(1.0), 1.0
+    dx, dc = x - x.mean(), cert - cert.mean()
+    var, cov = float(np.mean(dx * dx)), float(np.mean(dx * dc))
+    candidates = [1.0, scale_bounds[0], scale_bounds[1]]
+    if var > 0:
+        candidates += [(2 * cov - 0.1 * mean_abs) / (2 * var), (2 * cov + 0.1 * mean_abs) / (2 * var)]
+    candidates = np.clip(candidates, *scale_bounds)
+
+    def objective(s):
+        a = blank_for(s)
+        return np.mean(((x + a) * s - cert) ** 2) + 0.1 * abs(s - 1) * mean_abs
+
+    scale = float(min(candidates, key=objective))
+    return blank_for(scale), scale
+
+
 class ReportDialog(QDialog):
     """Dialog to display table-based CRM analysis report with scrollable column visibility toggles and textual decision analysis."""
     def __init__(self, parent, annotations):
@@ -312,44 +453,62 @@ class ReportDialog(QDialog):
             self.logger.warning("No sufficient data for decision analysis")
             self.decision_data['final_decision'] = "No sufficient data for analysis."
             return "<div class='decision-section'><h2>Decision Analysis</h2><p>No sufficient data for analysis.</p></div>"
-        
+
+        element = getattr(self.parent(), 'selected_element', None)
+        key = (element, tuple((d['id'], d['cert_val'], d['sample_val'], d['lower'], d['upper'], d['blank_val'])
+                              for d in crm_data))
+        cached = _DECISION_CACHE.get(key)
+        if cached is None:
+            cached = self.analyze_decision(crm_data)
+            _DECISION_CACHE[key] = cached
+            while len(_DECISION_CACHE) > DECISION_CACHE_SIZE:
+                _DECISION_CACHE.popitem(last=False)
+        else:
+            _DECISION_CACHE.move_to_end(key)
+            self.logger.debug(f"Decision analysis for {element} reused from cache")
+        analysis_html, decision = cached
+        self.decision_data.update(decision)
+        return analysis_html
+
+    def analyze_decision(self, crm_data):
+        """Run the conditions and the three models on crm_data; returns (html, decision_data)."""
+        cert = np.array([d['cert_val'] for d in crm_data], dtype=float)
+        sample = np.array([d['sample_val'] for d in crm_data], dtype=float)
+        blank = np.array([d['blank_val'] for d in crm_data], dtype=float)
+        lower = np.array([d['lower'] for d in crm_data], dtype=float)
+        upper = np.array([d['upper'] for d in crm_data], dtype=float)
+        x = sample - blank
+        total = len(crm_data)
+
         analysis_html = "<div class='decision-section'><h2>Decision Analysis</h2><ul>"
         
         # Condition 1: Check if subtracting blank brings into range
-        in_range_with_blank = sum(d['lower'] <= (d['sample_val'] - d['blank_val']) <= d['upper'] for d in crm_data)
-        total = len(crm_data)
+        in_range_with_blank = count_in_range(x, lower, upper)
         analysis_html += f"<li>Condition 1: With blank subtraction, {in_range_with_blank}/{total} CRMs are in range. "
         if in_range_with_blank / total >= 0.75:
             analysis_html += "This is sufficient for most cases; prefer blank adjustment over scaling.</li>"
         else:
             analysis_html += "Insufficient; consider additional adjustments.</li>"
         
-        # Condition 2: Try dynamic blank adjustment
-        def objective_cond2(p):
-            adjust = p[0]
-            in_range = sum(d['lower'] <= (d['sample_val'] - d['blank_val'] + adjust) <= d['upper'] for d in crm_data)
-            return -in_range
-        
-        max_val = max([abs(d['sample_val']) for d in crm_data] + [abs(d['blank_val']) for d in crm_data] + [1])
-        adjust_bounds = [(-10 * max_val, 10 * max_val)]
+        # Condition 2: Try dynamic blank adjustment (دقیق با sweep روی مرز بازه‌ها)
+        max_val = max(np.abs(sample).max(), np.abs(blank).max(), 1)
+        adjust_bounds = (-10 * max_val, 10 * max_val)
         
         try:
-            res_cond2 = differential_evolution(objective_cond2, adjust_bounds)
-            best_blank_adjust = res_cond2.x[0] if res_cond2.success else 0
-            best_in_range = -res_cond2.fun if res_cond2.success else in_range_with_blank
+            best_blank_adjust_val, best_in_range = best_blank_adjust(x, lower, upper, adjust_bounds)
         except Exception as e:
             self.logger.error(f"Error in Condition 2 optimization: {str(e)}")
-            best_blank_adjust = 0
+            best_blank_adjust_val = 0
             best_in_range = in_range_with_blank
         
-        analysis_html += f"<li>Condition 2: Adjusting blank by {best_blank_adjust:.3f}, achieves {best_in_range}/{total} in range. "
+        analysis_html += f"<li>Condition 2: Adjusting blank by {best_blank_adjust_val:.3f}, achieves {best_in_range}/{total} in range. "
         if best_in_range / total >= 0.75:
             analysis_html += "No scaling needed; apply this blank adjustment globally.</li>"
         else:
             analysis_html += "Still insufficient; proceed to scaling.</li>"
         
         # Condition 3: Check initial in-range count
-        initial_in_range = sum(d['lower'] <= d['sample_val'] <= d['upper'] for d in crm_data)
+        initial_in_range = count_in_range(sample, lower, upper)
         analysis_html += f"<li>Condition 3: Initially, {initial_in_range}/{total} in range. With blank: {in_range_with_blank}/{total}. "
         if initial_in_range / total >= 0.75 or in_range_with_blank / total >= 0.75:
             analysis_html += "Majority in range; no scaling required.</li>"
@@ -357,10 +516,11 @@ class ReportDialog(QDialog):
             analysis_html += "Minority in range; scaling may be necessary.</li>"
         
         # Condition 4: Check duplicate CRM IDs
-        id_groups = defaultdict(list)
-        for d in crm_data:
-            id_groups[d['id']].append(d)
-        good_groups = sum(any(d['lower'] <= d['sample_val'] <= d['upper'] for d in group) for group in id_groups.values())
+        initially_in = (lower <= sample) & (sample <= upper)
+        id_groups = defaultdict(bool)
+        for d, ok in zip(crm_data, initially_in):
+            id_groups[d['id']] |= bool(ok)
+        good_groups = sum(id_groups.values())
         analysis_html += f"<li>Condition 4: For duplicate CRM IDs, {good_groups}/{len(id_groups)} groups have at least one in range. "
         if len(id_groups) == 0 or good_groups / len(id_groups) >= 0.75:
             analysis_html += "Sufficient coverage; no scaling needed.</li>"
@@ -368,16 +528,14 @@ class ReportDialog(QDialog):
             analysis_html += "Insufficient; consider scaling.</li>"
         
         # Condition 5: Different magnitudes
-        def get_magnitude(val):
-            return np.floor(np.log10(abs(val))) if val != 0 else 0
+        with np.errstate(divide='ignore'):
+            magnitudes = np.where(cert != 0, np.floor(np.log10(np.abs(cert))), 0)
         mag_groups = defaultdict(list)
-        for d in crm_data:
-            mag = get_magnitude(d['cert_val'])
-            mag_groups[mag].append(d)
+        for mag, ok in zip(magnitudes, initially_in):
+            mag_groups[mag].append(ok)
         analysis_html += f"<li>Condition 5: {len(mag_groups)} magnitude groups detected. "
         for mag, group in mag_groups.items():
-            in_range = sum(d['lower'] <= d['sample_val'] <= d['upper'] for d in group)
-            analysis_html += f"Magnitude 10^{mag}: {in_range}/{len(group)} in range. "
+            analysis_html += f"Magnitude 10^{mag}: {sum(group)}/{len(group)} in range. "
         if len(mag_groups) > 1:
             analysis_html += "Apply adjustments selectively to low-performing groups.</li>"
         else:
@@ -388,118 +546,65 @@ class ReportDialog(QDialog):
         
         # Condition 7: Average scaling
         max_corr = 0.3
-        possible_scales = [d['cert_val'] / d['sample_val'] if d['sample_val'] != 0 else 1 for d in crm_data]
-        possible_scales = [s for s in possible_scales if 1 - max_corr <= s <= 1 + max_corr]
-        if possible_scales:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            possible_scales = np.where(sample != 0, cert / sample, 1)
+        possible_scales = possible_scales[(1 - max_corr <= possible_scales) & (possible_scales <= 1 + max_corr)]
+        if len(possible_scales):
             avg_scale = np.mean(possible_scales)
-            in_range_with_avg = sum(d['lower'] <= d['sample_val'] * avg_scale <= d['upper'] for d in crm_data)
+            in_range_with_avg = count_in_range(sample, lower, upper, scale=avg_scale)
             analysis_html += f"<li>Condition 7: Average scale {avg_scale:.3f} brings {in_range_with_avg}/{total} in range (allowing 1-2 outliers).</li>"
         else:
             analysis_html += "<li>Condition 7: No valid scales within bounds.</li>"
         
         # Condition 8: Best blank selection
-        analysis_html += f"<li>Condition 8: Best blank adjustment selected as {best_blank_adjust:.3f}, maximizing in-range to {best_in_range}/{total}.</li>"
+        analysis_html += f"<li>Condition 8: Best blank adjustment selected as {best_blank_adjust_val:.3f}, maximizing in-range to {best_in_range}/{total}.</li>"
         
         analysis_html += "</ul>"
         
         # Compute bounds for optimization
-        avg_cert = np.mean([d['cert_val'] for d in crm_data])
-        max_val = max([abs(d['sample_val']) for d in crm_data] + [abs(d['blank_val']) for d in crm_data] + [abs(avg_cert), 1])
+        avg_cert = np.mean(cert)
+        max_val = max(np.abs(sample).max(), np.abs(blank).max(), abs(avg_cert), 1)
         blank_bounds_wide = (-10 * max_val, 10 * max_val)
         scale_bounds = (1 - max_corr, 1 + max_corr)
+        mean_abs_sample = np.mean(np.abs(sample))
         
-        # Model 1: Maximize in-range count
-        def objective_a(params):
-            blank_adjust, scale = params
-            in_range_count = 0
-            for d in crm_data:
-                adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust) * scale
-                if d['lower'] <= adjusted_val <= d['upper']:
-                    in_range_count += 1
-            reg = 10 * abs(scale - 1)
-            return -in_range_count + reg / total
-        
-        bounds_a = [blank_bounds_wide, scale_bounds]
-        
+        # Model 1: Maximize in-range count (دقیق: sweep روی blank برای هر مقیاس کاندید)
         try:
-            res_a = differential_evolution(objective_a, bounds_a)
-            if res_a.success:
-                blank_adjust_a, scale_a = res_a.x
-                in_range_after_a = 0
-                for d in crm_data:
-                    adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_a) * scale_a
-                    if d['lower'] <= adjusted_val <= d['upper']:
-                        in_range_after_a += 1
-                def objective_blank_a(p):
-                    return objective_a([p[0], 1])
-                res_blank_a = differential_evolution(objective_blank_a, [blank_bounds_wide])
-                if res_blank_a.success:
-                    blank_adjust_blank_a = res_blank_a.x[0]
-                    in_range_blank_a = 0
-                    for d in crm_data:
-                        adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_blank_a) * 1
-                        if d['lower'] <= adjusted_val <= d['upper']:
-                            in_range_blank_a += 1
-                    if in_range_blank_a > in_range_after_a or (in_range_blank_a == in_range_after_a and in_range_blank_a / total >= 0.75):
-                        blank_adjust_a = blank_adjust_blank_a
-                        scale_a = 1.0
-                        in_range_after_a = in_range_blank_a
-                analysis_html += f'<div class="model-comparison"><strong>Model A (In-Range Maximization):</strong> Blank adjust: {blank_adjust_a:.3f}, Scale: {scale_a:.3f}, In-range: {in_range_after_a}/{total}.</div>'
-            else:
-                analysis_html += '<div class="model-comparison"><strong>Model A:</strong> Optimization failed.</div>'
-                self.logger.warning("Model A optimization failed")
+            blank_adjust_a, scale_a, in_range_after_a = best_blank_and_scale(
+                x, lower, upper, blank_bounds_wide, scale_bounds, total)
+            blank_adjust_blank_a, in_range_blank_a = best_blank_adjust(x, lower, upper, blank_bounds_wide)
+            if in_range_blank_a > in_range_after_a or (in_range_blank_a == in_range_after_a and in_range_blank_a / total >= 0.75):
+                blank_adjust_a = blank_adjust_blank_a
+                scale_a = 1.0
+                in_range_after_a = in_range_blank_a
+            analysis_html += f'<div class="model-comparison"><strong>Model A (In-Range Maximization):</strong> Blank adjust: {blank_adjust_a:.3f}, Scale: {scale_a:.3f}, In-range: {in_range_after_a}/{total}.</div>'
         except Exception as e:
             analysis_html += f'<div class="model-comparison"><strong>Model A:</strong> Error: {str(e)}.</div>'
             self.logger.error(f"Error in Model A optimization: {str(e)}")
         
-        # Model 2: Minimize distances with Huber loss
+        # Model 2: Minimize distances with Huber loss (تابع هدف برداری؛ کل جمعیت DE یکجا)
         def objective_b(params):
             blank_adjust, scale = params
-            total_distance = 0.0
-            for d in crm_data:
-                adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust) * scale
-                if adjusted_val < d['lower']:
-                    dist = d['lower'] - adjusted_val
-                elif adjusted_val > d['upper']:
-                    dist = adjusted_val - d['upper']
-                else:
-                    dist = 0.0
-                total_distance += huber(1.0, dist)
-            reg = 0.1 * (abs(scale - 1) * np.mean([abs(d['sample_val']) for d in crm_data]))
+            total_distance = huber(1.0, range_distances(x, lower, upper, blank_adjust, scale)).sum(axis=-1)
+            reg = 0.1 * (np.abs(np.asarray(scale) - 1) * mean_abs_sample)
             return (total_distance / total) + reg
         
         bounds_b = [blank_bounds_wide, scale_bounds]
         
         try:
-            res_b = differential_evolution(objective_b, bounds_b)
+            res_b = differential_evolution(objective_b, bounds_b, vectorized=True, updating='deferred')
             if res_b.success:
                 blank_adjust_b, scale_b = res_b.x
-                distances_b = []
-                in_range_after_b = 0
-                for d in crm_data:
-                    adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_b) * scale_b
-                    if d['lower'] <= adjusted_val <= d['upper']:
-                        in_range_after_b += 1
-                        distances_b.append(0)
-                    else:
-                        dist = min(abs(adjusted_val - d['lower']), abs(adjusted_val - d['upper']))
-                        distances_b.append(dist)
+                distances_b = range_distances(x, lower, upper, blank_adjust_b, scale_b)
+                in_range_after_b = int((distances_b == 0).sum())
                 avg_distance_b = np.mean(distances_b)
                 def objective_blank_b(p):
-                    return objective_b([p[0], 1])
-                res_blank_b = differential_evolution(objective_blank_b, [blank_bounds_wide])
+                    return objective_b([p[0], np.ones_like(p[0])])
+                res_blank_b = differential_evolution(objective_blank_b, [blank_bounds_wide], vectorized=True, updating='deferred')
                 if res_blank_b.success:
                     blank_adjust_blank_b = res_blank_b.x[0]
-                    distances_blank_b = []
-                    in_range_blank_b = 0
-                    for d in crm_data:
-                        adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_blank_b) * 1
-                        if d['lower'] <= adjusted_val <= d['upper']:
-                            in_range_blank_b += 1
-                            distances_blank_b.append(0)
-                        else:
-                            dist = min(abs(adjusted_val - d['lower']), abs(adjusted_val - d['upper']))
-                            distances_blank_b.append(dist)
+                    distances_blank_b = range_distances(x, lower, upper, blank_adjust_blank_b)
+                    in_range_blank_b = int((distances_blank_b == 0).sum())
                     avg_distance_blank_b = np.mean(distances_blank_b)
                     if in_range_blank_b > in_range_after_b or (in_range_blank_b == in_range_after_b and in_range_blank_b / total >= 0.75):
                         blank_adjust_b = blank_adjust_blank_b
@@ -514,65 +619,28 @@ class ReportDialog(QDialog):
             analysis_html += f'<div class="model-comparison"><strong>Model B:</strong> Error: {str(e)}.</div>'
             self.logger.error(f"Error in Model B optimization: {str(e)}")
 
-        # Model 3: Minimize sum of squared errors
-        def objective_c(params):
-            blank_adjust, scale = params
-            total_sse = 0.0
-            for d in crm_data:
-                adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust) * scale
-                total_sse += (adjusted_val - d['cert_val']) ** 2
-            reg = 0.1 * (abs(scale - 1) * np.mean([abs(d['sample_val']) for d in crm_data]))
-            return (total_sse / total) + reg
-        
-        bounds_c = [blank_bounds_wide, scale_bounds]
-        
+        # Model 3: Minimize sum of squared errors (حل بسته؛ برای مقیاس ثابت blank بهینه میانگین است)
         try:
-            res_c = differential_evolution(objective_c, bounds_c)
-            if res_c.success:
-                blank_adjust_c, scale_c = res_c.x
-                distances_c = []
-                in_range_after_c = 0
-                for d in crm_data:
-                    adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_c) * scale_c
-                    if d['lower'] <= adjusted_val <= d['upper']:
-                        in_range_after_c += 1
-                        distances_c.append(0)
-                    else:
-                        dist = min(abs(adjusted_val - d['lower']), abs(adjusted_val - d['upper']))
-                        distances_c.append(dist)
-                avg_distance_c = np.mean(distances_c)
-                def objective_blank_c(p):
-                    return objective_c([p[0], 1])
-                res_blank_c = differential_evolution(objective_blank_c, [blank_bounds_wide])
-                if res_blank_c.success:
-                    blank_adjust_blank_c = res_blank_c.x[0]
-                    distances_blank_c = []
-                    in_range_blank_c = 0
-                    for d in crm_data:
-                        adjusted_val = (d['sample_val'] - d['blank_val'] + blank_adjust_blank_c) * 1
-                        if d['lower'] <= adjusted_val <= d['upper']:
-                            in_range_blank_c += 1
-                            distances_blank_c.append(0)
-                        else:
-                            dist = min(abs(adjusted_val - d['lower']), abs(adjusted_val - d['upper']))
-                            distances_blank_c.append(dist)
-                    avg_distance_blank_c = np.mean(distances_blank_c)
-                    if in_range_blank_c > in_range_after_c or (in_range_blank_c == in_range_after_c and in_range_blank_c / total >= 0.75):
-                        blank_adjust_c = blank_adjust_blank_c
-                        scale_c = 1.0
-                        in_range_after_c = in_range_blank_c
-                        avg_distance_c = avg_distance_blank_c
-                analysis_html += f'<div class="model-comparison"><strong>Model C (SSE Minimization to Cert Val):</strong> Blank adjust: {blank_adjust_c:.3f}, Scale: {scale_c:.3f}, In-range: {in_range_after_c}/{total}, Avg distance: {avg_distance_c:.3f}.</div>'
-            else:
-                analysis_html += '<div class="model-comparison"><strong>Model C:</strong> Optimization failed.</div>'
-                self.logger.warning("Model C optimization failed")
+            blank_adjust_c, scale_c = best_sse_blank_and_scale(x, cert, mean_abs_sample, blank_bounds_wide, scale_bounds)
+            distances_c = range_distances(x, lower, upper, blank_adjust_c, scale_c)
+            in_range_after_c = int((distances_c == 0).sum())
+            avg_distance_c = np.mean(distances_c)
+            blank_adjust_blank_c, _ = best_sse_blank_and_scale(x, cert, mean_abs_sample, blank_bounds_wide)
+            distances_blank_c = range_distances(x, lower, upper, blank_adjust_blank_c)
+            in_range_blank_c = int((distances_blank_c == 0).sum())
+            avg_distance_blank_c = np.mean(distances_blank_c)
+            if in_range_blank_c > in_range_after_c or (in_range_blank_c == in_range_after_c and in_range_blank_c / total >= 0.75):
+                blank_adjust_c = blank_adjust_blank_c
+                scale_c = 1.0
+                in_range_after_c = in_range_blank_c
+                avg_distance_c = avg_distance_blank_c
+            analysis_html += f'<div class="model-comparison"><strong>Model C (SSE Minimization to Cert Val):</strong> Blank adjust: {blank_adjust_c:.3f}, Scale: {scale_c:.3f}, In-range: {in_range_after_c}/{total}, Avg distance: {avg_distance_c:.3f}.</div>'
         except Exception as e:
             analysis_html += f'<div class="model-comparison"><strong>Model C:</strong> Error: {str(e)}.</div>'
             self.logger.error(f"Error in Model C optimization: {str(e)}")
         
         # Model Comparison and Final Decision
-        initial_distances = [0 if d['lower'] <= d['sample_val'] <= d['upper'] else min(abs(d['sample_val'] - d['lower']), abs(d['sample_val'] - d['upper'])) for d in crm_data]
-        avg_distance_initial = np.mean(initial_distances)
+        avg_distance_initial = np.mean(range_distances(sample, lower, upper))
         
         models = []
         if 'in_range_after_a' in locals():
@@ -593,7 +661,7 @@ class ReportDialog(QDialog):
             blank_val = crm_data[0]['blank_val'] if crm_data else 0.0
             recommended_blank = blank_val - blank_adjust
         else:
-            blank_adjust = best_blank_adjust
+            blank_adjust = best_blank_adjust_val
             recommended_scale = 1.0
             recommended_in_range = best_in_range
             recommended_avg_distance = "N/A"
@@ -602,13 +670,13 @@ class ReportDialog(QDialog):
             recommended_blank = blank_val - blank_adjust
         
         # Update decision data
-        self.decision_data.update({
+        decision = {
             'recommended_blank': recommended_blank,
             'recommended_scale': recommended_scale,
             'recommended_in_range': recommended_in_range,
             'recommended_avg_distance': recommended_avg_distance if isinstance(recommended_avg_distance, float) else "N/A",
             'final_decision': "Calculating..."
-        })
+        }
         
         analysis_html += f"<p><strong>Model Comparison Summary:</strong> Initial in-range: {initial_in_range}/{total}, Avg distance initial: {avg_distance_initial:.3f}.</p>"
         analysis_html += f"<p><strong>Recommended Correction (Model {model_used}):</strong> Effective blank to subtract: {recommended_blank:.3f}, Scale: {recommended_scale:.3f}, achieving {recommended_in_range}/{total} in range (avg distance: {recommended_avg_distance}).</p>"
@@ -624,11 +692,11 @@ class ReportDialog(QDialog):
         else:
             recommended_action = "No improvement; do not apply changes. Consider manual review if needed."
         
-        self.decision_data['final_decision'] = recommended_action
+        decision['final_decision'] = recommended_action
         analysis_html += f"<p><strong>Final Decision:</strong> {recommended_action} This ensures the majority of data falls within acceptable ranges with the least disruption, aligning with the goal of optimal data integrity.</p></div>"
         
         self.logger.debug(f"Decision Analysis: Final Decision = {recommended_action}, Blank = {recommended_blank:.3f}, Scale = {recommended_scale:.3f}, In-range = {recommended_in_range}/{total}")
-        return analysis_html
+        return analysis_html, decision
 
     def get_final_decision(self):
         """Return the Final Decision for external use."""
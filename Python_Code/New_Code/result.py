@@ -12,14 +12,12 @@ from openpyxl.utils import get_column_letter
 import numpy as np
 import os
 import platform
-import math
-from functools import reduce
-import re
 import logging
 
 from .changeReport import ChangesReportDialog
 from ..Common.column_filter import ColumnFilterDialog
 from ..Common.Freeze_column import FreezeTableWidget
+from utils.pivot_func import build_pivot, dataset_fingerprint, pivot_cache
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -504,163 +502,52 @@ class ResultsFrame(QWidget):
             return pd.DataFrame()
 
         try:
-            # فقط نمونه‌ها
-            samples = df[df['Type'].isin(['Samp', 'Sample'])].copy()
-            if samples.empty:
-                return pd.DataFrame()
-
-            # exclusions
             exclude_samples = self.app.get_excluded_samples()
             exclude_volumes = self.app.get_excluded_volumes()
             exclude_dfs = self.app.get_excluded_dfs()
-            samples = samples[
-                (~samples['Solution Label'].isin(exclude_samples)) &
-                (~samples['Solution Label'].isin(exclude_volumes)) &
-                (~samples['Solution Label'].isin(exclude_dfs))
-            ]
-            if samples.empty:
-                return pd.DataFrame()
-
-            # حفظ ترتیب اصلی
-            samples = samples.reset_index(drop=True)
-            samples['original_index'] = samples.index
-
-            # تمیزکاری
-            samples['Solution Label'] = samples['Solution Label'].fillna('Unknown').astype(str)
-            samples['Solution Label'] = samples['Solution Label'].str.replace(r'(?i)^nan$', 'Unknown', regex=True)
-            samples['Element'] = samples['Element'].astype(str).str.split('_').str[0]
-            samples['Corr Con'] = pd.to_numeric(samples['Corr Con'], errors='coerce')
-
-            records = samples.to_dict('records')
-
-            # گروه‌بندی بر اساس Solution Label
-            solution_groups = {}
-            for r in records:
-                sl = r['Solution Label']
-                solution_groups.setdefault(sl, []).append(r)
-
-            # محاسبه set_size
-            most_common_sizes = {}
-            for sl, group in solution_groups.items():
-                counts = {}
-                for r in group:
-                    counts[r['Element']] = counts.get(r['Element'], 0) + 1
-                values = list(counts.values())
-                g = reduce(math.gcd, values) if values else 1
-                total = len(group)
-                most_common_sizes[sl] = total // g if g > 1 and total % g == 0 else total
-
-            # تشخیص تکرار
-            has_repeats = False
-            check = {}
-            for r in records:
-                sl = r['Solution Label']
-                pos = next(i for i, x in enumerate(solution_groups[sl]) if x is r)
-                gid_approx = pos // most_common_sizes[sl]
-                key = (sl, gid_approx, r['Element'])
-                check[key] = check.get(key, 0) + 1
-                if check[key] > 1:
-                    has_repeats = True
-                    break
-
-            # تابع مرتب‌سازی برچسب
-            def label_key(x):
-                s = str(x).replace(' ', '')
-                m = re.search(r'(\d+)', s)
-                return (s.lower() if not m else s[:m.start()].lower(), int(m.group(1)) if m else 0)
-
-            final_rows = []
-
-            if has_repeats:
-                # حالت تکرار → گروه‌بندی دقیق
-                for r in records:
-                    sl = r['Solution Label']
-                    pos = next(i for i, x in enumerate(solution_groups[sl]) if x is r)
-                    r['_group_id'] = pos // most_common_sizes[sl]
-
-                occ_count = {}
-                for r in records:
-                    k = (r['Solution Label'], r['_group_id'], r['Element'])
-                    occ_count[k] = occ_count.get(k, 0) + 1
-
-                occ_counter = {}
-                for r in records:
-                    k = (r['Solution Label'], r['_group_id'], r['Element'])
-                    n = occ_count[k]
-                    idx = occ_counter.get(k, 0) + 1
-                    occ_counter[k] = idx
-                    r['_col'] = f"{r['Element']}_{idx}" if n > 1 else r['Element']
-
-                row_map = {}
-                for r in records:
-                    rid = (r['Solution Label'], r['_group_id'])
-                    row_map.setdefault(rid, {'Solution Label': r['Solution Label']})
-                    row_map[rid][r['_col']] = r['Corr Con']
-
-                # مرتب‌سازی بر اساس اولین ایندکس
-                def first_idx(rid):
-                    sl, gid = rid
-                    return min(x['original_index'] for x in records if x['Solution Label'] == sl and x.get('_group_id') == gid)
-
-                ordered = sorted(row_map.items(), key=lambda x: first_idx(x[0]))
-                final_rows = [row for _, row in ordered]
-
-                # تعیین ترتیب عناصر از اولین گروه کامل
-                first_full = next((row for _, row in row_map.items()
-                                if len(row) - 1 >= most_common_sizes.get(row['Solution Label'], 1)), None)
-                element_order = sorted(
-                    [k for k in (first_full or final_rows[0]).keys() if k != 'Solution Label'],
-                    key=label_key
-                )
-                self.element_order = element_order
-
-            else:
-                # بدون تکرار
-                uid_map = {}
-                for r in records:
-                    k = (r['Solution Label'], r['Element'])
-                    uid_map[k] = uid_map.get(k, -1) + 1
-                    r['_uid'] = uid_map[k]
-
-                row_map = {}
-                for r in records:
-                    rid = (r['Solution Label'], r['_uid'])
-                    row_map.setdefault(rid, {'Solution Label': r['Solution Label']})
-                    row_map[rid][r['Element']] = r['Corr Con']
-
-                def first_idx(rid):
-                    sl, uid = rid
-                    return min((x['original_index'] for x in records if x['Solution Label'] == sl and x.get('_uid') == uid), default=999999)
-
-                ordered = sorted(row_map.items(), key=lambda x: first_idx(x[0]))
-                final_rows = [row for _, row in ordered]
-
-                cols = set()
-                for r in final_rows:
-                    cols.update(k for k in r if k != 'Solution Label')
-                self.element_order = sorted(cols, key=label_key)
-
-            # مرتب‌سازی Solution Label
-            self.solution_label_order = sorted(
-                {r['Solution Label'] for r in final_rows},
-                key=label_key
+            self.data_hash = dataset_fingerprint(df)
+            cache_key = (
+                'results', self.data_hash, 'Corr Con',
+                tuple(sorted(map(str, exclude_samples))),
+                tuple(sorted(map(str, exclude_volumes))),
+                tuple(sorted(map(str, exclude_dfs))),
             )
 
-            # ساخت DataFrame نهایی
-            if not final_rows:
-                return pd.DataFrame(columns=['Solution Label'])
-
-            pivot_df = pd.DataFrame(final_rows)
-
-            # اعمال ترتیب ستون‌ها
-            if self.element_order:
-                cols = ['Solution Label'] + [c for c in self.element_order if c in pivot_df.columns]
-                missing = [c for c in pivot_df.columns if c not in cols]
-                pivot_df = pivot_df[cols + missing]
+            result = pivot_cache.get(cache_key)
+            if result is None:
+                # فقط نمونه‌ها
+                samples = df[df['Type'].isin(['Samp', 'Sample'])].copy()
+                if samples.empty:
+                    return pd.DataFrame()
+
+                # exclusions
+                samples = samples[
+                    (~samples['Solution Label'].isin(exclude_samples)) &
+                    (~samples['Solution Label'].isin(exclude_volumes)) &
+                    (~samples['Solution Label'].isin(exclude_dfs))
+                ]
+                if samples.empty:
+                    return pd.DataFrame()
+
+                # حفظ ترتیب اصلی
+                samples = samples.reset_index(drop=True)
+                samples['original_index'] = samples.index
+
+                # تمیزکاری
+                samples['Solution Label'] = samples['Solution Label'].fillna('Unknown').astype(str)
+                samples['Solution Label'] = samples['Solution Label'].str.replace(r'(?i)^nan$', 'Unknown', regex=True)
+                samples['Element'] = samples['Element'].astype(str).str.split('_').str[0]
+                samples['Corr Con'] = pd.to_numeric(samples['Corr Con'], errors='coerce')
+
+                result = build_pivot(samples, 'Corr Con')
+                pivot_cache.put(cache_key, result)
+
+            self.element_order = result.element_order
+            self.solution_label_order = result.solution_label_order
+            pivot_df = result.pivot_df
 
             # کش کردن
             self.last_pivot_data = pivot_df
-            self.data_hash = str(pd.util.hash_pandas_object(samples).sum())
 
             # حالا فیلترها رو اعمال کن
             filtered = self.apply_filters_to_wide_data(pivot_df)
@@ -1,22 +1,33 @@
 # screens/process/verification/rm_drift_handler.py
 import numpy as np
 import pandas as pd
-from PyQt6.QtWidgets import QMessageBox, QMenu, QProgressDialog
+from PyQt6.QtWidgets import QMessageBox, QMenu, QProgressDialog, QDialog, QVBoxLayout, QTableView, QDialogButtonBox, QHeaderView
 from PyQt6.QtGui import QStandardItem, QStandardItemModel, QColor, QFont
 from PyQt6.QtCore import Qt
 import pyqtgraph as pg
 from functools import partial
 import logging
+from utils.undo_journal import app_journal, JournalError
+from utils.correction_ledger import correction_ledger
+from .rm_ratio import bracket_intervals, ramp_drift, optimize_rm_groups
+from .find_rm import RMSegmentIndex
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+JOURNAL_SCOPE = 'rm_drift'
+
 class RMDriftHandler:
     def __init__(self, window):
         self.w = window
-        self.undo_stack = []
         self.manual_corrections = {}  # {original_index: corrected_value}
         self.ignored_pivots = set()   # set of ignored pivot_indices
+        self.journal = app_journal(window.app)
+        self.journal.register(f"{JOURNAL_SCOPE}.last_filtered_data", lambda: self.w.app.results.last_filtered_data)
+        self.journal.register(f"{JOURNAL_SCOPE}.rm_df", lambda: self.w.rm_df)
+        self.journal.register(f"{JOURNAL_SCOPE}.all_rm_df", lambda: self.w.all_rm_df)
+        self.journal.register(f"{JOURNAL_SCOPE}.corrected_drift", lambda: self.w.corrected_drift)
+        self.journal.register(f"{JOURNAL_SCOPE}.correction_ledger", lambda: correction_ledger(self.w.app.results).live)
 
     def setup_plot_items(self):
         # 1. Corrected Values (blue circles)
@@ -97,6 +108,7 @@ class RMDriftHandler:
         self.w.all_pivot_df = results['pivot_df'].copy(deep=True)
         self.w.elements = results['elements']
         self.w.file_ranges = self.w.app.file_ranges if hasattr(self.w.app, 'file_ranges') else []
+        self.w.segment_index = results.get('segment_index')
 
         # <<< این خط حیاتی رو اضافه کن >>>
         self.w.empty_rows_from_check = results.get('empty_rows', pd.DataFrame())  # اضافه شد
@@ -123,6 +135,26 @@ class RMDriftHandler:
         self.w.progress_dialog.close()
         QMessageBox.critical(self.w, "Error", message)
 
+    def segment_index(self):
+        """RMSegmentIndex of the loaded run; rebuilt only when the frames or files no longer match it (e.g. a loaded project)."""
+        index = getattr(self.w, 'segment_index', None)
+        file_ranges = getattr(self.w, 'file_ranges', None)
+        if index is None or not index.matches(self.w.all_pivot_df, self.w.all_positions_df, file_ranges):
+            index = RMSegmentIndex(self.w.all_pivot_df, self.w.all_positions_df, file_ranges)
+            self.w.segment_index = index
+        return index
+
+    def pivot_rows_between(self, low, high, by_original=False):
+        """Rows of the current pivot view strictly between two RMs (by pivot_index, or original_index) with a value for the selected element."""
+        index = self.segment_index()
+        view = index.frame_view(self.w.pivot_df)
+        if by_original:
+            rows = index.rows_between_original(low, high, view)
+        else:
+            rows = index.rows_between(low, high, view)
+        data = self.w.pivot_df.iloc[rows]
+        return data[data[self.w.selected_element].notna()]
+
     def get_valid_rm_data(self):
         """Extract valid RM data for current group, including masks."""
         label_df = self.w.rm_df[self.w.rm_df['rm_num'] == self.w.current_rm_num].sort_values('pivot_index')
@@ -323,8 +355,7 @@ class RMDriftHandler:
                 continue
             prev_pivot = x_rm[i]
             curr_pivot = x_rm[i + 1]
-            cond = (self.w.pivot_df.index > prev_pivot) & (self.w.pivot_df.index < curr_pivot) & self.w.pivot_df[self.w.selected_element].notna()
-            seg_data = self.w.pivot_df[cond].copy()
+            seg_data = self.pivot_rows_between(prev_pivot, curr_pivot)
             if filter_text:
                 seg_data = seg_data[seg_data['Solution Label'].str.lower().str.contains(filter_text, na=False)]
             if seg_data.empty:
@@ -394,8 +425,7 @@ class RMDriftHandler:
                     continue
                 prev_pivot = x_rm[i]
                 curr_pivot = x_rm[i + 1]
-                cond = (self.w.pivot_df.index > prev_pivot) & (self.w.pivot_df.index < curr_pivot) & self.w.pivot_df[self.w.selected_element].notna()
-                seg_data = self.w.pivot_df[cond].copy()
+                seg_data = self.pivot_rows_between(prev_pivot, curr_pivot)
                 if filter_text:
                     seg_data = seg_data[seg_data['Solution Label'].str.lower().str.contains(filter_text, na=False)]
                 if seg_data.empty:
@@ -494,8 +524,8 @@ class RMDriftHandler:
         if normal_mask.sum() == 0:
             return
 
-        seg_dict = dict(zip(self.w.positions_df['pivot_index'], self.w.positions_df['segment_id']))
-        unique_segs = np.unique([seg_dict.get(p, -1) for p in pivot[normal_mask]])
+        seg_ids = self.segment_index().segment_of(pivot)
+        unique_segs = np.unique(seg_ids[normal_mask])
 
         if self.w.global_optimize_cb.isChecked():
             first_idx = np.where(normal_mask)[0][0]
@@ -505,7 +535,7 @@ class RMDriftHandler:
             for seg_id in unique_segs:
                 if seg_id == -1:
                     continue
-                seg_mask = np.array([seg_dict.get(p, -1) == seg_id for p in pivot])
+                seg_mask = seg_ids == seg_id
                 seg_normal_mask = seg_mask & normal_mask
                 if seg_normal_mask.sum() == 0:
                     continue
@@ -638,7 +668,7 @@ class RMDriftHandler:
         if normal_mask.sum() < 2:
             return
 
-        seg_dict = dict(zip(self.w.positions_df['pivot_index'], self.w.positions_df['segment_id']))
+        seg_ids = self.segment_index().segment_of(pivot_indices)
 
         if self.w.global_optimize_cb.isChecked():
             # به صورت کلی (global)
@@ -651,11 +681,11 @@ class RMDriftHandler:
 
         else:
             # به تفکیک segment
-            unique_segs = np.unique([seg_dict.get(p, -1) for p in pivot_indices[normal_mask]])
+            unique_segs = np.unique(seg_ids[normal_mask])
             for seg_id in unique_segs:
                 if seg_id == -1:
                     continue
-                seg_mask = np.isin(pivot_indices, [p for p, s in seg_dict.items() if s == seg_id])
+                seg_mask = seg_ids == seg_id
                 seg_normal_mask = seg_mask & normal_mask
                 if seg_normal_mask.sum() < 2:
                     continue
@@ -734,6 +764,96 @@ class RMDriftHandler:
         self.update_rm_plot()
         QMessageBox.information(self.w, "Info", "Optimized to slope zero per file")
 
+    def auto_optimize_all(self, mode):
+        """Auto Flat ('flat') or Auto Zero Slope ('zero') of the current RM number for every element at once.
+
+        Groups follow the single-element buttons: files in per-file mode,
+        the whole view with Global Optimize, otherwise segments. All
+        (group, element) fits are solved in one batched least-squares pass,
+        written back in one assignment and journaled as one undo step.
+        """
+        if self.w.current_rm_num is None or getattr(self.w, 'all_rm_df', None) is None:
+            return
+        per_file = self.w.current_file_index <= 0 and self.w.per_file_cb.isChecked() and bool(self.w.file_ranges)
+        source = self.w.all_rm_df if per_file else self.w.rm_df
+        rows = source[source['rm_num'] == self.w.current_rm_num].sort_values('pivot_index')
+        elements = [el for el in self.w.elements if el in rows.columns]
+        if rows.empty or not elements:
+            QMessageBox.warning(self.w, "Warning", "No RM values to optimize.")
+            return
+
+        index = self.segment_index()
+        pivots = rows['pivot_index'].to_numpy()
+        if per_file:
+            group_of = index.file_of(pivots)
+            group_names = {i: fr.get('clean_name', f"File {i+1}") for i, fr in enumerate(self.w.file_ranges)}
+        elif self.w.global_optimize_cb.isChecked():
+            group_of = np.zeros(len(pivots), dtype=int)
+            group_names = {0: "All"}
+        else:
+            group_of = index.segment_of(pivots)
+            group_names = {seg: f"Segment {seg}" for seg in np.unique(group_of)}
+        in_group = group_of >= 0
+        if not in_group.any():
+            QMessageBox.warning(self.w, "Warning", "No RM values to optimize.")
+            return
+        group_ids, groups = np.unique(group_of[in_group], return_inverse=True)
+
+        values = rows[elements].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)[in_group]
+        skipped = np.isin(pivots[in_group], list(set(self.ignored_pivots) | set(self.w.empty_pivot_set)))
+        valid = ~np.isnan(values) & ~skipped[:, None]
+        if mode == 'flat' and per_file:
+            valid &= values > 1e-6  # مثل Auto Flat تک‌عنصری در حالت per-file
+        new, before, after = optimize_rm_groups(pivots[in_group].astype(float), values, valid, groups, len(group_ids), mode)
+
+        labels = rows.index[in_group]
+        snapshot = {name: self._element_columns(frame, elements)
+                    for name, frame in (('rm_df', self.w.rm_df), ('all_rm_df', self.w.all_rm_df))}
+        self.w.all_rm_df.loc[labels, elements] = new
+        shown = self.w.rm_df.index.intersection(labels)
+        self.w.rm_df.loc[shown, elements] = self.w.all_rm_df.loc[shown, elements]
+        title = "Auto Flat" if mode == 'flat' else "Auto Zero Slope"
+        with self.journal.group(f"{title} (all elements)", JOURNAL_SCOPE):
+            for name, frame in (('rm_df', self.w.rm_df), ('all_rm_df', self.w.all_rm_df)):
+                self.journal.record_frame_diff(f"{JOURNAL_SCOPE}.{name}", snapshot[name], frame, elements)
+        self.w.undo_rm_btn.setEnabled(self.journal.can_undo(JOURNAL_SCOPE))
+
+        points = np.zeros((len(group_ids), len(elements)), dtype=int)
+        np.add.at(points, groups, valid)
+        self.last_optimize_summary = pd.DataFrame({
+            'Group': np.repeat([group_names.get(g, str(g)) for g in group_ids], len(elements)),
+            'Element': np.tile(elements, len(group_ids)),
+            'Points': points.ravel(),
+            'Slope Before': before.ravel(),
+            'Slope After': after.ravel(),
+        })
+        self.update_displays()
+        self.update_slope_from_data()
+        self.show_optimize_summary(f"{title} — RM {self.w.current_rm_num}", self.last_optimize_summary)
+
+    def show_optimize_summary(self, title, summary):
+        """Slopes before/after for every (group, element) of an optimize-all run."""
+        dialog = QDialog(self.w)
+        dialog.setWindowTitle(title)
+        dialog.resize(640, 480)
+        layout = QVBoxLayout(dialog)
+        model = QStandardItemModel()
+        model.setHorizontalHeaderLabels(list(summary.columns))
+        for row in summary.itertuples(index=False):
+            items = [QStandardItem(str(row[0])), QStandardItem(str(row[1])), QStandardItem(str(row[2]))]
+            items += [QStandardItem("—" if pd.isna(v) else f"{v:.7f}") for v in row[3:]]
+            for item in items:
+                item.setEditable(False)
+            model.appendRow(items)
+        table = QTableView()
+        table.setModel(model)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(table)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        dialog.exec()
+
     def on_table_row_clicked(self, index):
         self.selected_start_rm_points.setData([], [])
         self.selected_end_rm_points.setData([], [])
@@ -812,8 +932,7 @@ class RMDriftHandler:
             return pd.DataFrame()
         pivot_prev = self.w.current_valid_pivot_indices[self.w.selected_row-1]
         pivot_curr = self.w.current_valid_pivot_indices[self.w.selected_row]
-        cond = (self.w.pivot_df['original_index'] > pivot_prev) & (self.w.pivot_df['original_index'] < pivot_curr) & self.w.pivot_df[self.w.selected_element].notna()
-        data = self.w.pivot_df[cond].copy().sort_values('original_index')
+        data = self.pivot_rows_between(pivot_prev, pivot_curr, by_original=True)
         filter_text = self.w.filter_solution_edit.text().strip().lower()
         if filter_text:
             filter_mask = data['Solution Label'].str.lower().str.contains(filter_text)
@@ -1003,62 +1122,121 @@ class RMDriftHandler:
             symbol='o', size=20, brush=pg.mkBrush('#FFD700'), pen=pg.mkPen('black', width=4)
         )
 
+    def rm_ratio_block(self, elements):
+        """RM pivots of the current RM number with their initial and current values of `elements` (RMs x elements)."""
+        label_df = self.w.rm_df[self.w.rm_df['rm_num'] == self.w.current_rm_num].sort_values('pivot_index')
+        initial_label_df = self.w.initial_rm_df[self.w.initial_rm_df['rm_num'] == self.w.current_rm_num].sort_values('pivot_index')
+        if len(label_df) != len(initial_label_df):
+            common_pivot = np.intersect1d(label_df['pivot_index'], initial_label_df['pivot_index'])
+            label_df = label_df[label_df['pivot_index'].isin(common_pivot)]
+            initial_label_df = initial_label_df[initial_label_df['pivot_index'].isin(common_pivot)]
+        original = initial_label_df[elements].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        display = label_df[elements].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        return label_df['pivot_index'].to_numpy(), original, display
+
+    def drift_correct_elements(self, new_df, elements):
+        """Drift-correct `elements` of new_df in place between consecutive RMs; returns {(label, element): ratio}.
+
+        The RM ratio matrix is built once. Elements whose valid RMs are the same
+        share one interval assignment (searchsorted on original_index) and are
+        corrected together as one block.
+        """
+        pivots, original, display = self.rm_ratio_block(elements)
+        empty_pivot_set = set(self.w.empty_rows_from_check['original_index'].dropna().astype(int).tolist()) \
+            if not self.w.empty_rows_from_check.empty and 'original_index' in self.w.empty_rows_from_check.columns else set()
+        skipped = np.array([p in empty_pivot_set or p in self.ignored_pivots for p in pivots], dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(original != 0, display / original, 1.0)
+        valid = ~np.isnan(original) & ~np.isnan(display)
+
+        positions = new_df['original_index'].to_numpy()
+        labels = new_df['Solution Label'].to_numpy(dtype=object)
+        stepwise = self.w.stepwise_cb.isChecked()
+        groups = {}
+        for j in range(len(elements)):
+            groups.setdefault(valid[:, j].tobytes(), []).append(j)
+
+        drift = {}
+        for cols in groups.values():
+            keep = valid[:, cols[0]]
+            bounds, bound_skipped = pivots[keep], skipped[keep]
+            # بازه‌ای که یکی از دو RM آن خالی یا نادیده گرفته شده باشد تصحیح نمی‌شود
+            active = ~(bound_skipped[:-1] | bound_skipped[1:])
+            interval = bracket_intervals(positions, bounds)
+            rows = np.flatnonzero(interval >= 0)
+            rows = rows[active[interval[rows]]]
+            if len(rows) == 0:
+                continue
+            rows = rows[np.argsort(interval[rows], kind='stable')]
+            names = [elements[j] for j in cols]
+            col_pos = [new_df.columns.get_loc(el) for el in names]
+            values = new_df.iloc[rows, col_pos].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+            block_ratios = ratios[keep][:, cols]
+            corrected, cell_ratios = ramp_drift(values, interval[rows], block_ratios[:-1], block_ratios[1:], stepwise)
+            for c, (col, element) in enumerate(zip(col_pos, names)):
+                ok = ~np.isnan(values[:, c])
+                new_df.iloc[rows[ok], col] = corrected[ok, c]
+                drift.update(zip(zip(labels[rows[ok]], [element] * int(ok.sum())), cell_ratios[ok, c]))
+        return drift
+
+    @staticmethod
+    def _element_columns(df, elements):
+        """{element: copy of the column} snapshot for the journal (only the columns the frame has)."""
+        if df is None:
+            return {}
+        return {el: df[el].copy() for el in elements if el in df.columns}
+
     def apply_to_single_rm(self):
         if not self.w.selected_element or self.w.current_rm_num is None:
             QMessageBox.critical(self.w, "Error", "No element or RM number selected.")
             return
+        self.apply_drift([self.w.selected_element])
+        QMessageBox.information(self.w, "Success", "All corrections (Drift + Manual) applied and saved!")
 
-        # Sync temp changes to df before apply
-        self.update_rm_data()
-
-        current_report_change = self.w.app.results.report_change.copy() if hasattr(self.w.app.results, 'report_change') else pd.DataFrame()
-        
-        self.undo_stack.append((
-            self.w.app.results.last_filtered_data.copy(),      # 0
-            self.w.rm_df.copy(),                               # 1
-            self.w.corrected_drift.copy(),                     # 2
-            self.manual_corrections.copy(),                    # 3
-            current_report_change,                             # 4 *** اضافه شد ***
-            self.w.all_rm_df.copy()                            # 5 *** اضافه شد ***
-        ))
-        self.w.undo_rm_btn.setEnabled(True)
+    def apply_to_all_elements(self):
+        if self.w.current_rm_num is None:
+            QMessageBox.critical(self.w, "Error", "No RM number selected.")
+            return
+        df = self.w.app.results.last_filtered_data
+        elements = [el for el in self.w.elements
+                    if el in df.columns and el in self.w.rm_df.columns and el in self.w.initial_rm_df.columns]
+        if not elements:
+            QMessageBox.critical(self.w, "Error", "No elements to correct.")
+            return
+        self.apply_drift(elements)
+        QMessageBox.information(self.w, "Success", f"Drift corrections applied to {len(elements)} elements and saved!")
 
-        new_df = self.w.app.results.last_filtered_data.copy()
+    def apply_drift(self, elements):
+        """Apply the current RM number's drift correction (plus manual corrections) to `elements`."""
         element = self.w.selected_element
+        # فقط ستون‌های عناصر قبل از تغییر نگه داشته می‌شوند؛ ژورنال فقط سلول‌های تغییرکرده را ذخیره می‌کند
+        before = {
+            name: self._element_columns(frame, elements)
+            for name, frame in (('last_filtered_data', self.w.app.results.last_filtered_data),
+                                ('rm_df', self.w.rm_df), ('all_rm_df', self.w.all_rm_df))
+        }
+        drift_before = dict(self.w.corrected_drift)
+        ledger = correction_ledger(self.w.app.results)
+        ledger_before = dict(ledger.live)
 
-        # Clear existing corrected_drift for this element
-        self.w.corrected_drift = {k: v for k, v in self.w.corrected_drift.items() if k[1] != element}
+        # Sync temp changes to df before apply
+        if element:
+            self.update_rm_data()
 
-        rm_data = self.get_valid_rm_data()
-        pivot_indices = rm_data['pivot_indices']
-        original_rm_values = rm_data['original_values']
-        display_values = rm_data['display_values']
-        effective_empty = rm_data['effective_empty']
+        new_df = self.w.app.results.last_filtered_data.copy()
 
-        for i in range(len(pivot_indices) - 1):
-            if effective_empty[i] or effective_empty[i + 1]:
-                continue
-            prev_pivot = pivot_indices[i]
-            curr_pivot = pivot_indices[i + 1]
-            cond = (new_df['original_index'] > prev_pivot) & (new_df['original_index'] < curr_pivot) & new_df[element].notna()
-            seg_data = new_df[cond].copy()
-            if seg_data.empty:
-                continue
-            orig_values = seg_data[element].values.astype(float)
-            current_ratio = display_values[i + 1] / original_rm_values[i + 1] if original_rm_values[i + 1] != 0 else 1.0
-            prev_ratio = display_values[i] / original_rm_values[i] if original_rm_values[i] != 0 else 1.0
-            corrected, ratios = self.calculate_corrected_values_with_ratios(orig_values, current_ratio, prev_ratio)
-            new_df.loc[cond, element] = corrected
-            for j in range(len(seg_data)):
-                sl = seg_data.iloc[j]['Solution Label']
-                key = (sl, element)
-                self.w.corrected_drift[key] = ratios[j]
+        # Clear existing corrected_drift for these elements
+        element_set = set(elements)
+        self.w.corrected_drift = {k: v for k, v in self.w.corrected_drift.items() if k[1] not in element_set}
+        self.w.corrected_drift.update(self.drift_correct_elements(new_df, elements))
 
         # Apply changes to RM points themselves if changed
         # Already done in update_rm_data
 
-        # Apply manual corrections
-        for orig_index, manual_val in self.manual_corrections.items():
+        # Apply manual corrections (مقادیر دستی فقط برای عنصر انتخاب‌شده هستند)
+        manual_corrections = self.manual_corrections.items() if element in element_set else []
+        manual_entries = []
+        for orig_index, manual_val in manual_corrections:
             mask = new_df['original_index'] == orig_index
             if mask.any():
                 old_val = new_df.loc[mask, element].iloc[0]
@@ -1067,13 +1245,25 @@ class RMDriftHandler:
                 key = (sl, element)
                 ratio = manual_val / old_val if old_val != 0 else 1.0
                 self.w.corrected_drift[key] = ratio
+                manual_entries.append((sl, old_val, manual_val, ratio))
+        if manual_entries:
+            labels, old_values, new_values, ratios = zip(*manual_entries)
+            ledger.record('manual', element, labels, replace=True,
+                          **{'Original Value': old_values, 'New Value': new_values, 'Ratio': ratios})
 
         self.w.app.results.last_filtered_data = new_df
         self.save_corrected_drift()
+
+        label = element if len(elements) == 1 else f"{len(elements)} elements"
+        with self.journal.group(f"RM drift {label}", JOURNAL_SCOPE):
+            for name, frame in (('last_filtered_data', new_df), ('rm_df', self.w.rm_df), ('all_rm_df', self.w.all_rm_df)):
+                self.journal.record_frame_diff(f"{JOURNAL_SCOPE}.{name}", before[name], frame, elements)
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.corrected_drift", drift_before, self.w.corrected_drift)
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.correction_ledger", ledger_before, ledger.live)
+        self.w.undo_rm_btn.setEnabled(True)
         self.w.results_update_requested.emit(new_df)
         # self.manual_corrections.clear()  # Optional reset
         self.update_displays()
-        QMessageBox.information(self.w, "Success", "All corrections (Drift + Manual) applied and saved!")
     
     def has_changes(self):
         if len(self.w.original_rm_values) == 0 or len(self.w.display_rm_values) == 0:
@@ -1235,59 +1425,9 @@ class RMDriftHandler:
             # Update corrected_drift
             self.w.app.results.corrected_drift.update(self.w.corrected_drift)
             
-            # Build drift_df
-            drift_data = []
-            for (sl, element), ratio in self.w.corrected_drift.items():
-                drift_data.append({
-                    'Solution Label': sl, 
-                    'Element': element, 
-                    'Ratio': ratio
-                })
-            
-            drift_df = pd.DataFrame(drift_data)
-            
-            # *** SAFE INITIALIZATION OF report_change ***
-            if not hasattr(self.w.app.results, 'report_change'):
-                self.w.app.results.report_change = pd.DataFrame(
-                    columns=['Solution Label', 'Element', 'Ratio']
-                )
-            else:
-                # Ensure correct columns exist
-                report_change = self.w.app.results.report_change
-                required_cols = ['Solution Label', 'Element', 'Ratio']
-                for col in required_cols:
-                    if col not in report_change.columns:
-                        report_change[col] = pd.NA
-            
-            report_change = self.w.app.results.report_change
-            
-            if not drift_df.empty:
-                # *** SAFE REMOVAL OF EXISTING ENTRIES ***
-                try:
-                    if 'Element' in report_change.columns:
-                        existing_elements = drift_df['Element'].unique()
-                        existing_mask = report_change['Element'].isin(existing_elements)
-                        report_change = report_change[~existing_mask]
-                    else:
-                        # If no Element column, clear all (fallback)
-                        report_change = pd.DataFrame(columns=['Solution Label', 'Element', 'Ratio'])
-                        
-                except Exception as e:
-                    logger.warning(f"Could not filter existing entries: {e}")
-                    # Fallback: clear all drift entries
-                    report_change = pd.DataFrame(columns=['Solution Label', 'Element', 'Ratio'])
-                
-                # *** SAFE CONCATENATION ***
-                try:
-                    report_change = pd.concat([report_change, drift_df], ignore_index=True)
-                except Exception as e:
-                    logger.warning(f"Could not concat drift_df: {e}")
-                    report_change = drift_df.copy()
-            
-            # *** FINAL ASSIGNMENT ***
-            self.w.app.results.report_change = report_change
-            
-            logger.info(f"✅ Saved {len(drift_df)} drift coefficients to report_change")
+            # *** ضرایب drift هر عنصر در ledger جایگزین می‌شوند ***
+            saved = correction_ledger(self.w.app.results).record_drift(self.w.corrected_drift)
+            logger.info(f"✅ Saved {saved} drift coefficients to the correction ledger")
             
         except Exception as e:
             logger.error(f"❌ Error saving corrected_drift: {str(e)}")
@@ -1309,14 +1449,11 @@ class RMDriftHandler:
             self.w.initial_rm_df = self.w.all_initial_rm_df.copy(deep=True)
             self.w.positions_df = self.w.all_positions_df.copy(deep=True)
         else:
-            fr = self.w.file_ranges[file_index]
-            start_pivot = fr['start_pivot_row']
-            end_pivot = fr['end_pivot_row']
-            valid_pivots = self.w.all_pivot_df[self.w.all_pivot_df['pivot_index'].between(start_pivot, end_pivot)]['pivot_index'].unique()
-            mask_pivot = self.w.all_pivot_df['pivot_index'].isin(valid_pivots)
-            mask_rm = self.w.all_rm_df['pivot_index'].isin(valid_pivots)
-            mask_pos = self.w.all_positions_df['pivot_index'].isin(valid_pivots)
-            self.w.pivot_df = self.w.all_pivot_df[mask_pivot].copy(deep=True)
+            # ردیف‌های pivot هر فایل پیوسته‌اند: برش مستقیم به جای ماسک روی کل داده
+            start_pivot, end_pivot = self.segment_index().file_bounds(file_index)
+            mask_rm = self.w.all_rm_df['pivot_index'].between(start_pivot, end_pivot - 1)
+            mask_pos = self.w.all_positions_df['pivot_index'].between(start_pivot, end_pivot - 1)
+            self.w.pivot_df = self.w.all_pivot_df.iloc[start_pivot:end_pivot].copy(deep=True)
             self.w.rm_df = self.w.all_rm_df[mask_rm].copy(deep=True)
             self.w.initial_rm_df = self.w.all_initial_rm_df[mask_rm].copy(deep=True)
             self.w.positions_df = self.w.all_positions_df[mask_pos].copy(deep=True)
@@ -1336,37 +1473,14 @@ class RMDriftHandler:
             self.w.all_rm_df.loc[self.w.all_rm_df['pivot_index'] == pivot, self.w.selected_element] = val
 
     def sync_corrected_drift_to_report_change(self):
-        """Sync corrected_drift with current report_change after undo"""
+        """Sync corrected_drift with the drift entries of the correction ledger after undo"""
         try:
-            if not hasattr(self.w.app.results, 'report_change'):
-                self.w.corrected_drift = {}
-                return
-            
-            report_change = self.w.app.results.report_change
-            
-            # Check if report_change has required columns
-            required_cols = ['Solution Label', 'Element', 'Ratio']
-            missing_cols = [col for col in required_cols if col not in report_change.columns]
-            if missing_cols:
-                logger.warning(f"report_change missing columns: {missing_cols}")
-                self.w.corrected_drift = {}
-                return
+            drift = correction_ledger(self.w.app.results).to_frame('drift')
+            drift = drift[drift['Solution Label'].notna() & drift['Element'].notna() & drift['Ratio'].notna()]
+            keys = zip(drift['Solution Label'].astype(str).tolist(), drift['Element'].astype(str).tolist())
+            self.w.corrected_drift = dict(zip(keys, drift['Ratio'].tolist()))
             
-            # Clear current corrected_drift
-            self.w.corrected_drift = {}
-            
-            # Rebuild from report_change (only drift-related entries if identifiable)
-            if not report_change.empty:
-                for _, row in report_change.iterrows():
-                    sl = row['Solution Label']
-                    element = row['Element']
-                    ratio = row['Ratio']
-                    
-                    if (pd.notna(sl) and pd.notna(element) and pd.notna(ratio)):
-                        key = (str(sl), str(element))
-                        self.w.corrected_drift[key] = float(ratio)
-            
-            logger.info(f"🔄 Synced corrected_drift from report_change: {len(self.w.corrected_drift)} entries")
+            logger.info(f"🔄 Synced corrected_drift from the correction ledger: {len(self.w.corrected_drift)} entries")
             
         except Exception as e:
             logger.error(f"❌ Error syncing corrected_drift: {str(e)}")
@@ -1374,32 +1488,23 @@ class RMDriftHandler:
 
 
     def undo_changes(self):
-        if not self.undo_stack:
+        if not self.journal.can_undo(JOURNAL_SCOPE):
+            return
+
+        # *** Restore فقط سلول‌های تغییرکرده (data, rm_df, all_rm_df, corrected_drift, correction ledger) ***
+        try:
+            self.journal.undo(JOURNAL_SCOPE)
+        except JournalError as e:
+            logger.error(f"RM undo failed: {e}")
+            QMessageBox.warning(self.w, "Undo", f"Could not undo the last RM change:\n{e}")
             return
         
-        last_state = self.undo_stack.pop()
-        
-        # *** Restore همه state ها ***
-        self.w.app.results.last_filtered_data = last_state[0].copy()
-        self.w.rm_df = last_state[1].copy()
-        self.w.corrected_drift = last_state[2].copy()
-        self.manual_corrections = last_state[3].copy()
-        
-        # *** CRITICAL: Restore report_change ***
-        if len(last_state) > 4:
-            previous_report_change = last_state[4].copy()
-            self.w.app.results.report_change = previous_report_change
-        
-        # *** Restore all_rm_df ***
-        if len(last_state) > 5:
-            self.w.all_rm_df = last_state[5].copy()
-        
-        # *** Sync corrected_drift با report_change ***
+        # *** Sync corrected_drift با correction ledger ***
         self.sync_corrected_drift_to_report_change()
         
         # *** Update displays ***
         self.update_displays()
-        self.w.undo_rm_btn.setEnabled(bool(self.undo_stack))
+        self.w.undo_rm_btn.setEnabled(self.journal.can_undo(JOURNAL_SCOPE))
         
         # *** اطلاع‌رسانی به ResultsFrame ***
         if hasattr(self.w.app.results, 'notify_data_changed'):
@@ -1413,6 +1518,21 @@ class RMDriftHandler:
             "• Report changes restored"
         )
 
+    def redo_changes(self):
+        if not self.journal.can_redo(JOURNAL_SCOPE):
+            return
+        try:
+            self.journal.redo(JOURNAL_SCOPE)
+        except JournalError as e:
+            logger.error(f"RM redo failed: {e}")
+            QMessageBox.warning(self.w, "Redo", f"Could not redo the last RM change:\n{e}")
+            return
+        self.sync_corrected_drift_to_report_change()
+        self.update_displays()
+        self.w.undo_rm_btn.setEnabled(self.journal.can_undo(JOURNAL_SCOPE))
+        if hasattr(self.w.app.results, 'notify_data_changed'):
+            self.w.app.results.notify_data_changed()
+
     def undo_crm_changes(self):
         # Placeholder for CRM undo - implement based on CRM handler
         # Assuming similar stack for CRM
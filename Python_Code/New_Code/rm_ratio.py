@@ -1,145 +1,339 @@
-from PyQt6.QtWidgets import QApplication
+# screens/process/verification/rm_ratio.py
 import pandas as pd
 import re
 import logging
+import threading
 import numpy as np
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
-class ApplySingleRM:
-    def __init__(self, app, keyword, element, rm_num, rm_df, initial_rm_df, segments, stepwise, progress_dialog=None):
-        self.app = app
+
+
+def keyword_mask(labels, keyword):
+    """Rows whose Solution Label is the RM keyword followed by an optional number."""
+    return labels.str.fullmatch(rf'{re.escape(keyword)}\s*\d*', na=False, flags=re.IGNORECASE).to_numpy(dtype=bool)
+
+
+def rm_ratio_matrix(rm_df, initial_rm_df, rm_num, elements):
+    """current / initial value of every RM of rm_num (rows, in rm_df order) for every element (columns).
+
+    Missing values count as 0 and a 0 initial value gives a ratio of 1, as in the single-element path.
+    """
+    def values(frame):
+        block = frame.loc[frame['rm_num'] == rm_num, elements]
+        return block.apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    init_vals, curr_vals = values(initial_rm_df), values(rm_df)
+    n = min(len(init_vals), len(curr_vals))
+    init_vals, curr_vals = init_vals[:n], curr_vals[:n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(init_vals != 0, curr_vals / init_vals, 1.0)
+
+
+def interval_factors(ratios, interval, stepwise):
+    """Correction factor of every row (rows x elements) from the ratio of its RM interval.
+
+    `interval` is the interval id of each row, ascending. Flat mode uses the
+    interval ratio as is; stepwise mode ramps from 1 to the ratio over the
+    rows of each interval (k-th of n rows gets 1 + (ratio - 1) / n * k).
+    """
+    row_ratios = ratios[interval]
+    if not stepwise:
+        return row_ratios
+    counts = np.bincount(interval, minlength=len(ratios))
+    starts = np.cumsum(counts) - counts
+    n = counts[interval]
+    k = np.arange(1, len(interval) + 1) - starts[interval]
+    ramp = 1.0 + (row_ratios - 1.0) / n[:, None] * k[:, None]
+    return np.where(n[:, None] > 1, ramp, row_ratios)
+
+
+def bracket_intervals(positions, boundaries):
+    """Interval id of each position strictly between boundaries[i] and boundaries[i + 1]; -1 on or outside them."""
+    positions = np.asarray(positions)
+    j = np.searchsorted(boundaries, positions, side='left')
+    inside = (j > 0) & (j < len(boundaries))
+    inside[inside] = positions[inside] < np.asarray(boundaries)[j[inside]]
+    return np.where(inside, j - 1, -1)
+
+
+def ramp_drift(values, interval, prev_ratios, cur_ratios, stepwise):
+    """Drift-correct a block of rows (rows x elements) from the RM ratios at both ends of each row's interval.
+
+    Rows must be grouped by interval in ascending order; NaN cells are left
+    alone and not counted. Flat mode multiplies by the ratio of the closing
+    RM. Stepwise mode ramps from the opening to the closing ratio over the
+    n valid cells of each interval: ratio_k = (cur - prev) / n * k + prev.
+    Returns (corrected values, ratio of every cell).
+    """
+    values = np.asarray(values, dtype=float)
+    cur = cur_ratios[interval]
+    if not stepwise:
+        ratios = np.broadcast_to(cur, values.shape).copy()
+    else:
+        valid = ~np.isnan(values)
+        # rank k of each valid cell within its interval and the interval size n, per element
+        counted = np.vstack([np.zeros((1, values.shape[1]), dtype=int), np.cumsum(valid, axis=0)])
+        first = np.searchsorted(interval, interval, side='left')
+        last = np.searchsorted(interval, interval, side='right')
+        before = counted[first]
+        k = counted[1:] - before
+        n = counted[last] - before
+        prev = prev_ratios[interval]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = ((cur - prev) / n) * k + prev
+    return ratios * values, ratios
+
+
+def group_slopes(x, values, valid, groups, n_groups):
+    """Least-squares slope of every (group, element) over its valid cells, in one batched pass.
+
+    x: position of each row; values/valid: rows x elements; groups: group id
+    (0..n_groups-1) of each row. Returns n_groups x elements, NaN where a
+    group has fewer than two valid points of an element.
+    """
+    membership = np.zeros((n_groups, len(x)))
+    membership[groups, np.arange(len(x))] = 1.0
+    weight = valid.astype(float)
+    count = membership @ weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = (membership @ (weight * x[:, None])) / count
+        mean_y = (membership @ np.where(valid, values, 0.0)) / count
+        dx = np.where(valid, x[:, None] - mean_x[groups], 0.0)
+        dy = np.where(valid, values - mean_y[groups], 0.0)
+        slope = (membership @ (dx * dy)) / (membership @ (dx * dx))
+    return np.where(count >= 2, slope, np.nan)
+
+
+def optimize_rm_groups(x, values, valid, groups, n_groups, mode):
+    """Auto Flat / Zero Slope of every (group, element) at once.
+
+    'flat' sets the valid cells of a group to its first valid value; 'zero'
+    removes the group's least-squares slope, keeping the first valid point.
+    Invalid cells are left alone. Returns (new values, slopes before, slopes after).
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    first = np.full((n_groups, values.shape[1]), n)
+    np.minimum.at(first, groups, np.where(valid, np.arange(n)[:, None], n))
+    has_first = first < n
+    first_row = np.minimum(first, n - 1)
+    cols = np.arange(values.shape[1])
+
+    before = group_slopes(x, values, valid, groups, n_groups)
+    if mode == 'flat':
+        first_value = np.where(has_first, values[first_row, cols], np.nan)
+        target = first_value[groups]
+    else:
+        first_x = np.where(has_first, x[first_row], np.nan)
+        shift = np.nan_to_num(before)[groups] * (x[:, None] - first_x[groups])
+        target = values - shift
+    new = np.where(valid, target, values)
+    return new, before, group_slopes(x, new, valid, groups, n_groups)
+
+
+class DriftCancelled(Exception):
+    """correct_drift was stopped through its CancelToken."""
+
+
+class CancelToken:
+    """Cancel flag shared between the GUI and a correction running in a worker thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def segment_intervals(positions, rm_num, ref_rm_num, keyword, ignored=()):
+    """(interval boundaries, ratio-matrix row of each closing RM) of one segment, or None if it has nothing to correct.
+
+    `positions` is the segment's slice of positions_df; RMs whose pivot_index
+    is in `ignored` are skipped.
+    """
+    rm_pos = positions[positions['rm_num'] == rm_num]
+    if rm_pos.empty:
+        return None
+
+    # فقط RMهایی که rm_num >= ref_rm_num هستند (یعنی بعد از مرجع)
+    valid = rm_pos[rm_pos['rm_num'] >= ref_rm_num]
+    if ignored:
+        valid = valid[~valid['pivot_index'].isin(ignored)]
+    if valid.empty:
+        return None
+
+    # مهم: فقط بر اساس موقعیت واقعی در داده مرتب کن (نه row_id!)
+    valid = valid.sort_values('pivot_index').reset_index(drop=True)
+
+    # RM مرجع: اولین RM با برچسب keyword، وگرنه اولین RM معتبر
+    is_ref = keyword_mask(valid['Solution Label'], keyword)
+    ref_pos = int(np.argmax(is_ref)) if is_ref.any() else 0
+    start_pivot = valid['pivot_index'].iloc[ref_pos]
+    logger.debug(f"Reference RM at pivot_index = {start_pivot}, row_id = {valid['row_id'].iloc[ref_pos]}")
+
+    pivots = valid['pivot_index'].to_numpy()
+    pivot_to_idx = dict(zip(pivots, valid.index))
+    cur_pivots = pivots[pivots > start_pivot]
+    if len(cur_pivots) == 0:
+        return None
+    # جلوگیری از عقب‌گرد: RMهای تکراری در یک موقعیت فقط یک بار مرز هستند
+    cur_pivots = cur_pivots[np.r_[True, np.diff(cur_pivots) > 0]]
+    ratio_rows = np.array([pivot_to_idx[p] for p in cur_pivots], dtype=int)
+    return np.r_[start_pivot, cur_pivots], ratio_rows
+
+
+def drift_intervals(segments, rm_num, keyword, ignored=()):
+    """segment_intervals of every segment (None where a segment has nothing to correct)."""
+    return [segment_intervals(seg['positions'], rm_num, seg['ref_rm_num'], keyword, ignored) for seg in segments]
+
+
+class DriftResult:
+    """Output of correct_drift: the corrected block, the rows it changed and the RM ratio used for each."""
+
+    def __init__(self, values, rows, ratios):
+        self.values = values
+        self.rows = rows
+        self.ratios = ratios
+
+    def ledger(self, labels, elements):
+        """{(Solution Label, element): ratio} of every corrected cell; a later row of the same label wins."""
+        ledger = {}
+        row_labels = np.asarray(labels, dtype=object)[self.rows]
+        for j, element in enumerate(elements):
+            ledger.update(zip(zip(row_labels, [element] * len(self.rows)), self.ratios[:, j]))
+        return ledger
+
+
+def correct_drift(values, is_rm, intervals, ratios, stepwise, progress=None, cancel=None):
+    """Drift-correct a block of element values (rows in pivot order x elements).
+
+    Row i is pivot_index i. `intervals` holds, per segment, the (boundaries,
+    ratio_rows) pair of drift_intervals and `ratios` the rm_ratio_matrix of
+    the RM number. Non-RM rows between a segment's reference RM and its last
+    RM are multiplied by the factors of their interval (missing values count
+    as 0); RM rows and rows outside the segments are returned unchanged.
+    progress(step, total) is called after each segment and `cancel` (a
+    CancelToken) is checked before each; DriftCancelled is raised if it is set.
+    No Qt, no app: safe to run in a worker thread.
+    """
+    corrected = np.array(values, dtype=float)
+    n = len(corrected)
+    done_rows, done_ratios = [], []
+    total = len(intervals)
+    for step, seg in enumerate(intervals, start=1):
+        if cancel is not None and cancel.cancelled:
+            raise DriftCancelled()
+        if seg is not None:
+            boundaries, ratio_rows = seg
+            # pivot_index همان شماره ردیف است: ردیف‌های سگمنت یک برش پیوسته‌اند
+            span = np.arange(max(int(boundaries[0]), 0), min(int(boundaries[-1]), n))
+            rows = span[~is_rm[span]]
+            # بازه‌ی هر ردیف: [boundaries[j], boundaries[j+1])
+            interval = np.searchsorted(boundaries, rows, side='right') - 1
+            # RMهایی که مقدارشان در rm_df نیست بازه‌شان را تصحیح نمی‌کنند
+            usable = ratio_rows < len(ratios)
+            keep = usable[interval]
+            rows, interval = rows[keep], interval[keep]
+            if len(rows):
+                used = np.flatnonzero(usable)
+                interval = np.searchsorted(used, interval)
+                segment_ratios = ratios[ratio_rows[used]]
+                factors = interval_factors(segment_ratios, interval, stepwise)
+                block = corrected[rows]
+                corrected[rows] = np.where(np.isnan(block), 0.0, block) * factors
+                done_rows.append(rows)
+                done_ratios.append(segment_ratios[interval])
+                logger.debug(f"Segment {step}: {len(rows)} rows x {corrected.shape[1]} elements in {len(used)} RM intervals")
+        if progress is not None:
+            progress(step, total)
+
+    if done_rows:
+        return DriftResult(corrected, np.concatenate(done_rows), np.vstack(done_ratios))
+    return DriftResult(corrected, np.empty(0, dtype=int), np.empty((0, corrected.shape[1])))
+
+
+def prepare_drift_frame(data):
+    """Copy of the results frame sorted like CheckRMThread's pivot (pivot_index = row number)."""
+    df = data.copy(deep=True)
+    if 'original_index' not in df.columns:
+        df['original_index'] = df.index if 'pivot_index' not in df.columns else df['pivot_index']
+    df = df.sort_values('original_index').reset_index(drop=True)
+    df['pivot_index'] = df.index
+    return df
+
+
+class ApplyRMDrift:
+    """Drift correction of a set of elements between consecutive RMs of one RM number.
+
+    Frame-level wrapper around correct_drift: takes a copy of the results
+    frame and the RM state when it is built, so run() touches no GUI or app
+    state and can run in a worker. progress(step, total) and a CancelToken
+    are passed through to correct_drift.
+    """
+
+    def __init__(self, data, keyword, elements, rm_num, rm_df, initial_rm_df, segments, stepwise,
+                 ignored_pivots=None, progress=None, cancel=None):
+        self.data = data.copy(deep=True)
         self.keyword = keyword
-        self.element = element
+        self.elements = list(elements)
         self.rm_num = rm_num
         self.rm_df = rm_df.copy(deep=True)
         self.initial_rm_df = initial_rm_df.copy(deep=True)
         self.segments = segments
         self.stepwise = stepwise
+        self.ignored_pivots = set(ignored_pivots or ())
+        self.progress = progress
+        self.cancel = cancel
         self.corrected_drift = {}
-        self.progress_dialog = progress_dialog
 
     def run(self):
         try:
-            df = self.app.results.last_filtered_data.copy(deep=True)
-            if 'original_index' not in df.columns:
-                df['original_index'] = df.index if 'pivot_index' not in df.columns else df['pivot_index']
-            df = df.sort_values('original_index').reset_index(drop=True)
-            df['pivot_index'] = df.index
-
+            df = prepare_drift_frame(self.data)
             if df.empty:
                 return {'error': "No data to process."}
 
-            total_steps = len(self.segments)
-            step = 0
-
-            for seg_idx, segment in enumerate(self.segments):
-                ref_rm_num = segment['ref_rm_num']
-                pos_df = segment['positions'].copy()
-                rm_pos = pos_df[pos_df['rm_num'] == self.rm_num].copy()
-
-                if rm_pos.empty:
-                    step += 1
-                    if self.progress_dialog:
-                        self.progress_dialog.setValue(int(step / total_steps * 100))
-                        QApplication.processEvents()
-                    continue
-
-                # فقط RMهایی که rm_num >= ref_rm_num هستند (یعنی بعد از مرجع)
-                valid = rm_pos[rm_pos['rm_num'] >= ref_rm_num].copy()
-
-                if hasattr(self.app, 'rm_check') and self.app.rm_check:
-                    ignored_set = self.app.rm_check.ignored_pivots
-                    valid = valid[~valid['pivot_index'].isin(ignored_set)]
-                if valid.empty:
-                    step += 1
-                    if self.progress_dialog:
-                        self.progress_dialog.setValue(int(step / total_steps * 100))
-                        QApplication.processEvents()
-                    continue
-
-                # مهم: فقط بر اساس موقعیت واقعی در داده مرتب کن (نه row_id!)
-                valid = valid.sort_values('pivot_index').reset_index(drop=True)
-
-                # حالا پیدا کردن RM مرجع (اولین RM معتبر)
-                allowed = {'RM', 'RM RM', 'RM 1', 'RM1'}
-                ref_candidates = valid[valid['Solution Label'].str.fullmatch(rf'{re.escape(self.keyword)}\s*\d*', na=False, flags=re.IGNORECASE)]
-                if not ref_candidates.empty:
-                    ref_row = ref_candidates.iloc[0]
-                else:
-                    ref_row = valid.iloc[0]  # اگر نبود، اولین را بگیر
-
-                start_pivot = ref_row['pivot_index']
-                logger.debug(f"Reference RM at pivot_index = {start_pivot}, row_id = {ref_row['row_id']}")
-
-                # فقط RMهایی که بعد از مرجع هستند (شامل خود مرجع نمی‌شود برای تصحیح)
-                correction_rm = valid[valid['pivot_index'] > start_pivot].copy()
-                if correction_rm.empty:
-                    step += 1
-                    continue
-
-                # پیش‌محاسبه ratioها بر اساس اندیس در valid اصلی (نه در correction_rm!)
-                init_series = self.initial_rm_df[self.initial_rm_df['rm_num'] == self.rm_num][self.element]
-                curr_series = self.rm_df[self.rm_df['rm_num'] == self.rm_num][self.element]
-                init_vals = pd.to_numeric(init_series, errors='coerce').fillna(0).values
-                curr_vals = pd.to_numeric(curr_series, errors='coerce').fillna(0).values
-
-                # نقشه از pivot_index به اندیس در آرایه init_vals/curr_vals
-                pivot_to_idx = dict(zip(valid['pivot_index'], valid.index))
-
-                prev_pivot = start_pivot
-
-                for _, rm_row in correction_rm.iterrows():
-                    cur_pivot = rm_row['pivot_index']
-
-                    if cur_pivot <= prev_pivot:
-                        continue  # جلوگیری از عقب‌گرد
-
-                    # پیدا کردن اندیس درست در init_vals و curr_vals
-                    orig_idx = pivot_to_idx.get(cur_pivot)
-                    if orig_idx is None or orig_idx >= len(init_vals) or orig_idx >= len(curr_vals):
-                        prev_pivot = cur_pivot
-                        continue
-
-                    i_val = init_vals[orig_idx]
-                    c_val = curr_vals[orig_idx]
-                    ratio = c_val / i_val if i_val != 0 else 1.0
-
-                    # بازه بین دو RM
-                    cond = (
-                        (df['pivot_index'] >= prev_pivot) &
-                        (df['pivot_index'] < cur_pivot) &
-                        ~df['Solution Label'].str.fullmatch(rf'{re.escape(self.keyword)}\s*\d*', na=False, flags=re.IGNORECASE)
-                    )
-                    to_correct = df[cond]
-
-                    if not to_correct.empty:
-                        orig_vals = pd.to_numeric(to_correct[self.element], errors='coerce').fillna(0).values
-                        new_vals = self.calculate_corrected_values(orig_vals, ratio)
-                        df.loc[to_correct.index, self.element] = new_vals
-
-                        for idx in to_correct.index:
-                            sl = df.at[idx, 'Solution Label']
-                            self.corrected_drift[(sl, self.element)] = ratio
-
-                        logger.debug(f"RM {rm_row['row_id']}: ratio={ratio:.6f} [{prev_pivot} → {cur_pivot})")
-
-                    prev_pivot = cur_pivot
-
-                step += 1
-                if self.progress_dialog:
-                    self.progress_dialog.setValue(int(step / total_steps * 100))
-                    QApplication.processEvents()
+            elements = [el for el in self.elements
+                        if el in df.columns and el in self.rm_df.columns and el in self.initial_rm_df.columns]
+            if not elements:
+                return {'error': "None of the selected elements are in the data."}
+
+            ratios = rm_ratio_matrix(self.rm_df, self.initial_rm_df, self.rm_num, elements)
+            is_rm = keyword_mask(df['Solution Label'], self.keyword)
+            intervals = drift_intervals(self.segments, self.rm_num, self.keyword, self.ignored_pivots)
+            values = df[elements].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+            result = correct_drift(values, is_rm, intervals, ratios, self.stepwise, self.progress, self.cancel)
+
+            if len(result.rows):
+                columns = [df.columns.get_loc(el) for el in elements]
+                df.iloc[result.rows, columns] = result.values[result.rows]
+            self.corrected_drift = result.ledger(df['Solution Label'].to_numpy(dtype=object), elements)
 
             return {
                 'df': df,
                 'rm_df': self.rm_df,
-                'corrected_drift': self.corrected_drift
+                'corrected_drift': self.corrected_drift,
+                'elements': elements,
             }
 
+        except DriftCancelled:
+            logger.info(f"{type(self).__name__} cancelled")
+            return {'cancelled': True}
         except Exception as e:
-            logger.error(f"ApplySingleRM error: {e}", exc_info=True)
+            logger.error(f"{type(self).__name__} error: {e}", exc_info=True)
             return {'error': str(e)}
 
+
+class ApplySingleRM(ApplyRMDrift):
+    def __init__(self, data, keyword, element, rm_num, rm_df, initial_rm_df, segments, stepwise,
+                 ignored_pivots=None, progress=None, cancel=None):
+        super().__init__(data, keyword, [element], rm_num, rm_df, initial_rm_df, segments, stepwise,
+                         ignored_pivots, progress, cancel)
+        self.element = element
+
     def calculate_corrected_values(self, original_values, ratio):
         values = np.array(original_values, dtype=float)
         n = len(values)
@@ -151,4 +345,4 @@ class ApplySingleRM:
             factors = 1.0 + step_delta * np.arange(1, n + 1)
         else:
             factors = np.full(n, ratio)
-        return values * factors
\ No newline at end of file
+        return values * factors
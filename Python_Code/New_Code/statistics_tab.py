@@ -1,5 +1,5 @@
 # screens/management/statistics_tab.py
-import sqlite3
+from utils.db_pool import get_connection
 import pandas as pd
 import logging
 from PyQt6.QtWidgets import (
@@ -195,9 +195,8 @@ class StatisticsTab(QWidget):
 
     def load_devices(self):
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             df = pd.read_sql_query("SELECT name FROM devices ORDER BY name", conn)
-            conn.close()
             for name in df['name']:
                 self.device_combo.addItem(name)
         except Exception as e:
@@ -214,7 +213,7 @@ class StatisticsTab(QWidget):
         device = self.device_combo.currentText() if self.device_combo.currentText() != "All Devices" else None
 
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
 
             # آپدیت کارت‌ها
             counts = [
@@ -244,8 +243,6 @@ class StatisticsTab(QWidget):
             self.plot_device_pie_fixed(conn, pie_chart, start, end)
             self.charts_grid.addWidget(pie_chart,0,1)  # دو ستون
 
-            conn.close()
-
         except Exception as e:
             logger.error(f"Dashboard error: {e}")
             QMessageBox.critical(self, "Error", str(e))
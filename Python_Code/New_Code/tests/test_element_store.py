@@ -0,0 +1,86 @@
+# tests/test_element_store.py
+"""Paging and Y-range filtering of element_store.read_window.
+
+Run from the package root: python -m pytest tests
+"""
+import math
+import os
+
+import pandas as pd
+import pytest
+
+from utils import db_initializer
+from utils.db_pool import close_connections
+from utils.element_store import read_window, sample_count, store_file
+
+SCALE = 10000
+
+
+@pytest.fixture
+def elements_db(tmp_path):
+    """Two uploads; S2 of the first one has no value for Cu."""
+    db_initializer.init_db_schema(lambda name: str(tmp_path / name))
+    db_path = str(tmp_path / "excels_elements.db")
+    first = [
+        ('S1', 'Fe', 2.0), ('S1', 'Cu', 3.0),
+        ('S2', 'Fe', 4.0),
+        ('S3', 'Fe', 5.0), ('S3', 'Cu', 9.5),
+    ]
+    second = [
+        ('T1', 'Fe', 6.0), ('T1', 'Cu', 1.0),
+        ('T2', 'Fe', 7.0), ('T2', 'Cu', 8.0),
+    ]
+    for file_name, rows in (('first.xlsx', first), ('second.xlsx', second)):
+        values = pd.DataFrame(rows, columns=['sample_id', 'element', 'value'])
+        values['value'] *= SCALE
+        store_file(db_path, file_name, values)
+    yield db_path
+    close_connections(db_path)
+
+
+def _wide(frame):
+    return frame.pivot(index='position', columns='element', values='value').reindex(columns=['Fe', 'Cu'])
+
+
+def test_window_pages_rows_in_upload_order(elements_db):
+    assert sample_count(elements_db) == 5
+
+    window = read_window(elements_db, ['Fe', 'Cu'], 1, 4, scale=SCALE)
+
+    assert window['sample_id'].drop_duplicates().tolist() == ['S2', 'S3', 'T1']
+    assert window['file_name'].drop_duplicates().tolist() == ['first.xlsx', 'second.xlsx']
+    wide = _wide(window)
+    assert wide.index.tolist() == [1, 2, 3]
+    assert wide.loc[1, 'Fe'] == 4.0
+    # the missing element is still a row of the window, with no value
+    assert math.isnan(wide.loc[1, 'Cu'])
+    assert wide.loc[3].tolist() == [6.0, 1.0]
+
+
+def test_window_past_the_end(elements_db):
+    assert len(read_window(elements_db, ['Fe'], 3, 10, scale=SCALE)['position'].unique()) == 2
+    assert read_window(elements_db, ['Fe'], 5, 8, scale=SCALE).empty
+
+
+def test_value_range_matches_wide_frame_mask(elements_db):
+    window = read_window(elements_db, ['Fe', 'Cu'], 0, 5, scale=SCALE)
+    wide = _wide(window)
+    lo, hi = 1.0, 8.0
+    mask = True
+    for elem in ['Fe', 'Cu']:
+        mask &= (wide[elem] >= lo) & (wide[elem] <= hi)
+
+    filtered = _wide(read_window(elements_db, ['Fe', 'Cu'], 0, 5, value_range=(lo, hi), scale=SCALE))
+
+    # S2 (no Cu) and S3 (Cu above hi) are dropped, the rest keep their positions
+    assert filtered.index.tolist() == [0, 3, 4]
+    pd.testing.assert_frame_equal(filtered, wide[mask])
+
+
+def test_value_range_filters_only_the_window(elements_db):
+    filtered = read_window(elements_db, ['Fe', 'Cu'], 2, 4, value_range=(1.0, 8.0), scale=SCALE)
+    assert filtered['position'].unique().tolist() == [3]
+
+    # with Fe alone, S2 has every selected element and is kept
+    fe_only = read_window(elements_db, ['Fe'], 0, 5, value_range=(4.0, 6.0), scale=SCALE)
+    assert fe_only['sample_id'].tolist() == ['S2', 'S3', 'T1']
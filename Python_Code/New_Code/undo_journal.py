@@ -0,0 +1,332 @@
+# utils/undo_journal.py
+import logging
+from collections import deque
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_GROUPS = 500
+
+
+class JournalError(Exception):
+    """An undo/redo step could not be applied to the current frames."""
+
+
+class _CellChange:
+    """Old/new values of one column at some rows (index labels) of a DataFrame."""
+
+    def __init__(self, frame_id, rows, column, old, new):
+        self.frame_id = frame_id
+        self.rows = np.asarray(rows)
+        self.column = column
+        self.old = np.asarray(old)
+        self.new = np.asarray(new)
+
+    @property
+    def nbytes(self):
+        return _array_bytes(self.rows) + _array_bytes(self.old) + _array_bytes(self.new)
+
+    def write(self, df, values):
+        if self.column not in df.columns:
+            raise JournalError(f"Column '{self.column}' is no longer in {self.frame_id}")
+        positions = df.index.get_indexer(self.rows)
+        found = positions >= 0
+        if not found.all():
+            logger.warning(f"{int((~found).sum())} rows of {self.frame_id} are gone; skipping them")
+        col = df.columns.get_loc(self.column)
+        if values.dtype.kind == 'f' and df[self.column].dtype.kind in 'iub':
+            df[self.column] = df[self.column].astype(float)
+        df.iloc[positions[found], col] = values[found]
+
+    def undo(self, frame):
+        self.write(frame, self.old)
+
+    def redo(self, frame):
+        self.write(frame, self.new)
+
+
+class _KeyChange:
+    """Old/new value of one key of a dict (_MISSING when the key was absent)."""
+
+    nbytes = 64
+
+    def __init__(self, frame_id, key, old, new):
+        self.frame_id = frame_id
+        self.key = key
+        self.old = old
+        self.new = new
+
+    @staticmethod
+    def _set(mapping, key, value):
+        if value is _MISSING:
+            mapping.pop(key, None)
+        else:
+            mapping[key] = value
+
+    def undo(self, frame):
+        self._set(frame, self.key, self.old)
+
+    def redo(self, frame):
+        self._set(frame, self.key, self.new)
+
+
+class _Replacement:
+    """A whole object swapped for another (for state that is rebuilt rather than edited)."""
+
+    def __init__(self, frame_id, old, new):
+        self.frame_id = frame_id
+        self.old = old
+        self.new = new
+
+    @property
+    def nbytes(self):
+        return _object_bytes(self.old) + _object_bytes(self.new)
+
+
+class _Group:
+    def __init__(self, label, scope):
+        self.label = label
+        self.scope = scope
+        self.changes = []
+        self.nbytes = 0
+
+    def add(self, change):
+        self.changes.append(change)
+        self.nbytes += change.nbytes
+
+
+def _array_bytes(values):
+    values = np.asarray(values)
+    return values.nbytes + (48 * values.size if values.dtype == object else 0)
+
+
+def _object_bytes(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, (dict, list, tuple, set)):
+        return 64 * (len(obj) + 1)
+    return 64
+
+
+def _same(a, b):
+    """Element-wise equality that treats NaN == NaN."""
+    try:
+        equal = np.asarray(a == b, dtype=bool)
+    except (TypeError, ValueError):
+        equal = np.array([x == y for x, y in zip(a, b)], dtype=bool)
+    return equal | (pd.isna(a) & pd.isna(b))
+
+
+class UndoJournal:
+    """App-wide undo/redo journal that stores only what changed.
+
+    Every undoable operation is a group of changes tagged with a scope (the
+    tab or handler that made it): changed DataFrame cells as (frame id, row
+    index labels, column, old values, new values), changed dict keys, or a
+    whole object replaced. Frames are looked up through getters registered
+    under their frame id, so undo and redo write into whatever frame is
+    current and cost O(changed cells). The oldest groups are dropped once
+    the journal goes over max_bytes or max_groups.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_groups=DEFAULT_MAX_GROUPS):
+        self.max_bytes = max_bytes
+        self.max_groups = max_groups
+        self._undo = deque()
+        self._redo = deque()
+        self._frames = {}
+        self._open = None
+        self._depth = 0
+        self.nbytes = 0
+
+    def __getstate__(self):
+        # getters/setters point at live widgets; the owners register them again
+        state = self.__dict__.copy()
+        state['_frames'] = {}
+        state['_open'] = None
+        state['_depth'] = 0
+        return state
+
+    def register(self, frame_id, getter, setter=None):
+        """Make frame_id resolvable: getter() returns the current object, setter(obj) replaces it."""
+        self._frames[frame_id] = (getter, setter)
+
+    def _frame(self, frame_id):
+        if frame_id not in self._frames:
+            raise JournalError(f"Frame '{frame_id}' is not registered")
+        frame = self._frames[frame_id][0]()
+        if frame is None:
+            raise JournalError(f"Frame '{frame_id}' is not loaded")
+        return frame
+
+    # ----- recording -----
+    def group(self, label, scope=None):
+        """Context manager collecting every change recorded inside it into one undo step."""
+        return _GroupContext(self, label, scope)
+
+    def _begin(self, label, scope):
+        if self._depth == 0:
+            self._open = _Group(label, scope)
+        self._depth += 1
+
+    def _end(self, commit):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        group, self._open = self._open, None
+        if commit and group.changes:
+            self._push(group)
+
+    def _add(self, change):
+        if self._open is not None:
+            self._open.add(change)
+        else:
+            group = _Group(None, None)
+            group.add(change)
+            self._push(group)
+
+    def _push(self, group):
+        self._undo.append(group)
+        self.nbytes += group.nbytes
+        self._drop_redo(group.scope)
+        while self._undo and (len(self._undo) > self.max_groups or self.nbytes > self.max_bytes):
+            dropped = self._undo.popleft()
+            self.nbytes -= dropped.nbytes
+            logger.debug(f"Undo journal over budget; dropped '{dropped.label}' ({dropped.nbytes} bytes)")
+        logger.debug(f"Journaled '{group.label}': {len(group.changes)} changes, {group.nbytes} bytes "
+                     f"(journal {self.nbytes} bytes, {len(self._undo)} steps)")
+
+    def _drop_redo(self, scope):
+        # a new step makes the redo steps of its scope (all of them when unscoped) stale
+        self._redo = self._without(self._redo, scope)
+
+    def _without(self, stack, scope):
+        kept = deque()
+        for g in stack:
+            if scope is not None and g.scope != scope:
+                kept.append(g)
+            else:
+                self.nbytes -= g.nbytes
+        return kept
+
+    def record_cells(self, frame_id, rows, column, old, new):
+        """Record new values written to `column` at index labels `rows` of a frame."""
+        if len(rows):
+            self._add(_CellChange(frame_id, rows, column, old, new))
+
+    def record_frame_diff(self, frame_id, before, after, columns=None):
+        """Record the cells of `columns` that differ between two versions of a frame.
+
+        `before` is a DataFrame or a {column: Series} snapshot; rows are
+        matched by index label and only rows present in both are compared.
+        """
+        columns = list(columns if columns is not None else after.columns)
+        for column in columns:
+            if column not in after.columns:
+                continue
+            new = after[column]
+            old = before[column] if column in before else pd.Series(np.nan, index=new.index)
+            if not old.index.equals(new.index):
+                old = old.reindex(new.index)
+            old_values, new_values = old.to_numpy(), new.to_numpy()
+            changed = ~_same(old_values, new_values)
+            if changed.any():
+                self.record_cells(frame_id, new.index.to_numpy()[changed], column,
+                                  old_values[changed], new_values[changed])
+
+    def record_key(self, frame_id, key, old=_MISSING, new=_MISSING):
+        self._add(_KeyChange(frame_id, key, old, new))
+
+    def record_dict_diff(self, frame_id, before, after):
+        """Record the keys added, removed or changed between two versions of a dict."""
+        for key in before.keys() | after.keys():
+            old, new = before.get(key, _MISSING), after.get(key, _MISSING)
+            if old is _MISSING or new is _MISSING or not _same(np.asarray([old], dtype=object), np.asarray([new], dtype=object))[0]:
+                self.record_key(frame_id, key, old, new)
+
+    def record_replace(self, frame_id, old, new):
+        """Record that the object behind frame_id was replaced (undo puts `old` back via the setter)."""
+        if old is not new:
+            self._add(_Replacement(frame_id, old, new))
+
+    # ----- undo / redo -----
+    def _latest(self, stack, scope):
+        for i in range(len(stack) - 1, -1, -1):
+            if scope is None or stack[i].scope == scope:
+                return i
+        return None
+
+    def can_undo(self, scope=None):
+        return self._latest(self._undo, scope) is not None
+
+    def can_redo(self, scope=None):
+        return self._latest(self._redo, scope) is not None
+
+    def _replay(self, group, undo):
+        for change in (reversed(group.changes) if undo else group.changes):
+            if isinstance(change, _Replacement):
+                setter = self._frames.get(change.frame_id, (None, None))[1]
+                if setter is None:
+                    raise JournalError(f"Frame '{change.frame_id}' cannot be replaced")
+                setter(change.old if undo else change.new)
+            elif undo:
+                change.undo(self._frame(change.frame_id))
+            else:
+                change.redo(self._frame(change.frame_id))
+
+    def _move(self, source, target, scope, undo):
+        i = self._latest(source, scope)
+        if i is None:
+            return None
+        group = source[i]
+        self._replay(group, undo)
+        del source[i]
+        target.append(group)
+        logger.debug(f"{'Undid' if undo else 'Redid'} '{group.label}' ({len(group.changes)} changes)")
+        return group.label or ''
+
+    def undo(self, scope=None):
+        """Undo the latest step of `scope` (any scope if None); returns its label, or None if there is none."""
+        return self._move(self._undo, self._redo, scope, undo=True)
+
+    def redo(self, scope=None):
+        return self._move(self._redo, self._undo, scope, undo=False)
+
+    def clear(self, scope=None):
+        """Forget the undo and redo steps of `scope` (all of them if None)."""
+        self._undo = self._without(self._undo, scope)
+        self._redo = self._without(self._redo, scope)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def __bool__(self):
+        return bool(self._undo)
+
+
+class _GroupContext:
+    def __init__(self, journal, label, scope):
+        self.journal = journal
+        self.label = label
+        self.scope = scope
+
+    def __enter__(self):
+        self.journal._begin(self.label, self.scope)
+        return self.journal
+
+    def __exit__(self, exc_type, exc, tb):
+        self.journal._end(commit=exc_type is None)
+        return False
+
+
+def app_journal(app):
+    """The application's shared UndoJournal, created on first use."""
+    journal = getattr(app, 'undo_journal', None)
+    if journal is None:
+        journal = UndoJournal()
+        app.undo_journal = journal
+    return journal
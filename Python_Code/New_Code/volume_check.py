@@ -5,42 +5,33 @@ import pandas as pd
 import numpy as np
 import time
 import logging
-from collections import deque
+from utils.correction_kernel import correct_by_label
+from utils.undo_journal import app_journal, JournalError
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+JOURNAL_SCOPE = 'volume_check'
+
 class VolumeCorrectionThread(QThread):
     """Thread for applying volume corrections in the background."""
     progress = pyqtSignal(int)
-    finished = pyqtSignal(str, int)
+    finished = pyqtSignal(object, int)
     error = pyqtSignal(str)
 
     def __init__(self, df, solution_labels, new_volume):
         super().__init__()
-        self.df = df.copy()
+        self.df = df  # read only; the result is applied on the GUI thread
         self.solution_labels = solution_labels
         self.new_volume = new_volume
 
     def run(self):
         try:
-            corrected_rows = 0
-            total_rows = len(self.solution_labels)
-            for i, solution_label in enumerate(self.solution_labels):
-                mask = (self.df['Solution Label'] == solution_label) & (self.df['Type'] == 'Samp')
-                matching_rows = self.df[mask]
-                if not matching_rows.empty:
-                    for idx in matching_rows.index:
-                        current_volume = float(self.df.loc[idx, 'Act Vol'])
-                        current_corr_con = float(self.df.loc[idx, 'Corr Con'])
-                        corrected_corr_con = (self.new_volume / current_volume) * current_corr_con if current_volume != 0 else current_corr_con
-                        self.df.loc[idx, 'Corr Con'] = corrected_corr_con
-                        self.df.loc[idx, 'Act Vol'] = self.new_volume
-                    corrected_rows += len(matching_rows)
-                if total_rows > 10:
-                    self.progress.emit(int((i + 1) / total_rows * 100))
-            self.finished.emit(self.df.to_json(), corrected_rows)
+            factors = dict.fromkeys(self.solution_labels, self.new_volume)
+            result = correct_by_label(self.df, factors, 'Act Vol', 'Corr Con')
+            self.progress.emit(100)
+            self.finished.emit(result, result.corrected_rows)
         except Exception as e:
             self.error.emit(str(e))
 
@@ -61,7 +52,10 @@ class VolumeCheckFrame(QWidget):
         self.included_samples = set()
         self.volume_value = 50.0
         self.new_volume = 50.0
-        self.undo_stack = deque()
+        self.journal = app_journal(app)
+        self.journal.register(f"{JOURNAL_SCOPE}.df_cache", lambda: self.df_cache)
+        self.journal.register(f"{JOURNAL_SCOPE}.corrected_volumes", lambda: self.corrected_volumes)
+        self._corrected_volumes_before = {}
         self.is_select_all_processing = False
         self.setup_ui()
 
@@ -176,6 +170,11 @@ class VolumeCheckFrame(QWidget):
         undo_button.clicked.connect(self.undo_last_change)
         input_layout.addWidget(undo_button)
 
+        redo_button = QPushButton("Redo")
+        redo_button.setToolTip("Redo the last undone volume correction")
+        redo_button.clicked.connect(self.redo_last_change)
+        input_layout.addWidget(redo_button)
+
         input_layout.addStretch()
         main_layout.addWidget(input_group)
 
@@ -445,7 +444,7 @@ class VolumeCheckFrame(QWidget):
             QMessageBox.warning(self, "Warning", "No samples included! Check 'Include' checkboxes.")
             return
 
-        self.undo_stack.append(df.copy().to_json())
+        self._corrected_volumes_before = dict(self.corrected_volumes)
 
         # Update corrected volumes dictionary
         if self.bad_volumes is not None:
@@ -464,18 +463,9 @@ class VolumeCheckFrame(QWidget):
 
         if len(valid_labels) <= 10:
             try:
-                corrected_rows = 0
-                for solution_label in valid_labels:
-                    mask = (df['Solution Label'] == solution_label) & (df['Type'] == 'Samp')
-                    matching_rows = df[mask]
-                    if not matching_rows.empty:
-                        for idx in matching_rows.index:
-                            current_volume = float(df.loc[idx, 'Act Vol'])
-                            current_corr_con = float(df.loc[idx, 'Corr Con'])
-                            corrected_corr_con = (self.new_volume / current_volume) * current_corr_con if current_volume != 0 else current_corr_con
-                            df.loc[idx, 'Corr Con'] = corrected_corr_con
-                            df.loc[idx, 'Act Vol'] = self.new_volume
-                        corrected_rows += len(matching_rows)
+                result = correct_by_label(df, dict.fromkeys(valid_labels, self.new_volume), 'Act Vol', 'Corr Con')
+                self.apply_correction_result(result)
+                corrected_rows = result.corrected_rows
                 self.df_cache = df
                 self.app.set_data(self.df_cache)
                 self.data_changed.emit()
@@ -511,13 +501,43 @@ class VolumeCheckFrame(QWidget):
 
         logger.debug(f"Starting apply_volume_correction took {time.time() - start_time:.3f} seconds")
 
+    def apply_correction_result(self, result):
+        """Write a correction into df_cache and journal the changed cells and corrected_volumes entries."""
+        with self.journal.group("Volume correction", JOURNAL_SCOPE):
+            result.apply(self.df_cache, self.journal, f"{JOURNAL_SCOPE}.df_cache")
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.corrected_volumes",
+                                          self._corrected_volumes_before, self.corrected_volumes)
+
     def undo_last_change(self):
         """Undo the last volume correction."""
-        if not self.undo_stack:
+        if not self.journal.can_undo(JOURNAL_SCOPE):
             QMessageBox.information(self, "Info", "No changes to undo!")
             return
-        prev_json = self.undo_stack.pop()
-        self.df_cache = pd.read_json(prev_json)
+        try:
+            self.journal.undo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Undo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change undone")
+        if self.bad_volumes.empty:
+            QMessageBox.information(self, "Info", "No issues found with volumes after undo.")
+
+    def redo_last_change(self):
+        """Redo the last undone volume correction."""
+        if not self.journal.can_redo(JOURNAL_SCOPE):
+            QMessageBox.information(self, "Info", "No changes to redo!")
+            return
+        try:
+            self.journal.redo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Redo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change redone")
+
+    def refresh_after_journal_step(self):
+        """Publish df_cache after an undo/redo and rebuild the bad volumes table."""
         self.app.set_data(self.df_cache)
         self.data_changed.emit()  # Emit signal to notify ResultsFrame
         self.app.notify_data_changed()
@@ -525,19 +545,15 @@ class VolumeCheckFrame(QWidget):
         self.bad_volumes = sample_data[
             (sample_data['Act Vol'] != self.volume_value)
         ][['Solution Label', 'Act Vol', 'Corr Con']].drop_duplicates(subset=['Solution Label'])
-        self.corrected_volumes.clear()
         self.included_samples.clear()
         self.correction_table.clearSelection()
         self.selected_solution_labels = []
         self.select_all_checkbox.setCheckState(Qt.CheckState.Unchecked)
         self.update_correction_table()
-        QMessageBox.information(self, "Success", "Last change undone")
-        if self.bad_volumes.empty:
-            QMessageBox.information(self, "Info", "No issues found with volumes after undo.")
 
-    def on_correction_finished(self, df_json, corrected_rows):
+    def on_correction_finished(self, result, corrected_rows):
         """Handle thread completion."""
-        self.df_cache = pd.read_json(df_json)
+        self.apply_correction_result(result)
         self.app.set_data(self.df_cache)
         self.data_changed.emit()  # Emit signal to notify ResultsFrame
         self.app.notify_data_changed()
@@ -575,7 +591,7 @@ class VolumeCheckFrame(QWidget):
         self.included_samples = set()
         self.volume_value = 50.0
         self.new_volume = 50.0
-        self.undo_stack = deque()
+        self.journal.clear(JOURNAL_SCOPE)
         self.is_select_all_processing = False
         
         # Reset UI elements
@@ -5,42 +5,33 @@ import pandas as pd
 import numpy as np
 import time
 import logging
-from collections import deque
+from utils.correction_kernel import correct_by_label
+from utils.undo_journal import app_journal, JournalError
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+JOURNAL_SCOPE = 'weight_check'
+
 class WeightCorrectionThread(QThread):
     """Thread for applying weight corrections in the background."""
     progress = pyqtSignal(int)
-    finished = pyqtSignal(str, int)
+    finished = pyqtSignal(object, int)
     error = pyqtSignal(str)
 
     def __init__(self, df, solution_labels, new_weight):
         super().__init__()
-        self.df = df.copy()
+        self.df = df  # فقط خوانده می‌شود؛ تغییرات در نخ اصلی اعمال می‌شود
         self.solution_labels = solution_labels
         self.new_weight = new_weight
 
     def run(self):
         try:
-            corrected_rows = 0
-            total_rows = len(self.solution_labels)
-            for i, solution_label in enumerate(self.solution_labels):
-                mask = (self.df['Solution Label'] == solution_label) & (self.df['Type'] == 'Samp')
-                matching_rows = self.df[mask]
-                if not matching_rows.empty:
-                    for idx in matching_rows.index:
-                        current_weight = float(self.df.loc[idx, 'Act Wgt'])
-                        current_corr_con = float(self.df.loc[idx, 'Corr Con'])
-                        corrected_corr_con = (self.new_weight / current_weight) * current_corr_con if current_weight != 0 else current_corr_con
-                        self.df.loc[idx, 'Corr Con'] = corrected_corr_con
-                        self.df.loc[idx, 'Act Wgt'] = self.new_weight
-                    corrected_rows += len(matching_rows)
-                if total_rows > 10:
-                    self.progress.emit(int((i + 1) / total_rows * 100))
-            self.finished.emit(self.df.to_json(), corrected_rows)
+            factors = dict.fromkeys(self.solution_labels, self.new_weight)
+            result = correct_by_label(self.df, factors, 'Act Wgt', 'Corr Con')
+            self.progress.emit(100)
+            self.finished.emit(result, result.corrected_rows)
         except Exception as e:
             self.error.emit(str(e))
 
@@ -59,7 +50,10 @@ class WeightCheckFrame(QWidget):
         self.weight_min = 0.190
         self.weight_max = 0.210
         self.new_weight = 0.2
-        self.undo_stack = deque()
+        self.journal = app_journal(app)
+        self.journal.register(f"{JOURNAL_SCOPE}.df_cache", lambda: self.df_cache)
+        self.journal.register(f"{JOURNAL_SCOPE}.corrected_weights", lambda: self.corrected_weights)
+        self._corrected_weights_before = {}
         self.is_select_all_processing = False
         self.setup_ui()
 
@@ -180,6 +174,11 @@ class WeightCheckFrame(QWidget):
         undo_button.clicked.connect(self.undo_last_change)
         input_layout.addWidget(undo_button)
 
+        redo_button = QPushButton("Redo")
+        redo_button.setToolTip("Redo the last undone weight correction")
+        redo_button.clicked.connect(self.redo_last_change)
+        input_layout.addWidget(redo_button)
+
         input_layout.addStretch()
         main_layout.addWidget(input_group)
 
@@ -445,7 +444,7 @@ class WeightCheckFrame(QWidget):
                 QMessageBox.warning(self, "Warning", "No samples included! Check 'Include' checkboxes.")
                 return
 
-            self.undo_stack.append(df.copy().to_json())
+            self._corrected_weights_before = dict(self.corrected_weights)
 
             if self.original_bad_weights is not None:
                 bad_weights_dict = self.original_bad_weights.set_index('Solution Label')[['Act Wgt', 'Corr Con']].to_dict('index')
@@ -463,18 +462,9 @@ class WeightCheckFrame(QWidget):
 
             if len(valid_labels) <= 10:
                 try:
-                    corrected_rows = 0
-                    for solution_label in valid_labels:
-                        mask = (df['Solution Label'] == solution_label) & (df['Type'] == 'Samp')
-                        matching_rows = df[mask]
-                        if not matching_rows.empty:
-                            for idx in matching_rows.index:
-                                current_weight = float(df.loc[idx, 'Act Wgt'])
-                                current_corr_con = float(df.loc[idx, 'Corr Con'])
-                                corrected_corr_con = (new_weight / current_weight) * current_corr_con if current_weight != 0 else current_corr_con
-                                df.loc[idx, 'Corr Con'] = corrected_corr_con
-                                df.loc[idx, 'Act Wgt'] = new_weight
-                            corrected_rows += len(matching_rows)
+                    result = correct_by_label(df, dict.fromkeys(valid_labels, new_weight), 'Act Wgt', 'Corr Con')
+                    self.apply_correction_result(result)
+                    corrected_rows = result.corrected_rows
                     self.df_cache = df
                     self.app.set_data(self.df_cache)
                     self.data_changed.emit()
@@ -510,41 +500,58 @@ class WeightCheckFrame(QWidget):
             self.thread.error.connect(self.on_correction_error)
             self.thread.start()
 
+    def apply_correction_result(self, result):
+        """Write a correction into df_cache and journal the changed cells and corrected_weights entries."""
+        with self.journal.group("Weight correction", JOURNAL_SCOPE):
+            result.apply(self.df_cache, self.journal, f"{JOURNAL_SCOPE}.df_cache")
+            self.journal.record_dict_diff(f"{JOURNAL_SCOPE}.corrected_weights",
+                                          self._corrected_weights_before, self.corrected_weights)
+
     def undo_last_change(self):
         """Undo the last weight correction and update the table."""
-        if not self.undo_stack:
+        if not self.journal.can_undo(JOURNAL_SCOPE):
             QMessageBox.information(self, "Info", "No changes to undo!")
             return
-        
-        # Restore previous data from undo stack
-        prev_json = self.undo_stack.pop()
-        self.df_cache = pd.read_json(prev_json)
+        try:
+            self.journal.undo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Undo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change undone")
+        if self.bad_weights.empty:
+            QMessageBox.information(self, "Info", "No issues found with weights after undo.")
+
+    def redo_last_change(self):
+        """Redo the last undone weight correction and update the table."""
+        if not self.journal.can_redo(JOURNAL_SCOPE):
+            QMessageBox.information(self, "Info", "No changes to redo!")
+            return
+        try:
+            self.journal.redo(JOURNAL_SCOPE)
+        except JournalError as e:
+            QMessageBox.warning(self, "Error", f"Redo failed: {e}")
+            return
+        self.refresh_after_journal_step()
+        QMessageBox.information(self, "Success", "Last change redone")
+
+    def refresh_after_journal_step(self):
+        """Publish df_cache after an undo/redo and rebuild the bad weights table."""
         self.app.set_data(self.df_cache)
         self.data_changed.emit()
         self.app.notify_data_changed()  # Notify all tabs of data change
-        
-        # Recalculate bad_weights based on restored data
         sample_data = self.df_cache[self.df_cache['Type'] == 'Samp']
         self.bad_weights = sample_data[
             (sample_data['Act Wgt'] < self.weight_min) | (sample_data['Act Wgt'] > self.weight_max)
         ][['Solution Label', 'Act Wgt', 'Corr Con']].drop_duplicates(subset=['Solution Label'])
-
-        # Clear corrected weights since we're reverting to previous state
-        self.corrected_weights.clear()
-        
-        # Update table to reflect restored bad weights
         self.update_correction_table()
         self.correction_table.clearSelection()
         self.selected_solution_labels = []
         self.included_samples.clear()
         self.select_all_checkbox.setCheckState(Qt.CheckState.Unchecked)
-        
-        QMessageBox.information(self, "Success", "Last change undone")
-        if self.bad_weights.empty:
-            QMessageBox.information(self, "Info", "No issues found with weights after undo.")
 
-    def on_correction_finished(self, df_json, corrected_rows):
-        self.df_cache = pd.read_json(df_json)
+    def on_correction_finished(self, result, corrected_rows):
+        self.apply_correction_result(result)
         self.app.set_data(self.df_cache)
         self.data_changed.emit()
         sample_data = self.df_cache[self.df_cache['Type'] == 'Samp']
@@ -581,7 +588,7 @@ class WeightCheckFrame(QWidget):
         self.weight_min = 0.190
         self.weight_max = 0.210
         self.new_weight = 0.2
-        self.undo_stack = deque()
+        self.journal.clear(JOURNAL_SCOPE)
         self.is_select_all_processing = False
         
         # Reset UI elements